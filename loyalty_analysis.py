@@ -10,7 +10,21 @@ Author: Kent Schneider
 Last Updated: November 9, 2024
 
 Usage:
-    python loyalty_analysis.py
+    python loyalty_analysis.py [--input FILE] [--output-dir DIR] [--workers N] [--compact]
+                               [--cache [DIR]] [--history [DIR]] [--profile]
+                               [--metrics-file json|csv] [--sort full|loyal|none]
+                               [--compress gzip|zstd] [--float-format shortest|fixed]
+                               [--timestamp column|sidecar] [--check-config] [--dry-run]
+                               [--transactions FILE [FILE ...] [--accounts FILE]]
+                               [--hierarchy FILE] [--merge-duplicates FILE]
+
+Library use (no printing, no files written, nothing run at import):
+    from loyalty_analysis import load_revenue_extract, run_analysis
+    from loyalty_config import LOYALTY_CONFIG
+    df = load_revenue_extract("customer_annual_revenue.csv")
+    result = run_analysis(df, LOYALTY_CONFIG)
+    result["output"]    # PowerBI-ready DataFrame
+    result["summary"]   # Headline statistics
 
 Requirements:
     - Python 3.7+
@@ -23,45 +37,151 @@ Output:
     - Console summary statistics
 """
 
-import pandas as pd
-import numpy as np
-from datetime import datetime
-import sys
+import argparse
 import os
+import sys
+from contextlib import nullcontext
+from datetime import datetime
+
+# pandas and numpy are imported inside the functions that use them, so that
+# --help, --check-config and --dry-run answer without loading them
 
-# Import configuration
+# Import configuration (reported by main() if missing, so importing this
+# module never exits the interpreter)
 try:
-    from loyalty_config import LOYALTY_CONFIG, EVALUATION_YEARS, NUM_EVALUATION_YEARS
+    from loyalty_config import LOYALTY_CONFIG
 except ImportError:
-    print("ERROR: loyalty_config.py not found in current directory.")
-    print("Please ensure loyalty_config.py is in the same folder as this script.")
-    sys.exit(1)
+    LOYALTY_CONFIG = None
 
 # ============================================================================
 # CONFIGURATION & CONSTANTS
 # ============================================================================
 
 INPUT_FILE = "customer_annual_revenue.csv"
-CURRENT_YEAR = LOYALTY_CONFIG["current_year"]
-
-# Extract thresholds from config
-MIN_TENURE = LOYALTY_CONFIG["min_tenure_years"]
-MIN_CONSISTENCY = LOYALTY_CONFIG["min_consistency_rate"]
-MIN_REVENUE_5YR = LOYALTY_CONFIG["min_revenue_5yr"]
-MIN_REVENUE_PER_YEAR = LOYALTY_CONFIG["min_revenue_per_active_year"]
-
-print("="*80)
-print("CUSTOMER LOYALTY FRAMEWORK ANALYSIS")
-print("="*80)
-print(f"Analysis Date: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-print(f"Framework Version: 1.0")
-print(f"\nConfiguration:")
-print(f"  • Minimum Tenure: {MIN_TENURE} years")
-print(f"  • Minimum Consistency: {MIN_CONSISTENCY:.0%} ({int(MIN_CONSISTENCY * NUM_EVALUATION_YEARS)} of {NUM_EVALUATION_YEARS} years)")
-print(f"  • Minimum 5-Year Revenue: ${MIN_REVENUE_5YR:,}")
-print(f"  • Min Revenue Per Active Year: ${MIN_REVENUE_PER_YEAR:,} {'(DISABLED)' if MIN_REVENUE_PER_YEAR == 0 else '(ENABLED)'}")
-print(f"  • Evaluation Window: {LOYALTY_CONFIG['evaluation_start_year']}-{LOYALTY_CONFIG['evaluation_end_year']}")
-print("="*80)
+FRAMEWORK_VERSION = "1.0"
+
+BASE_COLUMNS = ['Account_ID', 'Name', 'Sub Segment', 'First Order Date']
+
+# Output sort order (Loyal first, Ineligible last)
+STATUS_ORDER = {'Loyal': 0, 'Not Qualified': 1, 'Ineligible': 2}
+
+# Row orders sort_output() can produce ('full' is the documented file layout)
+OUTPUT_ORDERS = ['full', 'loyal', 'none']
+
+def get_evaluation_years(config):
+    """
+    List the years in the evaluation window of a config.
+
+    Args:
+        config: Loyalty config dict (see loyalty_config.py)
+
+    Returns:
+        list: e.g. [2020, 2021, 2022, 2023, 2024]
+    """
+    return list(range(config["evaluation_start_year"], config["evaluation_end_year"] + 1))
+
+def revenue_column_name(year):
+    """Raw input column holding a year's revenue (e.g. "TY Net Product Revenue 2020")."""
+    return f'TY Net Product Revenue {year}'
+
+def timed_stage(metrics, name, rows=None):
+    """
+    metrics.stage(name, rows) from loyalty_profiling, or a no-op block when
+    metrics is None.
+    """
+    if metrics is None:
+        return nullcontext({})
+    return metrics.stage(name, rows)
+
+def get_required_columns(config):
+    """
+    Input columns needed to score a config's evaluation window.
+
+    Args:
+        config: Loyalty config dict
+
+    Returns:
+        list: Base identification columns followed by one revenue column per year
+    """
+    return BASE_COLUMNS + [revenue_column_name(year) for year in get_evaluation_years(config)]
+
+# Config keys and the (inclusive) range each must fall in
+CONFIG_LIMITS = {
+    "min_tenure_years": (0, None),
+    "evaluation_start_year": (1900, None),
+    "evaluation_end_year": (1900, None),
+    "min_consistency_rate": (0, 1),
+    "min_revenue_5yr": (0, None),
+    "min_revenue_per_active_year": (0, None),
+    "current_year": (1900, None),
+}
+
+# Thresholds a segment_thresholds entry can override
+THRESHOLD_KEYS = ["min_tenure_years", "min_consistency_rate", "min_revenue_5yr",
+                  "min_revenue_per_active_year"]
+
+# Rule set of accounts whose segment has no override
+DEFAULT_RULE = 'default'
+
+def _limit_problem(key, value):
+    """Why a config value is outside CONFIG_LIMITS (None if it is fine)."""
+    low, high = CONFIG_LIMITS[key]
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return f"{key} must be a number (got {value!r})"
+    if (low is not None and value < low) or (high is not None and value > high):
+        bounds = f"between {low} and {high}" if high is not None else f"at least {low}"
+        return f"{key} must be {bounds} (got {value})"
+    return None
+
+def validate_config(config, evaluation_years=None):
+    """
+    Check a config before any data is read.
+
+    Args:
+        config: Loyalty config dict
+        evaluation_years: EVALUATION_YEARS from loyalty_config.py, if defined;
+                          must list the years of the evaluation window
+
+    Returns:
+        list: Problem descriptions (empty if the config is usable)
+    """
+    problems = []
+    for key in CONFIG_LIMITS:
+        if key not in config:
+            problems.append(f"{key} is missing")
+        elif _limit_problem(key, config[key]):
+            problems.append(_limit_problem(key, config[key]))
+
+    overrides = config.get("segment_thresholds") or {}
+    if not isinstance(overrides, dict):
+        problems.append(f"segment_thresholds must be a dict of segment → thresholds (got {overrides!r})")
+        overrides = {}
+    for segment, thresholds in overrides.items():
+        if not isinstance(segment, str) or segment == DEFAULT_RULE:
+            problems.append(f"segment_thresholds: {segment!r} is not a usable Sub Segment name")
+        elif not isinstance(thresholds, dict):
+            problems.append(f"segment_thresholds[{segment!r}] must be a dict of thresholds")
+        else:
+            for key, value in thresholds.items():
+                if key not in THRESHOLD_KEYS:
+                    problems.append(f"segment_thresholds[{segment!r}]: unknown threshold {key!r}")
+                elif _limit_problem(key, value):
+                    problems.append(f"segment_thresholds[{segment!r}]: {_limit_problem(key, value)}")
+    if problems:
+        return problems
+
+    start, end = config["evaluation_start_year"], config["evaluation_end_year"]
+    if start != int(start) or end != int(end):
+        problems.append(f"evaluation years must be whole years (got {start}-{end})")
+    elif start > end:
+        problems.append(f"evaluation_start_year ({start}) is after evaluation_end_year ({end})")
+    elif evaluation_years is not None and list(evaluation_years) != get_evaluation_years(config):
+        problems.append(f"EVALUATION_YEARS {list(evaluation_years)} does not match the "
+                        f"evaluation window {start}-{end}")
+    if config["current_year"] < end:
+        problems.append(f"current_year ({config['current_year']}) is before "
+                        f"evaluation_end_year ({end})")
+    return problems
 
 # ============================================================================
 # DATA CLEANING FUNCTIONS
@@ -89,6 +209,8 @@ def clean_currency(val):
     Returns:
         float: Cleaned numeric value
     """
+    import pandas as pd
+
     # Handle null/blank
     if pd.isna(val) or val == '' or val == ' ':
         return 0.0
@@ -118,342 +240,1808 @@ def clean_currency(val):
     except ValueError:
         return 0.0
 
-def infer_first_order_year(row, year_columns):
+# A plain decimal number once $, commas and spaces are removed. Anything else
+# (blanks aside) is rare and falls back to clean_currency() value by value.
+CURRENCY_NUMBER_PATTERN = r'[+-]?(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?'
+
+def _parse_currency_text(values):
     """
-    Infer first order year from revenue data if First Order Date is blank.
+    Vectorized clean_currency() for an object/string Series.
     
-    Finds the earliest year with positive revenue.
+    Blanks become 0.0 and plain decimal strings are converted in bulk; the
+    few values that don't look like a plain number are passed to
+    clean_currency() so the results are identical value for value.
     
     Args:
-        row: DataFrame row
-        year_columns: List of revenue column names to check
+        values: pandas Series of strings, numbers, or nulls
         
     Returns:
-        int or None: Year of first order, or None if no revenue found
+        numpy.ndarray: float64 values aligned with the input
     """
-    for col in year_columns:
-        if row[col] > 0:  # First year with positive revenue
-            # Extract year from column name (e.g., "revenue_2020" → 2020)
-            return int(col.split('_')[1])
-    return None
+    import numpy as np
+    import pandas as pd
+
+    result = np.zeros(len(values), dtype='float64')
+    present = values.notna().to_numpy()
+    if not present.any():
+        return result
+    
+    text = values[present]
+    if not pd.api.types.is_string_dtype(text.dtype) or text.dtype == object:
+        text = text.astype(str)
+    text = text.str.strip()
+    is_negative = text.str.startswith('(') & text.str.endswith(')')
+    text = text.where(~is_negative, text.str.slice(1, -1))
+    text = (text.str.replace('$', '', regex=False)
+                .str.replace(',', '', regex=False)
+                .str.replace(' ', '', regex=False))
+    
+    is_number = text.str.fullmatch(CURRENCY_NUMBER_PATTERN).to_numpy(dtype=bool)
+    is_blank = (text.str.len() == 0).to_numpy() & ~is_negative.to_numpy()
+    
+    parsed = np.zeros(len(text), dtype='float64')
+    parsed[is_number] = text[is_number].astype('float64').to_numpy()
+    negative = is_negative.to_numpy() & is_number
+    parsed[negative] = -np.abs(parsed[negative])
+    
+    # Everything else (bad text, "inf", booleans, ...) takes the slow path
+    fallback = ~is_number & ~is_blank
+    if fallback.any():
+        originals = values[present][fallback]
+        parsed[fallback] = [clean_currency(val) for val in originals]
+    
+    result[present] = parsed
+    return result
+
+def parse_currency_columns(df, columns):
+    """
+    Clean several currency columns at once, matching clean_currency().
+    
+    Columns that pandas already read as numbers skip string parsing
+    entirely (blanks → 0.0). All remaining text columns are stacked and
+    parsed together in a single vectorized pass.
+    
+    Args:
+        df: DataFrame containing the raw columns
+        columns: List of column names to clean
+        
+    Returns:
+        DataFrame: float64 columns with the same names and index as the input
+    """
+    import pandas as pd
+
+    cleaned = {}
+    text_columns = []
+    for col in columns:
+        if pd.api.types.is_numeric_dtype(df[col]):
+            cleaned[col] = df[col].astype('float64').fillna(0.0).to_numpy()
+        else:
+            text_columns.append(col)
+    
+    if text_columns:
+        stacked = pd.concat([df[col] for col in text_columns], ignore_index=True)
+        parsed = _parse_currency_text(stacked).reshape(len(text_columns), len(df))
+        for col, values in zip(text_columns, parsed):
+            cleaned[col] = values
+    
+    return pd.DataFrame({col: cleaned[col] for col in columns}, index=df.index)
+
+def infer_first_order_years(df, year_columns):
+    """
+    Infer first order years from revenue data for rows whose First Order
+    Date is blank: the earliest year with positive revenue.
+    
+    Builds a boolean "revenue > 0" matrix over the year columns and takes
+    the first True position per row (argmax), so the work happens in NumPy
+    rather than in a Python loop over customers.
+    
+    Args:
+        df: DataFrame with cleaned revenue columns
+        year_columns: List of revenue column names in year order
+        
+    Returns:
+        Series: Inferred year per row (float, NaN if no revenue found)
+    """
+    import pandas as pd
+
+    years = [int(col.split('_')[1]) for col in year_columns]
+    return pd.Series(first_revenue_years(df[year_columns].to_numpy(), years), index=df.index)
+
+def first_revenue_years(revenue, years):
+    """
+    First year with positive revenue for each row of an (accounts x years)
+    array.
+
+    Args:
+        revenue: 2-D revenue array, columns in year order
+        years: Year of each column
+
+    Returns:
+        numpy.ndarray: float year per row (NaN if no revenue found)
+    """
+    import numpy as np
+
+    has_revenue = revenue > 0
+    first_year_index = has_revenue.argmax(axis=1)
+    years = np.asarray(years, dtype='float64')
+    return np.where(has_revenue.any(axis=1), years[first_year_index], np.nan)
+
+# ============================================================================
+# DATE PARSING
+# ============================================================================
+
+# Formats tried, in order, on the distinct First Order Date strings before
+# pandas is asked to guess. The PowerBI export writes the first; Excel's
+# short date is the last. Tenure only needs the year, which month-first and
+# day-first readings agree on, so day-first dates are left to the guess.
+DATE_FORMATS = ['%Y-%m-%d %H:%M:%S', '%Y-%m-%d', '%m/%d/%Y', '%m/%d/%Y %H:%M:%S', '%m/%d/%Y %H:%M',
+                '%m/%d/%y']
+
+# pandas' per-value parsing mode, used (and reported as the format) for
+# values no format above and no guessed format reads
+MIXED_FORMAT = 'mixed'
+
+def _parse_datetimes(text, positions, fmt):
+    """text[positions] read with one format, as datetime64[s] (NaT where it does not match)."""
+    import pandas as pd
+
+    parsed = pd.to_datetime(text[positions], format=fmt, errors='coerce')
+    return parsed.to_numpy(dtype='datetime64[s]')
+
+def date_years(values):
+    """Calendar year of each datetime64 value as float64 (NaN for NaT)."""
+    import numpy as np
+
+    values = np.asarray(values, dtype='datetime64[s]')
+    years = values.astype('datetime64[Y]').astype('int64') + 1970
+    return np.where(np.isnat(values), np.nan, years)
+
+def _parse_distinct_dates(dates, formats):
+    """
+    Factorize a text (or categorical) date column and parse each distinct
+    value once; see parse_first_order_years().
+
+    Returns:
+        tuple: (int codes per row, -1 for missing; datetime64[s] per
+        distinct value followed by one NaT, so code -1 reads NaT; stats dict)
+    """
+    import warnings
+
+    import numpy as np
+    import pandas as pd
+
+    if isinstance(dates.dtype, pd.CategoricalDtype):
+        codes, uniques = dates.cat.codes.to_numpy(), dates.cat.categories
+    else:
+        codes, uniques = pd.factorize(dates)
+    text = pd.Index(uniques, dtype=object).astype(str).str.strip().to_numpy(dtype=object)
+
+    unique_dates = np.full(len(text) + 1, np.datetime64('NaT'), dtype='datetime64[s]')
+    unique_format = np.full(len(text), -1, dtype='int16')
+    blank = text == ''
+    detected = []
+
+    def read(positions, fmt):
+        parsed = _parse_datetimes(text, positions, fmt)
+        hit = ~np.isnat(parsed)
+        if hit.any():
+            if fmt not in detected:
+                detected.append(fmt)
+            unique_dates[positions[hit]] = parsed[hit]
+            unique_format[positions[hit]] = detected.index(fmt)
+
+    for fmt in formats:
+        unparsed = np.flatnonzero((unique_format < 0) & ~blank)
+        if len(unparsed) == 0:
+            break
+        read(unparsed, fmt)
+
+    # Anything else: guess a format per leftover value, then read each
+    # guessed format's values together
+    leftovers = np.flatnonzero((unique_format < 0) & ~blank)
+    if len(leftovers):
+        from pandas.tseries.api import guess_datetime_format
+
+        guessed = {}
+        with warnings.catch_warnings():
+            # Day-first guesses warn; the year is the same either way
+            warnings.simplefilter('ignore', UserWarning)
+            for position in leftovers:
+                fmt = guess_datetime_format(text[position])
+                if fmt is not None:
+                    guessed.setdefault(fmt, []).append(position)
+        for fmt, positions in guessed.items():
+            read(np.asarray(positions), fmt)
+
+    # Last resort: whatever pd.to_datetime() reads on its own ("Jul 2020",
+    # "7/17/20 13:45"), each value parsed separately
+    leftovers = np.flatnonzero((unique_format < 0) & ~blank)
+    if len(leftovers):
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', UserWarning)
+            read(leftovers, MIXED_FORMAT)
+
+    # Rows per distinct value
+    occurrences = np.bincount(codes[codes >= 0], minlength=len(text))
+    stats = {
+        'formats': {fmt: int(occurrences[unique_format == i].sum()) for i, fmt in enumerate(detected)},
+        'blank': int((codes < 0).sum() + occurrences[blank].sum()),
+        'invalid': int(occurrences[(unique_format < 0) & ~blank].sum()),
+    }
+    return codes, unique_dates, stats
+
+def _typed_date_stats(values):
+    """parse_first_order_years() statistics for a column already typed as dates."""
+    import numpy as np
+
+    parsed = int((~np.isnat(values)).sum())
+    return {'formats': {'datetime': parsed} if parsed else {}, 'blank': len(values) - parsed, 'invalid': 0}
+
+def parse_first_order_years(dates, formats=DATE_FORMATS):
+    """
+    Year of each First Order Date, parsing every distinct string once.
+
+    The column is factorized and only its distinct values are parsed: each
+    format in `formats` is tried on the values still unparsed, then pandas
+    guesses a format for whatever is left, and anything still unread is
+    parsed value by value (MIXED_FORMAT). The years are mapped back to the
+    rows through the factorized codes. No datetime column is built, since
+    tenure only needs the year.
+
+    pd.to_datetime(..., errors='coerce') without a format takes its format
+    from the first value and turns values written any other way into NaT.
+    Here each value is read with the first format it matches, so an extract
+    mixing formats keeps those dates instead of inferring them from revenue.
+
+    Args:
+        dates: First Order Date column (text, categorical or datetime)
+        formats: strptime formats to try before guessing
+
+    Returns:
+        tuple: (float64 numpy array of years, NaN where blank or
+        unparseable; dict with 'formats' (rows read per format, in the
+        order detected), 'blank' and 'invalid' row counts)
+    """
+    import pandas as pd
+
+    if pd.api.types.is_datetime64_any_dtype(dates):
+        # Columnar extracts can store the dates already typed
+        values = dates.to_numpy(dtype='datetime64[s]')
+        return date_years(values), _typed_date_stats(values)
+    codes, unique_dates, stats = _parse_distinct_dates(dates, formats)
+    return date_years(unique_dates)[codes], stats
+
+def parse_dates(dates, formats=DATE_FORMATS):
+    """
+    parse_first_order_years(), keeping the full date.
+
+    Returns:
+        tuple: (datetime64[s] numpy array, NaT where blank or unparseable;
+        statistics dict as from parse_first_order_years())
+    """
+    import pandas as pd
+
+    if pd.api.types.is_datetime64_any_dtype(dates):
+        values = dates.to_numpy(dtype='datetime64[s]')
+        return values, _typed_date_stats(values)
+    codes, unique_dates, stats = _parse_distinct_dates(dates, formats)
+    return unique_dates[codes], stats
 
 # ============================================================================
 # DATA LOADING & VALIDATION
 # ============================================================================
 
-print("\n" + "-"*80)
-print("STEP 1: LOADING DATA")
-print("-"*80)
+def load_revenue_extract(path=INPUT_FILE):
+    """
+    Read the revenue extract exported from PowerBI.
 
-# Check if input file exists
-if not os.path.exists(INPUT_FILE):
-    print(f"ERROR: Input file '{INPUT_FILE}' not found.")
-    print(f"Please ensure {INPUT_FILE} is in the same directory as this script.")
-    sys.exit(1)
+    CSV is read directly; .parquet/.feather extracts go through loyalty_io
+    and arrive with revenue already numeric (no currency parsing needed).
 
-# Load data
-try:
-    df = pd.read_csv(INPUT_FILE, encoding='utf-8-sig')
-    print(f"✓ Successfully loaded {len(df):,} customer records")
-except Exception as e:
-    print(f"ERROR: Failed to load {INPUT_FILE}")
-    print(f"Error message: {str(e)}")
-    sys.exit(1)
-
-# Validate required columns exist
-required_columns = ['Account_ID', 'Name', 'Sub Segment', 'First Order Date']
-revenue_columns_raw = [f'TY Net Product Revenue {year}' for year in EVALUATION_YEARS]
-required_columns.extend(revenue_columns_raw)
-
-missing_columns = [col for col in required_columns if col not in df.columns]
-if missing_columns:
-    print(f"ERROR: Missing required columns: {missing_columns}")
-    print(f"\nExpected columns: {required_columns}")
-    print(f"Found columns: {list(df.columns)}")
-    sys.exit(1)
-
-print(f"✓ All required columns present")
-
-# Check for duplicate Account_IDs
-duplicates = df['Account_ID'].duplicated().sum()
-if duplicates > 0:
-    print(f"WARNING: {duplicates} duplicate Account_IDs found")
-    print(f"Keeping first occurrence of each duplicate")
-    df = df.drop_duplicates(subset=['Account_ID'], keep='first')
+    Args:
+        path: Path to customer_annual_revenue.csv (or .parquet/.feather)
+
+    Returns:
+        DataFrame: Raw extract, one row per account
+
+    Raises:
+        FileNotFoundError: If the file does not exist
+    """
+    import pandas as pd
+
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Input file '{path}' not found.")
+    if not path.lower().endswith('.csv'):
+        from loyalty_io import read_table
+        return read_table(path)
+    return pd.read_csv(path, encoding='utf-8-sig')
+
+def find_missing_columns(df, config):
+    """
+    List required input columns that are absent from the extract.
+
+    Args:
+        df: Raw extract
+        config: Loyalty config dict
+
+    Returns:
+        list: Missing column names (empty if the extract is usable)
+    """
+    return [col for col in get_required_columns(config) if col not in df.columns]
+
+def drop_duplicate_accounts(df):
+    """
+    Keep the first occurrence of each Account_ID.
+
+    Args:
+        df: Raw extract
+
+    Returns:
+        tuple: (de-duplicated DataFrame, number of duplicate rows dropped)
+    """
+    duplicates = int(df['Account_ID'].duplicated().sum())
+    if duplicates > 0:
+        df = df.drop_duplicates(subset=['Account_ID'], keep='first')
+    return df, duplicates
+
+# Whole-number text IDs (loose: padded, signed, leading zeros, ".0" allowed)
+_INTEGER_ID = r'-?(?:0|[1-9][0-9]*)'
+_LOOSE_INTEGER_ID = r'[+-]?[0-9]+(?:\.0*)?'
+
+def account_id_keys(account_ids, loose=False):
+    """
+    Lookup keys for Account_IDs read in separate chunks or files.
+
+    Whole-number IDs get an int64 key, read without going through float64,
+    so IDs above 2**53 stay distinct. pandas reads the same CSV column as
+    integers in a chunk of numeric IDs and as text in a chunk that also has
+    a text ID, so the text "1001" gets the same key as the number 1001.
+    Other IDs are their own key, which makes "1001.0" and "1001 " different
+    accounts, as drop_duplicate_accounts() treats them. With loose=True,
+    text is stripped and whole numbers may carry a sign, leading zeros or
+    a ".0", so all three are account 1001.
+
+    Args:
+        account_ids: Account_ID values (array-like)
+        loose: Also match padded and "1001.0"-style text IDs
+
+    Returns:
+        tuple: (boolean numpy array, True where the key is an integer;
+        int64 keys of those IDs, in order; list of the other IDs' keys, in
+        order, None for blank IDs)
+    """
+    import numpy as np
+    import pandas as pd
+
+    account_ids = pd.Series(account_ids)
+    missing = account_ids.isna().to_numpy()
+    is_integer = np.zeros(len(account_ids), dtype=bool)
+    keys = np.zeros(len(account_ids), dtype='int64')
+    if pd.api.types.is_integer_dtype(account_ids.dtype):
+        is_integer = ~missing
+        keys[is_integer] = account_ids[is_integer].to_numpy(dtype='int64')
+    elif pd.api.types.is_float_dtype(account_ids.dtype):
+        # A chunk with a blank ID is read as float (digits past 2**53 are
+        # already lost by then)
+        values = account_ids.to_numpy(dtype='float64', na_value=np.nan)
+        is_integer = (values == np.floor(values)) & (np.abs(values) < 2.0 ** 63)
+        keys[is_integer] = values[is_integer].astype('int64')
+    else:
+        text = account_ids[~missing].astype(str)
+        if loose:
+            text = text.str.strip()
+        whole = text.str.fullmatch(_LOOSE_INTEGER_ID if loose else _INTEGER_ID).to_numpy(dtype=bool)
+        digits = text[whole].str.replace(r'\.0*$', '', regex=True) if loose else text[whole]
+        numbers = np.array([int(value) for value in digits], dtype=object)
+        fits = np.zeros(len(text), dtype=bool)
+        fits[whole] = (numbers >= -2 ** 63) & (numbers < 2 ** 63)
+        positions = np.flatnonzero(~missing)
+        is_integer[positions[fits]] = True
+        keys[positions[fits]] = numbers[fits[whole]].astype('int64')
+        if loose:
+            account_ids = account_ids.copy()
+            account_ids[~missing] = text
+    values = account_ids.to_numpy(dtype=object)
+    other_keys = [None if blank else value for value, blank in zip(values[~is_integer], missing[~is_integer])]
+    return is_integer, keys[is_integer], other_keys
 
 # ============================================================================
 # DATA CLEANING & TRANSFORMATION
 # ============================================================================
 
-print("\n" + "-"*80)
-print("STEP 2: CLEANING DATA")
-print("-"*80)
+def clean_revenue(df, config):
+    """
+    Parse the evaluation-window revenue columns into revenue_{year}.
 
-# Clean revenue columns
-print("Cleaning revenue columns...")
-for year in EVALUATION_YEARS:
-    col_raw = f'TY Net Product Revenue {year}'
-    col_clean = f'revenue_{year}'
-    df[col_clean] = df[col_raw].apply(clean_currency)
-    
-    # Track statistics
-    negative_count = (df[col_clean] < 0).sum()
-    if negative_count > 0:
-        print(f"  • {year}: {negative_count:,} negative values (returns/credits)")
-
-print(f"✓ Revenue columns cleaned for {len(EVALUATION_YEARS)} years")
-
-# Parse First Order Date
-print("\nParsing First Order Date...")
-df['first_order_date_parsed'] = pd.to_datetime(df['First Order Date'], errors='coerce')
-
-# Infer missing dates from revenue
-blank_dates = df['first_order_date_parsed'].isna().sum()
-if blank_dates > 0:
-    print(f"  • {blank_dates:,} blank/invalid dates found")
-    print(f"  • Inferring from first year with revenue...")
-    
-    revenue_cols = [f'revenue_{year}' for year in EVALUATION_YEARS]
-    df['inferred_year'] = df.apply(lambda row: infer_first_order_year(row, revenue_cols), axis=1)
-    
-    # Use parsed year if available, otherwise use inferred
-    df['first_order_year'] = df['first_order_date_parsed'].dt.year
-    df.loc[df['first_order_year'].isna(), 'first_order_year'] = df.loc[df['first_order_year'].isna(), 'inferred_year']
-    
-    inferred_count = df['inferred_year'].notna().sum()
-    print(f"  • Successfully inferred {inferred_count:,} dates from revenue data")
-else:
-    df['first_order_year'] = df['first_order_date_parsed'].dt.year
+    Args:
+        df: Extract rows (modified in place)
+        config: Loyalty config dict
 
-# Handle customers with no date and no revenue
-no_data = df['first_order_year'].isna().sum()
-if no_data > 0:
-    print(f"  • WARNING: {no_data:,} customers have no date and no revenue")
-    print(f"  • These will be excluded from analysis")
+    Returns:
+        dict: Negative-value count per year (returns/credits)
+    """
+    years = get_evaluation_years(config)
+
+    # Clean revenue columns (all years parsed together)
+    cleaned_revenue = parse_currency_columns(df, [revenue_column_name(year) for year in years])
+    negative_counts = {}
+    for year in years:
+        col_clean = f'revenue_{year}'
+        df[col_clean] = cleaned_revenue[revenue_column_name(year)]
+        negative_counts[year] = int((df[col_clean] < 0).sum())
+    return negative_counts
+
+def resolve_first_order_years(df, config):
+    """
+    Parse First Order Date and fill blank dates from the first year with
+    revenue.
+
+    Args:
+        df: Frame from clean_revenue() (modified in place)
+        config: Loyalty config dict
+
+    Returns:
+        tuple: (blank/invalid date count, dates inferred from revenue,
+        date parsing statistics from parse_first_order_years())
+    """
+    import numpy as np
+
+    years = get_evaluation_years(config)
+
+    # Parse First Order Date (year only)
+    date_years, date_stats = parse_first_order_years(df['First Order Date'])
+    missing_year = np.isnan(date_years)
+
+    # Infer missing dates from revenue
+    blank_dates = int(missing_year.sum())
+    inferred_count = 0
+    if blank_dates > 0:
+        revenue_cols = [f'revenue_{year}' for year in years]
+        df['inferred_year'] = infer_first_order_years(df, revenue_cols)
 
-print(f"✓ First Order Date processed")
+        # Use parsed year if available, otherwise use inferred
+        df['first_order_year'] = date_years
+        df.loc[missing_year, 'first_order_year'] = df.loc[missing_year, 'inferred_year']
+
+        # Only count blank dates actually filled in (not every row with revenue)
+        inferred_count = int((missing_year & df['inferred_year'].notna()).sum())
+    else:
+        # Whole years, as Series.dt.year gives them
+        df['first_order_year'] = date_years.astype('int32')
+    return blank_dates, inferred_count, date_stats
+
+def clean_data(df, config, metrics=None):
+    """
+    Parse revenue columns and resolve each account's first order year.
+
+    Works on a copy, so the caller's frame is left untouched. Adds
+    revenue_{year}, first_order_year and (when any date is blank or
+    unparseable) inferred_year.
+
+    Args:
+        df: Raw extract (already de-duplicated)
+        config: Loyalty config dict
+        metrics: Optional loyalty_profiling.StageMetrics to record timings
+
+    Returns:
+        tuple: (cleaned DataFrame, dict of cleaning statistics)
+    """
+    with timed_stage(metrics, 'clean_revenue', len(df)):
+        df = df.copy()
+        negative_counts = clean_revenue(df, config)
+    with timed_stage(metrics, 'date_inference', len(df)):
+        blank_dates, inferred_count, date_stats = resolve_first_order_years(df, config)
+
+    stats = {
+        'negative_counts': negative_counts,
+        'date_formats': date_stats['formats'],
+        'invalid_dates': date_stats['invalid'],
+        'blank_dates': blank_dates,
+        'inferred_count': inferred_count,
+        # Customers with no date and no revenue (excluded from analysis)
+        'no_data': int(df['first_order_year'].isna().sum()),
+    }
+    return df, stats
 
 # ============================================================================
 # METRIC CALCULATIONS
 # ============================================================================
 
-print("\n" + "-"*80)
-print("STEP 3: CALCULATING LOYALTY METRICS")
-print("-"*80)
-
-# Calculate tenure
-df['tenure_years'] = CURRENT_YEAR - df['first_order_year']
-print(f"✓ Tenure calculated (range: {df['tenure_years'].min():.0f} to {df['tenure_years'].max():.0f} years)")
-
-# Calculate active years (considering per-year minimum if enabled)
-print(f"\nCalculating consistency...")
-if MIN_REVENUE_PER_YEAR > 0:
-    print(f"  • Per-year minimum ENABLED: ${MIN_REVENUE_PER_YEAR:,}")
-    print(f"  • Years with revenue >= ${MIN_REVENUE_PER_YEAR:,} count as active")
-    for year in EVALUATION_YEARS:
-        df[f'active_{year}'] = df[f'revenue_{year}'] >= MIN_REVENUE_PER_YEAR
-else:
-    print(f"  • Per-year minimum DISABLED")
-    print(f"  • Any positive revenue counts as active")
-    for year in EVALUATION_YEARS:
-        df[f'active_{year}'] = df[f'revenue_{year}'] > 0
-
-# Count years active
-active_cols = [f'active_{year}' for year in EVALUATION_YEARS]
-df['years_active'] = df[active_cols].sum(axis=1)
-
-# Calculate consistency rate
-df['consistency_rate'] = df['years_active'] / NUM_EVALUATION_YEARS
-
-print(f"✓ Consistency calculated")
-print(f"  • Distribution of years active:")
-for i in range(NUM_EVALUATION_YEARS + 1):
-    count = (df['years_active'] == i).sum()
-    pct = count / len(df) * 100
-    print(f"    {i}/{NUM_EVALUATION_YEARS} years: {count:>6,} customers ({pct:>5.1f}%)")
-
-# Calculate 5-year revenue
-revenue_cols = [f'revenue_{year}' for year in EVALUATION_YEARS]
-df['revenue_5yr'] = df[revenue_cols].sum(axis=1)
-print(f"\n✓ 5-Year Revenue calculated")
-print(f"  • Total revenue: ${df['revenue_5yr'].sum():,.2f}")
-print(f"  • Average per customer: ${df['revenue_5yr'].mean():,.2f}")
-print(f"  • Median per customer: ${df['revenue_5yr'].median():,.2f}")
+def calculate_metrics(df, config):
+    """
+    Add tenure, consistency and 5-year revenue columns.
+
+    Args:
+        df: Cleaned DataFrame from clean_data() (modified in place)
+        config: Loyalty config dict
+
+    Returns:
+        DataFrame: The same frame with tenure_years, active_{year},
+        years_active, consistency_rate and revenue_5yr added
+
+    Raises:
+        KeyError: If the config has segment_thresholds and df has no Sub Segment
+    """
+    import numpy as np
+
+    years = get_evaluation_years(config)
+    _, thresholds = row_thresholds(df['Sub Segment'], config)
+    min_revenue_per_year = thresholds["min_revenue_per_active_year"]
+
+    # Calculate tenure
+    df['tenure_years'] = config["current_year"] - df['first_order_year']
+
+    # Calculate active years (considering per-year minimum if enabled;
+    # count_active_years() applies the same rule to a revenue array)
+    for year in years:
+        if np.ndim(min_revenue_per_year) > 0:
+            # Per-segment minimums: each account's own rule
+            df[f'active_{year}'] = np.where(min_revenue_per_year > 0,
+                                            df[f'revenue_{year}'] >= min_revenue_per_year,
+                                            df[f'revenue_{year}'] > 0)
+        elif min_revenue_per_year > 0:
+            df[f'active_{year}'] = df[f'revenue_{year}'] >= min_revenue_per_year
+        else:
+            df[f'active_{year}'] = df[f'revenue_{year}'] > 0
+
+    # Count years active and derive consistency rate
+    active_cols = [f'active_{year}' for year in years]
+    df['years_active'] = df[active_cols].sum(axis=1)
+    df['consistency_rate'] = df['years_active'] / len(years)
+
+    # Calculate 5-year revenue
+    revenue_cols = [f'revenue_{year}' for year in years]
+    df['revenue_5yr'] = df[revenue_cols].sum(axis=1)
+    return df
+
+def count_active_years(yearly_revenue, min_revenue_per_year):
+    """
+    Years active per account, using the same rule as calculate_metrics().
+
+    Args:
+        yearly_revenue: (accounts x years) revenue array
+        min_revenue_per_year: Per-year minimum (0 = any positive revenue)
+
+    Returns:
+        numpy.ndarray: Active-year count per account
+    """
+    if min_revenue_per_year > 0:
+        return (yearly_revenue >= min_revenue_per_year).sum(axis=1)
+    return (yearly_revenue > 0).sum(axis=1)
+
+# ============================================================================
+# THRESHOLD RULES (PER-SEGMENT OVERRIDES)
+# ============================================================================
+
+def threshold_rules(config):
+    """
+    The rule sets of a config: the default thresholds, then one per
+    segment_thresholds entry.
+
+    Args:
+        config: Loyalty config dict
+
+    Returns:
+        tuple: (list of rule names, DEFAULT_RULE first; dict of
+        THRESHOLD_KEYS → float64 array of each rule's value, indexed by
+        rule code)
+    """
+    import numpy as np
+
+    overrides = config.get("segment_thresholds") or {}
+    names = [DEFAULT_RULE] + list(overrides)
+    tables = {
+        key: np.array([config[key]] + [rules.get(key, config[key]) for rules in overrides.values()],
+                      dtype='float64')
+        for key in THRESHOLD_KEYS
+    }
+    return names, tables
+
+def segment_rule_codes(segments, config):
+    """
+    Rule code of each account (index into threshold_rules() names).
+
+    Accounts whose Sub Segment has an override get its code, others 0 (the
+    defaults). A blank segment uses an 'UNKNOWN' override if there is one,
+    as build_output() reports blanks as UNKNOWN.
+
+    Args:
+        segments: Sub Segment Series (text or categorical)
+        config: Loyalty config dict
+
+    Returns:
+        numpy.ndarray: int16 codes
+    """
+    import numpy as np
+    import pandas as pd
+
+    names, _ = threshold_rules(config)
+    rule_index = {name: code for code, name in enumerate(names) if code > 0}
+    # Same recoding of the few distinct values as status_codes()
+    codes, values = pd.factorize(segments)
+    recode = np.array([rule_index.get(value, 0) for value in values] + [rule_index.get('UNKNOWN', 0)],
+                      dtype='int16')
+    return recode[codes]
+
+def row_thresholds(segments, config):
+    """
+    The thresholds each account is scored under.
+
+    Without segment_thresholds these are the config's own values. With
+    them, each threshold is looked up per account from its rule code in one
+    array take, so every segment is scored in the same vectorized pass.
+
+    Args:
+        segments: Sub Segment Series (not read without segment_thresholds)
+        config: Loyalty config dict
+
+    Returns:
+        tuple: (int16 rule code per account, or None without overrides;
+        dict of THRESHOLD_KEYS → value, or per-account float64 array)
+    """
+    if not config.get("segment_thresholds"):
+        return None, {key: config[key] for key in THRESHOLD_KEYS}
+    _, tables = threshold_rules(config)
+    rules = segment_rule_codes(segments, config)
+    return rules, {key: table[rules] for key, table in tables.items()}
+
+def rule_categorical(rules, config):
+    """threshold_rule column values: rule codes as a categorical of rule names."""
+    import pandas as pd
+
+    return pd.Categorical.from_codes(rules, threshold_rules(config)[0])
 
 # ============================================================================
 # LOYALTY STATUS DETERMINATION
 # ============================================================================
 
-print("\n" + "-"*80)
-print("STEP 4: DETERMINING LOYALTY STATUS")
-print("-"*80)
-
-# Initialize status column
-df['loyalty_status'] = 'Not Qualified'
-df['ineligibility_reason'] = None
-
-# Ineligible: Insufficient tenure
-ineligible_mask = (df['tenure_years'] < MIN_TENURE) | df['tenure_years'].isna()
-df.loc[ineligible_mask, 'loyalty_status'] = 'Ineligible'
-df.loc[ineligible_mask, 'ineligibility_reason'] = 'Insufficient Tenure'
-
-# For eligible customers, check consistency and revenue
-eligible_mask = ~ineligible_mask
-
-# Loyal: Meets all criteria
-loyal_mask = (
-    eligible_mask &
-    (df['consistency_rate'] >= MIN_CONSISTENCY) &
-    (df['revenue_5yr'] >= MIN_REVENUE_5YR)
-)
-df.loc[loyal_mask, 'loyalty_status'] = 'Loyal'
-
-# Track reasons for not qualifying (for eligible customers who don't qualify)
-not_qualified_mask = eligible_mask & ~loyal_mask
-fails_consistency = (df['consistency_rate'] < MIN_CONSISTENCY)
-fails_revenue = (df['revenue_5yr'] < MIN_REVENUE_5YR)
-
-# Set ineligibility reasons
-df.loc[not_qualified_mask & fails_consistency & fails_revenue, 'ineligibility_reason'] = 'Below Consistency & Revenue Thresholds'
-df.loc[not_qualified_mask & fails_consistency & ~fails_revenue, 'ineligibility_reason'] = 'Below Consistency Threshold'
-df.loc[not_qualified_mask & ~fails_consistency & fails_revenue, 'ineligibility_reason'] = 'Below Revenue Threshold'
-
-# Results summary
-print(f"\nLoyalty Status Results:")
-print(f"  ✓ Loyal: {loyal_mask.sum():,} customers ({loyal_mask.sum()/len(df)*100:.2f}%)")
-print(f"  ✗ Not Qualified: {not_qualified_mask.sum():,} customers ({not_qualified_mask.sum()/len(df)*100:.2f}%)")
-print(f"  ⊘ Ineligible: {ineligible_mask.sum():,} customers ({ineligible_mask.sum()/len(df)*100:.2f}%)")
-
-# Economic impact
-total_revenue = df['revenue_5yr'].sum()
-loyal_revenue = df.loc[loyal_mask, 'revenue_5yr'].sum()
-print(f"\nEconomic Impact:")
-print(f"  • Total 5-year revenue: ${total_revenue:,.2f}")
-print(f"  • Revenue from loyal customers: ${loyal_revenue:,.2f}")
-print(f"  • Revenue concentration: {loyal_revenue/total_revenue*100:.1f}%")
-print(f"  • Avg revenue (loyal): ${df.loc[loyal_mask, 'revenue_5yr'].mean():,.2f}")
-print(f"  • Avg revenue (non-loyal): ${df.loc[~loyal_mask, 'revenue_5yr'].mean():,.2f}")
+def loyalty_masks(tenure_years, consistency_rate, revenue_5yr, thresholds):
+    """
+    The loyalty rules as boolean masks.
+
+    Args:
+        tenure_years: Tenure per account (NaN = unknown)
+        consistency_rate: Consistency rate per account
+        revenue_5yr: 5-year revenue per account
+        thresholds: Loyalty config dict, or the per-account thresholds from
+                    row_thresholds()
+
+    Returns:
+        dict: ineligible, loyal, fails_consistency and fails_revenue masks
+        (Series or arrays, matching the inputs)
+    """
+    import pandas as pd
+
+    min_tenure = thresholds["min_tenure_years"]
+    min_consistency = thresholds["min_consistency_rate"]
+    min_revenue_5yr = thresholds["min_revenue_5yr"]
+
+    # Ineligible: Insufficient tenure
+    ineligible = (tenure_years < min_tenure) | pd.isna(tenure_years)
+
+    # Loyal: Meets all criteria
+    loyal = ~ineligible & (consistency_rate >= min_consistency) & (revenue_5yr >= min_revenue_5yr)
+    return {
+        'ineligible': ineligible,
+        'loyal': loyal,
+        'fails_consistency': consistency_rate < min_consistency,
+        'fails_revenue': revenue_5yr < min_revenue_5yr,
+    }
+
+def classify_loyalty(df, config):
+    """
+    Assign loyalty_status and ineligibility_reason.
+
+    Args:
+        df: DataFrame from calculate_metrics() (modified in place)
+        config: Loyalty config dict
+
+    Returns:
+        DataFrame: The same frame with loyalty_status and ineligibility_reason
+        (and threshold_rule if the config has segment_thresholds)
+    """
+    rules, thresholds = row_thresholds(df['Sub Segment'], config)
+    masks = loyalty_masks(df['tenure_years'], df['consistency_rate'], df['revenue_5yr'], thresholds)
+    if rules is not None:
+        df['threshold_rule'] = rule_categorical(rules, config)
+
+    # Initialize status column
+    df['loyalty_status'] = 'Not Qualified'
+    df['ineligibility_reason'] = None
+
+    # Ineligible: Insufficient tenure
+    ineligible_mask = masks['ineligible']
+    df.loc[ineligible_mask, 'loyalty_status'] = 'Ineligible'
+    df.loc[ineligible_mask, 'ineligibility_reason'] = 'Insufficient Tenure'
+
+    # Loyal: Meets all criteria
+    loyal_mask = masks['loyal']
+    df.loc[loyal_mask, 'loyalty_status'] = 'Loyal'
+
+    # Track reasons for not qualifying (for eligible customers who don't qualify)
+    not_qualified_mask = ~ineligible_mask & ~loyal_mask
+    fails_consistency = masks['fails_consistency']
+    fails_revenue = masks['fails_revenue']
+
+    # Set ineligibility reasons
+    df.loc[not_qualified_mask & fails_consistency & fails_revenue, 'ineligibility_reason'] = 'Below Consistency & Revenue Thresholds'
+    df.loc[not_qualified_mask & fails_consistency & ~fails_revenue, 'ineligibility_reason'] = 'Below Consistency Threshold'
+    df.loc[not_qualified_mask & ~fails_consistency & fails_revenue, 'ineligibility_reason'] = 'Below Revenue Threshold'
+    return df
+
+def score_metrics(df, config, engine='auto'):
+    """
+    calculate_metrics() and classify_loyalty() in one pass over the revenue
+    matrix (see loyalty_kernel.py).
+
+    No active_{year} columns are added. loyalty_status and
+    ineligibility_reason are categoricals over the kernel's codes; their
+    values are the text classify_loyalty() assigns, with a missing value
+    where it leaves None.
+
+    Args:
+        df: Cleaned DataFrame from clean_data() (modified in place)
+        config: Loyalty config dict
+        engine: Kernel engine, 'auto', 'numpy' or 'numba'
+
+    Returns:
+        DataFrame: The same frame with tenure_years, years_active,
+        consistency_rate, revenue_5yr, loyalty_status and ineligibility_reason
+        (and threshold_rule if the config has segment_thresholds)
+    """
+    import pandas as pd
+    from loyalty_io import INELIGIBILITY_REASONS
+    from loyalty_kernel import score_matrix
+
+    revenue_cols = [f'revenue_{year}' for year in get_evaluation_years(config)]
+    df['tenure_years'] = config["current_year"] - df['first_order_year']
+    rules, thresholds = row_thresholds(df['Sub Segment'], config)
+    scores = score_matrix(df[revenue_cols].to_numpy(dtype='float64'),
+                          df['tenure_years'].to_numpy(dtype='float64', na_value=float('nan')),
+                          thresholds, engine)
+    df['years_active'] = scores['years_active']
+    df['consistency_rate'] = scores['consistency_rate']
+    df['revenue_5yr'] = scores['revenue_5yr']
+    df['loyalty_status'] = pd.Categorical.from_codes(scores['status'], list(STATUS_ORDER))
+    df['ineligibility_reason'] = pd.Categorical.from_codes(scores['reason'], INELIGIBILITY_REASONS)
+    if rules is not None:
+        df['threshold_rule'] = rule_categorical(rules, config)
+    return df
+
+def score_accounts(df, config, metrics=None):
+    """
+    Clean, measure and classify a batch of (de-duplicated) accounts.
+
+    Every decision depends only on the account's own row, so any subset of
+    the extract can be scored independently.
+
+    Args:
+        df: Raw extract rows
+        config: Loyalty config dict
+        metrics: Optional loyalty_profiling.StageMetrics to record timings
+
+    Returns:
+        tuple: (scored DataFrame, dict of cleaning statistics)
+    """
+    df, stats = clean_data(df, config, metrics)
+    with timed_stage(metrics, 'score_metrics', len(df)):
+        df = score_metrics(df, config)
+    return df, stats
+
+def summarize_results(df, config):
+    """
+    Headline statistics for a scored frame.
+
+    Args:
+        df: Scored DataFrame from score_accounts()
+        config: Loyalty config dict
+
+    Returns:
+        dict: Counts, distributions and revenue figures shown in the console
+        summary
+    """
+    import numpy as np
+
+    num_years = len(get_evaluation_years(config))
+    loyal_mask = df['loyalty_status'] == 'Loyal'
+    years_active_counts = np.bincount(df['years_active'].to_numpy(dtype='int64'), minlength=num_years + 1)
+    status_counts = df['loyalty_status'].value_counts()
+    summary = {
+        'total_customers': len(df),
+        'status_counts': {status: int(status_counts.get(status, 0)) for status in STATUS_ORDER},
+        'tenure_min': df['tenure_years'].min(),
+        'tenure_max': df['tenure_years'].max(),
+        'years_active_distribution': {
+            i: int(count) for i, count in enumerate(years_active_counts[:num_years + 1])
+        },
+        'total_revenue': df['revenue_5yr'].sum(),
+        'mean_revenue': df['revenue_5yr'].mean(),
+        'median_revenue': df['revenue_5yr'].median(),
+        'loyal_revenue': df.loc[loyal_mask, 'revenue_5yr'].sum(),
+        'avg_revenue_loyal': df.loc[loyal_mask, 'revenue_5yr'].mean(),
+        'avg_revenue_non_loyal': df.loc[~loyal_mask, 'revenue_5yr'].mean(),
+    }
+    if 'threshold_rule' in df.columns:
+        summary['rule_counts'] = rule_status_counts(df['threshold_rule'], df['loyalty_status'])
+    return summary
+
+def rule_status_counts(rules, statuses):
+    """
+    Accounts per threshold rule set and loyalty status.
+
+    Args:
+        rules: threshold_rule categorical Series
+        statuses: loyalty_status Series
+
+    Returns:
+        dict: rule name → {status: count}, every rule and status included
+    """
+    import numpy as np
+
+    names = list(rules.cat.categories)
+    # One bincount over rule x status; missing statuses are left out
+    codes = status_codes(statuses).astype('int64')
+    known = codes >= 0
+    cells = rules.cat.codes.to_numpy(dtype='int64')[known] * len(STATUS_ORDER) + codes[known]
+    counts = np.bincount(cells, minlength=len(names) * len(STATUS_ORDER)).reshape(len(names), -1)
+    return {name: dict(zip(STATUS_ORDER, row.tolist())) for name, row in zip(names, counts)}
 
 # ============================================================================
 # OUTPUT FILE PREPARATION
 # ============================================================================
 
-print("\n" + "-"*80)
-print("STEP 5: PREPARING OUTPUT FILE")
-print("-"*80)
-
-# Create output DataFrame with required columns
-output_df = pd.DataFrame({
-    'customer_id': df['Account_ID'],
-    'customer_name': df['Name'],
-    'sub_segment': df['Sub Segment'].fillna('UNKNOWN'),
-    'loyalty_status': df['loyalty_status'],
-    'tenure_years': df['tenure_years'].fillna(-1).astype(int),
-    'years_active_in_window': df['years_active'].astype(int),
-    'consistency_rate': df['consistency_rate'].round(4),
-    'revenue_5yr': df['revenue_5yr'].round(2),
-})
-
-# Add individual year revenues
-for year in EVALUATION_YEARS:
-    output_df[f'revenue_{year}'] = df[f'revenue_{year}'].round(2)
-
-# Add metadata
-output_df['ineligibility_reason'] = df['ineligibility_reason']
-output_df['analysis_timestamp'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-
-# Sort by loyalty status, then by revenue (descending)
-status_order = {'Loyal': 0, 'Not Qualified': 1, 'Ineligible': 2}
-output_df['status_sort'] = output_df['loyalty_status'].map(status_order)
-output_df = output_df.sort_values(['status_sort', 'revenue_5yr'], ascending=[True, False])
-output_df = output_df.drop('status_sort', axis=1)
-
-print(f"✓ Output DataFrame prepared with {len(output_df)} rows")
+def build_output(df, config, analysis_timestamp=None, sort=True):
+    """
+    Build the PowerBI output table from a scored frame.
+
+    Args:
+        df: Scored DataFrame from score_accounts()
+        config: Loyalty config dict
+        analysis_timestamp: Value for the analysis_timestamp column
+                            (defaults to now)
+        sort: Order rows Loyal first, then by revenue descending; False
+              keeps input order (used when streaming chunks)
+
+    Returns:
+        DataFrame: One row per customer (with a threshold_rule column before
+        analysis_timestamp if the config has segment_thresholds)
+    """
+    import pandas as pd
+
+    if analysis_timestamp is None:
+        analysis_timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+    # Create output DataFrame with required columns
+    output_df = pd.DataFrame({
+        'customer_id': df['Account_ID'],
+        'customer_name': df['Name'],
+        'sub_segment': df['Sub Segment'].fillna('UNKNOWN'),
+        'loyalty_status': df['loyalty_status'],
+        'tenure_years': df['tenure_years'].fillna(-1).astype(int),
+        'years_active_in_window': df['years_active'].astype(int),
+        'consistency_rate': df['consistency_rate'].round(4),
+        'revenue_5yr': df['revenue_5yr'].round(2),
+    })
+
+    # Add individual year revenues
+    for year in get_evaluation_years(config):
+        output_df[f'revenue_{year}'] = df[f'revenue_{year}'].round(2)
+
+    # Add metadata
+    output_df['ineligibility_reason'] = df['ineligibility_reason']
+    if 'threshold_rule' in df.columns:
+        output_df['threshold_rule'] = df['threshold_rule']
+    output_df['analysis_timestamp'] = analysis_timestamp
+
+    if not sort:
+        return output_df
+    return sort_output(output_df)
+
+def status_codes(statuses):
+    """
+    STATUS_ORDER code of each loyalty status (0 Loyal, 1 Not Qualified,
+    2 Ineligible, -1 missing).
+
+    Args:
+        statuses: loyalty_status Series (text or categorical)
+
+    Returns:
+        numpy.ndarray: int8 codes
+    """
+    import numpy as np
+    import pandas as pd
+
+    # Factorizing and recoding the few distinct values is much faster than
+    # pd.Categorical(..., categories=...) on a text column
+    codes, values = pd.factorize(statuses)
+    recode = np.array([STATUS_ORDER.get(value, -1) for value in values] + [-1], dtype='int8')
+    return recode[codes]    # factorize's -1 (missing) picks the trailing -1
+
+def sort_output(output_df, order='full'):
+    """
+    Order output rows for presentation.
+
+    Args:
+        output_df: Output table
+        order: One of OUTPUT_ORDERS:
+               'full'  - Loyal first, then Not Qualified, then Ineligible,
+                         and by revenue_5yr descending within each status
+                         (ties keep their order)
+               'loyal' - Statuses in the same order, but only the Loyal
+                         rows sorted by revenue; the others keep their order
+               'none'  - Rows left in scoring (input) order
+
+    Returns:
+        DataFrame: Sorted copy ('none' returns output_df itself)
+    """
+    import numpy as np
+
+    if order == 'none':
+        return output_df
+    if order == 'loyal':
+        # Grouping by status is a stable sort on small integer codes, which
+        # NumPy does in linear time; only the Loyal block is sorted by revenue
+        codes = status_codes(output_df['loyalty_status'])
+        positions = np.argsort(codes, kind='stable')
+        loyal_count = int((codes == STATUS_ORDER['Loyal']).sum())
+        loyal = positions[:loyal_count]
+        revenue = output_df['revenue_5yr'].to_numpy()[loyal]
+        positions[:loyal_count] = loyal[np.argsort(-revenue, kind='stable')]
+        return output_df.iloc[positions]
+
+    output_df = output_df.assign(status_sort=output_df['loyalty_status'].map(STATUS_ORDER))
+    output_df = output_df.sort_values(['status_sort', 'revenue_5yr'], ascending=[True, False])
+    output_df = output_df.drop('status_sort', axis=1)
+    return output_df
 
 # ============================================================================
 # DATA QUALITY VALIDATION
 # ============================================================================
 
-print("\n" + "-"*80)
-print("STEP 6: QUALITY VALIDATION")
-print("-"*80)
-
-validation_passed = True
-
-# Check 1: Record count matches
-if len(output_df) != len(df):
-    print(f"✗ FAIL: Record count mismatch (input: {len(df)}, output: {len(output_df)})")
-    validation_passed = False
-else:
-    print(f"✓ Record count validated: {len(output_df):,} records")
-
-# Check 2: No null loyalty status
-null_status = output_df['loyalty_status'].isna().sum()
-if null_status > 0:
-    print(f"✗ FAIL: {null_status} records have null loyalty_status")
-    validation_passed = False
-else:
-    print(f"✓ All records have loyalty_status assigned")
-
-# Check 3: Revenue totals match
-input_total = df['revenue_5yr'].sum()
-output_total = output_df['revenue_5yr'].sum()
-if abs(input_total - output_total) > 1:  # Allow for rounding
-    print(f"✗ FAIL: Revenue mismatch (input: ${input_total:,.2f}, output: ${output_total:,.2f})")
-    validation_passed = False
-else:
-    print(f"✓ Revenue totals validated: ${output_total:,.2f}")
-
-# Check 4: Loyalty status distribution
-status_counts = output_df['loyalty_status'].value_counts()
-print(f"\n✓ Loyalty status distribution:")
-for status, count in status_counts.items():
-    print(f"  • {status}: {count:,}")
-
-if validation_passed:
-    print(f"\n✓ All quality checks passed")
-else:
-    print(f"\n✗ Quality validation failed - review errors above")
+def check_totals(input_count, output_count, null_status, input_total, output_total):
+    """
+    Record-count, null-status and revenue-total checks.
 
-# ============================================================================
-# SAVE OUTPUT FILE
-# ============================================================================
+    Args:
+        input_count: Scored rows
+        output_count: Output rows
+        null_status: Output rows without a loyalty_status
+        input_total: Sum of revenue_5yr before rounding
+        output_total: Sum of revenue_5yr in the output
 
-print("\n" + "-"*80)
-print("STEP 7: SAVING OUTPUT")
-print("-"*80)
+    Returns:
+        list: (passed, message) tuples
+    """
+    checks = []
 
-# Generate output filename with timestamp
-timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-output_filename = f'loyalty_analysis_{timestamp}.csv'
+    # Check 1: Record count matches
+    if output_count != input_count:
+        checks.append((False, f"Record count mismatch (input: {input_count}, output: {output_count})"))
+    else:
+        checks.append((True, f"Record count validated: {output_count:,} records"))
 
-try:
-    output_df.to_csv(output_filename, index=False)
-    print(f"✓ Output file saved: {output_filename}")
-    print(f"  • Location: {os.path.abspath(output_filename)}")
-    print(f"  • Rows: {len(output_df):,}")
-    print(f"  • Columns: {len(output_df.columns)}")
-except Exception as e:
-    print(f"✗ ERROR: Failed to save output file")
-    print(f"  • Error: {str(e)}")
-    sys.exit(1)
+    # Check 2: No null loyalty status
+    if null_status > 0:
+        checks.append((False, f"{null_status} records have null loyalty_status"))
+    else:
+        checks.append((True, f"All records have loyalty_status assigned"))
+
+    # Check 3: Revenue totals match
+    if abs(input_total - output_total) > 1:  # Allow for rounding
+        checks.append((False, f"Revenue mismatch (input: ${input_total:,.2f}, output: ${output_total:,.2f})"))
+    else:
+        checks.append((True, f"Revenue totals validated: ${output_total:,.2f}"))
+
+    return checks
+
+def check_parsing(df, config):
+    """
+    Cheap consistency checks on the parsed and scored columns of every row.
+
+    The parsers and the fused scoring kernel are compared with their
+    reference rules in the tests (test_loyalty_analysis.py).
+
+    Args:
+        df: Cleaned or scored DataFrame (revenue_{year} and first_order_year)
+        config: Loyalty config dict
+
+    Returns:
+        list: (passed, message) tuples
+    """
+    import numpy as np
+
+    years = get_evaluation_years(config)
+    checks = []
+
+    # Check 4: Every revenue cell parsed to a number (text such as "nan" or
+    # "inf" does not add up)
+    revenue = df[[f'revenue_{year}' for year in years]].to_numpy(dtype='float64')
+    unparsed = int((~np.isfinite(revenue)).sum())
+    if unparsed > 0:
+        checks.append((False, f"{unparsed:,} revenue values are not finite numbers"))
+    else:
+        checks.append((True, f"Revenue parsed to numbers ({revenue.size:,} values)"))
+
+    # Check 5: Accounts left without a first order year have no positive
+    # revenue in the window (inference fills in every other blank date)
+    undated = df['first_order_year'].isna().to_numpy()
+    unexplained = int((revenue[undated] > 0).any(axis=1).sum())
+    if unexplained > 0:
+        checks.append((False, f"{unexplained:,} accounts with revenue have no first order year"))
+    else:
+        checks.append((True, f"First order year set for every account with revenue "
+                             f"({int(undated.sum()):,} without)"))
+
+    # Check 6: The scoring kernel's metrics add up (skipped for a frame that
+    # has not been scored yet)
+    if 'revenue_5yr' in df.columns:
+        row_totals = np.isclose(df['revenue_5yr'].to_numpy(dtype='float64'), revenue.sum(axis=1))
+        years_active = df['years_active'].to_numpy(dtype='float64')
+        rates = df['consistency_rate'].to_numpy(dtype='float64') == years_active / len(years)
+        mismatched = int((~(row_totals & rates)).sum())
+        if mismatched > 0:
+            checks.append((False, f"{mismatched:,} accounts have a revenue_5yr or consistency_rate "
+                                  f"that does not add up"))
+        else:
+            checks.append((True, f"Scoring metrics add up ({len(df):,} accounts)"))
+
+    return checks
+
+def validate_output(df, output_df, config):
+    """
+    Run the quality checks on a scored frame and its output table.
+
+    Args:
+        df: Scored DataFrame from score_accounts()
+        output_df: Output table from build_output()
+        config: Loyalty config dict
+
+    Returns:
+        list: (passed, message) tuples, one per check
+    """
+    checks = check_totals(
+        len(df), len(output_df),
+        int(output_df['loyalty_status'].isna().sum()),
+        df['revenue_5yr'].sum(), output_df['revenue_5yr'].sum(),
+    )
+    return checks + check_parsing(df, config)
 
 # ============================================================================
-# SUMMARY REPORT
+# PIPELINE
 # ============================================================================
 
-print("\n" + "="*80)
-print("ANALYSIS COMPLETE")
-print("="*80)
+def run_analysis(df, config=None, analysis_timestamp=None, metrics=None, order='full'):
+    """
+    Score a revenue extract end to end without printing or writing files.
+
+    Args:
+        df: Raw extract (e.g. from load_revenue_extract()); not modified
+        config: Loyalty config dict (defaults to LOYALTY_CONFIG)
+        analysis_timestamp: Value for the output analysis_timestamp column
+        metrics: Optional loyalty_profiling.StageMetrics; receives one
+                 record per stage (dedupe, clean_revenue, date_inference,
+                 score_metrics, build_output, sort, summary, validate)
+        order: Output row order, see sort_output()
 
-print(f"\nFramework Summary:")
-print(f"  • {loyal_mask.sum():,} loyal customers identified")
-print(f"  • Representing ${loyal_revenue:,.2f} ({loyal_revenue/total_revenue*100:.1f}% of total revenue)")
-print(f"  • Loyal customers are {df.loc[loyal_mask, 'revenue_5yr'].mean() / df.loc[~loyal_mask, 'revenue_5yr'].mean():.1f}x more valuable on average")
+    Returns:
+        dict: input_rows, duplicates, cleaning stats, scored frame, output
+        table, summary statistics and validation checks
+
+    Raises:
+        ValueError: If required input columns are missing
+    """
+    if config is None:
+        config = LOYALTY_CONFIG
+
+    missing_columns = find_missing_columns(df, config)
+    if missing_columns:
+        raise ValueError(f"Missing required columns: {missing_columns}")
+
+    input_rows = len(df)
+    with timed_stage(metrics, 'dedupe', input_rows):
+        df, duplicates = drop_duplicate_accounts(df)
+    scored, cleaning_stats = score_accounts(df, config, metrics)
+    with timed_stage(metrics, 'build_output', len(scored)):
+        output_df = build_output(scored, config, analysis_timestamp, sort=False)
+    with timed_stage(metrics, 'sort', len(output_df)):
+        output_df = sort_output(output_df, order)
+    with timed_stage(metrics, 'summary', len(scored)):
+        summary = summarize_results(scored, config)
+    with timed_stage(metrics, 'validate', len(scored)):
+        validation = validate_output(scored, output_df, config)
+
+    return {
+        'config': config,
+        'input_rows': input_rows,
+        'duplicates': duplicates,
+        'cleaning': cleaning_stats,
+        'scored': scored,
+        'output': output_df,
+        'summary': summary,
+        'validation': validation,
+    }
+
+def get_output_filename(output_dir=None, timestamp=None, file_format='csv', compression=None):
+    """
+    Path for a new loyalty_analysis_YYYYMMDD_HHMMSS output file.
 
-print(f"\nOutput File: {output_filename}")
-print(f"Ready for PowerBI import or further analysis.")
+    Args:
+        output_dir: Directory to write into (defaults to the current one)
+        timestamp: Filename timestamp (defaults to now)
+        file_format: 'csv', 'parquet' or 'feather' (sets the extension)
+        compression: None, 'gzip' or 'zstd' (CSV only; adds .gz/.zst)
 
-print("\n" + "="*80)
-print(f"Script completed at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-print("="*80)
+    Returns:
+        str: Output path
+    """
+    if timestamp is None:
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    extension = {'csv': '.csv', 'parquet': '.parquet', 'feather': '.feather'}[file_format]
+    if compression:
+        extension += {'gzip': '.gz', 'zstd': '.zst'}[compression]
+    return os.path.join(output_dir or '', f'loyalty_analysis_{timestamp}{extension}')
+
+def save_output(output_df, output_dir=None, timestamp=None, file_format='csv', compression=None,
+                float_format='shortest', timestamp_column=True):
+    """
+    Write the output table as loyalty_analysis_YYYYMMDD_HHMMSS.<format>.
+
+    Args:
+        output_df: Output table from build_output()
+        output_dir: Directory to write into (defaults to the current one)
+        timestamp: Filename timestamp (defaults to now)
+        file_format: 'csv' (default), or 'parquet'/'feather' for typed
+                     columnar output (requires pyarrow)
+        compression: None, or 'gzip'/'zstd' for compressed CSV (requires pyarrow)
+        float_format: CSV only: 'shortest' (default) or 'fixed' decimals
+        timestamp_column: False leaves out the analysis_timestamp column
+                          (the summary sidecar still records it)
+
+    Returns:
+        str: Path of the written file
+    """
+    from loyalty_io import write_output
+
+    output_filename = get_output_filename(output_dir, timestamp, file_format, compression)
+    if not timestamp_column:
+        output_df = output_df.drop(columns='analysis_timestamp')
+    write_output(output_df, output_filename, float_format)
+    return output_filename
+
+# ============================================================================
+# COMMAND LINE INTERFACE
+# ============================================================================
+
+def print_step(title):
+    print("\n" + "-"*80)
+    print(title)
+    print("-"*80)
+
+def print_configuration(config):
+    years = get_evaluation_years(config)
+    min_consistency = config["min_consistency_rate"]
+    min_revenue_per_year = config["min_revenue_per_active_year"]
+    print("="*80)
+    print("CUSTOMER LOYALTY FRAMEWORK ANALYSIS")
+    print("="*80)
+    print(f"Analysis Date: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    print(f"Framework Version: {FRAMEWORK_VERSION}")
+    print(f"\nConfiguration:")
+    print(f"  • Minimum Tenure: {config['min_tenure_years']} years")
+    print(f"  • Minimum Consistency: {min_consistency:.0%} ({int(min_consistency * len(years))} of {len(years)} years)")
+    print(f"  • Minimum 5-Year Revenue: ${config['min_revenue_5yr']:,}")
+    print(f"  • Min Revenue Per Active Year: ${min_revenue_per_year:,} {'(DISABLED)' if min_revenue_per_year == 0 else '(ENABLED)'}")
+    print(f"  • Evaluation Window: {config['evaluation_start_year']}-{config['evaluation_end_year']}")
+    for segment, overrides in (config.get("segment_thresholds") or {}).items():
+        changes = ", ".join(f"{key} {value:,}" for key, value in overrides.items()) or "defaults"
+        print(f"  • Segment override {segment}: {changes}")
+    print("="*80)
+
+def describe_run_mode(args):
+    """One line describing how main() will score the extract."""
+    if args.chunksize:
+        return f"Streaming in chunks of {args.chunksize:,} rows (loyalty_streaming)"
+    if args.workers:
+        return f"Parallel scoring on {args.workers} workers, partitioned by {args.partition_by}"
+    if args.compact:
+        return "Compact memory mode (loyalty_compact)"
+    if args.cache:
+        return f"Cleaned input reused from {args.cache}/ when the extract is unchanged"
+    if args.transactions:
+        return "Extract aggregated from order lines (loyalty_transactions)"
+    return "Standard in-memory run"
+
+def print_dry_run(args, config):
+    """
+    Report what a run with these arguments would read and write, reading
+    only the input's header (or the order-line files' headers).
+
+    Returns:
+        bool: True if the input exists and has every required column
+    """
+    import importlib.util
+
+    print_step("DRY RUN: NO DATA LOADED, NO FILES WRITTEN")
+    print(f"• Mode: {describe_run_mode(args)}")
+    if args.transactions:
+        if not check_transaction_files(args):
+            return False
+    elif not check_input_file(args, config):
+        return False
+    if args.hierarchy and not check_hierarchy_file(args):
+        return False
+    if args.merge_duplicates and not check_duplicate_pairs_file(args):
+        return False
+
+    needs_pyarrow = (args.format != 'csv' or args.cache or args.history or args.compress
+                     or args.float_format != 'shortest'
+                     or not all(path.lower().endswith('.csv') for path in input_paths(args)))
+    if needs_pyarrow and importlib.util.find_spec('pyarrow') is None:
+        print("✗ This run needs the pyarrow library (pip install pyarrow --break-system-packages)")
+        return False
+    output_filename = get_output_filename(args.output_dir, 'YYYYMMDD_HHMMSS', args.format, args.compress)
+    print(f"• Output: {output_filename}")
+    if args.hierarchy or args.merge_duplicates:
+        from loyalty_rollup import member_output_filename
+        print(f"• Member rows: {member_output_filename(output_filename)}")
+    if args.history:
+        print(f"• History: run recorded in {args.history}/")
+    return True
+
+def input_paths(args):
+    """Files a run reads: the order-line files and account file, or the extract."""
+    paths = [args.input]
+    if args.transactions:
+        paths = args.transactions + ([args.accounts] if args.accounts else [])
+    return paths + [path for path in (args.hierarchy, args.merge_duplicates) if path]
+
+def check_input_file(args, config):
+    """Dry-run check that the extract exists and has every required column."""
+    from loyalty_io import read_columns
+
+    required_columns = get_required_columns(config)
+    print(f"• Input: {args.input}")
+    if not os.path.exists(args.input):
+        print(f"✗ Input file '{args.input}' not found")
+        return False
+    try:
+        columns = read_columns(args.input)
+    except Exception as e:
+        print(f"✗ Could not read the header of {args.input}: {str(e)}")
+        return False
+    print(f"✓ Input file found ({os.path.getsize(args.input) / 1_000_000:,.1f} MB, "
+          f"{len(columns)} columns)")
+    missing_columns = [col for col in required_columns if col not in columns]
+    if missing_columns:
+        print(f"✗ Missing required columns: {missing_columns}")
+        return False
+    print(f"✓ All {len(required_columns)} required columns present")
+    return True
+
+def check_transaction_files(args):
+    """Dry-run check that each order-line file exists and has the columns ingest needs."""
+    from loyalty_io import read_columns
+    from loyalty_transactions import REQUIRED_ROLES, TRANSACTION_COLUMNS
+
+    required_columns = [TRANSACTION_COLUMNS[role] for role in REQUIRED_ROLES]
+    for path in args.transactions:
+        if not os.path.exists(path):
+            print(f"✗ Order line file '{path}' not found")
+            return False
+        try:
+            columns = read_columns(path)
+        except Exception as e:
+            print(f"✗ Could not read the header of {path}: {str(e)}")
+            return False
+        missing_columns = [col for col in required_columns if col not in columns]
+        if missing_columns:
+            print(f"✗ {path}: missing order line columns {missing_columns}")
+            return False
+        print(f"✓ Order lines: {path} ({os.path.getsize(path) / 1_000_000:,.1f} MB)")
+    if args.accounts:
+        if not os.path.exists(args.accounts):
+            print(f"✗ Account file '{args.accounts}' not found")
+            return False
+        print(f"✓ Accounts: {args.accounts}")
+    return True
+
+def check_hierarchy_file(args):
+    """Dry-run check that the hierarchy file exists and has its child and parent columns."""
+    from loyalty_io import read_columns
+    from loyalty_rollup import HIERARCHY_COLUMNS
+
+    if not os.path.exists(args.hierarchy):
+        print(f"✗ Hierarchy file '{args.hierarchy}' not found")
+        return False
+    try:
+        columns = read_columns(args.hierarchy)
+    except Exception as e:
+        print(f"✗ Could not read the header of {args.hierarchy}: {str(e)}")
+        return False
+    missing_columns = [col for col in HIERARCHY_COLUMNS if col not in columns]
+    if missing_columns:
+        print(f"✗ {args.hierarchy}: missing hierarchy columns {missing_columns}")
+        return False
+    print(f"✓ Hierarchy: {args.hierarchy} ({os.path.getsize(args.hierarchy) / 1_000_000:,.1f} MB); "
+          f"linked accounts scored as one customer")
+    return True
+
+def check_duplicate_pairs_file(args):
+    """Dry-run check that the duplicate pairs file exists and has its pair and confirmed columns."""
+    from loyalty_io import read_columns
+    from loyalty_duplicates import CONFIRMED_COLUMNS
+
+    if not os.path.exists(args.merge_duplicates):
+        print(f"✗ Duplicate pairs file '{args.merge_duplicates}' not found")
+        return False
+    try:
+        columns = read_columns(args.merge_duplicates)
+    except Exception as e:
+        print(f"✗ Could not read the header of {args.merge_duplicates}: {str(e)}")
+        return False
+    missing_columns = [col for col in CONFIRMED_COLUMNS if col not in columns]
+    if missing_columns:
+        print(f"✗ {args.merge_duplicates}: missing duplicate pair columns {missing_columns}")
+        return False
+    print(f"✓ Duplicate pairs: {args.merge_duplicates}; confirmed pairs scored as one customer")
+    return True
+
+def print_cleaning_report(result):
+    config = result['config']
+    stats = result['cleaning']
+    print_step("STEP 2: CLEANING DATA")
+    print("Cleaning revenue columns...")
+    for year, negative_count in stats['negative_counts'].items():
+        if negative_count > 0:
+            print(f"  • {year}: {negative_count:,} negative values (returns/credits)")
+    print(f"✓ Revenue columns cleaned for {len(get_evaluation_years(config))} years")
+
+    print("\nParsing First Order Date...")
+    for date_format, count in stats['date_formats'].items():
+        print(f"  • {count:,} dates in format {date_format}")
+    if stats['invalid_dates'] > 0:
+        print(f"  • {stats['invalid_dates']:,} dates in no recognized format (treated as blank)")
+    if stats['blank_dates'] > 0:
+        print(f"  • {stats['blank_dates']:,} blank/invalid dates found")
+        print(f"  • Inferring from first year with revenue...")
+        print(f"  • Successfully inferred {stats['inferred_count']:,} dates from revenue data")
+    if stats['no_data'] > 0:
+        print(f"  • WARNING: {stats['no_data']:,} customers have no date and no revenue")
+        print(f"  • These will be excluded from analysis")
+    print(f"✓ First Order Date processed")
+
+def print_metrics_report(result):
+    config = result['config']
+    summary = result['summary']
+    num_years = len(get_evaluation_years(config))
+    min_revenue_per_year = config["min_revenue_per_active_year"]
+    print_step("STEP 3: CALCULATING LOYALTY METRICS")
+    print(f"✓ Tenure calculated (range: {summary['tenure_min']:.0f} to {summary['tenure_max']:.0f} years)")
+
+    print(f"\nCalculating consistency...")
+    if min_revenue_per_year > 0:
+        print(f"  • Per-year minimum ENABLED: ${min_revenue_per_year:,}")
+        print(f"  • Years with revenue >= ${min_revenue_per_year:,} count as active")
+    else:
+        print(f"  • Per-year minimum DISABLED")
+        print(f"  • Any positive revenue counts as active")
+    print(f"✓ Consistency calculated")
+    print(f"  • Distribution of years active:")
+    for i, count in summary['years_active_distribution'].items():
+        pct = count / summary['total_customers'] * 100
+        print(f"    {i}/{num_years} years: {count:>6,} customers ({pct:>5.1f}%)")
+
+    print(f"\n✓ 5-Year Revenue calculated")
+    print(f"  • Total revenue: ${summary['total_revenue']:,.2f}")
+    print(f"  • Average per customer: ${summary['mean_revenue']:,.2f}")
+    print(f"  • Median per customer: ${summary['median_revenue']:,.2f}")
+
+def print_status_report(result):
+    summary = result['summary']
+    total = summary['total_customers']
+    counts = summary['status_counts']
+    total_revenue = summary['total_revenue']
+    loyal_revenue = summary['loyal_revenue']
+    print_step("STEP 4: DETERMINING LOYALTY STATUS")
+    print(f"\nLoyalty Status Results:")
+    print(f"  ✓ Loyal: {counts['Loyal']:,} customers ({counts['Loyal']/total*100:.2f}%)")
+    print(f"  ✗ Not Qualified: {counts['Not Qualified']:,} customers ({counts['Not Qualified']/total*100:.2f}%)")
+    print(f"  ⊘ Ineligible: {counts['Ineligible']:,} customers ({counts['Ineligible']/total*100:.2f}%)")
+    if 'rule_counts' in summary:
+        print(f"\nBy Threshold Rule Set:")
+        for rule, rule_counts in summary['rule_counts'].items():
+            rule_total = sum(rule_counts.values())
+            loyal_share = f"{rule_counts['Loyal'] / rule_total * 100:.2f}% loyal" if rule_total else "no accounts"
+            print(f"  • {rule}: {rule_total:,} customers, {rule_counts['Loyal']:,} Loyal, "
+                  f"{rule_counts['Not Qualified']:,} Not Qualified, "
+                  f"{rule_counts['Ineligible']:,} Ineligible ({loyal_share})")
+
+    print(f"\nEconomic Impact:")
+    print(f"  • Total 5-year revenue: ${total_revenue:,.2f}")
+    print(f"  • Revenue from loyal customers: ${loyal_revenue:,.2f}")
+    print(f"  • Revenue concentration: {loyal_revenue/total_revenue*100:.1f}%")
+    print(f"  • Avg revenue (loyal): ${summary['avg_revenue_loyal']:,.2f}")
+    print(f"  • Avg revenue (non-loyal): ${summary['avg_revenue_non_loyal']:,.2f}")
+
+def print_validation_report(result):
+    print_step("STEP 6: QUALITY VALIDATION")
+    validation_passed = True
+    for passed, message in result['validation']:
+        if passed:
+            print(f"✓ {message}")
+        else:
+            print(f"✗ FAIL: {message}")
+            validation_passed = False
+
+    status_counts = sorted(result['summary']['status_counts'].items(), key=lambda item: -item[1])
+    print(f"\n✓ Loyalty status distribution:")
+    for status, count in status_counts:
+        if count > 0:
+            print(f"  • {status}: {count:,}")
+
+    if validation_passed:
+        print(f"\n✓ All quality checks passed")
+    else:
+        print(f"\n✗ Quality validation failed - review errors above")
+
+def print_profile_report(metrics, args, timestamp, output_filename):
+    print_step("PIPELINE TIMING")
+    print(metrics.format_table())
+    if args.metrics_file:
+        metrics_filename = os.path.join(args.output_dir or '', f'loyalty_metrics_{timestamp}.{args.metrics_file}')
+        metrics.write(metrics_filename, {
+            'run_timestamp': datetime.strptime(timestamp, '%Y%m%d_%H%M%S').strftime('%Y-%m-%d %H:%M:%S'),
+            'framework_version': FRAMEWORK_VERSION,
+            'input_file': ', '.join(input_paths(args)),
+            'output_file': output_filename,
+        })
+        print(f"\n✓ Metrics file saved: {metrics_filename}")
+
+def print_final_summary(result, output_filename):
+    summary = result['summary']
+    loyal_revenue = summary['loyal_revenue']
+    print("\n" + "="*80)
+    print("ANALYSIS COMPLETE")
+    print("="*80)
+
+    print(f"\nFramework Summary:")
+    print(f"  • {summary['status_counts']['Loyal']:,} loyal customers identified")
+    print(f"  • Representing ${loyal_revenue:,.2f} ({loyal_revenue/summary['total_revenue']*100:.1f}% of total revenue)")
+    print(f"  • Loyal customers are {summary['avg_revenue_loyal'] / summary['avg_revenue_non_loyal']:.1f}x more valuable on average")
+
+    print(f"\nOutput File: {output_filename}")
+    print(f"Ready for PowerBI import or further analysis.")
+
+    print("\n" + "="*80)
+    print(f"Script completed at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    print("="*80)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Identify loyal customers and write the PowerBI output file.")
+    parser.add_argument('--input', default=INPUT_FILE,
+                        help=f"Revenue extract: .csv, .parquet or .feather (default: {INPUT_FILE})")
+    parser.add_argument('--transactions', nargs='+', default=None, metavar='FILE',
+                        help="Build the extract from order-line files instead of --input "
+                             "(see loyalty_transactions.py)")
+    parser.add_argument('--accounts', default=None, metavar='FILE',
+                        help="With --transactions: Name and Sub Segment per Account_ID")
+    parser.add_argument('--hierarchy', default=None, metavar='FILE',
+                        help="Child → parent Account_ID links; linked accounts are scored "
+                             "as one customer (see loyalty_rollup.py)")
+    parser.add_argument('--merge-duplicates', default=None, metavar='FILE',
+                        help="Pairs file from loyalty_duplicates.py; confirmed pairs are "
+                             "scored as one customer (with --hierarchy links, if given)")
+    parser.add_argument('--output-dir', default=None,
+                        help="Directory for loyalty_analysis_*.csv (default: current directory)")
+    parser.add_argument('--format', choices=['csv', 'parquet', 'feather'], default='csv',
+                        help="Output file format; parquet/feather keep typed columns "
+                             "and need pyarrow (default: csv)")
+    parser.add_argument('--compress', choices=['gzip', 'zstd'], default=None,
+                        help="Compress the CSV output (.csv.gz / .csv.zst; requires pyarrow)")
+    parser.add_argument('--float-format', choices=['shortest', 'fixed'], default='shortest',
+                        help="CSV numbers: shortest (as before, e.g. 1250.5) or fixed "
+                             "(revenue always with 2 decimals, consistency rate with 4). "
+                             "Default: shortest")
+    parser.add_argument('--timestamp', choices=['column', 'sidecar'], default='column',
+                        help="Where the analysis timestamp goes: a column on every row "
+                             "(default) or only the summary sidecar")
+    parser.add_argument('--chunksize', type=int, default=None, metavar='ROWS',
+                        help="Stream the input in chunks of ROWS rows to bound memory "
+                             "(output rows stay in input order)")
+    parser.add_argument('--sort', choices=OUTPUT_ORDERS, default='full',
+                        help="Output row order: full (Loyal → Ineligible, revenue descending), "
+                             "loyal (only Loyal rows sorted by revenue) or none (input "
+                             "order; fastest). Default: full")
+    parser.add_argument('--workers', type=int, default=None, metavar='N',
+                        help="Score on N CPU cores (output identical to a serial run)")
+    parser.add_argument('--partition-by', choices=['account', 'segment'], default='account',
+                        help="How rows are split between workers: Account_ID hash or "
+                             "Sub Segment (default: account)")
+    parser.add_argument('--compact', action='store_true',
+                        help="Memory-lean mode: parse while reading, compact column "
+                             "types (same output)")
+    parser.add_argument('--cache', nargs='?', const='.loyalty_cache', default=None,
+                        metavar='DIR',
+                        help="Reuse the cleaned input when the extract is unchanged, so "
+                             "threshold-only reruns skip loading and cleaning "
+                             "(default DIR: .loyalty_cache; requires pyarrow)")
+    parser.add_argument('--history', nargs='?', const='loyalty_history', default=None,
+                        metavar='DIR',
+                        help="Record this run's statuses for quarter-over-quarter comparison "
+                             "(default DIR: loyalty_history; requires pyarrow)")
+    parser.add_argument('--check-config', action='store_true',
+                        help="Validate loyalty_config.py and exit (no data is read)")
+    parser.add_argument('--dry-run', action='store_true',
+                        help="Check the config and the input file's header, show what "
+                             "would be written, and exit")
+    parser.add_argument('--profile', action='store_true',
+                        help="Print wall time, CPU time, rows and peak memory for each stage")
+    parser.add_argument('--metrics-file', choices=['json', 'csv'], default=None,
+                        help="Also save the stage metrics as loyalty_metrics_*.json/.csv "
+                             "next to the output (implies --profile)")
+    parser.add_argument('--trace-memory', action='store_true',
+                        help="Add tracemalloc peak memory per stage; slows the run "
+                             "(implies --profile)")
+    args = parser.parse_args(argv)
+    if args.workers is not None and args.workers < 1:
+        parser.error("--workers must be at least 1")
+    if args.workers and args.chunksize:
+        parser.error("--workers cannot be combined with --chunksize")
+    if args.compact and (args.workers or args.chunksize):
+        parser.error("--compact cannot be combined with --workers or --chunksize")
+    if args.chunksize and args.sort != 'full':
+        parser.error("--chunksize output is always in input order; --sort does not apply")
+    if args.cache and (args.workers or args.chunksize or args.compact):
+        parser.error("--cache cannot be combined with --workers, --chunksize or --compact")
+    if args.format != 'csv' and (args.compress or args.float_format != 'shortest'):
+        parser.error("--compress and --float-format apply to CSV output only")
+    if args.chunksize and args.timestamp == 'sidecar':
+        parser.error("--chunksize writes no summary sidecar; use --timestamp column")
+    if args.transactions and (args.chunksize or args.compact or args.cache):
+        parser.error("--transactions cannot be combined with --chunksize, --compact or --cache")
+    if args.accounts and not args.transactions:
+        parser.error("--accounts applies to --transactions only")
+    if args.hierarchy and (args.chunksize or args.workers or args.compact or args.cache):
+        parser.error("--hierarchy cannot be combined with --chunksize, --workers, --compact or --cache")
+    if args.merge_duplicates and (args.chunksize or args.workers or args.compact or args.cache):
+        parser.error("--merge-duplicates cannot be combined with --chunksize, --workers, --compact "
+                     "or --cache")
+    return args
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    if LOYALTY_CONFIG is None:
+        print("ERROR: loyalty_config.py not found in current directory.")
+        print("Please ensure loyalty_config.py is in the same folder as this script.")
+        return 1
+    config = LOYALTY_CONFIG
+    import loyalty_config
+    config_problems = validate_config(config, getattr(loyalty_config, 'EVALUATION_YEARS', None))
+    if config_problems:
+        print("ERROR: loyalty_config.py is not valid:")
+        for problem in config_problems:
+            print(f"  ✗ {problem}")
+        return 1
+    if args.check_config:
+        print_configuration(config)
+        print(f"✓ loyalty_config.py is valid")
+        return 0
+    if args.dry_run:
+        print_configuration(config)
+        return 0 if print_dry_run(args, config) else 1
+
+    metrics = None
+    if args.profile or args.metrics_file or args.trace_memory:
+        from loyalty_profiling import StageMetrics
+        metrics = StageMetrics(trace_memory=args.trace_memory)
+    print_configuration(config)
+
+    print_step("STEP 1: LOADING DATA")
+    try:
+        if args.chunksize:
+            # Only the header is read up front; rows are streamed in STEP 2
+            import pandas as pd
+            from loyalty_io import read_columns
+            if not os.path.exists(args.input):
+                raise FileNotFoundError(args.input)
+            df = pd.DataFrame(columns=read_columns(args.input))
+            print(f"✓ Streaming {args.input} in chunks of {args.chunksize:,} rows")
+        elif args.compact:
+            from loyalty_compact import load_revenue_extract_compact
+            with timed_stage(metrics, 'load') as record:
+                df = load_revenue_extract_compact(args.input, config)
+                record['rows'] = len(df)
+            print(f"✓ Successfully loaded {len(df):,} customer records (compact mode)")
+        elif args.transactions:
+            from loyalty_transactions import aggregate_transactions, print_ingest_report
+            df, ingest_stats = aggregate_transactions(args.transactions, config,
+                                                      accounts_path=args.accounts, metrics=metrics)
+            print_ingest_report(ingest_stats)
+        elif args.cache:
+            from loyalty_cache import load_cleaned_extract
+            df, cache_info = load_cleaned_extract(args.input, config, args.cache, metrics)
+            if cache_info['cache_hit']:
+                print(f"✓ Loaded {len(df):,} cleaned customer records from the cache ({args.cache}/)")
+            else:
+                print(f"✓ Successfully loaded {cache_info['input_rows']:,} customer records "
+                      f"(cleaned copy cached in {args.cache}/)")
+        else:
+            with timed_stage(metrics, 'load') as record:
+                df = load_revenue_extract(args.input)
+                record['rows'] = len(df)
+            print(f"✓ Successfully loaded {len(df):,} customer records")
+    except FileNotFoundError as e:
+        if args.transactions:
+            print(f"ERROR: {e}")
+            return 1
+        print(f"ERROR: Input file '{args.input}' not found.")
+        print(f"Please ensure {args.input} is in the same directory as this script.")
+        return 1
+    except Exception as e:
+        print(f"ERROR: Failed to load {', '.join(input_paths(args))}")
+        print(f"Error message: {str(e)}")
+        return 1
+
+    # load_cleaned_extract() checks the raw columns before cleaning (ValueError above)
+    missing_columns = [] if args.cache else find_missing_columns(df, config)
+    if missing_columns:
+        print(f"ERROR: Missing required columns: {missing_columns}")
+        print(f"\nExpected columns: {get_required_columns(config)}")
+        print(f"Found columns: {list(df.columns)}")
+        return 1
+    print(f"✓ All required columns present")
+
+    if args.hierarchy:
+        from loyalty_rollup import load_hierarchy
+        try:
+            with timed_stage(metrics, 'load_hierarchy') as record:
+                links = load_hierarchy(args.hierarchy)
+                record['rows'] = len(links)
+        except Exception as e:
+            print(f"ERROR: Failed to load {args.hierarchy}")
+            print(f"Error message: {str(e)}")
+            return 1
+        print(f"✓ Loaded {len(links):,} account links from {args.hierarchy}")
+    if args.merge_duplicates:
+        import pandas as pd
+        from loyalty_duplicates import load_confirmed_links
+        try:
+            with timed_stage(metrics, 'load_duplicate_pairs') as record:
+                confirmed = load_confirmed_links(args.merge_duplicates)
+                record['rows'] = len(confirmed)
+        except Exception as e:
+            print(f"ERROR: Failed to load {args.merge_duplicates}")
+            print(f"Error message: {str(e)}")
+            return 1
+        print(f"✓ Loaded {len(confirmed):,} confirmed duplicate pairs from {args.merge_duplicates}")
+        links = pd.concat([links, confirmed], ignore_index=True) if args.hierarchy else confirmed
+    roll_up_accounts = bool(args.hierarchy or args.merge_duplicates)
+
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    output_filename = get_output_filename(args.output_dir, timestamp, args.format, args.compress)
+    if args.chunksize:
+        from loyalty_streaming import run_analysis_chunked
+        try:
+            with timed_stage(metrics, 'stream_score_write') as record:
+                result = run_analysis_chunked(args.input, output_filename, config, args.chunksize,
+                                              float_format=args.float_format)
+                record['rows'] = result['input_rows']
+        except Exception as e:
+            print(f"✗ ERROR: Failed to stream {args.input} to {output_filename}")
+            print(f"  • Error: {str(e)}")
+            return 1
+        print(f"✓ Streamed {result['input_rows']:,} customer records in {result['chunks']:,} chunks")
+    elif args.workers:
+        from loyalty_parallel import run_analysis_parallel
+        with timed_stage(metrics, 'parallel_score', len(df)):
+            result = run_analysis_parallel(df, config, args.workers, args.partition_by, order=args.sort)
+        print(f"✓ Scored {len(result['partitions'])} partitions on {result['workers']} workers "
+              f"(by {args.partition_by}, {min(result['partitions']):,}-{max(result['partitions']):,} rows each)")
+    elif args.compact:
+        from loyalty_compact import run_analysis_compact
+        result = run_analysis_compact(df, config, metrics=metrics, order=args.sort)
+    elif roll_up_accounts:
+        from loyalty_rollup import run_analysis_rollup
+        result = run_analysis_rollup(df, links, config, metrics=metrics, order=args.sort)
+    elif args.cache:
+        from loyalty_cache import run_analysis_cached
+        result = run_analysis_cached(df, cache_info, config, metrics=metrics, order=args.sort)
+    else:
+        result = run_analysis(df, config, metrics=metrics, order=args.sort)
+    if result['duplicates'] > 0:
+        print(f"WARNING: {result['duplicates']} duplicate Account_IDs found")
+        print(f"Keeping first occurrence of each duplicate")
+
+    print_cleaning_report(result)
+    if roll_up_accounts:
+        from loyalty_rollup import print_rollup_report
+        print_rollup_report(result)
+    print_metrics_report(result)
+    print_status_report(result)
+
+    print_step("STEP 5: PREPARING OUTPUT FILE")
+    if args.chunksize:
+        print(f"✓ Output rows written chunk by chunk in input order ({result['output_rows']:,} rows)")
+    else:
+        print(f"✓ Output DataFrame prepared with {len(result['output'])} rows")
+        if args.sort == 'loyal':
+            print(f"  • Only Loyal rows sorted by revenue; other statuses keep input order")
+        elif args.sort == 'none':
+            print(f"  • Rows left in input order (not sorted)")
+    if roll_up_accounts:
+        print(f"  • One row per group; {len(result['members']):,} member rows prepared "
+              f"(each account with its group's status)")
+    if args.compact:
+        memory = result['memory']
+        print(f"  • Memory per account: input {memory['input']:,.0f} B, "
+              f"scoring frame {memory['scored']:,.0f} B, output {memory['output']:,.0f} B")
+
+    print_validation_report(result)
+
+    print_step("STEP 7: SAVING OUTPUT")
+    try:
+        if args.chunksize:
+            output_rows, output_columns = result['output_rows'], result['output_columns']
+        else:
+            with timed_stage(metrics, 'write_output', len(result['output'])):
+                save_output(result['output'], args.output_dir, timestamp, args.format, args.compress,
+                            args.float_format, args.timestamp == 'column')
+            output_rows = len(result['output'])
+            output_columns = len(result['output'].columns) - (args.timestamp == 'sidecar')
+        print(f"✓ Output file saved: {output_filename}")
+        print(f"  • Location: {os.path.abspath(output_filename)}")
+        print(f"  • Rows: {output_rows:,}")
+        print(f"  • Columns: {output_columns}")
+        if args.timestamp == 'sidecar':
+            print(f"  • analysis_timestamp left out (recorded in the summary sidecar)")
+        if roll_up_accounts:
+            from loyalty_io import write_output
+            from loyalty_rollup import member_output_filename
+            members_filename = member_output_filename(output_filename)
+            members = result['members']
+            if args.timestamp == 'sidecar':
+                members = members.drop(columns='analysis_timestamp')
+            with timed_stage(metrics, 'write_members', len(members)):
+                write_output(members, members_filename, args.float_format)
+            print(f"✓ Member rows saved: {members_filename} ({len(members):,} rows)")
+    except Exception as e:
+        print(f"✗ ERROR: Failed to save output file")
+        print(f"  • Error: {str(e)}")
+        return 1
+
+    if not args.chunksize:
+        # Figures for loyalty_summary_report.py, so it need not re-read the output
+        from loyalty_summary_report import save_summary_sidecar
+        try:
+            with timed_stage(metrics, 'summary_sidecar', len(result['output'])):
+                summary_filename = save_summary_sidecar(result['output'], output_filename)
+            print(f"✓ Summary sidecar saved: {summary_filename}")
+        except Exception as e:
+            print(f"  • Summary sidecar not saved ({str(e)}); the summary report will read the output file")
+
+    if args.history:
+        from loyalty_history import record_output_file, record_run
+        try:
+            with timed_stage(metrics, 'record_history', output_rows):
+                if args.chunksize:
+                    # Streamed output is only on disk
+                    record_output_file(args.history, output_filename, timestamp)
+                else:
+                    record_run(args.history, result['output'], timestamp, os.path.basename(output_filename))
+            print(f"✓ Run {timestamp} recorded in {args.history}/ "
+                  f"(compare runs with: python3 loyalty_history.py diff)")
+        except Exception as e:
+            print(f"✗ ERROR: Failed to record the run in {args.history}")
+            print(f"  • Error: {str(e)}")
+            return 1
+
+    if metrics is not None:
+        print_profile_report(metrics, args, timestamp, output_filename)
+
+    print_final_summary(result, output_filename)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,967 @@
+"""
+LOYALTY ANALYSIS - BENCHMARKS
+
+Purpose: Measure how the loyalty pipeline performs on larger extracts than the
+         one we ship, so changes to the scoring code can be compared.
+
+Usage:
+    python loyalty_benchmark.py io [--rows 1000000] [--currency-strings]
+    python loyalty_benchmark.py parallel [--rows 2000000] [--workers 1 2 4 8]
+    python loyalty_benchmark.py stages [--rows 10000 100000 1000000] [--save FILE]
+    python loyalty_benchmark.py memory [--rows 1000000]
+    python loyalty_benchmark.py kernel [--rows 1000000] [--per-year-minimum 5000]
+    python loyalty_benchmark.py write [--rows 1000000]
+    python loyalty_benchmark.py dates [--rows 5000000] [--blank 0.002] [--invalid 0.001] [--mixed 0.0]
+    python loyalty_benchmark.py transactions [--accounts 500000] [--lines-per-year 4] [--chunksize 1000000]
+    python loyalty_benchmark.py rollup [--accounts 1000000] [--linked 1.0]
+    python loyalty_benchmark.py duplicates [--accounts 1000000] [--duplicates 0.05] [--min-score 0.8]
+    python loyalty_benchmark.py service [--rows 1000000] [--lookups 2000]
+    python loyalty_benchmark.py startup [--max-import-ms 150]
+
+Benchmarks:
+    io        - Load times for CSV vs Parquet/Feather: the revenue extract
+                (read + revenue parsing) and the analysis output as read by
+                the summary report (column-pruned) and in full.
+    parallel  - Scoring time of run_analysis() vs run_analysis_parallel() at
+                each worker count, checking the outputs are identical.
+    stages    - Time and peak memory of each pipeline stage (load, clean,
+                date inference, metrics, classification, output, sort,
+                summary, validation, write, summary report) on synthetic
+                extracts of each size.
+    memory    - Bytes per account and process peak memory of a normal run
+                vs --compact mode, each in a fresh process.
+    kernel    - STEP 3-4 scoring of a cleaned extract: the multi-pass
+                calculate_metrics() + classify_loyalty() + years-active
+                histogram vs score_metrics() with each kernel engine
+                (numba only if installed; its first call, which compiles
+                the loop, is timed separately). Checks the results agree.
+    write     - STEP 7 output CSV: DataFrame.to_csv() vs write_output()
+                (Arrow writer), with fixed decimals, gzip, zstd and without
+                the analysis_timestamp column. Checks the plain file is
+                byte-identical to to_csv() and that every variant keeps the
+                column order and parses back to the same values.
+    dates     - STEP 2 First Order Date parsing: pd.to_datetime() without a
+                format (the previous call) vs parse_first_order_years(), on
+                the template's dates with blanks, bad values and optionally
+                a share in a second format mixed in. Reports rows read per
+                format and checks the years agree wherever pd.to_datetime()
+                reads a date.
+    transactions - loyalty_transactions.py: order lines generated from a
+                synthetic extract are aggregated back into an extract in a
+                fresh process (time, lines per second, peak RSS). Checks the
+                revenue per account and year, first order years and loyalty
+                statuses match the extract the lines came from.
+    rollup    - loyalty_rollup.py: grouping synthetic child → parent links
+                with the one-link-at-a-time union-find vs the array
+                union-find, then run_analysis() vs run_analysis_rollup()
+                on the linked extract. Checks both groupings agree, no
+                revenue is lost and every roll-up validation passes.
+    duplicates - loyalty_duplicates.py: candidate pairs on an extract of
+                distinct random company names, a share of them copied to
+                another account with a typo, a legal suffix or different
+                case and punctuation. Reports time per stage and the
+                candidates scored against all-pairs comparison, and checks
+                that the copies scoring at least --min-score are found.
+    service   - loyalty_service.py: time to score and index an extract,
+                single and batch lookup latency in-process and over HTTP
+                (keep-alive), and lookups answered while a reload runs.
+    startup   - Start-up time of the commands that should answer without
+                loading pandas (--help, --check-config, --dry-run), with
+                the import time reported by python -X importtime. Exits 1
+                if any of them imports pandas, NumPy or pyarrow (or, with
+                --max-import-ms, takes longer than that to import), so it
+                can guard start-up in a pre-release check.
+
+Requirements:
+    - pandas library
+    - pyarrow library (for the columnar side of the io benchmark)
+    - customer_annual_revenue.csv, used as the template for the io and
+      parallel extracts (rows are repeated with new Account_IDs up to
+      --rows); the stages benchmark uses loyalty_synthetic.py instead
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from loyalty_analysis import (
+    INPUT_FILE, LOYALTY_CONFIG, get_evaluation_years, load_revenue_extract,
+    parse_currency_columns, revenue_column_name, run_analysis,
+)
+
+# ============================================================================
+# HELPERS
+# ============================================================================
+
+def time_call(func, repeat=3):
+    """
+    Best-of-N wall time of a call.
+
+    Args:
+        func: Zero-argument callable
+        repeat: Number of runs
+
+    Returns:
+        float: Fastest run in seconds
+    """
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def scale_extract(template, rows, currency_strings=False):
+    """
+    Repeat a real extract up to the requested size with unique Account_IDs.
+
+    Args:
+        template: Revenue extract to repeat
+        rows: Number of rows wanted
+        currency_strings: Render revenue as "$1,234.56" / "($500.00)" text,
+                          like a raw BI export
+
+    Returns:
+        DataFrame: Extract with the template's schema
+    """
+    repeats = -(-rows // len(template))
+    df = pd.concat([template] * repeats, ignore_index=True).head(rows)
+    df['Account_ID'] = np.arange(1_000_000, 1_000_000 + rows)
+    if currency_strings:
+        for col in [c for c in df.columns if c.startswith('TY Net Product Revenue')]:
+            values = df[col]
+            text = values.abs().map('${:,.2f}'.format)
+            text = text.where(values >= 0, '(' + text + ')')
+            df[col] = text.where(values.notna(), '')
+    return df
+
+def file_size_mb(path):
+    return os.path.getsize(path) / 1_000_000
+
+def print_table(rows):
+    print(f"  {'Benchmark':<44} {'Seconds':>9} {'File MB':>9}")
+    print(f"  {'-'*44} {'-'*9} {'-'*9}")
+    for name, seconds, size in rows:
+        size_text = f"{size:>9.1f}" if size is not None else f"{'':>9}"
+        print(f"  {name:<44} {seconds:>9.3f} {size_text}")
+
+# ============================================================================
+# BENCHMARKS
+# ============================================================================
+
+def benchmark_io(args):
+    from loyalty_io import read_table, require_pyarrow, write_output, write_table
+    from loyalty_summary_report import load_analysis
+
+    require_pyarrow('parquet')
+    config = LOYALTY_CONFIG
+    raw_columns = [revenue_column_name(year) for year in get_evaluation_years(config)]
+    extract = scale_extract(load_revenue_extract(args.template), args.rows, args.currency_strings)
+    print(f"Synthetic extract: {len(extract):,} rows "
+          f"({'currency strings' if args.currency_strings else 'numeric revenue'})")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = {fmt: os.path.join(tmp, f"extract.{fmt}") for fmt in ('csv', 'parquet', 'feather')}
+        extract.to_csv(paths['csv'], index=False)
+        for fmt in ('parquet', 'feather'):
+            # Columnar extracts store revenue as numbers, not text
+            typed = extract.copy()
+            typed[raw_columns] = parse_currency_columns(typed, raw_columns)
+            write_table(typed, paths[fmt])
+
+        def load_and_parse(path):
+            df = read_table(path)
+            parse_currency_columns(df, raw_columns)
+
+        rows = []
+        for fmt, path in paths.items():
+            rows.append((f"Extract {fmt}: load + parse revenue",
+                         time_call(lambda: load_and_parse(path), args.repeat), file_size_mb(path)))
+
+        output = run_analysis(extract, config)['output']
+        outputs = {fmt: os.path.join(tmp, f"loyalty_analysis_bench.{fmt}") for fmt in ('csv', 'parquet', 'feather')}
+        for path in outputs.values():
+            write_output(output, path)
+        for fmt, path in outputs.items():
+            rows.append((f"Output {fmt}: summary report columns",
+                         time_call(lambda: load_analysis(path), args.repeat), file_size_mb(path)))
+        for fmt, path in outputs.items():
+            rows.append((f"Output {fmt}: all columns",
+                         time_call(lambda: read_table(path), args.repeat), None))
+
+    print_table(rows)
+
+def benchmark_parallel(args):
+    from loyalty_parallel import default_workers, run_analysis_parallel
+
+    config = LOYALTY_CONFIG
+    timestamp = '2024-01-01 00:00:00'
+    extract = scale_extract(load_revenue_extract(args.template), args.rows, args.currency_strings)
+    print(f"Synthetic extract: {len(extract):,} rows "
+          f"({'currency strings' if args.currency_strings else 'numeric revenue'}), "
+          f"{default_workers()} CPU cores available")
+
+    expected = run_analysis(extract, config, timestamp)['output'].to_csv(index=False)
+    serial = time_call(lambda: run_analysis(extract, config, timestamp), args.repeat)
+
+    print(f"  {'Run':<30} {'Seconds':>9} {'Speed-up':>9} {'Output':>10}")
+    print(f"  {'-'*30} {'-'*9} {'-'*9} {'-'*10}")
+    print(f"  {'Serial run_analysis()':<30} {serial:>9.3f} {1.0:>8.2f}x {'reference':>10}")
+    for workers in args.workers:
+        result = run_analysis_parallel(extract, config, workers, args.partition_by, timestamp)
+        identical = result['output'].to_csv(index=False) == expected
+        seconds = time_call(
+            lambda: run_analysis_parallel(extract, config, workers, args.partition_by, timestamp), args.repeat)
+        print(f"  {f'{workers} worker(s), by {args.partition_by}':<30} {seconds:>9.3f} "
+              f"{serial / seconds:>8.2f}x {'identical' if identical else 'DIFFERS':>10}")
+
+def run_stages(input_path, config, output_path, trace_memory=False):
+    """
+    Run the pipeline once, recording every stage.
+
+    The stages are the ones run_analysis() records, plus loading, writing
+    the output CSV and building the summary report from it.
+
+    Args:
+        input_path: Revenue extract
+        config: Loyalty config dict
+        output_path: Where the output CSV is written
+        trace_memory: Record tracemalloc peaks (slows the run, so timings
+                      from a traced run are not reported)
+
+    Returns:
+        list: Stage records from loyalty_profiling.StageMetrics
+    """
+    from loyalty_io import write_output
+    from loyalty_profiling import StageMetrics
+    from loyalty_summary_report import build_summary, load_analysis
+
+    metrics = StageMetrics(trace_memory=trace_memory)
+    with metrics.stage('load') as record:
+        df = load_revenue_extract(input_path)
+        record['rows'] = len(df)
+    output = run_analysis(df, config, metrics=metrics)['output']
+    with metrics.stage('write_csv', len(output)):
+        write_output(output, output_path)
+    with metrics.stage('summary_report', len(output)):
+        build_summary(load_analysis(output_path))
+    return metrics.records
+
+def benchmark_stages(args):
+    from loyalty_synthetic import write_synthetic_extract
+
+    config = LOYALTY_CONFIG
+    records = []
+    with tempfile.TemporaryDirectory() as tmp:
+        output_path = os.path.join(tmp, "loyalty_analysis_bench.csv")
+        for rows in sorted(args.rows):
+            input_path = os.path.join(tmp, f"synthetic_{rows}.csv")
+            write_synthetic_extract(input_path, rows, config, seed=args.seed,
+                                    profile={'currency_text': args.currency_text})
+            print(f"\nSynthetic extract: {rows:,} rows, {file_size_mb(input_path):.1f} MB "
+                  f"({args.currency_text:.0%} of revenue as currency text)")
+
+            timings = [run_stages(input_path, config, output_path) for _ in range(args.repeat)]
+            memory = run_stages(input_path, config, output_path, trace_memory=True)
+
+            print(f"  {'Stage':<18} {'Seconds':>9} {'Traced peak MB':>15} {'Max RSS MB':>11}")
+            print(f"  {'-'*18} {'-'*9} {'-'*15} {'-'*11}")
+            total = 0.0
+            for i, traced in enumerate(memory):
+                seconds = min(run[i]['wall_seconds'] for run in timings)
+                total += seconds
+                rss = traced['max_rss_mb']
+                rss_text = f"{rss:>11.0f}" if rss is not None else f"{'':>11}"
+                print(f"  {traced['stage']:<18} {seconds:>9.3f} {traced['traced_peak_mb']:>15.1f} {rss_text}")
+                records.append({'rows': rows, 'stage': traced['stage'], 'seconds': seconds,
+                                'traced_peak_mb': traced['traced_peak_mb'], 'max_rss_mb': rss})
+            print(f"  {'total':<18} {total:>9.3f}")
+
+    print("\nTraced peak: Python/NumPy allocations during the stage (Arrow-backed strings")
+    print("are not traced). Max RSS: process high-water mark so far, all sizes included.")
+    if args.save:
+        # Appended, so repeated runs build a history to compare against
+        frame = pd.DataFrame(records)
+        frame.insert(0, 'run_timestamp', pd.Timestamp.now().strftime('%Y-%m-%d %H:%M:%S'))
+        frame.to_csv(args.save, index=False, mode='a', header=not os.path.exists(args.save))
+        print(f"✓ Results appended to {args.save}")
+
+def measure_run_memory(input_path, compact):
+    """
+    Score an extract and report its memory use (run in a fresh process).
+
+    Args:
+        input_path: Revenue extract
+        compact: Use loyalty_compact instead of the normal pipeline
+
+    Returns:
+        dict: seconds, bytes per account (input, scored, output) and peak
+        RSS in MB
+    """
+    from loyalty_profiling import max_rss_mb
+
+    config = LOYALTY_CONFIG
+    start = time.perf_counter()
+    if compact:
+        from loyalty_compact import load_revenue_extract_compact, run_analysis_compact
+        df = load_revenue_extract_compact(input_path, config)
+        result = run_analysis_compact(df, config)
+        memory = result['memory']
+    else:
+        from loyalty_compact import bytes_per_account
+        df = load_revenue_extract(input_path)
+        result = run_analysis(df, config)
+        memory = {
+            'input': bytes_per_account(df),
+            'scored': bytes_per_account(result['scored']),
+            'output': bytes_per_account(result['output']),
+        }
+    return {'seconds': time.perf_counter() - start, **memory, 'max_rss_mb': max_rss_mb()}
+
+def benchmark_memory(args):
+    import multiprocessing
+    from loyalty_synthetic import write_synthetic_extract
+
+    with tempfile.TemporaryDirectory() as tmp:
+        input_path = os.path.join(tmp, "synthetic.csv")
+        write_synthetic_extract(input_path, args.rows, LOYALTY_CONFIG, seed=args.seed,
+                                profile={'currency_text': args.currency_text})
+        print(f"Synthetic extract: {args.rows:,} rows, {file_size_mb(input_path):.1f} MB "
+              f"({args.currency_text:.0%} of revenue as currency text)")
+
+        # A fresh process per mode, so each peak RSS is that mode's alone
+        context = multiprocessing.get_context('spawn')
+        runs = {}
+        for label, compact in (('normal', False), ('compact', True)):
+            with context.Pool(1) as pool:
+                runs[label] = pool.apply(measure_run_memory, (input_path, compact))
+
+    print(f"  {'Mode':<10} {'Seconds':>9} {'Input B/acct':>13} {'Scored B/acct':>14} "
+          f"{'Output B/acct':>14} {'Peak RSS MB':>12}")
+    print(f"  {'-'*10} {'-'*9} {'-'*13} {'-'*14} {'-'*14} {'-'*12}")
+    for label, run in runs.items():
+        rss = f"{run['max_rss_mb']:>12.0f}" if run['max_rss_mb'] is not None else f"{'':>12}"
+        print(f"  {label:<10} {run['seconds']:>9.2f} {run['input']:>13,.0f} {run['scored']:>14,.0f} "
+              f"{run['output']:>14,.0f} {rss}")
+
+def multi_pass_scores(cleaned, config):
+    """STEP 3-4 as calculate_metrics(), classify_loyalty() and a histogram loop."""
+    from loyalty_analysis import calculate_metrics, classify_loyalty
+
+    scored = classify_loyalty(calculate_metrics(cleaned.copy(), config), config)
+    histogram = [int((scored['years_active'] == i).sum())
+                 for i in range(len(get_evaluation_years(config)) + 1)]
+    return scored, histogram
+
+def fused_scores(cleaned, config, engine):
+    """STEP 3-4 as score_metrics() and a bincount histogram."""
+    from loyalty_analysis import score_metrics
+
+    scored = score_metrics(cleaned.copy(), config, engine)
+    histogram = np.bincount(scored['years_active'], minlength=len(get_evaluation_years(config)) + 1)
+    return scored, histogram.tolist()
+
+def benchmark_kernel(args):
+    from loyalty_analysis import clean_data, drop_duplicate_accounts
+    from loyalty_kernel import numba_available
+    from loyalty_synthetic import write_synthetic_extract
+
+    config = dict(LOYALTY_CONFIG, min_revenue_per_active_year=args.per_year_minimum)
+    with tempfile.TemporaryDirectory() as tmp:
+        input_path = os.path.join(tmp, "synthetic.csv")
+        write_synthetic_extract(input_path, args.rows, config, seed=args.seed)
+        df, _ = drop_duplicate_accounts(load_revenue_extract(input_path))
+    cleaned, _ = clean_data(df, config)
+    columns = ['first_order_year'] + [f'revenue_{year}' for year in get_evaluation_years(config)]
+    cleaned = cleaned[columns]
+    print(f"Cleaned extract: {len(cleaned):,} accounts, per-year minimum ${args.per_year_minimum:,}")
+
+    expected, expected_histogram = multi_pass_scores(cleaned, config)
+    runs = [('multi-pass (calculate_metrics + classify_loyalty)',
+             lambda: multi_pass_scores(cleaned, config))]
+    engines = ['numpy']
+    if numba_available():
+        start = time.perf_counter()
+        fused_scores(cleaned, config, 'numba')
+        print(f"  numba import + compile (first call): {time.perf_counter() - start:.2f}s")
+        engines.append('numba')
+    else:
+        print("  numba not installed; only the NumPy engine is timed")
+    for engine in engines:
+        runs.append((f"fused score_metrics ({engine})",
+                     lambda engine=engine: fused_scores(cleaned, config, engine)))
+
+    print(f"  {'Scoring':<52} {'Seconds':>9} {'Speed-up':>9}  Same results")
+    print(f"  {'-'*52} {'-'*9} {'-'*9}  {'-'*12}")
+    baseline = None
+    for label, run in runs:
+        seconds = time_call(run, args.repeat)
+        baseline = baseline or seconds
+        scored, histogram = run()
+        same = histogram == expected_histogram and all(
+            expected[col].astype(object).fillna('').equals(scored[col].astype(object).fillna(''))
+            for col in ['years_active', 'consistency_rate', 'revenue_5yr', 'loyalty_status',
+                        'ineligibility_reason'])
+        print(f"  {label:<52} {seconds:>9.3f} {baseline / seconds:>8.1f}x  {'yes' if same else 'NO'}")
+
+def benchmark_write(args):
+    from loyalty_io import read_table, require_pyarrow, write_output
+
+    require_pyarrow('The write benchmark')
+    config = LOYALTY_CONFIG
+    extract = scale_extract(load_revenue_extract(args.template), args.rows)
+    output = run_analysis(extract, config, '2024-01-01 00:00:00')['output']
+    print(f"Output table: {len(output):,} rows x {len(output.columns)} columns")
+
+    variants = [
+        ('write_output()', 'loyalty_analysis_bench.csv', {}),
+        ('write_output(), fixed decimals', 'loyalty_analysis_bench_fixed.csv', {'float_format': 'fixed'}),
+        ('write_output(), gzip', 'loyalty_analysis_bench.csv.gz', {}),
+        ('write_output(), zstd', 'loyalty_analysis_bench.csv.zst', {}),
+        ('write_output(), no timestamp column', 'loyalty_analysis_bench_no_ts.csv', {'timestamp': False}),
+    ]
+    with tempfile.TemporaryDirectory() as tmp:
+        reference_path = os.path.join(tmp, 'loyalty_analysis_reference.csv')
+        baseline = time_call(lambda: output.to_csv(reference_path, index=False), args.repeat)
+        # The mostly empty ineligibility_reason column trips pandas' mixed-type warning
+        warnings.simplefilter('ignore', pd.errors.DtypeWarning)
+        expected = pd.read_csv(reference_path)
+        with open(reference_path, 'rb') as f:
+            expected_bytes = f.read()
+
+        print(f"  {'Writer':<40} {'Seconds':>9} {'Speed-up':>9} {'File MB':>9}  Output")
+        print(f"  {'-'*40} {'-'*9} {'-'*9} {'-'*9}  {'-'*22}")
+        print(f"  {'DataFrame.to_csv()':<40} {baseline:>9.3f} {1.0:>8.1f}x "
+              f"{file_size_mb(reference_path):>9.1f}  reference")
+        for label, name, options in variants:
+            path = os.path.join(tmp, name)
+            frame = output if options.get('timestamp', True) else output.drop(columns='analysis_timestamp')
+            float_format = options.get('float_format', 'shortest')
+            seconds = time_call(lambda: write_output(frame, path, float_format), args.repeat)
+
+            written = read_table(path)
+            reference = expected[list(frame.columns)]
+            if name == 'loyalty_analysis_bench.csv':
+                with open(path, 'rb') as f:
+                    check = 'byte-identical' if f.read() == expected_bytes else 'BYTES DIFFER'
+            elif list(written.columns) == list(reference.columns) and written.equals(reference):
+                check = 'same columns and values'
+            else:
+                check = 'VALUES DIFFER'
+            print(f"  {label:<40} {seconds:>9.3f} {baseline / seconds:>8.1f}x "
+                  f"{file_size_mb(path):>9.1f}  {check}")
+
+# Unparseable First Order Date values seen in exports
+BAD_DATES = ['N/A', 'unknown', '0', '00/00/0000', '2021-02-30 00:00:00', 'TBD']
+
+def dirty_dates(template_dates, rows, blank, invalid, mixed, seed=0):
+    """
+    First Order Dates repeated from a template, with a share of blanks, bad
+    values and dates rewritten as MM/DD/YYYY.
+
+    Args:
+        template_dates: Date text to repeat (its dtype is kept)
+        rows: Number of rows wanted
+        blank, invalid, mixed: Share of rows made blank, bad, or month-first
+
+    Returns:
+        Series: Date text
+    """
+    rng = np.random.default_rng(seed)
+    template = template_dates.dropna().to_numpy(dtype=object)
+    dates = pd.Series(template[rng.integers(0, len(template), rows)], dtype=object)
+    draw = rng.random(rows)
+    month_first = (draw >= blank + invalid) & (draw < blank + invalid + mixed)
+    if month_first.any():
+        dates[month_first] = pd.to_datetime(dates[month_first]).dt.strftime('%m/%d/%Y')
+    bad = (draw >= blank) & (draw < blank + invalid)
+    dates[bad] = rng.choice(BAD_DATES, int(bad.sum()))
+    dates[draw < blank] = None
+    return dates.astype(template_dates.dtype)
+
+def benchmark_dates(args):
+    from loyalty_analysis import parse_first_order_years
+
+    dates = dirty_dates(load_revenue_extract(args.template)['First Order Date'], args.rows,
+                        args.blank, args.invalid, args.mixed, args.seed)
+    print(f"First Order Dates: {len(dates):,} rows, {dates.nunique():,} distinct, "
+          f"{args.blank:.1%} blank, {args.invalid:.1%} bad, {args.mixed:.1%} MM/DD/YYYY")
+
+    # pd.to_datetime() takes its format from the first value; when that is
+    # not a date it cannot infer one and parses value by value
+    bad_first = dates.copy()
+    bad_first.iloc[0] = BAD_DATES[0]
+    for title, column in [('First value a date', dates), ('First value bad', bad_first)]:
+        def previous_call():
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore', UserWarning)
+                return np.asarray(pd.to_datetime(column, errors='coerce').dt.year, dtype='float64')
+
+        categorical = column.astype('category')
+        runs = [
+            ('pd.to_datetime(errors=coerce).dt.year', previous_call),
+            ('parse_first_order_years()', lambda: parse_first_order_years(column)[0]),
+            ('parse_first_order_years(), categorical', lambda: parse_first_order_years(categorical)[0]),
+        ]
+        expected = previous_call()
+        known = ~np.isnan(expected)
+
+        print(f"\n{title}")
+        print(f"  {'Parser':<42} {'Seconds':>9} {'Speed-up':>9} {'Years read':>11}  Agrees")
+        print(f"  {'-'*42} {'-'*9} {'-'*9} {'-'*11}  {'-'*6}")
+        baseline = None
+        for label, run in runs:
+            seconds = time_call(run, args.repeat)
+            baseline = baseline or seconds
+            years = run()
+            agrees = np.array_equal(expected[known], years[known])
+            print(f"  {label:<42} {seconds:>9.3f} {baseline / seconds:>8.1f}x "
+                  f"{int((~np.isnan(years)).sum()):>11,}  {'yes' if agrees else 'NO'}")
+
+    stats = parse_first_order_years(dates)[1]
+    print()
+    for date_format, count in stats['formats'].items():
+        print(f"  • {count:,} dates in format {date_format}")
+    print(f"  • {stats['blank']:,} blank, {stats['invalid']:,} in no recognized format")
+
+def measure_ingest(paths, chunksize):
+    """
+    Aggregate order-line files (run in a fresh process).
+
+    Returns:
+        tuple: (dict with seconds, ingest statistics and peak RSS in MB;
+        the aggregated extract)
+    """
+    from loyalty_profiling import max_rss_mb
+    from loyalty_transactions import aggregate_transactions
+
+    start = time.perf_counter()
+    extract, stats = aggregate_transactions(paths, LOYALTY_CONFIG, chunksize=chunksize)
+    return {'seconds': time.perf_counter() - start, **stats, 'max_rss_mb': max_rss_mb()}, extract
+
+def benchmark_transactions(args):
+    import multiprocessing
+    from loyalty_synthetic import generate_extract, generate_transactions
+
+    config = LOYALTY_CONFIG
+    # Started before the order lines are built: Linux carries a process's
+    # peak RSS over to the processes it starts
+    context = multiprocessing.get_context('spawn')
+    with context.Pool(1) as pool, tempfile.TemporaryDirectory() as tmp:
+        # No blank dates: the order lines then carry every account's First Order Date
+        source = generate_extract(args.accounts, config, args.seed,
+                                  {'currency_text': 0.0, 'duplicates': 0.0, 'missing_dates': 0.0})
+        path = os.path.join(tmp, 'transactions.csv')
+        generate_transactions(source, config, args.seed, args.lines_per_year).to_csv(path, index=False)
+        print(f"Order lines: {file_size_mb(path):.1f} MB for {len(source):,} accounts")
+        run, extract = pool.apply(measure_ingest, ([path], args.chunksize))
+    print(f"  ✓ {run['lines']:,} lines in {run['chunks']} chunks -> {run['accounts']:,} accounts "
+          f"in {run['seconds']:.2f}s ({run['lines'] / run['seconds']:,.0f} lines/s), "
+          f"peak RSS {run['max_rss_mb']:,.0f} MB")
+
+    aggregated = extract.set_index('Account_ID').reindex(source['Account_ID'])
+    columns = [revenue_column_name(year) for year in get_evaluation_years(config)]
+    revenue_error = np.abs(aggregated[columns].fillna(0.0).to_numpy()
+                           - source[columns].astype('float64').fillna(0.0).to_numpy()).max()
+    expected_years = pd.to_datetime(source['First Order Date']).dt.year.to_numpy(dtype='float64')
+    actual_years = aggregated['First Order Date'].dt.year.to_numpy(dtype='float64')
+    statuses = [run_analysis(frame, config, '')['output'].set_index('customer_id')['loyalty_status']
+                for frame in (source, extract)]
+    checks = [
+        (revenue_error < 0.005, f"Revenue per account and year (largest difference ${revenue_error:.2g})"),
+        (np.array_equal(expected_years, actual_years, equal_nan=True), "First order years"),
+        (statuses[0].astype(str).equals(statuses[1].reindex(statuses[0].index).astype(str)),
+         "Loyalty statuses"),
+    ]
+    for passed, message in checks:
+        print(f"  {'✓' if passed else '✗'} {message} {'match' if passed else 'DIFFER'} the source extract")
+    return 0 if all(passed for passed, _ in checks) else 1
+
+def benchmark_rollup(args):
+    from loyalty_rollup import connected_groups, run_analysis_rollup, union_find_groups
+    from loyalty_synthetic import generate_extract, generate_hierarchy
+
+    config = LOYALTY_CONFIG
+    links = generate_hierarchy(args.accounts, args.seed, args.linked)
+    codes, nodes = pd.factorize(pd.concat([links['Account_ID'], links['Parent_Account_ID']]))
+    left, right = np.split(codes, 2)
+    print(f"Grouping {len(links):,} links between {len(nodes):,} IDs")
+
+    start = time.perf_counter()
+    expected = union_find_groups(len(nodes), left.tolist(), right.tolist())
+    reference_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    labels = connected_groups(len(nodes), left, right)
+    array_seconds = time.perf_counter() - start
+    groups_match = np.array_equal(labels, expected)
+    print(f"  • union_find_groups(): {reference_seconds:.2f}s")
+    print(f"  • connected_groups():  {array_seconds:.2f}s ({reference_seconds / array_seconds:.1f}x), "
+          f"{len(np.unique(labels)):,} groups")
+
+    extract = generate_extract(args.accounts, config, args.seed, {'duplicates': 0.0})
+    start = time.perf_counter()
+    plain = run_analysis(extract, config, '')
+    plain_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    rolled = run_analysis_rollup(extract, links, config, '')
+    rollup_seconds = time.perf_counter() - start
+    stats = rolled['rollup']
+    print(f"\nScoring {args.accounts:,} accounts")
+    print(f"  • run_analysis():        {plain_seconds:.2f}s")
+    print(f"  • run_analysis_rollup(): {rollup_seconds:.2f}s, {stats['groups']:,} customers "
+          f"({stats['linked_accounts']:,} accounts in {stats['linked_groups']:,} linked groups, "
+          f"largest {stats['largest_group']:,})")
+    print(f"  • Loyal: {plain['summary']['status_counts']['Loyal']:,} accounts scored alone, "
+          f"{rolled['summary']['status_counts']['Loyal']:,} groups rolled up")
+
+    revenue_error = abs(plain['scored']['revenue_5yr'].sum() - rolled['scored']['revenue_5yr'].sum())
+    checks = [
+        (groups_match, "Array union-find groups agree with union_find_groups()"),
+        (revenue_error <= 1, f"Total revenue kept through the roll-up (difference ${revenue_error:,.2f})"),
+        (all(passed for passed, _ in rolled['validation']), "Roll-up quality validation passed"),
+    ]
+    for passed, message in checks:
+        print(f"  {'✓' if passed else '✗'} {message}")
+    return 0 if all(passed for passed, _ in checks) else 1
+
+SYLLABLES = [
+    'ar', 'bel', 'cor', 'dan', 'el', 'fen', 'gar', 'hol', 'is', 'jun', 'kel', 'lor', 'mar',
+    'nor', 'ol', 'pen', 'quin', 'ros', 'sal', 'tor', 'ul', 'ven', 'wil', 'yar', 'zen',
+    'ash', 'bro', 'cla', 'dor', 'est', 'fal', 'gri', 'har', 'ing', 'lan', 'mon', 'ner',
+]
+NAME_ENDINGS = ['', '', ' Interiors', ' Design', ' Studio', ' Design Group', ' Home', ' & Co.', ', LLC', ' Inc.']
+
+def company_names(count, rng):
+    """Mostly distinct random company names: two invented words and an ending."""
+    names = np.full(count, '', dtype=object)
+    for word in range(2):
+        for syllable in range(3):
+            picks = np.asarray(SYLLABLES, dtype=object)[rng.integers(0, len(SYLLABLES), count)]
+            if syllable == 2:
+                picks = np.where(rng.random(count) < 0.5, picks, '')
+            names = names + (picks if syllable else np.char.capitalize(picks.astype('str')).astype(object))
+        names = names + ' ' if word == 0 else names
+    return names + np.asarray(NAME_ENDINGS, dtype=object)[rng.integers(0, len(NAME_ENDINGS), count)]
+
+def misspell(name, rng):
+    """The name as a second account might carry it."""
+    kind = rng.integers(0, 4)
+    if kind == 0:
+        position = rng.integers(1, len(name) - 1)
+        return name[:position] + name[position + 1:]
+    if kind == 1:
+        position = rng.integers(1, len(name) - 2)
+        return name[:position] + name[position + 1] + name[position] + name[position + 2:]
+    if kind == 2:
+        return name.upper().replace('&', 'and')
+    return name.rstrip('.') + ', Inc.'
+
+def benchmark_duplicates(args):
+    from loyalty_duplicates import find_duplicate_pairs, normalize_name, name_similarity
+    from loyalty_profiling import StageMetrics
+    from loyalty_synthetic import generate_extract
+
+    rng = np.random.default_rng(args.seed)
+    extract = generate_extract(args.accounts, LOYALTY_CONFIG, args.seed, {'duplicates': 0.0})
+    names = company_names(args.accounts, rng)
+    copies = int(args.accounts * args.duplicates)
+    shuffled = rng.permutation(args.accounts)
+    sources, targets = shuffled[:copies], shuffled[copies:2 * copies]
+    names[targets] = [misspell(name, rng) for name in names[sources]]
+    extract['Name'] = names
+    print(f"Finding duplicate names among {args.accounts:,} accounts "
+          f"({copies:,} copied with a change)")
+
+    metrics = StageMetrics()
+    start = time.perf_counter()
+    pairs, stats = find_duplicate_pairs(extract, args.min_score, metrics=metrics)
+    seconds = time.perf_counter() - start
+    print(metrics.format_table())
+    all_pairs = stats['distinct_names'] * (stats['distinct_names'] - 1) // 2
+    print(f"  • {stats['candidates']:,} candidates, {stats['scored']:,} scored exactly "
+          f"(all pairs: {all_pairs:,}, {all_pairs / max(stats['scored'], 1):,.0f}x more)")
+    print(f"  • {len(pairs):,} pairs found in {seconds:.2f}s "
+          f"({stats['exact_pairs']:,} exact, {stats['similar_pairs']:,} similar)")
+
+    # Copies similar enough to be reported, and how many were
+    ids = extract['Account_ID'].to_numpy()
+    expected = [
+        (ids[source], ids[target]) for source, target in zip(sources, targets)
+        if name_similarity(normalize_name(names[source]), normalize_name(names[target])) >= args.min_score
+    ]
+    found = set(zip(pairs['account_id_1'], pairs['account_id_2']))
+    found |= {(second, first) for first, second in found}
+    recall = sum(pair in found for pair in expected) / max(len(expected), 1)
+    print(f"  • {len(expected):,} copies score at least {args.min_score}; {recall:.1%} found")
+
+    checks = stats['checks'] + [
+        (recall >= 0.95, "At least 95% of the copies found"),
+    ]
+    for passed, message in checks:
+        print(f"  {'✓' if passed else '✗'} {message}")
+    return 0 if all(passed for passed, _ in checks) else 1
+
+def latency_summary(seconds):
+    """Mean / p99 / max of per-call latencies, in milliseconds."""
+    values = np.sort(np.asarray(seconds)) * 1000
+    return f"mean {values.mean():.3f} ms, p99 {values[int(len(values) * 0.99)]:.3f} ms, max {values[-1]:.3f} ms"
+
+def benchmark_service(args):
+    import http.client
+    import json
+    import threading
+
+    from loyalty_service import LookupService, make_server, score_extract
+    from loyalty_synthetic import write_synthetic_extract
+
+    config = LOYALTY_CONFIG
+    with tempfile.TemporaryDirectory() as tmp:
+        input_path = os.path.join(tmp, "synthetic.csv")
+        write_synthetic_extract(input_path, args.rows, config, seed=args.seed)
+        start = time.perf_counter()
+        table = score_extract(input_path, config)
+        print(f"Scored and indexed {len(table):,} accounts in {time.perf_counter() - start:.2f}s")
+
+        rng = np.random.default_rng(args.seed)
+        ids = [str(account_id) for account_id in
+               load_revenue_extract(input_path)['Account_ID'].sample(args.lookups, replace=True,
+                                                                     random_state=args.seed)]
+        latencies = []
+        for account_id in ids:
+            start = time.perf_counter()
+            table.lookup(account_id)
+            latencies.append(time.perf_counter() - start)
+        print(f"  In-process lookup():        {latency_summary(latencies)}")
+        batch = list(rng.choice(ids, size=min(1000, len(ids))))
+        batch_seconds = time_call(lambda: table.lookup_many(batch), args.repeat)
+        print(f"  In-process lookup_many():   {len(batch):,} ids in {batch_seconds * 1000:.2f} ms")
+
+        service = LookupService(table, input_path)
+        server = make_server(service, port=0)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        connection = http.client.HTTPConnection('127.0.0.1', server.server_address[1])
+
+        def get(path):
+            connection.request('GET', path)
+            response = connection.getresponse()
+            response.read()
+            return response.status
+
+        latencies = []
+        for account_id in ids:
+            start = time.perf_counter()
+            get(f'/accounts/{account_id}')
+            latencies.append(time.perf_counter() - start)
+        print(f"  HTTP GET /accounts/<id>:    {latency_summary(latencies)}")
+        body = json.dumps({'ids': batch})
+        start = time.perf_counter()
+        connection.request('POST', '/accounts', body, {'Content-Type': 'application/json'})
+        connection.getresponse().read()
+        print(f"  HTTP POST /accounts:        {len(batch):,} ids in {(time.perf_counter() - start) * 1000:.2f} ms")
+
+        # Lookups keep being answered (from the old table) while a reload scores
+        reload_result = {}
+
+        def reload():
+            reload_connection = http.client.HTTPConnection('127.0.0.1', server.server_address[1],
+                                                           timeout=600)
+            reload_connection.request('POST', '/reload', '{}', {'Content-Type': 'application/json'})
+            response = reload_connection.getresponse()
+            reload_result['status'] = response.status
+            reload_result['body'] = json.loads(response.read())
+
+        reloader = threading.Thread(target=reload)
+        start = time.perf_counter()
+        reloader.start()
+        latencies, failures = [], 0
+        while reloader.is_alive():
+            account_id = ids[len(latencies) % len(ids)]
+            call_start = time.perf_counter()
+            failures += get(f'/accounts/{account_id}') != 200
+            latencies.append(time.perf_counter() - call_start)
+        reloader.join()
+        print(f"  During a {time.perf_counter() - start:.1f}s reload: {len(latencies):,} lookups answered, "
+              f"{failures} failed; {latency_summary(latencies)}")
+        print(f"  Reload: HTTP {reload_result['status']}, now serving generation "
+              f"{reload_result['body'].get('generation')}")
+        connection.close()
+        server.shutdown()
+        server.server_close()
+
+# Modules the light commands must not import
+HEAVY_MODULES = ('pandas', 'numpy', 'pyarrow')
+
+def startup_commands(input_path):
+    """Commands benchmarked by the startup benchmark, by label."""
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    analysis = os.path.join(script_dir, 'loyalty_analysis.py')
+    report = os.path.join(script_dir, 'loyalty_summary_report.py')
+    return {
+        'loyalty_analysis.py --help': [analysis, '--help'],
+        'loyalty_analysis.py --check-config': [analysis, '--check-config'],
+        'loyalty_analysis.py --dry-run': [analysis, '--dry-run', '--input', input_path],
+        'loyalty_summary_report.py --help': [report, '--help'],
+    }
+
+def import_profile(command):
+    """
+    Run a command under python -X importtime.
+
+    Args:
+        command: Script path and arguments
+
+    Returns:
+        tuple: (total import time in ms, sorted list of HEAVY_MODULES
+        imported)
+    """
+    completed = subprocess.run([sys.executable, '-X', 'importtime'] + command,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    total_us = 0
+    heavy = set()
+    for line in completed.stderr.splitlines():
+        # "import time: self [us] | cumulative | imported package"
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line.split('|')
+        if not name.startswith('  '):
+            # Top-level import; nested ones are included in its cumulative time
+            total_us += int(cumulative)
+        package = name.strip().split('.')[0]
+        if package in HEAVY_MODULES:
+            heavy.add(package)
+    return total_us / 1000, sorted(heavy)
+
+def benchmark_startup(args):
+    rows = []
+    for label, command in startup_commands(args.template).items():
+        seconds = time_call(lambda: subprocess.run([sys.executable] + command,
+                                                   stdout=subprocess.DEVNULL), args.repeat)
+        import_ms, heavy = import_profile(command)
+        rows.append((label, seconds, import_ms, heavy))
+
+    print(f"  {'Command':<40} {'Seconds':>9} {'Import ms':>10}  Heavy imports")
+    print(f"  {'-'*40} {'-'*9} {'-'*10}  {'-'*13}")
+    for label, seconds, import_ms, heavy in rows:
+        print(f"  {label:<40} {seconds:>9.3f} {import_ms:>10.1f}  {', '.join(heavy) or '-'}")
+
+    failures = [label for label, _, import_ms, heavy in rows
+                if heavy or (args.max_import_ms is not None and import_ms > args.max_import_ms)]
+    if failures:
+        print(f"\n✗ Start-up regressed: {', '.join(failures)}")
+        return 1
+    print(f"\n✓ No command imports {', '.join(HEAVY_MODULES)}")
+    return 0
+
+# ============================================================================
+# COMMAND LINE INTERFACE
+# ============================================================================
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the loyalty analysis pipeline.")
+    parser.add_argument('--template', default=INPUT_FILE,
+                        help=f"Extract used as the row template (default: {INPUT_FILE})")
+    parser.add_argument('--repeat', type=int, default=3,
+                        help="Runs per measurement; the fastest is reported (default: 3)")
+    subparsers = parser.add_subparsers(dest='benchmark', required=True)
+
+    io_parser = subparsers.add_parser('io', help="CSV vs Parquet/Feather load times")
+    io_parser.add_argument('--rows', type=int, default=1_000_000)
+    io_parser.add_argument('--currency-strings', action='store_true',
+                           help="Write revenue as $/comma/parenthesis text in the CSV extract")
+    io_parser.set_defaults(func=benchmark_io)
+
+    parallel_parser = subparsers.add_parser('parallel', help="Multi-core scoring scaling")
+    parallel_parser.add_argument('--rows', type=int, default=2_000_000)
+    parallel_parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parallel_parser.add_argument('--partition-by', choices=['account', 'segment'], default='account')
+    parallel_parser.add_argument('--currency-strings', action='store_true',
+                                 help="Render revenue as $/comma/parenthesis text")
+    parallel_parser.set_defaults(func=benchmark_parallel)
+
+    stages_parser = subparsers.add_parser('stages', help="Per-stage time and peak memory")
+    stages_parser.add_argument('--rows', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    stages_parser.add_argument('--currency-text', type=float, default=0.5, metavar='SHARE',
+                               help="Share of revenue cells written as $ text (default: 0.5)")
+    stages_parser.add_argument('--seed', type=int, default=0)
+    stages_parser.add_argument('--save', default=None, metavar='FILE',
+                               help="Append the results to this CSV")
+    stages_parser.set_defaults(func=benchmark_stages)
+
+    memory_parser = subparsers.add_parser('memory', help="Normal vs compact memory use")
+    memory_parser.add_argument('--rows', type=int, default=1_000_000)
+    memory_parser.add_argument('--currency-text', type=float, default=0.5, metavar='SHARE',
+                               help="Share of revenue cells written as $ text (default: 0.5)")
+    memory_parser.add_argument('--seed', type=int, default=0)
+    memory_parser.set_defaults(func=benchmark_memory)
+
+    kernel_parser = subparsers.add_parser('kernel', help="Multi-pass vs fused STEP 3-4 scoring")
+    kernel_parser.add_argument('--rows', type=int, default=1_000_000)
+    kernel_parser.add_argument('--per-year-minimum', type=int, default=0, metavar='DOLLARS',
+                               help="min_revenue_per_active_year to score with (default: 0)")
+    kernel_parser.add_argument('--seed', type=int, default=0)
+    kernel_parser.set_defaults(func=benchmark_kernel)
+
+    write_parser = subparsers.add_parser('write', help="to_csv() vs the Arrow CSV writer")
+    write_parser.add_argument('--rows', type=int, default=1_000_000)
+    write_parser.set_defaults(func=benchmark_write)
+
+    dates_parser = subparsers.add_parser('dates', help="pd.to_datetime() vs memoized date parsing")
+    dates_parser.add_argument('--rows', type=int, default=5_000_000)
+    dates_parser.add_argument('--blank', type=float, default=0.002, metavar='SHARE',
+                              help="Share of blank dates (default: 0.002)")
+    dates_parser.add_argument('--invalid', type=float, default=0.001, metavar='SHARE',
+                              help="Share of unparseable dates (default: 0.001)")
+    dates_parser.add_argument('--mixed', type=float, default=0.0, metavar='SHARE',
+                              help="Share of dates written MM/DD/YYYY (default: 0)")
+    dates_parser.add_argument('--seed', type=int, default=0)
+    dates_parser.set_defaults(func=benchmark_dates)
+
+    transactions_parser = subparsers.add_parser('transactions', help="Order-line ingest throughput")
+    transactions_parser.add_argument('--accounts', type=int, default=500_000)
+    transactions_parser.add_argument('--lines-per-year', type=float, default=4, metavar='LINES',
+                                     help="Mean order lines per account and year (default: 4)")
+    transactions_parser.add_argument('--chunksize', type=int, default=1_000_000, metavar='LINES')
+    transactions_parser.add_argument('--seed', type=int, default=0)
+    transactions_parser.set_defaults(func=benchmark_transactions)
+
+    rollup_parser = subparsers.add_parser('rollup', help="Parent/child account grouping and roll-up")
+    rollup_parser.add_argument('--accounts', type=int, default=1_000_000)
+    rollup_parser.add_argument('--linked', type=float, default=1.0, metavar='SHARE',
+                               help="Share of accounts with a parent (default: 1.0)")
+    rollup_parser.add_argument('--seed', type=int, default=0)
+    rollup_parser.set_defaults(func=benchmark_rollup)
+
+    duplicates_parser = subparsers.add_parser('duplicates', help="Fuzzy duplicate-name detection")
+    duplicates_parser.add_argument('--accounts', type=int, default=1_000_000)
+    duplicates_parser.add_argument('--duplicates', type=float, default=0.05, metavar='SHARE',
+                                   help="Share of accounts copied with a changed name (default: 0.05)")
+    duplicates_parser.add_argument('--min-score', type=float, default=0.8, metavar='SCORE')
+    duplicates_parser.add_argument('--seed', type=int, default=0)
+    duplicates_parser.set_defaults(func=benchmark_duplicates)
+
+    service_parser = subparsers.add_parser('service', help="Lookup service latency and reload")
+    service_parser.add_argument('--rows', type=int, default=1_000_000)
+    service_parser.add_argument('--lookups', type=int, default=2000,
+                                help="Random single lookups timed (default: 2000)")
+    service_parser.add_argument('--seed', type=int, default=0)
+    service_parser.set_defaults(func=benchmark_service)
+
+    startup_parser = subparsers.add_parser('startup', help="CLI start-up time and heavy imports")
+    startup_parser.add_argument('--max-import-ms', type=float, default=None, metavar='MS',
+                                help="Also fail if a command spends longer than MS importing")
+    startup_parser.set_defaults(func=benchmark_startup)
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    return args.func(args) or 0
+
+if __name__ == '__main__':
+    sys.exit(main())
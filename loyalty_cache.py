@@ -0,0 +1,287 @@
+"""
+LOYALTY ANALYSIS - CLEANED INPUT CACHE
+
+Purpose: Skip re-reading and re-cleaning an unchanged revenue extract. The
+         first run on a file stores the de-duplicated, cleaned accounts
+         (parsed revenue per year and the resolved first_order_year) as an
+         Arrow/Feather file, together with the load and cleaning statistics.
+         Later runs on the same file, for example after editing only the
+         thresholds in loyalty_config.py, read that file back and go
+         straight to metrics and classification. The results are the same
+         as an uncached run.
+
+Usage:
+    python loyalty_analysis.py --cache              # uses .loyalty_cache/
+    python loyalty_analysis.py --cache DIR
+
+Cache key:
+    - the extract's content hash (BLAKE2b); it is only recomputed when the
+      file's size or modification time changed
+    - the evaluation window (the years that are parsed)
+    - CLEANING_VERSION, bumped whenever parsing or date inference changes
+
+Eviction:
+    - an entry for an older version of the same file is deleted when the
+      new one is stored
+    - entries from another CLEANING_VERSION are deleted on sight
+    - beyond MAX_ENTRIES, the least recently used entries are deleted
+
+Requirements:
+    - pyarrow library (pip install pyarrow --break-system-packages)
+"""
+
+import hashlib
+import json
+import os
+
+import pandas as pd
+
+from loyalty_analysis import (
+    LOYALTY_CONFIG, build_output, check_parsing, check_totals, clean_data, drop_duplicate_accounts,
+    find_missing_columns, get_evaluation_years, load_revenue_extract, score_metrics, sort_output,
+    summarize_results, timed_stage,
+)
+
+CACHE_DIR = ".loyalty_cache"
+INDEX_FILE = "index.json"
+
+# Bump when clean_data() (currency parsing, date parsing or inference)
+# changes what it stores
+CLEANING_VERSION = 8
+
+MAX_ENTRIES = 8
+
+HASH_BLOCK_SIZE = 1 << 20
+
+# Cleaned columns kept in an entry (revenue_{year} columns are added per window)
+CACHED_COLUMNS = ['Account_ID', 'Name', 'Sub Segment', 'first_order_year']
+
+# ============================================================================
+# FINGERPRINTS
+# ============================================================================
+
+def file_hash(path):
+    """BLAKE2b hex digest of a file's contents."""
+    digest = hashlib.blake2b(digest_size=20)
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _read_index(cache_dir):
+    try:
+        with open(os.path.join(cache_dir, INDEX_FILE), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _write_index(cache_dir, index):
+    path = os.path.join(cache_dir, INDEX_FILE)
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(index, f, indent=1)
+    os.replace(path + '.tmp', path)
+
+def input_fingerprint(path, cache_dir):
+    """
+    Content hash of an extract, reusing the indexed hash while the file's
+    size and modification time are unchanged.
+
+    Returns:
+        str: Hex digest
+    """
+    stat = os.stat(path)
+    index = _read_index(cache_dir)
+    known = index.get(os.path.abspath(path))
+    if known and known['size'] == stat.st_size and known['mtime_ns'] == stat.st_mtime_ns:
+        return known['content_hash']
+    content_hash = file_hash(path)
+    index[os.path.abspath(path)] = {
+        'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'content_hash': content_hash,
+    }
+    os.makedirs(cache_dir, exist_ok=True)
+    _write_index(cache_dir, index)
+    return content_hash
+
+def entry_name(content_hash, config):
+    """File name stem of the cache entry for an extract and evaluation window."""
+    return (f"{content_hash}_{config['evaluation_start_year']}-{config['evaluation_end_year']}"
+            f"_v{CLEANING_VERSION}")
+
+# ============================================================================
+# STORE
+# ============================================================================
+
+def read_entry(cache_dir, name):
+    """
+    A stored entry, or None if it is missing or unreadable.
+
+    Returns:
+        tuple or None: (cleaned DataFrame, info dict)
+    """
+    data_path = os.path.join(cache_dir, name + '.feather')
+    info_path = os.path.join(cache_dir, name + '.json')
+    try:
+        with open(info_path, encoding='utf-8') as f:
+            info = json.load(f)
+        cleaned = pd.read_feather(data_path)
+    except (OSError, ValueError):
+        return None
+    # JSON keys are strings; negative counts are keyed by year
+    info['cleaning']['negative_counts'] = {
+        int(year): count for year, count in info['cleaning']['negative_counts'].items()}
+    # Mark as recently used for eviction
+    os.utime(info_path)
+    return cleaned, info
+
+def write_entry(cache_dir, name, cleaned, info):
+    """Store an entry, then evict stale and least recently used ones."""
+    os.makedirs(cache_dir, exist_ok=True)
+    cleaned.reset_index(drop=True).to_feather(os.path.join(cache_dir, name + '.feather'))
+    with open(os.path.join(cache_dir, name + '.json'), 'w', encoding='utf-8') as f:
+        json.dump(info, f, indent=1)
+    evict(cache_dir, keep=name)
+
+def evict(cache_dir, keep=None):
+    """
+    Delete entries of other CLEANING_VERSIONs, entries whose extract has
+    since changed (no longer in the index), and the least recently used
+    beyond MAX_ENTRIES.
+
+    Args:
+        cache_dir: Cache directory
+        keep: Entry name never to delete
+
+    Returns:
+        int: Entries deleted
+    """
+    current_hashes = {known['content_hash'] for known in _read_index(cache_dir).values()}
+    entries = []
+    for file_name in os.listdir(cache_dir):
+        if file_name.endswith('.json') and file_name != INDEX_FILE:
+            name = file_name[:-len('.json')]
+            used = os.path.getmtime(os.path.join(cache_dir, file_name))
+            entries.append((used, name))
+    entries.sort(reverse=True)
+
+    deleted = 0
+    kept = 0
+    for _, name in entries:
+        content_hash = name.split('_', 1)[0]
+        stale = (not name.endswith(f"_v{CLEANING_VERSION}") or content_hash not in current_hashes
+                 or kept >= MAX_ENTRIES)
+        if name == keep or not stale:
+            kept += 1
+            continue
+        for extension in ('.json', '.feather'):
+            try:
+                os.remove(os.path.join(cache_dir, name + extension))
+            except FileNotFoundError:
+                pass
+        deleted += 1
+    return deleted
+
+def load_cleaned_extract(path, config=None, cache_dir=CACHE_DIR, metrics=None):
+    """
+    De-duplicated, cleaned accounts of an extract, from the cache if possible.
+
+    On a miss the extract is loaded, de-duplicated and cleaned as in
+    run_analysis(), and the result is stored.
+
+    Args:
+        path: Revenue extract
+        config: Loyalty config dict (the evaluation window is part of the key)
+        cache_dir: Cache directory
+        metrics: Optional loyalty_profiling.StageMetrics
+
+    Returns:
+        tuple: (cleaned DataFrame with CACHED_COLUMNS and revenue_{year},
+        info dict with input_rows, duplicates, cleaning and cache_hit)
+
+    Raises:
+        FileNotFoundError: If the extract does not exist
+        ValueError: If required input columns are missing
+    """
+    from loyalty_io import require_pyarrow
+
+    require_pyarrow('The input cache')
+    if config is None:
+        config = LOYALTY_CONFIG
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Input file '{path}' not found.")
+
+    with timed_stage(metrics, 'cache_lookup'):
+        name = entry_name(input_fingerprint(path, cache_dir), config)
+        entry = read_entry(cache_dir, name)
+    if entry is not None:
+        cleaned, info = entry
+        return cleaned, {**info, 'cache_hit': True}
+
+    with timed_stage(metrics, 'load') as record:
+        df = load_revenue_extract(path)
+        record['rows'] = len(df)
+    missing_columns = find_missing_columns(df, config)
+    if missing_columns:
+        raise ValueError(f"Missing required columns: {missing_columns}")
+    with timed_stage(metrics, 'dedupe', len(df)):
+        deduplicated, duplicates = drop_duplicate_accounts(df)
+    cleaned, cleaning_stats = clean_data(deduplicated, config, metrics)
+
+    cleaned = cleaned[CACHED_COLUMNS + [f'revenue_{year}' for year in get_evaluation_years(config)]]
+    info = {
+        'input_file': os.path.basename(path),
+        'input_rows': len(df),
+        'duplicates': duplicates,
+        'cleaning': cleaning_stats,
+    }
+    with timed_stage(metrics, 'cache_store', len(cleaned)):
+        write_entry(cache_dir, name, cleaned, info)
+    return cleaned, {**info, 'cache_hit': False}
+
+# ============================================================================
+# PIPELINE
+# ============================================================================
+
+def run_analysis_cached(cleaned, info, config=None, analysis_timestamp=None, metrics=None, order='full'):
+    """
+    run_analysis() from the output of load_cleaned_extract().
+
+    Args:
+        cleaned: Cleaned accounts; not modified
+        info: Info dict from load_cleaned_extract()
+        config: Loyalty config dict (defaults to LOYALTY_CONFIG); must have
+                the evaluation window the cache entry was built for
+        analysis_timestamp: Value for the output analysis_timestamp column
+        metrics: Optional loyalty_profiling.StageMetrics
+        order: Output row order, see sort_output()
+
+    Returns:
+        dict: Same keys as run_analysis()
+    """
+    if config is None:
+        config = LOYALTY_CONFIG
+
+    with timed_stage(metrics, 'score_metrics', len(cleaned)):
+        scored = score_metrics(cleaned.copy(), config)
+    with timed_stage(metrics, 'build_output', len(scored)):
+        output_df = build_output(scored, config, analysis_timestamp, sort=False)
+    with timed_stage(metrics, 'sort', len(output_df)):
+        output_df = sort_output(output_df, order)
+    with timed_stage(metrics, 'summary', len(scored)):
+        summary = summarize_results(scored, config)
+    with timed_stage(metrics, 'validate', len(scored)):
+        validation = check_totals(
+            len(scored), len(output_df),
+            int(output_df['loyalty_status'].isna().sum()),
+            scored['revenue_5yr'].sum(), output_df['revenue_5yr'].sum(),
+        ) + check_parsing(scored, config)
+
+    return {
+        'config': config,
+        'input_rows': info['input_rows'],
+        'duplicates': info['duplicates'],
+        'cleaning': info['cleaning'],
+        'scored': scored,
+        'output': output_df,
+        'summary': summary,
+        'validation': validation,
+    }
@@ -0,0 +1,263 @@
+"""
+LOYALTY ANALYSIS - COMPACT (MEMORY-LEAN) MODE
+
+Purpose: Score the full account base with a fraction of the memory of a
+         normal run. The normal scoring frame keeps the raw text revenue
+         columns next to their parsed copies, one boolean column per year,
+         the parsed dates and the status/reason text repeated on every row.
+         Compact mode instead:
+           - reads only the columns scoring needs, in chunks, parsing
+             revenue as each chunk arrives so the raw text of the whole
+             extract is never held at once
+           - holds First Order Date as categorical text, so each distinct
+             date is stored and parsed once
+           - keeps revenue as one (accounts x years) float64 array
+           - keeps only the first order year, not the parsed dates
+           - stores tenure as float32 and years active as int8
+           - stores Sub Segment, loyalty_status, ineligibility_reason and
+             analysis_timestamp as categoricals
+
+         The output file is identical to a normal run. Revenue stays float64
+         because float32 cannot hold cents above ~$160K exactly.
+
+Usage:
+    python loyalty_analysis.py --compact
+
+Library use:
+    from loyalty_compact import load_revenue_extract_compact, run_analysis_compact
+    df = load_revenue_extract_compact("customer_annual_revenue.csv", LOYALTY_CONFIG)
+    result = run_analysis_compact(df, LOYALTY_CONFIG)
+    result["memory"]    # bytes per account: input, scored frame, output table
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from loyalty_analysis import (
+    LOYALTY_CONFIG, STATUS_ORDER, build_output, check_parsing, check_totals, drop_duplicate_accounts,
+    find_missing_columns, first_revenue_years, get_evaluation_years, get_required_columns,
+    parse_currency_columns, parse_first_order_years, revenue_column_name, row_thresholds,
+    rule_categorical, sort_output, summarize_results, timed_stage,
+)
+from loyalty_io import INELIGIBILITY_REASONS
+from loyalty_kernel import score_matrix
+
+# Text columns with few distinct values, stored as categoricals
+CATEGORICAL_COLUMNS = ['Sub Segment', 'First Order Date']
+
+# Rows read and converted at a time by load_revenue_extract_compact()
+COMPACT_CHUNKSIZE = 50_000
+
+# ============================================================================
+# LOADING
+# ============================================================================
+
+def load_revenue_extract_compact(path, config, chunksize=COMPACT_CHUNKSIZE):
+    """
+    Read only the columns scoring needs, converting each chunk as it arrives.
+
+    Revenue text is parsed to float64 per chunk, so the raw text of the
+    whole extract is never in memory at once. Sub Segment and First Order
+    Date become categoricals (dates are parsed when scoring, once per
+    distinct value).
+
+    Args:
+        path: Revenue extract (.csv, .parquet or .feather)
+        config: Loyalty config dict (sets the revenue years to read)
+        chunksize: Rows converted at a time
+
+    Returns:
+        DataFrame: Extract with parsed revenue
+
+    Raises:
+        FileNotFoundError: If the file does not exist
+    """
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Input file '{path}' not found.")
+    from loyalty_io import iter_chunks
+
+    chunks = []
+    for chunk in iter_chunks(path, chunksize, columns=get_required_columns(config)):
+        # Columns the extract lacks are reported later by find_missing_columns()
+        raw_columns = [revenue_column_name(year) for year in get_evaluation_years(config)
+                       if revenue_column_name(year) in chunk.columns]
+        chunk[raw_columns] = parse_currency_columns(chunk, raw_columns)
+        for column in CATEGORICAL_COLUMNS:
+            if column in chunk.columns:
+                chunk[column] = chunk[column].astype('category')
+        chunks.append(chunk)
+
+    if not chunks:
+        return pd.DataFrame(columns=get_required_columns(config))
+    # Chunks have different categories; union them before concatenating
+    columns = list(chunks[0].columns)
+    categorical = [column for column in columns if column in CATEGORICAL_COLUMNS]
+    unions = {column: union_categoricals([chunk.pop(column) for chunk in chunks])
+              for column in categorical}
+    df = pd.concat(chunks, ignore_index=True)
+    for column in categorical:
+        df.insert(columns.index(column), column, pd.Categorical(unions[column]))
+    return df
+
+def bytes_per_account(df):
+    """Memory held by a frame per row, strings included."""
+    return df.memory_usage(deep=True).sum() / len(df) if len(df) else 0.0
+
+# ============================================================================
+# SCORING
+# ============================================================================
+
+def score_accounts_compact(df, config):
+    """
+    Compact equivalent of score_accounts().
+
+    Produces the columns build_output(), summarize_results() and
+    validate_output() read, with the same values, in compact types. Raw
+    revenue text, parsed dates and per-year active flags are not kept.
+
+    Args:
+        df: Raw extract rows (already de-duplicated); not modified
+        config: Loyalty config dict
+
+    Returns:
+        tuple: (compact scored DataFrame, dict of cleaning statistics)
+    """
+    years = get_evaluation_years(config)
+
+    # Revenue: one (accounts x years) array, parsed column by column
+    revenue = np.empty((len(df), len(years)), dtype='float64')
+    for i, year in enumerate(years):
+        column = revenue_column_name(year)
+        revenue[:, i] = parse_currency_columns(df, [column])[column].to_numpy(dtype='float64')
+    negative_counts = dict(zip(years, (revenue < 0).sum(axis=0).tolist()))
+
+    # First order year: parsed date, else the first year with revenue
+    first_order_year, date_stats = parse_first_order_years(df['First Order Date'])
+    missing_year = np.isnan(first_order_year)
+    blank_dates = int(missing_year.sum())
+    inferred_count = 0
+    if blank_dates > 0:
+        inferred = first_revenue_years(revenue[missing_year], years)
+        first_order_year[missing_year] = inferred
+        inferred_count = int((~np.isnan(inferred)).sum())
+
+    tenure_years = (config["current_year"] - first_order_year).astype('float32')
+    # Metrics and status/reason codes in one pass (same rules as classify_loyalty)
+    rules, thresholds = row_thresholds(df['Sub Segment'], config)
+    scores = score_matrix(revenue, tenure_years, thresholds)
+
+    segments = df['Sub Segment']
+    if not isinstance(segments.dtype, pd.CategoricalDtype):
+        segments = segments.astype('category')
+    if 'UNKNOWN' not in segments.cat.categories:
+        # Lets build_output() fill blanks without leaving the categorical
+        segments = segments.cat.add_categories('UNKNOWN')
+
+    scored = pd.DataFrame({
+        'Account_ID': df['Account_ID'],
+        'Name': df['Name'],
+        'Sub Segment': segments,
+        'first_order_year': first_order_year.astype('float32'),
+        'tenure_years': tenure_years,
+        'years_active': scores['years_active'],
+        'consistency_rate': scores['consistency_rate'],
+        'revenue_5yr': scores['revenue_5yr'],
+        'loyalty_status': pd.Categorical.from_codes(scores['status'], list(STATUS_ORDER)),
+        'ineligibility_reason': pd.Categorical.from_codes(scores['reason'], INELIGIBILITY_REASONS),
+    }, index=df.index)
+    if rules is not None:
+        scored['threshold_rule'] = rule_categorical(rules, config)
+    revenue_frame = pd.DataFrame(revenue, columns=[f'revenue_{year}' for year in years], index=df.index)
+    scored = pd.concat([scored, revenue_frame], axis=1)
+
+    stats = {
+        'negative_counts': negative_counts,
+        'date_formats': date_stats['formats'],
+        'invalid_dates': date_stats['invalid'],
+        'blank_dates': blank_dates,
+        'inferred_count': inferred_count,
+        'no_data': int(np.isnan(first_order_year).sum()),
+    }
+    return scored, stats
+
+def compact_output(output_df):
+    """
+    Store the output table's repeated text as categoricals (values unchanged).
+
+    Args:
+        output_df: Output table from build_output()
+
+    Returns:
+        DataFrame: The same frame, with analysis_timestamp categorical
+    """
+    output_df['analysis_timestamp'] = output_df['analysis_timestamp'].astype('category')
+    return output_df
+
+# ============================================================================
+# PIPELINE
+# ============================================================================
+
+def run_analysis_compact(df, config=None, analysis_timestamp=None, metrics=None, order='full'):
+    """
+    run_analysis() in compact mode.
+
+    Args:
+        df: Extract from load_revenue_extract_compact() (or a raw extract);
+            not modified
+        config: Loyalty config dict (defaults to LOYALTY_CONFIG)
+        analysis_timestamp: Value for the output analysis_timestamp column
+        metrics: Optional loyalty_profiling.StageMetrics
+        order: Output row order, see sort_output()
+
+    Returns:
+        dict: Same keys as run_analysis(), 'scored' being the compact frame,
+        plus memory (bytes per account of the input, scored frame and output)
+
+    Raises:
+        ValueError: If required input columns are missing
+    """
+    if config is None:
+        config = LOYALTY_CONFIG
+
+    missing_columns = find_missing_columns(df, config)
+    if missing_columns:
+        raise ValueError(f"Missing required columns: {missing_columns}")
+
+    input_rows = len(df)
+    input_bytes = bytes_per_account(df)
+    with timed_stage(metrics, 'dedupe', input_rows):
+        df, duplicates = drop_duplicate_accounts(df)
+
+    with timed_stage(metrics, 'score_compact', len(df)):
+        scored, cleaning_stats = score_accounts_compact(df, config)
+    with timed_stage(metrics, 'build_output', len(scored)):
+        output_df = compact_output(build_output(scored, config, analysis_timestamp, sort=False))
+    with timed_stage(metrics, 'sort', len(output_df)):
+        output_df = sort_output(output_df, order)
+    with timed_stage(metrics, 'summary', len(scored)):
+        summary = summarize_results(scored, config)
+    with timed_stage(metrics, 'validate', len(scored)):
+        validation = check_totals(
+            len(scored), len(output_df),
+            int(output_df['loyalty_status'].isna().sum()),
+            scored['revenue_5yr'].sum(), output_df['revenue_5yr'].sum(),
+        ) + check_parsing(scored, config)
+
+    return {
+        'config': config,
+        'input_rows': input_rows,
+        'duplicates': duplicates,
+        'cleaning': cleaning_stats,
+        'scored': scored,
+        'output': output_df,
+        'summary': summary,
+        'validation': validation,
+        'memory': {
+            'input': input_bytes,
+            'scored': bytes_per_account(scored),
+            'output': bytes_per_account(output_df),
+        },
+    }
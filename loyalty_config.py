@@ -102,6 +102,32 @@ LOYALTY_CONFIG = {
     # Current status: DISABLED
     # Last updated: November 2024
     
+    # ========================================
+    # SEGMENT THRESHOLD OVERRIDES - OPTIONAL
+    # ========================================
+    "segment_thresholds": {
+        # "MARKETPLACE": {"min_revenue_5yr": 100000},
+        # "DESIGNER_INDEPENDENT": {"min_revenue_5yr": 20000, "min_consistency_rate": 0.40},
+    },
+    # Business rationale:
+    #   - A $35K five-year bar means very different things for a marketplace
+    #     than for an independent designer
+    #   - Each entry replaces some of the four thresholds above for one
+    #     Sub Segment (exact spelling as in the extract); thresholds not
+    #     listed keep their default value
+    #   - Accounts in segments not listed are scored under the defaults
+    #     ("default" rule set); blank segments use an "UNKNOWN" entry if any
+    #
+    # Keys allowed in an entry: min_tenure_years, min_consistency_rate,
+    #   min_revenue_5yr, min_revenue_per_active_year
+    #
+    # When entries exist, the output gains a threshold_rule column naming
+    # the rule set each account was scored under, and the console and
+    # executive summary break results down by rule set
+    #
+    # Current status: No overrides (every account uses the defaults)
+    # Last updated: October 2026
+
     # ========================================
     # ANALYSIS METADATA
     # ========================================
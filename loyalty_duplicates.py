@@ -0,0 +1,544 @@
+"""
+LOYALTY ANALYSIS - DUPLICATE CUSTOMER NAMES
+
+Purpose: Find accounts that are probably the same company under slightly
+         different names ("Sundial Design Co." / "Sundial Design Company",
+         "Linen & Lantern Interiors" / "Linen and Lantern Interiors, LLC").
+         Each such account is scored separately, so the company's revenue
+         is split and can fall below min_revenue_5yr.
+
+         Names are normalized (case, accents, punctuation, "&", legal
+         suffixes such as LLC/Inc/Co). Accounts with the same normalized
+         name form one exact block. Distinct names are then indexed with
+         MinHash signatures over character 3-grams. Each band of the
+         signature is a bucket key, and only names sharing a bucket are
+         compared, so the work grows with the number of names rather than
+         its square. Candidates whose signatures agree too little are
+         dropped, and the rest are scored by exact 3-gram Jaccard
+         similarity.
+
+         The result is a file of scored candidate pairs for review. Pairs
+         marked confirmed can be merged before scoring:
+         `loyalty_analysis.py --merge-duplicates FILE` treats them as
+         links for the account roll-up (see loyalty_rollup.py).
+
+Usage:
+    python loyalty_duplicates.py [--input FILE] [--output loyalty_duplicate_pairs.csv]
+                                 [--min-score 0.8] [--confirm-above 0.95]
+                                 [--same-segment]
+    python loyalty_analysis.py --merge-duplicates loyalty_duplicate_pairs.csv
+
+Library use:
+    from loyalty_duplicates import find_duplicate_pairs
+    pairs, stats = find_duplicate_pairs(df, min_score=0.8)
+    pairs.head()    # account_id_1, name_1, ..., score, match, confirmed
+
+Pairs file (PAIR_COLUMNS):
+    account_id_1, name_1, sub_segment_1 - The account that comes first in
+                                          the extract
+    account_id_2, name_2, sub_segment_2 - The other account
+    score      - 3-gram Jaccard similarity of the normalized names (1 = same)
+    match      - 'exact' (same normalized name) or 'similar'
+    confirmed  - Blank for review; Y (or yes/true/1/x) merges the pair.
+                 --confirm-above pre-fills it for high scores
+
+Notes:
+    - Accounts sharing a normalized name are listed as pairs with the
+      block's first account, not every pair, and a similar pair of two
+      blocks is listed once; merging still joins every account.
+    - MinHash finds a pair with a similarity of 0.8 about 98% of the time,
+      0.7 about 84% and 0.6 about 55%; before reporting pairs below 0.8,
+      raise SIGNATURE_BANDS (more recall, more candidates to score).
+    - Generic names ("Design Studio", "JH Interior Design") score 0.6-0.8
+      against many unrelated accounts, hence the 0.8 default.
+
+Requirements:
+    - pandas library
+"""
+
+import argparse
+import os
+import re
+import sys
+import time
+import unicodedata
+
+# pandas and numpy are imported inside the functions that use them, so that
+# `loyalty_analysis.py --merge-duplicates ... --dry-run` checks the file
+# without loading them
+from loyalty_analysis import INPUT_FILE, timed_stage
+
+DEFAULT_OUTPUT = "loyalty_duplicate_pairs.csv"
+
+# Words dropped from the end of names before matching ("Smith Design Co.,
+# Ltd." matches "Smith Design"); a leading "the" is dropped as well
+LEGAL_WORDS = [
+    'llc', 'inc', 'incorporated', 'co', 'corp', 'corporation', 'company', 'ltd', 'limited',
+    'lp', 'llp', 'pllc', 'pc', 'and',    # 'and' for "Smith & Co."
+]
+
+# MinHash signature: SIGNATURE_BANDS bands of BAND_ROWS values each. A pair
+# becomes a candidate when all values of any one band agree
+SIGNATURE_BANDS = 10
+BAND_ROWS = 5
+
+# Within a bucket each name is compared with this many following names
+# only, so a huge bucket of near-identical short names stays linear
+BUCKET_WINDOW = 32
+
+# Candidates whose signatures agree on less than min_score minus this share
+# are not scored exactly
+SIGNATURE_MARGIN = 0.2
+
+# Candidate pairs scored exactly per batch (bounds memory)
+SCORE_BATCH_PAIRS = 500_000
+
+# Names and pairs compared with the reference rules during validation
+CHECK_ROWS = 1000
+
+PAIR_COLUMNS = [
+    'account_id_1', 'name_1', 'sub_segment_1', 'account_id_2', 'name_2', 'sub_segment_2',
+    'score', 'match', 'confirmed',
+]
+# Columns --merge-duplicates reads, and the confirmed values that merge a pair
+CONFIRMED_COLUMNS = ['account_id_1', 'account_id_2', 'confirmed']
+CONFIRMED_VALUES = {'y', 'yes', 'true', '1', 'x'}
+
+_LEGAL_WORD = '(?:' + '|'.join(LEGAL_WORDS) + ')'
+_LEGAL_SUFFIX_PATTERN = f'(?:^| ){_LEGAL_WORD}(?: {_LEGAL_WORD})*$'
+
+# ============================================================================
+# NAME NORMALIZATION
+# ============================================================================
+
+def normalize_name(name):
+    """
+    Reference normalization of one name.
+
+    Accents and apostrophes are removed, "&" becomes "and", anything else
+    that is not a letter or digit separates words, and a leading "the" and
+    trailing LEGAL_WORDS are dropped.
+
+    Args:
+        name: Account name (None/NaN allowed)
+
+    Returns:
+        str: Lowercase words separated by single spaces ('' if nothing is left)
+    """
+    if name is None or name != name:
+        return ''
+    text = unicodedata.normalize('NFKD', str(name)).lower()
+    text = re.sub("[\u0300-\u036f'\u2019]", '', text)
+    text = text.replace('&', ' and ')
+    words = re.sub(r'[^a-z0-9]+', ' ', text).split()
+    if words and words[0] == 'the':
+        words = words[1:]
+    while words and words[-1] in LEGAL_WORDS:
+        words = words[:-1]
+    return ' '.join(words)
+
+def normalize_names(names):
+    """
+    normalize_name() for a whole column with vectorized string operations.
+
+    Args:
+        names: Series of names
+
+    Returns:
+        Series: Normalized names (str), '' for blanks
+    """
+    text = names.astype('str').where(names.notna(), '')
+    text = text.str.normalize('NFKD').str.lower()
+    text = text.str.replace("[\u0300-\u036f'\u2019]", '', regex=True)
+    text = text.str.replace('&', ' and ', regex=False)
+    text = text.str.replace(r'[^a-z0-9]+', ' ', regex=True).str.strip()
+    text = text.str.replace(r'^the(?: |$)', '', regex=True)
+    return text.str.replace(_LEGAL_SUFFIX_PATTERN, '', regex=True)
+
+def name_grams(name):
+    """Character 3-grams of a normalized name, with a space at each end."""
+    padded = f" {name} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)} if name else set()
+
+def name_similarity(a, b):
+    """
+    Reference score: Jaccard similarity of two normalized names' 3-grams.
+
+    Returns:
+        float: 0.0 (nothing shared) to 1.0 (same grams)
+    """
+    grams_a, grams_b = name_grams(a), name_grams(b)
+    if not grams_a or not grams_b:
+        return 0.0
+    return len(grams_a & grams_b) / len(grams_a | grams_b)
+
+def normalization_matches(names):
+    """Check normalize_names() against normalize_name() on a sample of names."""
+    expected = [normalize_name(name) for name in names]
+    return normalize_names(names).tolist() == expected
+
+# ============================================================================
+# MINHASH INDEX
+# ============================================================================
+
+def sorted_unique(values):
+    """np.unique() of an int64 array by sorting (several times faster on large arrays)."""
+    import numpy as np
+
+    values = np.sort(values)
+    keep = np.ones(len(values), dtype=bool)
+    keep[1:] = values[1:] != values[:-1]
+    return values[keep]
+
+def gram_sets(names):
+    """
+    Distinct character 3-grams of every normalized name.
+
+    Characters are a-z, 0-9 and space (37 symbols), so a gram is a number
+    below 37 ** 3.
+
+    Args:
+        names: Non-empty normalized names (list or array of str)
+
+    Returns:
+        tuple: (int64 start of each name's grams, int64 gram count per name,
+        sorted int32 grams, name by name)
+    """
+    import numpy as np
+
+    symbols = np.zeros(256, dtype='int64')
+    symbols[ord(' ')] = 0
+    symbols[np.frombuffer(b'abcdefghijklmnopqrstuvwxyz0123456789', dtype='uint8')] = np.arange(1, 37)
+
+    padded = [f" {name} " for name in names]
+    lengths = np.fromiter((len(text) for text in padded), dtype='int64', count=len(padded))
+    text = symbols[np.frombuffer(''.join(padded).encode('ascii'), dtype='uint8')]
+
+    # Gram at every position whose three characters lie within one name
+    gram_counts = lengths - 2
+    name_of_gram = np.repeat(np.arange(len(padded)), gram_counts)
+    positions = np.arange(len(name_of_gram)) + 2 * name_of_gram
+    grams = (text[positions] * 37 + text[positions + 1]) * 37 + text[positions + 2]
+
+    # One copy of each gram per name, sorted (names stay in order)
+    keys = sorted_unique(name_of_gram * 37 ** 3 + grams)
+    name_of_gram, grams = np.divmod(keys, 37 ** 3)
+    counts = np.bincount(name_of_gram, minlength=len(padded))
+    return np.cumsum(counts) - counts, counts, grams.astype('int32')
+
+def minhash_signatures(starts, grams, num_hashes, seed=0):
+    """
+    MinHash signature of every name's gram set.
+
+    Uses multiply-shift hashing h(g) = (a * g + b) >> 32 on uint64, one
+    random odd a and random b per signature value.
+
+    Returns:
+        numpy.ndarray: (names x num_hashes) uint32
+    """
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    multipliers = rng.integers(1, 2 ** 63, size=num_hashes, dtype='uint64') | np.uint64(1)
+    offsets = rng.integers(0, 2 ** 63, size=num_hashes, dtype='uint64')
+    values = grams.astype('uint64')
+    signatures = np.empty((len(starts), num_hashes), dtype='uint32')
+    if len(starts) == 0:
+        return signatures
+    for i in range(num_hashes):
+        hashed = (values * multipliers[i] + offsets[i]) >> np.uint64(32)
+        signatures[:, i] = np.minimum.reduceat(hashed, starts)
+    return signatures
+
+def band_keys(signatures, blocks=None):
+    """
+    One uint64 bucket key per name and band (bands in columns).
+
+    Args:
+        signatures: MinHash signatures
+        blocks: Optional int64 block per name (e.g. segment code); names in
+                different blocks never share a bucket
+    """
+    import numpy as np
+
+    keys = np.empty((len(signatures), SIGNATURE_BANDS), dtype='uint64')
+    for band in range(SIGNATURE_BANDS):
+        key = np.zeros(len(signatures), dtype='uint64')
+        for value in signatures[:, band * BAND_ROWS:(band + 1) * BAND_ROWS].T:
+            key = key * np.uint64(0x9E3779B97F4A7C15) + value.astype('uint64')
+        if blocks is not None:
+            key = key * np.uint64(0x9E3779B97F4A7C15) + blocks.astype('uint64')
+        keys[:, band] = key
+    return keys
+
+def bucket_pairs(keys):
+    """
+    Name pairs sharing a bucket in any band, each once.
+
+    Returns:
+        tuple: (int64 first name, int64 second name), first < second
+    """
+    import numpy as np
+
+    # Pairs as one int64 (first * names + second), de-duplicated band by band
+    pairs = np.empty(0, dtype='int64')
+    for band in range(keys.shape[1]):
+        order = np.argsort(keys[:, band], kind='stable')
+        sorted_keys = keys[order, band]
+        found = [pairs]
+        for distance in range(1, BUCKET_WINDOW + 1):
+            same = sorted_keys[distance:] == sorted_keys[:-distance]
+            if not same.any():
+                break
+            first, second = order[:-distance][same], order[distance:][same]
+            found.append(np.minimum(first, second) * len(keys) + np.maximum(first, second))
+        pairs = sorted_unique(np.concatenate(found))
+    return np.divmod(pairs, len(keys))
+
+def signature_agreement(signatures, left, right):
+    """Share of signature values each name pair has in common (estimates the similarity)."""
+    import numpy as np
+
+    agreement = np.empty(len(left))
+    for batch in range(0, len(left), SCORE_BATCH_PAIRS):
+        pair_left = left[batch:batch + SCORE_BATCH_PAIRS]
+        pair_right = right[batch:batch + SCORE_BATCH_PAIRS]
+        agreement[batch:batch + SCORE_BATCH_PAIRS] = (signatures[pair_left] == signatures[pair_right]).mean(axis=1)
+    return agreement
+
+def gram_similarity(starts, counts, grams, left, right):
+    """
+    Exact 3-gram Jaccard similarity of name pairs, in batches.
+
+    Same result as name_similarity() on the names.
+
+    Returns:
+        numpy.ndarray: float64 score per pair
+    """
+    import numpy as np
+
+    scores = np.empty(len(left))
+    for batch in range(0, len(left), SCORE_BATCH_PAIRS):
+        pair_left = left[batch:batch + SCORE_BATCH_PAIRS]
+        pair_right = right[batch:batch + SCORE_BATCH_PAIRS]
+        keys = []
+        for names in (pair_left, pair_right):
+            # Every gram of each pair's name, keyed by pair
+            pair_of_gram = np.repeat(np.arange(len(names)), counts[names])
+            first = np.cumsum(counts[names]) - counts[names]
+            gram_positions = np.arange(len(pair_of_gram)) - first[pair_of_gram] + starts[names][pair_of_gram]
+            keys.append(pair_of_gram * 37 ** 3 + grams[gram_positions])
+        keys = np.sort(np.concatenate(keys))
+        # A gram in both names appears twice under the pair's key
+        shared = keys[1:][keys[1:] == keys[:-1]] // 37 ** 3
+        intersection = np.bincount(shared, minlength=len(pair_left))
+        union = counts[pair_left] + counts[pair_right] - intersection
+        scores[batch:batch + SCORE_BATCH_PAIRS] = intersection / union
+    return scores
+
+# ============================================================================
+# CANDIDATE PAIRS
+# ============================================================================
+
+def find_duplicate_pairs(df, min_score=0.8, confirm_above=None, same_segment=False, metrics=None):
+    """
+    Scored candidate pairs of accounts whose names probably belong to the
+    same company.
+
+    Args:
+        df: De-duplicated extract (Account_ID, Name, Sub Segment)
+        min_score: Lowest similarity reported (0-1)
+        confirm_above: Pre-fill confirmed with Y from this score up
+                       (None leaves every pair for review)
+        same_segment: Only pair accounts of the same Sub Segment
+        metrics: Optional loyalty_profiling.StageMetrics
+
+    Returns:
+        tuple: (pairs DataFrame with PAIR_COLUMNS, highest score first;
+        statistics dict including 'checks', a list of (passed, message))
+    """
+    import numpy as np
+    import pandas as pd
+
+    with timed_stage(metrics, 'normalize_names', len(df)):
+        normalized = normalize_names(df['Name'])
+        # Exact blocks: same normalized name (and segment)
+        block_key = normalized
+        segments = None
+        if same_segment:
+            segments = pd.Series(pd.factorize(df['Sub Segment'].fillna('UNKNOWN'))[0], index=df.index)
+            block_key = segments.astype('str') + '|' + normalized
+        named = (normalized != '').to_numpy()
+        block_of_account, block_keys = pd.factorize(block_key.where(named))
+        first_account = np.full(len(block_keys), len(df))
+        np.minimum.at(first_account, block_of_account[named], np.flatnonzero(named))
+
+    # Exact pairs: each account with its block's first account
+    exact_accounts = np.flatnonzero(named)
+    exact_accounts = exact_accounts[first_account[block_of_account[exact_accounts]] != exact_accounts]
+    exact_left = first_account[block_of_account[exact_accounts]]
+
+    with timed_stage(metrics, 'minhash_index', len(block_keys)):
+        block_names = normalized.to_numpy()[first_account]
+        starts, counts, grams = gram_sets(block_names.tolist())
+        signatures = minhash_signatures(starts, grams, SIGNATURE_BANDS * BAND_ROWS)
+        blocks = None if segments is None else segments.to_numpy()[first_account]
+        left, right = bucket_pairs(band_keys(signatures, blocks))
+        candidates = len(left)
+
+    with timed_stage(metrics, 'score_pairs', candidates):
+        promising = signature_agreement(signatures, left, right) >= min_score - SIGNATURE_MARGIN
+        left, right = left[promising], right[promising]
+        scores = gram_similarity(starts, counts, grams, left, right)
+        check_pairs = list(zip(block_names[left[:CHECK_ROWS]], block_names[right[:CHECK_ROWS]]))
+        check_scores = scores[:CHECK_ROWS]
+        keep = scores >= min_score
+        similar_left = first_account[left[keep]]
+        similar_right = first_account[right[keep]]
+        similar_scores = scores[keep]
+
+    # Account positions of every pair; the earlier account goes first
+    first = np.concatenate([exact_left, np.minimum(similar_left, similar_right)])
+    second = np.concatenate([exact_accounts, np.maximum(similar_left, similar_right)])
+    pair_scores = np.concatenate([np.ones(len(exact_left)), similar_scores])
+    order = np.lexsort((second, first, -pair_scores))
+    first, second, pair_scores = first[order], second[order], pair_scores[order]
+    pairs = pd.DataFrame({
+        'account_id_1': df['Account_ID'].to_numpy()[first],
+        'name_1': df['Name'].to_numpy()[first],
+        'sub_segment_1': df['Sub Segment'].to_numpy()[first],
+        'account_id_2': df['Account_ID'].to_numpy()[second],
+        'name_2': df['Name'].to_numpy()[second],
+        'sub_segment_2': df['Sub Segment'].to_numpy()[second],
+        'score': pair_scores.round(4),
+        'match': np.where(order < len(exact_left), 'exact', 'similar'),
+    })
+    confirmed = np.full(len(pairs), '', dtype=object)
+    if confirm_above is not None:
+        confirmed[pair_scores >= confirm_above] = 'Y'
+    pairs['confirmed'] = confirmed
+
+    checks = []
+    sample = df['Name'].head(CHECK_ROWS)
+    if normalization_matches(sample):
+        checks.append((True, f"Name normalization validated against normalize_name ({len(sample):,} names)"))
+    else:
+        checks.append((False, "Vectorized name normalization disagrees with normalize_name"))
+    expected = [name_similarity(a, b) for a, b in check_pairs]
+    if np.allclose(check_scores, expected, rtol=0, atol=1e-12):
+        checks.append((True, f"Pair scores validated against name_similarity ({len(expected):,} pairs)"))
+    else:
+        checks.append((False, "Vectorized pair scores disagree with name_similarity"))
+
+    stats = {
+        'accounts': len(df),
+        'unnamed': int((~named).sum()),
+        'distinct_names': len(block_keys),
+        'exact_pairs': len(exact_left),
+        'candidates': candidates,
+        'scored': len(left),
+        'similar_pairs': len(similar_scores),
+        'confirmed': int((confirmed == 'Y').sum()),
+        'checks': checks,
+    }
+    return pairs, stats
+
+# ============================================================================
+# MERGING CONFIRMED PAIRS
+# ============================================================================
+
+def confirmed_links(pairs):
+    """
+    Roll-up links for the confirmed pairs of a pairs table.
+
+    Args:
+        pairs: DataFrame with account_id_1, account_id_2 and confirmed
+
+    Returns:
+        DataFrame: loyalty_rollup.HIERARCHY_COLUMNS, each second account
+        linked under the first
+    """
+    import pandas as pd
+    from loyalty_rollup import HIERARCHY_COLUMNS
+
+    confirmed = pairs['confirmed'].astype('str').str.strip().str.lower().isin(CONFIRMED_VALUES)
+    confirmed &= pairs['confirmed'].notna()
+    return pd.DataFrame({
+        HIERARCHY_COLUMNS[0]: pairs.loc[confirmed, 'account_id_2'].to_numpy(),
+        HIERARCHY_COLUMNS[1]: pairs.loc[confirmed, 'account_id_1'].to_numpy(),
+    })
+
+def load_confirmed_links(path):
+    """
+    Roll-up links for the confirmed pairs of a pairs file.
+
+    Raises:
+        FileNotFoundError: If the file does not exist
+        ValueError: If account_id_1, account_id_2 or confirmed is missing
+    """
+    from loyalty_io import read_columns, read_table
+
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Duplicate pairs file '{path}' not found.")
+    missing_columns = [col for col in CONFIRMED_COLUMNS if col not in read_columns(path)]
+    if missing_columns:
+        raise ValueError(f"Duplicate pairs file lacks required columns: {missing_columns}")
+    return confirmed_links(read_table(path, columns=CONFIRMED_COLUMNS))
+
+# ============================================================================
+# COMMAND LINE INTERFACE
+# ============================================================================
+
+def print_pairs_report(pairs, stats, seconds):
+    print(f"✓ {stats['accounts']:,} accounts, {stats['distinct_names']:,} distinct normalized names")
+    if stats['unnamed'] > 0:
+        print(f"  • {stats['unnamed']:,} accounts without a usable name skipped")
+    print(f"  • {stats['exact_pairs']:,} accounts share a normalized name with an earlier account")
+    print(f"  • {stats['candidates']:,} candidate name pairs from the MinHash index, "
+          f"{stats['scored']:,} scored exactly")
+    print(f"  • {stats['similar_pairs']:,} similar pairs at or above the minimum score")
+    if stats['confirmed'] > 0:
+        print(f"  • {stats['confirmed']:,} pairs pre-confirmed")
+    for passed, message in stats['checks']:
+        print(f"{'✓' if passed else '✗ FAIL:'} {message}")
+    print(f"✓ {len(pairs):,} candidate pairs found in {seconds:.1f}s")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Find accounts whose names probably belong to the same company.")
+    parser.add_argument('--input', default=INPUT_FILE,
+                        help=f"Revenue extract (default: {INPUT_FILE})")
+    parser.add_argument('--output', default=DEFAULT_OUTPUT,
+                        help=f"Pairs file to write (default: {DEFAULT_OUTPUT})")
+    parser.add_argument('--min-score', type=float, default=0.8, metavar='SCORE',
+                        help="Lowest name similarity reported, 0-1 (default: 0.8)")
+    parser.add_argument('--confirm-above', type=float, default=None, metavar='SCORE',
+                        help="Mark pairs scoring at least SCORE as confirmed "
+                             "(default: leave every pair for review)")
+    parser.add_argument('--same-segment', action='store_true',
+                        help="Only pair accounts of the same Sub Segment")
+    args = parser.parse_args(argv)
+    if not 0 < args.min_score <= 1:
+        parser.error("--min-score must be between 0 and 1")
+    return args
+
+def main(argv=None):
+    from loyalty_analysis import drop_duplicate_accounts, load_revenue_extract
+    from loyalty_io import write_table
+
+    args = parse_args(argv)
+    if not os.path.exists(args.input):
+        print(f"ERROR: Input file '{args.input}' not found.")
+        return 1
+    start = time.perf_counter()
+    df, _ = drop_duplicate_accounts(load_revenue_extract(args.input))
+    pairs, stats = find_duplicate_pairs(df, args.min_score, args.confirm_above, args.same_segment)
+    print_pairs_report(pairs, stats, time.perf_counter() - start)
+    write_table(pairs, args.output)
+    print(f"✓ Pairs saved: {args.output}")
+    print(f"  • Mark pairs to merge with Y in the confirmed column, then run:")
+    print(f"    python3 loyalty_analysis.py --merge-duplicates {args.output}")
+    return 0 if all(passed for passed, _ in stats['checks']) else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,523 @@
+"""
+LOYALTY ANALYSIS - STATUS HISTORY
+
+Purpose: Track loyalty status changes quarter-over-quarter. Every run's
+         results are appended to a history directory, one Parquet file per
+         run sorted by customer_id, plus a runs.csv index of the recorded
+         runs. Comparing two runs reads only those two files, and only the
+         columns needed, then matches accounts on the sorted customer_ids:
+           - promotions (now Loyal) and demotions (no longer Loyal)
+           - other status moves (Ineligible <-> Not Qualified)
+           - new accounts and lost accounts
+           - at-risk loyal accounts (Loyal, but no revenue in the latest year)
+
+Usage:
+    python loyalty_analysis.py --history                    # record each run
+    python loyalty_history.py add loyalty_analysis_*.csv     # backfill old outputs
+    python loyalty_history.py runs
+    python loyalty_history.py diff [--from RUN] [--to RUN] [--top 10] [--export FILE]
+
+    RUN is a run's timestamp label (YYYYMMDD_HHMMSS); diff defaults to the
+    two most recent runs.
+
+Library use:
+    from loyalty_history import record_run, diff_runs
+    record_run("loyalty_history", result["output"], "20250331_091534")
+    diff = diff_runs("loyalty_history", "20241231_090000", "20250331_091534")
+
+Storage (loyalty_history/ by default):
+    - runs.csv: one row per recorded run (label, output file, accounts)
+    - run=YYYYMMDD_HHMMSS.parquet: one row per account (status, reason,
+      tenure, years active, 5-year and latest-year revenue, name, segment)
+
+Requirements:
+    - pyarrow library (pip install pyarrow --break-system-packages)
+"""
+
+import argparse
+import os
+import re
+import sys
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from loyalty_analysis import STATUS_ORDER
+from loyalty_io import INELIGIBILITY_REASONS, require_pyarrow
+
+HISTORY_DIR = "loyalty_history"
+RUNS_FILE = "runs.csv"
+RUN_COLUMNS = ['run_label', 'output_file', 'analysis_timestamp', 'accounts', 'recorded_at']
+
+STATUSES = list(STATUS_ORDER)
+
+# Output columns kept per run
+HISTORY_COLUMNS = [
+    'customer_id', 'customer_name', 'sub_segment', 'loyalty_status', 'tenure_years',
+    'years_active_in_window', 'revenue_5yr', 'ineligibility_reason', 'analysis_timestamp',
+]
+
+# Row group size of the run files; smaller groups make name lookups for a
+# few accounts read less
+HISTORY_ROW_GROUP = 65_536
+
+CHANGE_TYPES = ['promotion', 'demotion', 'other_move', 'new', 'lost']
+
+CHANGE_COLUMNS = [
+    'change', 'customer_id', 'customer_name', 'sub_segment',
+    'from_status', 'to_status', 'from_revenue_5yr', 'to_revenue_5yr',
+]
+
+# ============================================================================
+# STORE
+# ============================================================================
+
+def run_file(history_dir, run_label):
+    return os.path.join(history_dir, f"run={run_label}.parquet")
+
+def run_label_from_path(path):
+    """
+    Run label (YYYYMMDD_HHMMSS) of a loyalty_analysis_* output file.
+
+    Raises:
+        ValueError: If the file name carries no timestamp
+    """
+    match = re.search(r'(\d{8}_\d{6})', os.path.basename(path))
+    if match is None:
+        raise ValueError(f"No YYYYMMDD_HHMMSS timestamp in '{os.path.basename(path)}'")
+    return match.group(1)
+
+def latest_revenue_column(columns):
+    """The revenue_YYYY column of the most recent year."""
+    years = [column for column in columns if re.fullmatch(r'revenue_\d{4}', column)]
+    return max(years) if years else None
+
+def list_runs(history_dir=HISTORY_DIR):
+    """
+    Recorded runs, oldest first.
+
+    Returns:
+        DataFrame: RUN_COLUMNS (empty if nothing is recorded)
+    """
+    path = os.path.join(history_dir, RUNS_FILE)
+    if not os.path.exists(path):
+        return pd.DataFrame(columns=RUN_COLUMNS)
+    return pd.read_csv(path, dtype={'run_label': str}).sort_values('run_label', ignore_index=True)
+
+def history_table(output_df):
+    """
+    Compact per-account history rows for one run, sorted by customer_id.
+
+    Args:
+        output_df: Output table (HISTORY_COLUMNS plus its revenue_YYYY columns)
+
+    Returns:
+        DataFrame: customer_id, status and reason codes, tenure, years active,
+        revenue_5yr, latest_revenue, customer_name, sub_segment
+    """
+    latest = latest_revenue_column(output_df.columns)
+    reason_codes = {reason: code for code, reason in enumerate(INELIGIBILITY_REASONS)}
+    table = pd.DataFrame({
+        'customer_id': output_df['customer_id'],
+        'status': output_df['loyalty_status'].astype(object).map(STATUS_ORDER).astype('int8'),
+        'reason': output_df['ineligibility_reason'].astype(object).map(reason_codes).fillna(-1).astype('int8'),
+        'tenure_years': output_df['tenure_years'].astype('int16'),
+        'years_active': output_df['years_active_in_window'].astype('int8'),
+        'revenue_5yr': output_df['revenue_5yr'].astype('float64'),
+        'latest_revenue': output_df[latest].astype('float64') if latest else np.nan,
+        'customer_name': output_df['customer_name'],
+        'sub_segment': output_df['sub_segment'].astype('category'),
+    })
+    return table.sort_values('customer_id', kind='stable', ignore_index=True)
+
+def record_run(history_dir, output_df, run_label, output_file=None, replace=False):
+    """
+    Append one run's output table to the history.
+
+    Args:
+        history_dir: History directory (created if needed)
+        output_df: Output table from build_output() (or read from an output file)
+        run_label: Run timestamp label, e.g. '20250331_091534'
+        output_file: Output file name, kept for reference
+        replace: Overwrite a run already recorded under run_label
+
+    Returns:
+        int: Accounts recorded
+
+    Raises:
+        ValueError: If run_label is already recorded and replace is False
+    """
+    require_pyarrow('History')
+    runs = list_runs(history_dir)
+    if run_label in set(runs['run_label']) and not replace:
+        raise ValueError(f"Run {run_label} is already in the history")
+
+    os.makedirs(history_dir, exist_ok=True)
+    history_table(output_df).to_parquet(run_file(history_dir, run_label), index=False,
+                                        row_group_size=HISTORY_ROW_GROUP)
+
+    timestamps = output_df['analysis_timestamp'] if 'analysis_timestamp' in output_df.columns else None
+    run = {
+        'run_label': run_label,
+        'output_file': output_file,
+        'analysis_timestamp': str(timestamps.iloc[0]) if timestamps is not None and len(output_df) else None,
+        'accounts': len(output_df),
+        'recorded_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+    }
+    runs = pd.concat([runs[runs['run_label'] != run_label], pd.DataFrame([run])], ignore_index=True)
+    # Write then rename, so an interrupted run never leaves a half-written index
+    runs_path = os.path.join(history_dir, RUNS_FILE)
+    runs.sort_values('run_label').to_csv(runs_path + '.tmp', index=False)
+    os.replace(runs_path + '.tmp', runs_path)
+    return len(output_df)
+
+def record_output_file(history_dir, path, run_label=None, replace=False):
+    """
+    Append a loyalty_analysis_* output file (.csv, .parquet or .feather).
+
+    Args:
+        history_dir: History directory
+        path: Output file
+        run_label: Run label (defaults to the file name's timestamp)
+        replace: Overwrite a run already recorded under the label
+
+    Returns:
+        tuple: (run label, accounts recorded)
+    """
+    from loyalty_io import read_columns, read_table
+
+    if run_label is None:
+        run_label = run_label_from_path(path)
+    columns = read_columns(path)
+    latest = latest_revenue_column(columns)
+    wanted = [column for column in HISTORY_COLUMNS if column in columns] + ([latest] if latest else [])
+    output_df = read_table(path, columns=wanted)
+    return run_label, record_run(history_dir, output_df, run_label, os.path.basename(path), replace)
+
+def read_run(history_dir, run_label, columns):
+    """
+    Columns of one recorded run, in customer_id order.
+
+    Raises:
+        ValueError: If the run is not recorded
+    """
+    path = run_file(history_dir, run_label)
+    if not os.path.exists(path):
+        raise ValueError(f"Run {run_label} is not in the history")
+    return pd.read_parquet(path, columns=columns)
+
+def account_details(history_dir, run_label, customer_ids):
+    """
+    Name and segment of a few accounts, reading only the row groups that
+    can hold them (run files are sorted by customer_id).
+
+    Returns:
+        DataFrame: customer_id, customer_name, sub_segment
+    """
+    if len(customer_ids) == 0:
+        return pd.DataFrame(columns=['customer_id', 'customer_name', 'sub_segment'])
+    return pd.read_parquet(run_file(history_dir, run_label),
+                           columns=['customer_id', 'customer_name', 'sub_segment'],
+                           filters=[('customer_id', 'in', list(customer_ids))])
+
+# ============================================================================
+# COMPARISON
+# ============================================================================
+
+def match_runs(history_dir, from_label, to_label):
+    """
+    Line up two runs account by account.
+
+    Both files are sorted by customer_id, so each account of one run is
+    found in the other with a binary search.
+
+    Returns:
+        tuple: (from-run frame, to-run frame, position of each from-run
+        account in the to-run (-1 if lost), and whether each to-run account
+        was in the from-run)
+    """
+    columns = ['customer_id', 'status', 'revenue_5yr', 'latest_revenue']
+    before = read_run(history_dir, from_label, columns)
+    after = read_run(history_dir, to_label, columns)
+    before_ids = before['customer_id'].to_numpy()
+    after_ids = after['customer_id'].to_numpy()
+
+    positions = np.searchsorted(after_ids, before_ids)
+    found = positions < len(after_ids)
+    found[found] = after_ids[positions[found]] == before_ids[found]
+    positions = np.where(found, positions, -1)
+    in_before = np.zeros(len(after), dtype=bool)
+    in_before[positions[found]] = True
+    return before, after, positions, in_before
+
+def change_rows(before, after, positions, in_before):
+    """
+    Every changed, new and lost account, without names.
+
+    Returns:
+        DataFrame: CHANGE_COLUMNS except customer_name and sub_segment,
+        largest to-run (else from-run) revenue first within each change type
+    """
+    loyal = STATUS_ORDER['Loyal']
+    matched = positions >= 0
+    before_status = before['status'].to_numpy()
+    after_status = np.full(len(before), -1)
+    after_status[matched] = after['status'].to_numpy()[positions[matched]]
+    after_revenue = np.full(len(before), np.nan)
+    after_revenue[matched] = after['revenue_5yr'].to_numpy()[positions[matched]]
+
+    changed = matched & (before_status != after_status)
+    # Codes into CHANGE_TYPES; -1 for unchanged accounts
+    change = np.select(
+        [changed & (after_status == loyal), changed & (before_status == loyal), changed, ~matched],
+        [0, 1, 2, 4], default=-1)
+    keep = change >= 0
+    new = ~in_before
+    rows = pd.DataFrame({
+        'change': np.concatenate([change[keep], np.full(new.sum(), 3)]),
+        'customer_id': np.concatenate([before['customer_id'].to_numpy()[keep], after['customer_id'].to_numpy()[new]]),
+        'from_status': np.concatenate([before_status[keep], np.full(new.sum(), -1)]),
+        'to_status': np.concatenate([after_status[keep], after['status'].to_numpy()[new]]),
+        'from_revenue_5yr': np.concatenate([before['revenue_5yr'].to_numpy()[keep], np.full(new.sum(), np.nan)]),
+        'to_revenue_5yr': np.concatenate([after_revenue[keep], after['revenue_5yr'].to_numpy()[new]]),
+    })
+    rows['change'] = pd.Categorical.from_codes(rows['change'], CHANGE_TYPES)
+    sort_revenue = rows['to_revenue_5yr'].fillna(rows['from_revenue_5yr'])
+    order = np.lexsort((-sort_revenue.to_numpy(), rows['change'].cat.codes.to_numpy()))
+    return rows.iloc[order].reset_index(drop=True)
+
+def name_changes(history_dir, rows, from_label, to_label):
+    """
+    Add customer_name and sub_segment (from the to-run, else the from-run)
+    and status names to change_rows() output.
+    """
+    details = pd.concat([
+        account_details(history_dir, to_label, rows.loc[rows['to_status'] >= 0, 'customer_id']),
+        account_details(history_dir, from_label, rows.loc[rows['to_status'] < 0, 'customer_id']),
+    ], ignore_index=True)
+    details['sub_segment'] = details['sub_segment'].astype(object)
+    rows = rows.merge(details.drop_duplicates('customer_id'), on='customer_id', how='left')
+    for column in ('from_status', 'to_status'):
+        rows[column] = [STATUSES[code] if code >= 0 else None for code in rows[column]]
+    rows['change'] = rows['change'].astype(object)
+    return rows[CHANGE_COLUMNS]
+
+def diff_runs(history_dir, from_label, to_label, top=10):
+    """
+    Compare two recorded runs.
+
+    Reads the status and revenue columns of the two runs only; names are
+    looked up for the listed accounts alone.
+
+    Args:
+        history_dir: History directory
+        from_label: Earlier run label
+        to_label: Later run label
+        top: Accounts listed per category (largest revenue first)
+
+    Returns:
+        dict: transitions (from_status x to_status counts, with a 'New' row
+        and a 'Lost' column), counts per change type, and the top accounts
+        of each change type plus at-risk loyal accounts
+
+    Raises:
+        ValueError: If either run is not recorded
+    """
+    before, after, positions, in_before = match_runs(history_dir, from_label, to_label)
+    rows = change_rows(before, after, positions, in_before)
+
+    # Transition matrix: statuses 0-2, with 3 standing for New (row) / Lost (column)
+    n = len(STATUSES)
+    matched = positions >= 0
+    from_codes = np.concatenate([before['status'].to_numpy(), np.full((~in_before).sum(), n)])
+    to_codes = np.concatenate([
+        np.where(matched, after['status'].to_numpy()[np.where(matched, positions, 0)], n),
+        after['status'].to_numpy()[~in_before],
+    ])
+    counts_grid = np.bincount(from_codes * (n + 1) + to_codes, minlength=(n + 1) ** 2).reshape(n + 1, n + 1)
+    transitions = pd.DataFrame(counts_grid, index=STATUSES + ['New'], columns=STATUSES + ['Lost'])
+
+    per_change = rows['change'].value_counts()
+    counts = {
+        'promotions': int(per_change['promotion']),
+        'demotions': int(per_change['demotion']),
+        'other_moves': int(per_change['other_move']),
+        'unchanged': int(matched.sum()) - int(per_change[['promotion', 'demotion', 'other_move']].sum()),
+        'new': int(per_change['new']),
+        'lost': int(per_change['lost']),
+    }
+
+    loyal = STATUS_ORDER['Loyal']
+    listed = pd.concat([
+        rows[rows['change'] == 'promotion'].head(top),
+        rows[rows['change'] == 'demotion'].head(top),
+        rows[(rows['change'] == 'lost') & (rows['from_status'] == loyal)].head(top),
+    ])
+    at_risk = after[(after['status'] == loyal) & ~(after['latest_revenue'] > 0)]
+    at_risk = at_risk.sort_values('revenue_5yr', ascending=False, kind='stable').head(top)
+    listed = name_changes(history_dir, listed, from_label, to_label)
+    at_risk_details = account_details(history_dir, to_label, at_risk['customer_id'])
+    at_risk = at_risk[['customer_id', 'revenue_5yr']].merge(
+        at_risk_details.astype({'sub_segment': object}), on='customer_id', how='left')
+
+    return {
+        'from_run': from_label,
+        'to_run': to_label,
+        'transitions': transitions,
+        'counts': counts,
+        'promotions': listed[listed['change'] == 'promotion'].reset_index(drop=True),
+        'demotions': listed[listed['change'] == 'demotion'].reset_index(drop=True),
+        'lost_loyal': listed[listed['change'] == 'lost'].reset_index(drop=True),
+        'at_risk': at_risk[['customer_id', 'customer_name', 'sub_segment', 'revenue_5yr']],
+    }
+
+def export_changes(history_dir, from_label, to_label, path):
+    """
+    Write every changed, new and lost account between two runs to CSV.
+
+    Returns:
+        int: Rows written
+    """
+    before, after, positions, in_before = match_runs(history_dir, from_label, to_label)
+    rows = name_changes(history_dir, change_rows(before, after, positions, in_before), from_label, to_label)
+    rows.to_csv(path, index=False)
+    return len(rows)
+
+# ============================================================================
+# REPORT
+# ============================================================================
+
+def format_diff(diff):
+    """
+    Render diff_runs() as console text.
+
+    Returns:
+        str: The report
+    """
+    lines = []
+    out = lines.append
+    counts = diff['counts']
+    out("=" * 70)
+    out(f"LOYALTY STATUS CHANGES: {diff['from_run']} → {diff['to_run']}")
+    out("=" * 70)
+    out(f"  Promotions (now Loyal):      {counts['promotions']:>10,}")
+    out(f"  Demotions (no longer Loyal): {counts['demotions']:>10,}")
+    out(f"  Other status moves:          {counts['other_moves']:>10,}")
+    out(f"  Unchanged:                   {counts['unchanged']:>10,}")
+    out(f"  New accounts:                {counts['new']:>10,}")
+    out(f"  Lost accounts:               {counts['lost']:>10,}")
+
+    out("")
+    out("-" * 70)
+    out("TRANSITIONS (rows: previous status, columns: current status)")
+    out("-" * 70)
+    transitions = diff['transitions']
+    out(f"  {'':<15}" + "".join(f"{column:>14}" for column in transitions.columns))
+    for status, row in transitions.iterrows():
+        out(f"  {status:<15}" + "".join(f"{count:>14,}" for count in row))
+
+    sections = [
+        ('TOP PROMOTIONS', diff['promotions']),
+        ('TOP DEMOTIONS', diff['demotions']),
+        ('LOST LOYAL ACCOUNTS', diff['lost_loyal']),
+    ]
+    for title, frame in sections:
+        out("")
+        out("-" * 70)
+        out(title)
+        out("-" * 70)
+        if frame.empty:
+            out("  (none)")
+        for _, r in frame.iterrows():
+            revenue = r['to_revenue_5yr'] if pd.notna(r['to_revenue_5yr']) else r['from_revenue_5yr']
+            from_status = r['from_status'] if pd.notna(r['from_status']) else 'New'
+            to_status = r['to_status'] if pd.notna(r['to_status']) else 'Lost'
+            out(f"  {str(r['customer_name']):40s} {from_status:>13} → {to_status:<13} ${revenue:>13,.0f}")
+
+    out("")
+    out("-" * 70)
+    out("AT-RISK LOYAL ACCOUNTS (no revenue in the latest year)")
+    out("-" * 70)
+    if diff['at_risk'].empty:
+        out("  (none)")
+    for _, r in diff['at_risk'].iterrows():
+        out(f"  {str(r['customer_name']):40s} {str(r['sub_segment']):20s} ${r['revenue_5yr']:>13,.0f}")
+    out("=" * 70)
+    return "\n".join(lines)
+
+# ============================================================================
+# COMMAND LINE INTERFACE
+# ============================================================================
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Loyalty status history across runs.")
+    parser.add_argument('--history', default=HISTORY_DIR,
+                        help=f"History directory (default: {HISTORY_DIR})")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    add_parser = subparsers.add_parser('add', help="Record existing output files")
+    add_parser.add_argument('files', nargs='+', help="loyalty_analysis_* output files")
+    add_parser.add_argument('--replace', action='store_true', help="Overwrite runs already recorded")
+
+    subparsers.add_parser('runs', help="List recorded runs")
+
+    diff_parser = subparsers.add_parser('diff', help="Compare two runs")
+    diff_parser.add_argument('--from', dest='from_run', default=None,
+                             help="Earlier run label (default: the run before --to)")
+    diff_parser.add_argument('--to', dest='to_run', default=None,
+                             help="Later run label (default: most recent)")
+    diff_parser.add_argument('--top', type=int, default=10, help="Accounts listed per category")
+    diff_parser.add_argument('--export', default=None, metavar='FILE',
+                             help="Also write every changed, new and lost account to a CSV")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    try:
+        require_pyarrow('History')
+    except ImportError as e:
+        print(f"ERROR: {str(e)}")
+        return 1
+
+    if args.command == 'add':
+        for path in args.files:
+            try:
+                label, accounts = record_output_file(args.history, path, replace=args.replace)
+            except Exception as e:
+                print(f"✗ {path}: {str(e)}")
+                continue
+            print(f"✓ Recorded run {label} ({accounts:,} accounts) from {path}")
+        return 0
+
+    runs = list_runs(args.history)
+    if args.command == 'runs':
+        if runs.empty:
+            print(f"No runs recorded in {args.history}.")
+        for _, run in runs.iterrows():
+            output_file = run['output_file'] if pd.notna(run['output_file']) else ''
+            print(f"  {run['run_label']}  {run['accounts']:>10,} accounts  {output_file}")
+        return 0
+
+    labels = runs['run_label'].tolist()
+    to_run = args.to_run or (labels[-1] if labels else None)
+    from_run = args.from_run
+    if from_run is None and to_run in labels and labels.index(to_run) > 0:
+        from_run = labels[labels.index(to_run) - 1]
+    if from_run is None or to_run is None:
+        print(f"ERROR: Need two recorded runs in {args.history} to compare.")
+        print("Run loyalty_analysis.py --history, or add existing outputs with 'loyalty_history.py add'.")
+        return 1
+    try:
+        diff = diff_runs(args.history, from_run, to_run, top=args.top)
+    except ValueError as e:
+        print(f"ERROR: {str(e)}")
+        return 1
+    print(format_diff(diff))
+    if args.export:
+        rows = export_changes(args.history, from_run, to_run, args.export)
+        print(f"✓ {rows:,} changed, new and lost accounts written to {args.export}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
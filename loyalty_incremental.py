@@ -0,0 +1,331 @@
+"""
+LOYALTY ANALYSIS - INCREMENTAL QUARTERLY RE-SCORING
+
+Purpose: Re-score only the accounts whose inputs changed since the previous run.
+         Most accounts' yearly revenue is unchanged between quarterly exports,
+         so their previous results are reused as-is. Each run saves a state
+         file (the previous output plus a per-account hash of the input row
+         and a fingerprint of the config), diffs the new extract against it,
+         and scores only new or changed accounts. If LOYALTY_CONFIG or the
+         revenue/date parsing (CLEANING_VERSION) changed, every account is
+         re-scored.
+
+Usage:
+    python loyalty_incremental.py [--input FILE] [--state loyalty_state.csv]
+                                  [--output-dir DIR] [--format csv|parquet|feather]
+                                  [--history [DIR]]
+
+Output:
+    - loyalty_analysis_YYYYMMDD_HHMMSS.csv: full result, identical to a
+      from-scratch run of loyalty_analysis.py on the same extract
+    - loyalty_changes_YYYYMMDD_HHMMSS.csv: change set (new, changed and
+      removed accounts, with previous and current loyalty_status)
+    - The state file, updated for the next run (.csv by default; use a
+      .parquet name for faster state loads if pyarrow is installed)
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from loyalty_analysis import (
+    FRAMEWORK_VERSION, INPUT_FILE, LOYALTY_CONFIG, build_output, drop_duplicate_accounts,
+    find_missing_columns, get_required_columns, load_revenue_extract, save_output,
+    score_accounts, sort_output,
+)
+from loyalty_cache import CLEANING_VERSION
+from loyalty_summary_report import save_summary_sidecar
+
+STATE_FILE = "loyalty_state.csv"
+
+# ============================================================================
+# FINGERPRINTS
+# ============================================================================
+
+def config_fingerprint(config):
+    """
+    Short hash of the config, framework version and cleaning version.
+
+    Any threshold, window or current_year change alters it, and so does a
+    change to currency or date parsing (loyalty_cache.CLEANING_VERSION),
+    which forces a full re-score.
+
+    Args:
+        config: Loyalty config dict
+
+    Returns:
+        str: 16-character hex digest
+    """
+    payload = json.dumps({'config': config, 'version': FRAMEWORK_VERSION, 'cleaning': CLEANING_VERSION},
+                         sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+def row_hashes(df, config):
+    """
+    Hash each account's scoring inputs (identification columns plus the
+    revenue columns of the evaluation window).
+
+    Args:
+        df: Raw extract
+        config: Loyalty config dict
+
+    Returns:
+        numpy.ndarray: int64 hash per row (uint64 bits, stored signed so it
+        survives a CSV round trip)
+    """
+    hashes = pd.util.hash_pandas_object(df[get_required_columns(config)], index=False)
+    return hashes.to_numpy().view('int64')
+
+# ============================================================================
+# INCREMENTAL SCORING
+# ============================================================================
+
+def load_state(path):
+    """
+    Read a previous run's state file.
+
+    Args:
+        path: State file (.csv, .parquet or .feather)
+
+    Returns:
+        DataFrame or None: Previous state, or None if there is no state yet
+    """
+    if not os.path.exists(path):
+        return None
+    from loyalty_io import read_table
+    return read_table(path)
+
+def save_state(state, path):
+    """Write the state for the next run (format from the extension)."""
+    from loyalty_io import write_table
+    write_table(state, path)
+
+def run_incremental(df, state=None, config=None, analysis_timestamp=None):
+    """
+    Score an extract, reusing previous results for unchanged accounts.
+
+    Args:
+        df: Raw extract
+        state: Previous state from load_state() (None scores everything)
+        config: Loyalty config dict (defaults to LOYALTY_CONFIG)
+        analysis_timestamp: Value for the output analysis_timestamp column
+
+    Returns:
+        dict: output (full sorted output table), changes (change set),
+        state (new state to save), and counts of reused, rescored, new,
+        changed and removed accounts
+
+    Raises:
+        ValueError: If required input columns are missing
+    """
+    if config is None:
+        config = LOYALTY_CONFIG
+    if analysis_timestamp is None:
+        analysis_timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+    missing_columns = find_missing_columns(df, config)
+    if missing_columns:
+        raise ValueError(f"Missing required columns: {missing_columns}")
+
+    df, duplicates = drop_duplicate_accounts(df)
+    df = df.reset_index(drop=True)
+    fingerprint = config_fingerprint(config)
+    hashes = row_hashes(df, config)
+
+    # Match accounts to the previous state; a config change invalidates all of it
+    previous = state.set_index('customer_id') if state is not None and len(state) > 0 else None
+    config_changed = previous is not None and not (previous['config_hash'] == fingerprint).all()
+
+    ids = df['Account_ID']
+    if previous is not None:
+        in_previous = ids.isin(previous.index).to_numpy()
+        previous_hash = previous['row_hash'].reindex(ids, fill_value=0).to_numpy()
+        unchanged = in_previous & (previous_hash == hashes) & (not config_changed)
+    else:
+        in_previous = np.zeros(len(df), dtype=bool)
+        unchanged = np.zeros(len(df), dtype=bool)
+
+    # Score only new or changed accounts
+    rescore = ~unchanged
+    if rescore.any():
+        scored, _ = score_accounts(df[rescore], config)
+        rescored_output = build_output(scored, config, analysis_timestamp, sort=False)
+    else:
+        rescored_output = None
+
+    # Reuse previous results for unchanged accounts
+    if rescored_output is not None:
+        output_columns = list(rescored_output.columns)
+    else:
+        # analysis_timestamp is not kept in the state; it is always the last column
+        output_columns = [col for col in previous.reset_index().columns
+                          if col not in ('row_hash', 'config_hash')] + ['analysis_timestamp']
+    parts = []
+    if unchanged.any():
+        reused = previous.loc[ids[unchanged]].reset_index()
+        reused['analysis_timestamp'] = analysis_timestamp
+        reused.index = np.flatnonzero(unchanged)
+        parts.append(reused[output_columns])
+    if rescored_output is not None:
+        rescored_output.index = np.flatnonzero(rescore)
+        parts.append(rescored_output[output_columns])
+
+    # Restore extract order before sorting so ties order exactly like a full run
+    combined = pd.concat(parts).sort_index()
+    output_df = sort_output(combined)
+
+    new_state = combined.drop(columns='analysis_timestamp')
+    new_state['row_hash'] = hashes
+    new_state['config_hash'] = fingerprint
+
+    changes = build_change_set(combined, previous, in_previous, rescore)
+    return {
+        'config': config,
+        'duplicates': duplicates,
+        'output': output_df,
+        'changes': changes,
+        'state': new_state.reset_index(drop=True),
+        'full_rescore': previous is None or config_changed,
+        'reused': int(unchanged.sum()),
+        'rescored': int(rescore.sum()),
+        'new': int((rescore & ~in_previous).sum()),
+        'changed': int((rescore & in_previous).sum()),
+        'removed': int((changes['change_type'] == 'removed').sum()),
+    }
+
+def build_change_set(combined, previous, in_previous, rescore):
+    """
+    Accounts that are new, changed or gone since the previous run.
+
+    Args:
+        combined: Current output rows in extract order
+        previous: Previous state indexed by customer_id (or None)
+        in_previous: Boolean mask, account existed in the previous state
+        rescore: Boolean mask, account was re-scored this run
+
+    Returns:
+        DataFrame: customer_id, customer_name, change_type, previous_status,
+        loyalty_status and status_changed (True for existing accounts whose
+        status moved)
+    """
+    current = combined[rescore]
+    if previous is not None:
+        previous_status = previous['loyalty_status'].astype(object).reindex(current['customer_id']).to_numpy()
+    else:
+        previous_status = np.full(len(current), None, dtype=object)
+
+    changes = pd.DataFrame({
+        'customer_id': current['customer_id'].to_numpy(),
+        'customer_name': current['customer_name'].to_numpy(),
+        'change_type': np.where(in_previous[rescore], 'changed', 'new'),
+        'previous_status': previous_status,
+        'loyalty_status': current['loyalty_status'].astype(object).to_numpy(),
+    })
+
+    if previous is not None:
+        gone = previous[~previous.index.isin(combined['customer_id'])]
+        removed = pd.DataFrame({
+            'customer_id': gone.index.to_numpy(),
+            'customer_name': gone['customer_name'].to_numpy(),
+            'change_type': 'removed',
+            'previous_status': gone['loyalty_status'].astype(object).to_numpy(),
+            'loyalty_status': None,
+        })
+        changes = pd.concat([changes, removed], ignore_index=True)
+
+    # Promotions/demotions of accounts present in both runs
+    changes['status_changed'] = (
+        (changes['change_type'] == 'changed') &
+        (changes['previous_status'] != changes['loyalty_status'])
+    )
+    return changes
+
+# ============================================================================
+# COMMAND LINE INTERFACE
+# ============================================================================
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Re-score only accounts whose revenue extract rows changed since the last run.")
+    parser.add_argument('--input', default=INPUT_FILE,
+                        help=f"Revenue extract: .csv, .parquet or .feather (default: {INPUT_FILE})")
+    parser.add_argument('--state', default=STATE_FILE,
+                        help=f"State file from the previous run, updated in place (default: {STATE_FILE})")
+    parser.add_argument('--output-dir', default=None,
+                        help="Directory for the output and change files (default: current directory)")
+    parser.add_argument('--format', choices=['csv', 'parquet', 'feather'], default='csv',
+                        help="Output file format (default: csv)")
+    parser.add_argument('--history', nargs='?', const='loyalty_history', default=None,
+                        metavar='DIR',
+                        help="Record this run's statuses in a history store (see loyalty_history.py)")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    if LOYALTY_CONFIG is None:
+        print("ERROR: loyalty_config.py not found in current directory.")
+        return 1
+
+    print("=" * 80)
+    print("CUSTOMER LOYALTY FRAMEWORK - INCREMENTAL RE-SCORING")
+    print("=" * 80)
+    try:
+        df = load_revenue_extract(args.input)
+        state = load_state(args.state)
+    except Exception as e:
+        print(f"ERROR: Failed to load inputs")
+        print(f"Error message: {str(e)}")
+        return 1
+    print(f"✓ Loaded {len(df):,} customer records from {args.input}")
+    if state is None:
+        print(f"  • No state file at {args.state}; scoring every account")
+    else:
+        print(f"✓ Loaded previous state for {len(state):,} accounts from {args.state}")
+
+    try:
+        result = run_incremental(df, state, LOYALTY_CONFIG)
+    except ValueError as e:
+        print(f"ERROR: {str(e)}")
+        return 1
+
+    if result['duplicates'] > 0:
+        print(f"WARNING: {result['duplicates']} duplicate Account_IDs found (kept first occurrence)")
+    if state is not None and len(state) > 0 and result['full_rescore']:
+        print(f"  • Config or parsing changed since the previous run; every account re-scored")
+
+    print(f"\nAccounts:")
+    print(f"  • Reused (unchanged):  {result['reused']:>10,}")
+    print(f"  • Re-scored:           {result['rescored']:>10,}  ({result['new']:,} new, {result['changed']:,} changed)")
+    print(f"  • Removed from extract:{result['removed']:>10,}")
+    print(f"  • Status changes:      {int(result['changes']['status_changed'].sum()):>10,}")
+
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    output_filename = save_output(result['output'], args.output_dir, timestamp, args.format)
+    save_summary_sidecar(result['output'], output_filename)
+    changes_filename = os.path.join(args.output_dir or '', f'loyalty_changes_{timestamp}.csv')
+    result['changes'].to_csv(changes_filename, index=False)
+    save_state(result['state'], args.state)
+    if args.history:
+        from loyalty_history import record_run
+        record_run(args.history, result['output'], timestamp, os.path.basename(output_filename))
+
+    status_counts = result['output']['loyalty_status'].value_counts()
+    print(f"\nLoyalty Status Results:")
+    for status, count in status_counts.items():
+        print(f"  • {status}: {count:,}")
+    print(f"\n✓ Output file saved: {output_filename}")
+    print(f"✓ Change set saved: {changes_filename}")
+    print(f"✓ State updated: {args.state}")
+    if args.history:
+        print(f"✓ Run {timestamp} recorded in {args.history}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,472 @@
+"""
+LOYALTY ANALYSIS - FILE FORMATS
+
+Purpose: Read revenue extracts and write analysis results as CSV or as typed
+         columnar files (Parquet, Arrow IPC/Feather). Columnar files keep
+         numbers as numbers, so loading them needs no string parsing and can
+         read just the columns a report needs.
+
+Formats (chosen by file extension):
+    .csv               - Text CSV (default, what PowerBI's Text/CSV import uses)
+    .parquet / .pq     - Apache Parquet (PowerBI: Get Data → Parquet)
+    .feather / .arrow  - Arrow IPC / Feather v2
+    .csv.gz / .csv.zst - Compressed CSV (gzip / zstd)
+
+CSV output:
+    write_output() renders the output table as CSV text with Arrow compute
+    kernels, a block of rows at a time, instead of DataFrame.to_csv()'s
+    row-by-row formatting. The bytes are the same as to_csv() writes;
+    float_format='fixed' writes every revenue with 2 decimals and the
+    consistency rate with 4 instead of the shortest form.
+
+Requirements:
+    - pandas library
+    - pyarrow library for Parquet/Feather, compressed CSV and the fast CSV
+      writer (without it, CSV output falls back to DataFrame.to_csv()):
+        pip install pyarrow --break-system-packages
+"""
+
+import csv
+import io
+import os
+
+from loyalty_analysis import STATUS_ORDER
+
+EXTENSION_FORMATS = {
+    '.csv': 'csv',
+    '.parquet': 'parquet',
+    '.pq': 'parquet',
+    '.feather': 'feather',
+    '.arrow': 'feather',
+}
+
+COMPRESSION_EXTENSIONS = {
+    '.gz': 'gzip',
+    '.zst': 'zstd',
+}
+
+FLOAT_FORMATS = ['shortest', 'fixed']
+
+# pyarrow's gzip default (level 9) takes longer than writing the CSV itself;
+# level 1 is several times faster for a slightly larger file (zstd is both
+# faster and smaller)
+GZIP_LEVEL = 1
+
+# Rows rendered to CSV text at a time
+CSV_BLOCK_ROWS = 262_144
+
+INELIGIBILITY_REASONS = [
+    'Insufficient Tenure',
+    'Below Consistency & Revenue Thresholds',
+    'Below Consistency Threshold',
+    'Below Revenue Threshold',
+]
+
+def split_compression(path):
+    """
+    Split a compression suffix off a path.
+
+    Returns:
+        tuple: (path without .gz/.zst, 'gzip', 'zstd' or None)
+    """
+    stem, extension = os.path.splitext(path)
+    compression = COMPRESSION_EXTENSIONS.get(extension.lower())
+    return (stem, compression) if compression else (path, None)
+
+def detect_format(path):
+    """
+    File format implied by a path's extension.
+
+    Args:
+        path: File path
+
+    Returns:
+        str: 'csv', 'parquet' or 'feather'
+
+    Raises:
+        ValueError: If the extension is not recognized, or a non-CSV file
+                    has a compression suffix
+    """
+    uncompressed, compression = split_compression(path)
+    extension = os.path.splitext(uncompressed)[1].lower()
+    if extension not in EXTENSION_FORMATS:
+        raise ValueError(f"Unsupported file type '{extension}' for {path} "
+                         f"(expected one of: {', '.join(sorted(EXTENSION_FORMATS))})")
+    if compression and EXTENSION_FORMATS[extension] != 'csv':
+        raise ValueError(f"Only CSV files can be compressed ({path})")
+    return EXTENSION_FORMATS[extension]
+
+def require_pyarrow(file_format):
+    """
+    Fail early, with install instructions, if a columnar format lacks pyarrow.
+
+    Raises:
+        ImportError: If pyarrow is not installed
+    """
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        raise ImportError(f"{file_format} files need the pyarrow library "
+                          f"(pip install pyarrow --break-system-packages)") from None
+
+def _csv_source(path):
+    # pandas needs the zstandard package for .zst; pyarrow decompresses both
+    compression = split_compression(path)[1]
+    if compression is None:
+        return path
+    require_pyarrow('Compressed CSV')
+    import pyarrow as pa
+    return pa.input_stream(path, compression=compression)
+
+def read_table(path, columns=None):
+    """
+    Read a CSV, Parquet or Feather file into a DataFrame.
+
+    Args:
+        path: File to read (format from the extension)
+        columns: Optional list of columns to load; columnar formats skip the
+                 others entirely
+
+    Returns:
+        DataFrame
+    """
+    import pandas as pd
+
+    file_format = detect_format(path)
+    if file_format == 'csv':
+        return pd.read_csv(_csv_source(path), encoding='utf-8-sig', usecols=columns)
+    require_pyarrow(file_format)
+    if file_format == 'parquet':
+        return pd.read_parquet(path, columns=columns)
+    return pd.read_feather(path, columns=columns)
+
+def read_columns(path):
+    """
+    Column names of a file without loading its rows (CSV headers are read
+    without pandas, so a dry run stays fast).
+
+    Args:
+        path: File to inspect
+
+    Returns:
+        list: Column names
+    """
+    file_format = detect_format(path)
+    if file_format == 'csv':
+        source = _csv_source(path)
+        if source is not path:
+            with io.TextIOWrapper(source, encoding='utf-8-sig', newline='') as f:
+                return next(csv.reader(f), [])
+        with open(path, encoding='utf-8-sig', newline='') as f:
+            return next(csv.reader(f), [])
+    require_pyarrow(file_format)
+    if file_format == 'parquet':
+        import pyarrow.parquet as pq
+        return list(pq.read_schema(path).names)
+    import pyarrow.ipc as ipc
+    return list(ipc.open_file(path).schema.names)
+
+def iter_chunks(path, chunksize, columns=None):
+    """
+    Read a file as a sequence of DataFrames of at most chunksize rows.
+
+    Args:
+        path: CSV, Parquet or Feather file
+        chunksize: Maximum rows per chunk (Feather files are read per
+                   stored record batch)
+        columns: Optional list of columns to read; names the file lacks are
+                 skipped
+
+    Yields:
+        DataFrame: The next chunk of rows
+    """
+    import pandas as pd
+
+    file_format = detect_format(path)
+    if columns is not None:
+        present = set(read_columns(path))
+        columns = [col for col in columns if col in present]
+    if file_format == 'csv':
+        yield from pd.read_csv(_csv_source(path), encoding='utf-8-sig', chunksize=chunksize,
+                               usecols=columns)
+        return
+    require_pyarrow(file_format)
+    if file_format == 'parquet':
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize, columns=columns):
+            yield batch.to_pandas()
+    else:
+        import pyarrow.ipc as ipc
+        reader = ipc.open_file(path)
+        for i in range(reader.num_record_batches):
+            batch = reader.get_batch(i)
+            yield (batch.select(columns) if columns is not None else batch).to_pandas()
+
+def to_typed_output(output_df):
+    """
+    Give the output table compact, explicit column types for columnar files.
+
+    Integer metrics become int32, status/segment/reason become categoricals
+    (status ordered Loyal → Ineligible) and revenue stays float64.
+
+    Args:
+        output_df: Output table from build_output()
+
+    Returns:
+        DataFrame: Typed copy with the same columns and values
+    """
+    import pandas as pd
+
+    typed = output_df.copy()
+    typed['tenure_years'] = typed['tenure_years'].astype('int32')
+    typed['years_active_in_window'] = typed['years_active_in_window'].astype('int32')
+    typed['sub_segment'] = typed['sub_segment'].astype('category')
+    typed['loyalty_status'] = typed['loyalty_status'].astype(
+        pd.CategoricalDtype(list(STATUS_ORDER), ordered=True))
+    typed['ineligibility_reason'] = typed['ineligibility_reason'].astype(
+        pd.CategoricalDtype(INELIGIBILITY_REASONS))
+    return typed
+
+# ============================================================================
+# CSV WRITER
+# ============================================================================
+
+def column_decimals(column):
+    """Decimals build_output() rounds an output column to (None if it is not rounded)."""
+    if column == 'consistency_rate':
+        return 4
+    if column.startswith('revenue_'):
+        return 2
+    return None
+
+def _fraction_table(decimals, fixed):
+    # Text after the integer part for every fraction 0 .. 10**decimals - 1;
+    # shortest form drops trailing zeros but keeps one digit, as repr() does
+    fractions = [f"{i:0{decimals}d}" for i in range(10 ** decimals)]
+    if not fixed:
+        fractions = [digits.rstrip('0') or '0' for digits in fractions]
+    return ['.' + digits for digits in fractions]
+
+def _decimal_text(values, decimals, fixed):
+    import numpy as np
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    values = np.asarray(values, dtype='float64')
+    if decimals is None:
+        return pa.array([None if v != v else repr(v) for v in values.tolist()], pa.string())
+
+    # Values that are exactly a whole number of 10**-decimals and small
+    # enough that no shorter decimal rounds to them are written from their
+    # integer digits. repr() gives the same text for these; anything else
+    # (NaN, inf, unrounded values) is formatted one by one with repr()
+    scale = 10 ** decimals
+    scaled = np.rint(values * scale)
+    exact = (np.abs(values) < 2.0 ** 52 / scale) & (scaled / scale == values)
+    digits = np.abs(np.where(exact, scaled, 0)).astype('int64')
+    whole = pc.cast(pa.array(digits // scale), pa.string())
+    negative = np.signbit(values)
+    if negative.any():
+        whole = pc.if_else(pa.array(negative), pc.binary_join_element_wise('-', whole, ''), whole)
+    fraction = pc.take(pa.array(_fraction_table(decimals, fixed), pa.string()), pa.array(digits % scale))
+    text = pc.binary_join_element_wise(whole, fraction, '')
+    if not exact.all():
+        others = [None if v != v else repr(v) for v in values[~exact].tolist()]
+        text = pc.replace_with_mask(text, pa.array(~exact), pa.array(others, pa.string()))
+    return text
+
+def _quoted_text(values):
+    import pyarrow.compute as pc
+
+    # csv.QUOTE_MINIMAL, as used by to_csv()
+    needs_quotes = pc.match_substring_regex(values, r'[,"\r\n]')
+    quoted = pc.binary_join_element_wise('"', pc.replace_substring(values, '"', '""'), '"', '')
+    return pc.if_else(needs_quotes, quoted, values)
+
+def _text_column(series):
+    import pandas as pd
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    # Text columns repeat few distinct values (status, segment, timestamp),
+    # so each distinct value is quoted once
+    codes, uniques = pd.factorize(series)
+    uniques = pd.Index(uniques)
+    if not pd.api.types.is_string_dtype(uniques.dtype):
+        uniques = uniques.map(str)
+    text = _quoted_text(pa.array(uniques.to_numpy(dtype=object), pa.string()))
+    return pc.take(text, pa.array(codes, mask=codes < 0))
+
+def csv_lines(df, float_format='shortest'):
+    """
+    The CSV line of every row of a frame, as to_csv(index=False) writes them.
+
+    Floats are written from the decimals build_output() rounded them to
+    (see column_decimals()); integers, text and categoricals as to_csv()
+    does. Missing values are empty.
+
+    Args:
+        df: Output table (or a block of its rows)
+        float_format: 'shortest' (same text as to_csv()) or 'fixed' (every
+                      value of a rounded column with all its decimals)
+
+    Returns:
+        pyarrow.StringArray: One line per row, each ending in os.linesep
+    """
+    import pandas as pd
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    if float_format not in FLOAT_FORMATS:
+        raise ValueError(f"Unknown float format '{float_format}' (expected one of: {', '.join(FLOAT_FORMATS)})")
+    columns = []
+    for column in df.columns:
+        values = df[column]
+        if pd.api.types.is_float_dtype(values.dtype):
+            columns.append(_decimal_text(values, column_decimals(column), float_format == 'fixed'))
+        elif pd.api.types.is_integer_dtype(values.dtype):
+            columns.append(pc.cast(pa.array(values, from_pandas=True), pa.string()))
+        else:
+            columns.append(_text_column(values))
+    rows = pc.binary_join_element_wise(*columns, ',', null_handling='replace', null_replacement='')
+    return pc.binary_join_element_wise(rows, '', os.linesep)
+
+def _write_lines(stream, lines):
+    import numpy as np
+
+    # The lines are stored back to back in the array's data buffer, so the
+    # block is written with one call and no copy
+    offsets_buffer, data_buffer = lines.buffers()[1:]
+    offsets = np.frombuffer(offsets_buffer, dtype='int32', count=len(lines) + 1, offset=lines.offset * 4)
+    if data_buffer is not None:
+        stream.write(memoryview(data_buffer)[offsets[0]:offsets[-1]])
+
+def _csv_header(columns):
+    header = io.StringIO()
+    csv.writer(header, lineterminator=os.linesep).writerow(columns)
+    return header.getvalue().encode('utf-8')
+
+def _open_csv_stream(path):
+    compression = split_compression(path)[1]
+    if compression is None:
+        return open(path, 'wb')
+    if compression == 'gzip':
+        import gzip
+        return gzip.open(path, 'wb', compresslevel=GZIP_LEVEL)
+    import pyarrow as pa
+    return pa.CompressedOutputStream(path, compression)
+
+def _write_csv_blocks(stream, df, float_format):
+    for start in range(0, len(df), CSV_BLOCK_ROWS):
+        _write_lines(stream, csv_lines(df.iloc[start:start + CSV_BLOCK_ROWS], float_format))
+
+def write_csv(df, path, float_format='shortest'):
+    """
+    Write the output table as CSV (gzip/zstd if the path ends in .gz/.zst).
+
+    Args:
+        df: Output table from build_output()
+        path: Destination
+        float_format: 'shortest' (same bytes as to_csv()) or 'fixed'
+    """
+    require_pyarrow('Compressed or fixed-decimal CSV')
+    with _open_csv_stream(path) as stream:
+        stream.write(_csv_header(df.columns))
+        _write_csv_blocks(stream, df, float_format)
+
+def write_table(df, path):
+    """
+    Write any DataFrame as CSV, Parquet or Feather (format from the extension).
+
+    Args:
+        df: Frame to write (e.g. a revenue extract)
+        path: Destination
+    """
+    file_format = detect_format(path)
+    if file_format == 'csv':
+        df.to_csv(path, index=False)
+        return
+    require_pyarrow(file_format)
+    df = df.reset_index(drop=True)
+    if file_format == 'parquet':
+        df.to_parquet(path, index=False)
+    else:
+        df.to_feather(path)
+
+def pyarrow_available():
+    """True if the pyarrow library can be imported."""
+    import importlib.util
+    return importlib.util.find_spec('pyarrow') is not None
+
+def write_output(output_df, path, float_format='shortest'):
+    """
+    Write the output table; columnar formats get typed columns.
+
+    CSV goes through write_csv() when pyarrow is installed, otherwise
+    through DataFrame.to_csv() (same file).
+
+    Args:
+        output_df: Output table from build_output()
+        path: Destination (format from the extension)
+        float_format: CSV only: 'shortest' or 'fixed' (see csv_lines())
+    """
+    if detect_format(path) != 'csv':
+        write_table(to_typed_output(output_df), path)
+    elif pyarrow_available() or float_format != 'shortest' or split_compression(path)[1]:
+        write_csv(output_df, path, float_format)
+    else:
+        output_df.to_csv(path, index=False)
+
+class ChunkedOutputWriter:
+    """
+    Appends output chunks to a CSV or Parquet file (streaming mode).
+
+    CSV chunks go through the same writer as write_output(). Parquet chunks
+    become row groups of one file with the schema of the first chunk
+    (sub_segment is stored as plain strings there, since its categories
+    differ from chunk to chunk).
+    """
+
+    def __init__(self, path, float_format='shortest'):
+        self.path = path
+        self.format = detect_format(path)
+        self.float_format = float_format
+        if self.format == 'feather':
+            raise ValueError("Feather output cannot be written in chunks; use .csv or .parquet")
+        if self.format == 'parquet':
+            require_pyarrow(self.format)
+        elif float_format != 'shortest' or split_compression(path)[1]:
+            require_pyarrow('Compressed or fixed-decimal CSV')
+        self._fast_csv = self.format == 'csv' and pyarrow_available()
+        self._writer = None
+        self._schema = None
+        self.rows = 0
+
+    def write(self, output_chunk):
+        if self._fast_csv:
+            if self._writer is None:
+                self._writer = _open_csv_stream(self.path)
+                self._writer.write(_csv_header(output_chunk.columns))
+            _write_csv_blocks(self._writer, output_chunk, self.float_format)
+        elif self.format == 'csv':
+            first_write = self.rows == 0
+            output_chunk.to_csv(self.path, index=False, mode='w' if first_write else 'a', header=first_write)
+        else:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            typed = to_typed_output(output_chunk)
+            # Segment categories differ between chunks; store them as plain strings
+            typed['sub_segment'] = typed['sub_segment'].astype(str)
+            if self._writer is None:
+                table = pa.Table.from_pandas(typed, preserve_index=False)
+                self._schema = table.schema
+                self._writer = pq.ParquetWriter(self.path, self._schema)
+            else:
+                table = pa.Table.from_pandas(typed, schema=self._schema, preserve_index=False)
+            self._writer.write_table(table)
+        self.rows += len(output_chunk)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
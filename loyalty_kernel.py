@@ -0,0 +1,207 @@
+"""
+LOYALTY ANALYSIS - FUSED SCORING KERNEL
+
+Purpose: Compute every per-account metric and the loyalty decision from the
+         (accounts x years) revenue matrix in one pass. The multi-pass code
+         in calculate_metrics() and classify_loyalty() adds one boolean
+         column per year, sums them, sums the revenue columns, and sets the
+         status and reason text through several masked assignments. This
+         kernel returns years_active, revenue_5yr, consistency_rate and
+         small integer status/reason codes instead. The codes become text
+         only as categoricals (see score_metrics() in loyalty_analysis.py),
+         so the text is not repeated on every row.
+
+Engines:
+    numba  - A compiled loop that visits each account's row once. Used
+             when the numba library is installed and the batch is large
+             enough to repay compiling the loop (NUMBA_MIN_ROWS).
+    numpy  - Whole-array NumPy operations over the same matrix. Always
+             available and gives identical results.
+
+Library use:
+    from loyalty_kernel import score_matrix
+    scores = score_matrix(revenue, tenure_years, LOYALTY_CONFIG)
+    scores["status"]    # codes into STATUS_ORDER: 0 Loyal, 1 Not Qualified, 2 Ineligible
+    scores["reason"]    # codes into INELIGIBILITY_REASONS, -1 = no reason
+
+Requirements:
+    - numpy library
+    - numba library (optional): pip install numba --break-system-packages
+"""
+
+import numpy as np
+
+from loyalty_analysis import STATUS_ORDER
+
+LOYAL = STATUS_ORDER['Loyal']
+NOT_QUALIFIED = STATUS_ORDER['Not Qualified']
+INELIGIBLE = STATUS_ORDER['Ineligible']
+
+# Codes into loyalty_io.INELIGIBILITY_REASONS
+NO_REASON = -1
+INSUFFICIENT_TENURE = 0
+BELOW_BOTH = 1
+BELOW_CONSISTENCY = 2
+BELOW_REVENUE = 3
+
+# Below this many accounts the NumPy engine wins. Measured on 1M accounts
+# (loyalty_benchmark.py kernel): numba saves ~0.03s per million accounts
+# but importing it and loading/compiling the loop costs 0.6-1.2s per process
+NUMBA_MIN_ROWS = 25_000_000
+
+ENGINES = ['auto', 'numpy', 'numba']
+
+_numba_kernel = None
+
+# ============================================================================
+# ENGINES
+# ============================================================================
+
+def numba_available():
+    """True if the numba library can be imported."""
+    import importlib.util
+    return importlib.util.find_spec('numba') is not None
+
+def _score_numpy(revenue, tenure_years, min_revenue_per_year, min_tenure, min_consistency,
+                 min_revenue_5yr):
+    num_years = revenue.shape[1]
+    if min_revenue_per_year.ndim > 0:
+        # Per-account minimums (segment overrides)
+        per_year = min_revenue_per_year[:, None]
+        active = np.where(per_year > 0, revenue >= per_year, revenue > 0)
+    elif min_revenue_per_year > 0:
+        active = revenue >= min_revenue_per_year
+    else:
+        active = revenue > 0
+    years_active = active.sum(axis=1, dtype='int8')
+
+    # Added year by year (not np.sum's pairwise order), so totals match the
+    # column-by-column DataFrame sum to the last bit
+    revenue_5yr = revenue[:, 0].copy()
+    for i in range(1, num_years):
+        revenue_5yr += revenue[:, i]
+    consistency_rate = years_active / num_years
+
+    ineligible = ~(tenure_years >= min_tenure)    # NaN tenure is ineligible
+    fails_consistency = consistency_rate < min_consistency
+    fails_revenue = revenue_5yr < min_revenue_5yr
+    fails_any = fails_consistency | fails_revenue
+
+    status = np.where(ineligible, INELIGIBLE, np.where(fails_any, NOT_QUALIFIED, LOYAL)).astype('int8')
+    # Not qualified: 1 = both thresholds, 2 = consistency only, 3 = revenue only
+    reason = BELOW_BOTH + ~fails_revenue + 2 * ~fails_consistency
+    reason = np.where(ineligible, INSUFFICIENT_TENURE, np.where(fails_any, reason, NO_REASON)).astype('int8')
+    return years_active, revenue_5yr, consistency_rate, status, reason
+
+def _build_numba_kernel():
+    import numba
+
+    # Thresholds are per-account arrays (the same value repeated when the
+    # config has no segment overrides)
+    @numba.njit(cache=True, nogil=True)
+    def kernel(revenue, tenure_years, min_revenue_per_year, min_tenure, min_consistency,
+               min_revenue_5yr):
+        accounts, num_years = revenue.shape
+        years_active = np.empty(accounts, dtype=np.int8)
+        revenue_5yr = np.empty(accounts, dtype=np.float64)
+        consistency_rate = np.empty(accounts, dtype=np.float64)
+        status = np.empty(accounts, dtype=np.int8)
+        reason = np.empty(accounts, dtype=np.int8)
+        for row in range(accounts):
+            count = 0
+            total = revenue[row, 0]
+            per_year = min_revenue_per_year[row]
+            for i in range(num_years):
+                value = revenue[row, i]
+                if i > 0:
+                    total += value
+                if (value >= per_year) if per_year > 0 else (value > 0):
+                    count += 1
+            rate = count / num_years
+            years_active[row] = count
+            revenue_5yr[row] = total
+            consistency_rate[row] = rate
+
+            fails_consistency = rate < min_consistency[row]
+            fails_revenue = total < min_revenue_5yr[row]
+            if not tenure_years[row] >= min_tenure[row]:
+                status[row] = INELIGIBLE
+                reason[row] = INSUFFICIENT_TENURE
+            elif fails_consistency and fails_revenue:
+                status[row] = NOT_QUALIFIED
+                reason[row] = BELOW_BOTH
+            elif fails_consistency:
+                status[row] = NOT_QUALIFIED
+                reason[row] = BELOW_CONSISTENCY
+            elif fails_revenue:
+                status[row] = NOT_QUALIFIED
+                reason[row] = BELOW_REVENUE
+            else:
+                status[row] = LOYAL
+                reason[row] = NO_REASON
+        return years_active, revenue_5yr, consistency_rate, status, reason
+
+    return kernel
+
+def _score_numba(revenue, tenure_years, *thresholds):
+    global _numba_kernel
+    if _numba_kernel is None:
+        _numba_kernel = _build_numba_kernel()
+    thresholds = [np.ascontiguousarray(np.broadcast_to(values, len(revenue))) for values in thresholds]
+    return _numba_kernel(np.ascontiguousarray(revenue), np.ascontiguousarray(tenure_years),
+                         *thresholds)
+
+# ============================================================================
+# SCORING
+# ============================================================================
+
+def choose_engine(rows, engine='auto'):
+    """
+    Engine score_matrix() will use for a batch.
+
+    Args:
+        rows: Number of accounts
+        engine: 'auto', 'numpy' or 'numba'
+
+    Returns:
+        str: 'numpy' or 'numba'
+
+    Raises:
+        ImportError: If engine is 'numba' and numba is not installed
+    """
+    if engine == 'numba' and not numba_available():
+        raise ImportError("The numba engine needs the numba library "
+                          "(pip install numba --break-system-packages)")
+    if engine == 'auto':
+        return 'numba' if rows >= NUMBA_MIN_ROWS and numba_available() else 'numpy'
+    return engine
+
+def score_matrix(revenue, tenure_years, config, engine='auto'):
+    """
+    Metrics and loyalty codes for every account of a revenue matrix.
+
+    Same rules as calculate_metrics() followed by classify_loyalty().
+
+    Args:
+        revenue: (accounts x years) float64 revenue, years in order, no NaN
+        tenure_years: Tenure per account (NaN = unknown)
+        config: Loyalty config dict, or per-account thresholds from
+                loyalty_analysis.row_thresholds() (segment overrides)
+        engine: 'auto', 'numpy' or 'numba' (see choose_engine())
+
+    Returns:
+        dict: years_active (int8), revenue_5yr, consistency_rate, status
+        (int8 codes into STATUS_ORDER) and reason (int8 codes into
+        INELIGIBILITY_REASONS, -1 for none)
+    """
+    revenue = np.asarray(revenue, dtype='float64')
+    tenure_years = np.asarray(tenure_years, dtype='float64')
+    # 0-d arrays for single values, compared exactly as Python floats are
+    thresholds = tuple(np.asarray(config[key], dtype='float64') for key in (
+        "min_revenue_per_active_year", "min_tenure_years", "min_consistency_rate", "min_revenue_5yr",
+    ))
+    if choose_engine(len(revenue), engine) == 'numba':
+        results = _score_numba(revenue, tenure_years, *thresholds)
+    else:
+        results = _score_numpy(revenue, tenure_years, *thresholds)
+    return dict(zip(['years_active', 'revenue_5yr', 'consistency_rate', 'status', 'reason'], results))
@@ -0,0 +1,210 @@
+"""
+LOYALTY ANALYSIS - MULTI-CORE SCORING
+
+Purpose: Score an extract on several CPU cores. Every loyalty decision
+         depends only on the account's own row, so the de-duplicated extract
+         is split into partitions (by Account_ID hash or by Sub Segment),
+         each partition is cleaned, measured and classified in a worker
+         process, and the results are merged back in extract order. The
+         output table and summary are identical to a serial run.
+
+Usage:
+    python loyalty_analysis.py --workers 4 [--partition-by account|segment]
+
+Library use:
+    from loyalty_parallel import run_analysis_parallel
+    result = run_analysis_parallel(df, LOYALTY_CONFIG, workers=4)
+
+Notes:
+    - Partitions are sent to the workers by pickling, so the speed-up is
+      below the worker count; see `python loyalty_benchmark.py parallel`.
+    - Partitioning by segment keeps each segment in one worker, but large
+      segments make the partitions uneven.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from loyalty_analysis import (
+    LOYALTY_CONFIG, build_output, check_parsing, check_totals, drop_duplicate_accounts,
+    find_missing_columns, score_accounts, sort_output, summarize_results,
+)
+
+PARTITION_COLUMNS = {
+    'account': 'Account_ID',
+    'segment': 'Sub Segment',
+}
+
+# Scored columns summarize_results() needs; only these come back from workers
+SUMMARY_COLUMNS = ['loyalty_status', 'tenure_years', 'years_active', 'revenue_5yr']
+# Also returned when the config has segment_thresholds (same categories in
+# every partition, so the concatenation stays categorical)
+OPTIONAL_SUMMARY_COLUMNS = ['threshold_rule']
+
+# ============================================================================
+# PARTITIONING
+# ============================================================================
+
+def default_workers():
+    """Number of CPU cores available to this process."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+def assign_partitions(df, partitions, partition_by='account'):
+    """
+    Partition number for every row.
+
+    Rows are assigned by a stable hash of the key column, so the same
+    account (or segment) lands in the same partition on every run.
+
+    Args:
+        df: Extract rows
+        partitions: Number of partitions
+        partition_by: 'account' (Account_ID) or 'segment' (Sub Segment)
+
+    Returns:
+        numpy.ndarray: Partition number (0 to partitions - 1) per row
+
+    Raises:
+        ValueError: If partition_by is not recognized
+    """
+    if partition_by not in PARTITION_COLUMNS:
+        raise ValueError(f"partition_by must be one of {sorted(PARTITION_COLUMNS)}, got '{partition_by}'")
+    keys = df[PARTITION_COLUMNS[partition_by]].astype(str).to_numpy()
+    return (pd.util.hash_array(keys) % np.uint64(partitions)).astype('int64')
+
+def merge_cleaning_stats(stats_list):
+    """
+    Add up per-partition cleaning statistics.
+
+    Args:
+        stats_list: clean_data() statistics dicts
+
+    Returns:
+        dict: Statistics in the shape returned by clean_data()
+    """
+    merged = {
+        'negative_counts': {},
+        'date_formats': {},
+        'invalid_dates': 0,
+        'blank_dates': 0,
+        'inferred_count': 0,
+        'no_data': 0,
+    }
+    for stats in stats_list:
+        for year, count in stats['negative_counts'].items():
+            merged['negative_counts'][year] = merged['negative_counts'].get(year, 0) + count
+        for date_format, count in stats['date_formats'].items():
+            merged['date_formats'][date_format] = merged['date_formats'].get(date_format, 0) + count
+        for key in ('invalid_dates', 'blank_dates', 'inferred_count', 'no_data'):
+            merged[key] += stats[key]
+    return merged
+
+# ============================================================================
+# WORKER
+# ============================================================================
+
+def score_partition(task):
+    """
+    Score one partition (runs in a worker process).
+
+    Args:
+        task: (partition rows, config, analysis_timestamp, run
+              check_parsing()) tuple
+
+    Returns:
+        dict: Unsorted output rows, the SUMMARY_COLUMNS of the scored rows,
+        cleaning statistics and parsing checks (empty unless requested)
+    """
+    df, config, analysis_timestamp, check = task
+    scored, stats = score_accounts(df, config)
+    return {
+        'output': build_output(scored, config, analysis_timestamp, sort=False),
+        'scored': scored[SUMMARY_COLUMNS + [c for c in OPTIONAL_SUMMARY_COLUMNS if c in scored.columns]],
+        'cleaning': stats,
+        'parsing_checks': check_parsing(scored, config) if check else [],
+    }
+
+# ============================================================================
+# PIPELINE
+# ============================================================================
+
+def run_analysis_parallel(df, config=None, workers=None, partition_by='account', analysis_timestamp=None,
+                          order='full'):
+    """
+    Score a revenue extract in a process pool.
+
+    Args:
+        df: Raw extract; not modified
+        config: Loyalty config dict (defaults to LOYALTY_CONFIG)
+        workers: Worker processes (defaults to the available cores); 1
+                 scores the partitions in this process
+        partition_by: 'account' or 'segment'
+        analysis_timestamp: Value for the output analysis_timestamp column
+        order: Output row order, see sort_output()
+
+    Returns:
+        dict: Same keys as run_analysis(), with 'scored' holding only the
+        SUMMARY_COLUMNS, plus workers and partitions (rows per partition)
+
+    Raises:
+        ValueError: If required input columns are missing
+    """
+    if config is None:
+        config = LOYALTY_CONFIG
+    if workers is None:
+        workers = default_workers()
+    if analysis_timestamp is None:
+        analysis_timestamp = pd.Timestamp.now().strftime('%Y-%m-%d %H:%M:%S')
+
+    missing_columns = find_missing_columns(df, config)
+    if missing_columns:
+        raise ValueError(f"Missing required columns: {missing_columns}")
+
+    # Duplicates span partitions, so they are dropped before splitting
+    input_rows = len(df)
+    df, duplicates = drop_duplicate_accounts(df)
+    df = df.reset_index(drop=True)
+
+    partition_of_row = assign_partitions(df, workers, partition_by)
+    partitions = [df[partition_of_row == i] for i in range(workers)]
+    partitions = [part for part in partitions if len(part) > 0] or [df]
+
+    # The partition holding row 0 runs the parsing checks (the parsers themselves
+    # are tested in test_loyalty_analysis.py)
+    tasks = [(part, config, analysis_timestamp, 0 in part.index) for part in partitions]
+    if workers == 1:
+        results = [score_partition(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(score_partition, tasks))
+
+    # Row labels are extract positions: restoring them makes ties sort like a serial run
+    output_df = sort_output(pd.concat([r['output'] for r in results]).sort_index(), order)
+    scored = pd.concat([r['scored'] for r in results]).sort_index()
+
+    validation = check_totals(
+        len(scored), len(output_df),
+        int(output_df['loyalty_status'].isna().sum()),
+        scored['revenue_5yr'].sum(), output_df['revenue_5yr'].sum(),
+    )
+    for r in results:
+        validation += r['parsing_checks']
+
+    return {
+        'config': config,
+        'input_rows': input_rows,
+        'duplicates': duplicates,
+        'cleaning': merge_cleaning_stats(r['cleaning'] for r in results),
+        'scored': scored,
+        'output': output_df,
+        'summary': summarize_results(scored, config),
+        'validation': validation,
+        'workers': workers,
+        'partitions': [len(part) for part in partitions],
+    }
@@ -0,0 +1,139 @@
+"""
+LOYALTY ANALYSIS - STAGE TIMING AND MEMORY
+
+Purpose: Record how long each pipeline step takes and how much memory it
+         uses, so a slow quarterly run can be traced to CSV parsing, revenue
+         cleaning, date inference, sorting or writing.
+
+Usage:
+    python loyalty_analysis.py --profile                 # print the stage table
+    python loyalty_analysis.py --metrics-file json       # also save loyalty_metrics_*.json
+    python loyalty_analysis.py --profile --trace-memory  # add tracemalloc peaks (slower)
+
+Library use:
+    from loyalty_profiling import StageMetrics
+    metrics = StageMetrics()
+    result = run_analysis(df, LOYALTY_CONFIG, metrics=metrics)
+    print(metrics.format_table())
+
+Recorded per stage:
+    - wall_seconds / cpu_seconds: elapsed and process CPU time
+    - rows: rows the stage processed
+    - max_rss_mb: process peak resident memory so far (high-water mark;
+      not available on Windows)
+    - traced_peak_mb: peak Python/NumPy allocations during the stage, with
+      --trace-memory only (Arrow-backed strings are not traced)
+"""
+
+import json
+import os
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+METRIC_COLUMNS = ['stage', 'rows', 'wall_seconds', 'cpu_seconds', 'max_rss_mb', 'traced_peak_mb']
+
+def max_rss_mb():
+    """Process peak resident memory so far in MB (None where unsupported)."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / 1_000_000 if sys.platform == 'darwin' else peak / 1_000
+
+class StageMetrics:
+    """
+    Collects one record per pipeline stage.
+
+    Stages are timed with the stage() context manager. The record it yields
+    can be updated inside the block, e.g. to set rows once they are known.
+    """
+
+    def __init__(self, trace_memory=False):
+        self.trace_memory = trace_memory
+        self.records = []
+
+    @contextmanager
+    def stage(self, name, rows=None):
+        """
+        Time a block of work as one stage.
+
+        Args:
+            name: Stage name
+            rows: Rows processed (can also be set on the yielded record)
+
+        Yields:
+            dict: The stage record
+        """
+        record = {'stage': name, 'rows': rows}
+        started_tracing = self.trace_memory and not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        elif self.trace_memory:
+            tracemalloc.reset_peak()
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        try:
+            yield record
+        finally:
+            record['wall_seconds'] = time.perf_counter() - wall_start
+            record['cpu_seconds'] = time.process_time() - cpu_start
+            record['max_rss_mb'] = max_rss_mb()
+            record['traced_peak_mb'] = (tracemalloc.get_traced_memory()[1] / 1_000_000
+                                        if self.trace_memory else None)
+            if started_tracing:
+                tracemalloc.stop()
+            self.records.append(record)
+
+    def total_seconds(self):
+        return sum(record['wall_seconds'] for record in self.records)
+
+    def format_table(self):
+        """
+        Render the records as a console table.
+
+        Returns:
+            str: One line per stage plus a total
+        """
+        lines = [
+            f"  {'Stage':<22} {'Rows':>11} {'Wall s':>8} {'CPU s':>8} {'Max RSS MB':>11} {'Traced MB':>10}",
+            f"  {'-'*22} {'-'*11} {'-'*8} {'-'*8} {'-'*11} {'-'*10}",
+        ]
+        for record in self.records:
+            rows = f"{record['rows']:>11,}" if record['rows'] is not None else f"{'':>11}"
+            rss = f"{record['max_rss_mb']:>11.0f}" if record['max_rss_mb'] is not None else f"{'':>11}"
+            traced = f"{record['traced_peak_mb']:>10.1f}" if record['traced_peak_mb'] is not None else f"{'':>10}"
+            lines.append(f"  {record['stage']:<22} {rows} {record['wall_seconds']:>8.3f} "
+                         f"{record['cpu_seconds']:>8.3f} {rss} {traced}")
+        lines.append(f"  {'total':<22} {'':>11} {self.total_seconds():>8.3f}")
+        return "\n".join(lines)
+
+    def write(self, path, run_info=None):
+        """
+        Save the records as JSON or CSV (format from the extension).
+
+        Args:
+            path: .json or .csv destination
+            run_info: Extra run fields (input file, timestamp, ...); JSON
+                      stores them once, CSV repeats them on every row
+
+        Raises:
+            ValueError: If the extension is not .json or .csv
+        """
+        run_info = dict(run_info or {})
+        extension = os.path.splitext(path)[1].lower()
+        if extension == '.json':
+            payload = {**run_info, 'total_wall_seconds': self.total_seconds(), 'stages': self.records}
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(payload, f, indent=2)
+        elif extension == '.csv':
+            import pandas as pd
+            frame = pd.DataFrame(self.records, columns=METRIC_COLUMNS)
+            for i, (key, value) in enumerate(run_info.items()):
+                frame.insert(i, key, value)
+            frame.to_csv(path, index=False)
+        else:
+            raise ValueError(f"Metrics file must be .json or .csv, got '{extension}'")
@@ -0,0 +1,248 @@
+"""
+LOYALTY ANALYSIS - ACCOUNT QUERIES
+
+Purpose: Answer "who are the top accounts" questions from an output table
+         without sorting it. Top-K by revenue and the accounts nearest the
+         median revenue are found by partial selection (np.partition), which
+         only orders the K rows returned. Row positions per status and
+         Sub Segment are indexed once, so per-segment questions read only
+         that segment's rows. This is why `--sort loyal` or `--sort none`
+         output files lose nothing.
+
+Usage:
+    python loyalty_query.py top [-k 10] [--segment NAME | --by-segment] [--status STATUS] [--file FILE]
+    python loyalty_query.py median [-k 5] [--segment NAME | --by-segment] [--status STATUS] [--file FILE]
+    python loyalty_query.py segments [--status STATUS] [--file FILE]
+
+Library use:
+    from loyalty_query import AccountIndex
+    index = AccountIndex(result["output"])
+    index.top(10)                          # top 10 Loyal accounts by revenue
+    index.top(5, segment="Healthcare")     # top 5 Loyal accounts in a segment
+    index.nearest(index.median(), 5)       # 5 Loyal accounts nearest the median
+
+Ties are broken by position in the table, like DataFrame.nlargest()
+(keep='first'), so a file's row order only matters when revenues tie
+exactly.
+
+Requirements:
+    - pandas library
+    - A loyalty analysis output file (default: the most recent
+      loyalty_analysis_* in the current directory)
+"""
+
+import argparse
+import sys
+
+import numpy as np
+import pandas as pd
+
+from loyalty_analysis import STATUS_ORDER, status_codes
+
+# ============================================================================
+# PARTIAL SELECTION
+# ============================================================================
+
+def smallest_positions(keys, positions, k):
+    """
+    The k positions with the smallest keys, in key order.
+
+    Only rows tied with the k-th smallest key are sorted. The rest are
+    dropped after a linear-time np.partition.
+
+    Args:
+        keys: Sort key per candidate row
+        positions: Row position of each candidate (ties go to the lower)
+        k: Number of rows wanted
+
+    Returns:
+        numpy.ndarray: Up to k row positions
+    """
+    if k <= 0 or len(keys) == 0:
+        return positions[:0]
+    if k < len(keys):
+        kth = np.partition(keys, k - 1)[k - 1]
+        candidates = np.flatnonzero(keys <= kth)
+        keys, positions = keys[candidates], positions[candidates]
+    return positions[np.lexsort((positions, keys))[:k]]
+
+# ============================================================================
+# INDEX
+# ============================================================================
+
+class AccountIndex:
+    """
+    Row positions of an output table grouped by loyalty status and
+    Sub Segment, for top-K and near-median queries.
+
+    Building it takes one stable sort on small integer group keys, which
+    NumPy does in linear time.
+    """
+
+    def __init__(self, output_df):
+        self.table = output_df
+        self.revenue = output_df['revenue_5yr'].to_numpy(dtype='float64')
+        segments = pd.Categorical(output_df['sub_segment'].fillna('UNKNOWN'))
+        self.segments = list(segments.categories)
+
+        # Group key = status code x segment code; rows with a missing status
+        # get the last status slot
+        statuses = status_codes(output_df['loyalty_status']).astype('int32')
+        statuses[statuses < 0] = len(STATUS_ORDER)
+        group = statuses * len(self.segments) + segments.codes
+        if group.max(initial=0) < 2 ** 15:
+            # 16-bit keys get NumPy's linear-time radix sort
+            group = group.astype('int16')
+        self._positions = np.argsort(group, kind='stable')
+        self._bounds = np.searchsorted(group[self._positions],
+                                       np.arange((len(STATUS_ORDER) + 1) * len(self.segments) + 1))
+
+    def positions(self, status='Loyal', segment=None):
+        """
+        Row positions of a status (and optionally one segment), grouped by
+        segment and in table order within each.
+
+        Args:
+            status: Loyalty status
+            segment: Sub Segment name, or None for every segment
+
+        Returns:
+            numpy.ndarray: Row positions
+
+        Raises:
+            KeyError: If the status or segment is unknown
+        """
+        if status not in STATUS_ORDER:
+            raise KeyError(f"Unknown loyalty status '{status}' (expected one of: {', '.join(STATUS_ORDER)})")
+        first = STATUS_ORDER[status] * len(self.segments)
+        if segment is None:
+            # A status's segments are adjacent groups: one contiguous slice
+            return self._positions[self._bounds[first]:self._bounds[first + len(self.segments)]]
+        if segment not in self.segments:
+            raise KeyError(f"Unknown Sub Segment '{segment}'")
+        group = first + self.segments.index(segment)
+        return self._positions[self._bounds[group]:self._bounds[group + 1]]
+
+    def count(self, status='Loyal', segment=None):
+        """Number of accounts with a status (in a segment)."""
+        return len(self.positions(status, segment))
+
+    def top(self, k=10, status='Loyal', segment=None):
+        """
+        The k accounts with the highest revenue_5yr, highest first.
+
+        Returns:
+            DataFrame: Rows of the output table
+        """
+        positions = self.positions(status, segment)
+        return self.table.iloc[smallest_positions(-self.revenue[positions], positions, k)]
+
+    def median(self, status='Loyal', segment=None):
+        """Median revenue_5yr of a status (in a segment); NaN if it has no accounts."""
+        positions = self.positions(status, segment)
+        return float(np.median(self.revenue[positions])) if len(positions) else float('nan')
+
+    def nearest(self, revenue, k=5, status='Loyal', segment=None):
+        """
+        The k accounts whose revenue_5yr is closest to a value, closest first.
+
+        Returns:
+            DataFrame: Rows of the output table
+        """
+        positions = self.positions(status, segment)
+        distance = np.abs(self.revenue[positions] - revenue)
+        return self.table.iloc[smallest_positions(distance, positions, k)]
+
+    def by_segment(self, query, k, status='Loyal'):
+        """
+        Run top() or nearest-median per segment.
+
+        Args:
+            query: 'top' or 'median'
+            k: Accounts per segment
+            status: Loyalty status
+
+        Returns:
+            dict: Segment name → DataFrame, for segments with accounts
+        """
+        results = {}
+        for segment in self.segments:
+            if not self.count(status, segment):
+                continue
+            if query == 'top':
+                results[segment] = self.top(k, status, segment)
+            else:
+                results[segment] = self.nearest(self.median(status, segment), k, status, segment)
+        return results
+
+# ============================================================================
+# COMMAND LINE INTERFACE
+# ============================================================================
+
+def print_accounts(title, accounts):
+    from loyalty_summary_report import format_account
+
+    print(f"\n{title}")
+    print("-" * 70)
+    for i, (_, r) in enumerate(accounts.iterrows(), 1):
+        print(f"  {i:>2}. {format_account(r)}")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Top-K and near-median account queries on a loyalty analysis output file.")
+    parser.add_argument('query', choices=['top', 'median', 'segments'],
+                        help="top: highest revenue; median: nearest the median revenue; "
+                             "segments: account counts per segment")
+    parser.add_argument('-k', type=int, default=None,
+                        help="Accounts to list (default: 10 for top, 5 for median)")
+    parser.add_argument('--status', choices=list(STATUS_ORDER), default='Loyal')
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument('--segment', default=None, metavar='NAME', help="Only this Sub Segment")
+    group.add_argument('--by-segment', action='store_true', help="Answer once per Sub Segment")
+    parser.add_argument('--file', default=None,
+                        help="Analysis output file (default: most recent loyalty_analysis_*)")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    from loyalty_summary_report import find_latest_analysis_file, load_analysis
+
+    args = parse_args(argv)
+    input_file = args.file or find_latest_analysis_file()
+    if input_file is None:
+        print("ERROR: No loyalty_analysis_* output files found in current directory.")
+        return 1
+    print(f"Reading: {input_file}")
+    index = AccountIndex(load_analysis(input_file))
+
+    if args.query == 'segments':
+        print(f"\n{'Segment':<30} {args.status + ' accounts':>20} {'Median revenue':>16}")
+        print("-" * 70)
+        for segment in index.segments:
+            count = index.count(args.status, segment)
+            if count:
+                print(f"  {segment:<28} {count:>20,} ${index.median(args.status, segment):>14,.0f}")
+        return 0
+
+    k = args.k if args.k is not None else (10 if args.query == 'top' else 5)
+    try:
+        if args.by_segment:
+            for segment, accounts in index.by_segment(args.query, k, args.status).items():
+                print_accounts(f"{segment} ({index.count(args.status, segment):,} {args.status})", accounts)
+            return 0
+        if args.query == 'top':
+            accounts = index.top(k, args.status, args.segment)
+            title = f"TOP {k} {args.status.upper()} ACCOUNTS (by 5-year revenue)"
+        else:
+            median = index.median(args.status, args.segment)
+            accounts = index.nearest(median, k, args.status, args.segment)
+            title = f"{k} {args.status.upper()} ACCOUNTS NEAREST THE MEDIAN (${median:,.0f})"
+    except KeyError as e:
+        print(f"ERROR: {e.args[0]}")
+        return 1
+    if args.segment:
+        title += f" — {args.segment}"
+    print_accounts(title, accounts)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
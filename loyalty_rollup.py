@@ -0,0 +1,460 @@
+"""
+LOYALTY ANALYSIS - ACCOUNT ROLL-UP
+
+Purpose: Score linked accounts as one customer. Many customers buy through
+         several Account_IDs ("Wayfair, LLC" and its CASTLEGATE
+         sub-accounts, regional branches, marketplace storefronts). An
+         optional hierarchy file lists child → parent links. Accounts
+         connected through any chain of links form a group. A group's
+         yearly revenue is the sum of its members', its first order year
+         is the earliest member's, and tenure, consistency, 5-year revenue
+         and loyalty status are decided once per group, before any status
+         is assigned. Each member account then carries its group's status.
+
+         Groups are found with an array-based union-find. Each round hooks
+         the larger group label of every link onto the smaller one
+         (np.minimum.at), then pointer jumping points every account straight
+         at its group's label. Links inside one group drop out, and a few
+         rounds settle millions of links in well under a second. The
+         one-link-at-a-time union-find is kept as the reference and checked
+         against it on every run.
+
+Usage:
+    python loyalty_analysis.py --hierarchy account_hierarchy.csv
+    python loyalty_analysis.py --transactions orders.csv --hierarchy account_hierarchy.csv
+
+Library use:
+    from loyalty_rollup import load_hierarchy, run_analysis_rollup
+    links = load_hierarchy("account_hierarchy.csv")
+    result = run_analysis_rollup(df, links, LOYALTY_CONFIG)
+    result["output"]    # one row per group (customer_id = group ID)
+    result["members"]   # one row per account, with group_id and the group's status
+
+Hierarchy file (see HIERARCHY_COLUMNS):
+    Account_ID          - Child account
+    Parent_Account_ID   - Its parent (need not be in the extract)
+    Links with a blank ID on either side are skipped. A child listed under
+    two parents joins both parents' groups; cycles are harmless.
+
+Group rows:
+    - customer_id is the group's top-level parent: its first member that is
+      nobody's child (accounts in the extract come first, in extract order),
+      or its first member if every member is someone's child
+    - customer_name and sub_segment are the top-level parent's when it is
+      in the extract, otherwise those of the group's first account
+    - group_members counts the group's accounts in the extract
+    - accounts without links are groups of one and score as before
+
+Requirements:
+    - pandas library
+    - pyarrow library for Parquet/Feather hierarchy files
+"""
+
+import os
+from datetime import datetime
+
+# pandas and numpy are imported inside the functions that use them, so that
+# `loyalty_analysis.py --hierarchy ... --dry-run` checks the file without
+# loading them
+from loyalty_analysis import (
+    LOYALTY_CONFIG, build_output, check_parsing, check_totals, clean_data, drop_duplicate_accounts,
+    find_missing_columns, get_evaluation_years, score_metrics, sort_output, summarize_results,
+    timed_stage,
+)
+
+# Child and parent columns of the hierarchy file
+HIERARCHY_COLUMNS = ['Account_ID', 'Parent_Account_ID']
+
+# Links checked against the reference union-find during quality validation
+ROLLUP_CHECK_LINKS = 1000
+
+# ============================================================================
+# GROUPING
+# ============================================================================
+
+def union_find_groups(count, left, right):
+    """
+    Reference grouping: a union-find (union by size, path halving) that
+    joins one link at a time.
+
+    Args:
+        count: Number of nodes (0 .. count - 1)
+        left, right: Node pairs, one per link
+
+    Returns:
+        list: Group label per node, the smallest node of its group
+    """
+    parent = list(range(count))
+    size = [1] * count
+
+    def find(node):
+        while parent[node] != node:
+            parent[node] = parent[parent[node]]
+            node = parent[node]
+        return node
+
+    for a, b in zip(left, right):
+        a, b = find(a), find(b)
+        if a == b:
+            continue
+        if size[a] < size[b]:
+            a, b = b, a
+        parent[b] = a
+        size[a] += size[b]
+
+    smallest = {}
+    roots = [find(node) for node in range(count)]
+    for node, root in enumerate(roots):
+        smallest.setdefault(root, node)
+    return [smallest[root] for root in roots]
+
+def connected_groups(count, left, right):
+    """
+    Group label of every node of a link graph, with whole-array operations.
+
+    Same result as union_find_groups(). Each round costs one pass over the
+    links still joining two groups plus a few passes over the nodes; the
+    number of rounds grows with the logarithm of the longest chain.
+
+    Args:
+        count: Number of nodes (0 .. count - 1)
+        left, right: Node pairs, one per link (int arrays)
+
+    Returns:
+        numpy.ndarray: int64 group label per node, the smallest node of its
+        group
+    """
+    import numpy as np
+
+    labels = np.arange(count)
+    left = np.asarray(left, dtype='int64')
+    right = np.asarray(right, dtype='int64')
+    while len(left) > 0:
+        # Every label is a group's smallest node here; links inside one
+        # group are done with
+        a, b = labels[left], labels[right]
+        joining = a != b
+        left, right, a, b = left[joining], right[joining], a[joining], b[joining]
+        if len(left) == 0:
+            break
+        # Hook each group onto the smallest group linked to it. Labels only
+        # ever decrease, so no cycle can form
+        np.minimum.at(labels, np.maximum(a, b), np.minimum(a, b))
+        # Pointer jumping until every node points at its group's label
+        while True:
+            jumped = labels[labels]
+            if np.array_equal(jumped, labels):
+                break
+            labels = jumped
+    return labels
+
+def group_labels_match(left, right):
+    """
+    Check connected_groups() against union_find_groups() on a set of links.
+
+    Args:
+        left, right: Linked IDs (array-like, any values)
+
+    Returns:
+        bool: True if both put every ID in the same group
+    """
+    import numpy as np
+    import pandas as pd
+
+    left, right = np.asarray(left, dtype=object), np.asarray(right, dtype=object)
+    codes, nodes = pd.factorize(np.concatenate([left, right]))
+    left_nodes, right_nodes = codes[:len(left)], codes[len(left):]
+    expected = union_find_groups(len(nodes), left_nodes.tolist(), right_nodes.tolist())
+    return np.array_equal(connected_groups(len(nodes), left_nodes, right_nodes), expected)
+
+def account_groups(account_ids, links):
+    """
+    Group every extract account with the accounts linked to it.
+
+    IDs are matched as in loyalty_transactions.AccountRows, so 1001, 1001.0
+    and "1001" are the same account, while IDs above 2**53 that differ in
+    the last digits stay separate accounts.
+
+    Args:
+        account_ids: De-duplicated extract Account_IDs, in extract order
+        links: DataFrame with HIERARCHY_COLUMNS (child, parent)
+
+    Returns:
+        tuple: (int64 group per account, 0 .. groups - 1 in order of each
+        group's first account; group ID (top-level parent) per group;
+        position of the account whose Name and Sub Segment each group
+        takes; roll-up statistics)
+    """
+    import numpy as np
+    import pandas as pd
+    from loyalty_transactions import AccountRows
+
+    # Extract accounts are numbered first, in extract order, then the IDs
+    # only the links mention
+    nodes = AccountRows()
+    account_nodes = nodes.lookup(account_ids)
+    extract_nodes = len(nodes)
+
+    children, parents = links[HIERARCHY_COLUMNS[0]], links[HIERARCHY_COLUMNS[1]]
+    usable = (children.notna() & parents.notna()).to_numpy()
+    codes, linked_ids = pd.factorize(pd.concat([children[usable], parents[usable]], ignore_index=True))
+    link_nodes = nodes.lookup(linked_ids)[codes]
+    child_nodes, parent_nodes = np.split(link_nodes, 2)
+    labels = connected_groups(len(nodes), child_nodes, parent_nodes)
+
+    # A group's label is its smallest node, which is its first extract
+    # account when it has one
+    group_labels, group_index = np.unique(labels[account_nodes], return_inverse=True)
+
+    # Top-level parent: the first member that is nobody's child, else the
+    # first member
+    node_numbers = np.arange(len(nodes))
+    is_child = np.zeros(len(nodes), dtype=bool)
+    is_child[child_nodes] = True
+    rank = np.where(is_child, len(nodes) + node_numbers, node_numbers)
+    top_rank = rank.copy()
+    np.minimum.at(top_rank, labels, rank)
+    top_nodes = top_rank[group_labels] % max(len(nodes), 1)
+    group_ids = nodes.ids()[top_nodes]
+
+    first_position = np.full(extract_nodes, len(account_nodes))
+    np.minimum.at(first_position, account_nodes, np.arange(len(account_nodes)))
+    name_positions = first_position[np.where(top_nodes < extract_nodes, top_nodes, group_labels)]
+
+    sizes = np.bincount(group_index, minlength=len(group_labels))
+    stats = {
+        'links': len(links),
+        'blank_links': int((~usable).sum()),
+        'outside_ids': len(nodes) - extract_nodes,
+        'groups': len(group_labels),
+        'linked_groups': int((sizes > 1).sum()),
+        'linked_accounts': int(sizes[sizes > 1].sum()),
+        'largest_group': int(sizes.max(initial=0)),
+    }
+    return group_index, group_ids, name_positions, stats
+
+def load_hierarchy(path):
+    """
+    Read a hierarchy file's child → parent links.
+
+    Args:
+        path: CSV, Parquet or Feather file with HIERARCHY_COLUMNS
+
+    Returns:
+        DataFrame: The two ID columns, one row per link
+
+    Raises:
+        FileNotFoundError: If the file does not exist
+        ValueError: If a required column is missing
+    """
+    from loyalty_io import read_columns, read_table
+
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Hierarchy file '{path}' not found.")
+    missing_columns = [col for col in HIERARCHY_COLUMNS if col not in read_columns(path)]
+    if missing_columns:
+        raise ValueError(f"Hierarchy file lacks required columns: {missing_columns}")
+    return read_table(path, columns=HIERARCHY_COLUMNS)
+
+# ============================================================================
+# ROLL-UP
+# ============================================================================
+
+def roll_up(cleaned, links, config):
+    """
+    One row per account group, from cleaned accounts.
+
+    Args:
+        cleaned: Frame from clean_data() (Account_ID, Name, Sub Segment,
+                 first_order_year and revenue_{year})
+        links: DataFrame with HIERARCHY_COLUMNS
+        config: Loyalty config dict
+
+    Returns:
+        tuple: (group frame with Account_ID, Name, Sub Segment,
+        group_members, first_order_year and revenue_{year}; int64 group per
+        account; roll-up statistics)
+    """
+    import numpy as np
+    import pandas as pd
+
+    group_index, group_ids, name_positions, stats = account_groups(cleaned['Account_ID'], links)
+    num_groups = len(group_ids)
+    rolled = pd.DataFrame({
+        'Account_ID': group_ids,
+        'Name': cleaned['Name'].array.take(name_positions),
+        'Sub Segment': cleaned['Sub Segment'].array.take(name_positions),
+        'group_members': np.bincount(group_index, minlength=num_groups),
+    })
+
+    # Earliest first order year; NaN only if no member has one
+    first_order_years = np.full(num_groups, np.nan)
+    np.fmin.at(first_order_years, group_index,
+               cleaned['first_order_year'].to_numpy(dtype='float64', na_value=np.nan))
+    rolled['first_order_year'] = first_order_years
+    for year in get_evaluation_years(config):
+        rolled[f'revenue_{year}'] = np.bincount(
+            group_index, weights=cleaned[f'revenue_{year}'].to_numpy(dtype='float64'), minlength=num_groups)
+    return rolled, group_index, stats
+
+def build_member_output(members, scored, group_index, output_df, config, analysis_timestamp):
+    """
+    Member-level output rows.
+
+    Each account keeps its own tenure, years active, consistency and
+    revenue, gets its group's ID, and carries its group's loyalty status,
+    ineligibility reason and threshold rule set. Rows follow the group output's order, with a
+    group's members together in extract order.
+
+    Args:
+        members: Scored member accounts (score_metrics() on the cleaned extract)
+        scored: Scored groups from roll_up()
+        group_index: Group per member account
+        output_df: Group output table (sorted)
+        config: Loyalty config dict
+        analysis_timestamp: Value for the analysis_timestamp column
+
+    Returns:
+        DataFrame: build_output() columns plus group_id, one row per account
+    """
+    import numpy as np
+
+    member_output = build_output(members, config, analysis_timestamp, sort=False)
+    member_output.insert(1, 'group_id', scored['Account_ID'].to_numpy()[group_index])
+    for column in ['loyalty_status', 'ineligibility_reason', 'threshold_rule']:
+        if column in member_output.columns:
+            member_output[column] = scored[column].array.take(group_index)
+
+    group_rank = np.empty(len(scored), dtype='int64')
+    group_rank[output_df.index.to_numpy()] = np.arange(len(output_df))
+    return member_output.iloc[np.argsort(group_rank[group_index], kind='stable')]
+
+def member_output_filename(output_filename):
+    """loyalty_members_YYYYMMDD_HHMMSS.<ext> next to loyalty_analysis_YYYYMMDD_HHMMSS.<ext>."""
+    directory, name = os.path.split(output_filename)
+    return os.path.join(directory, name.replace('loyalty_analysis_', 'loyalty_members_', 1))
+
+# ============================================================================
+# VALIDATION
+# ============================================================================
+
+def check_rollup(members, scored, links):
+    """
+    Roll-up checks: every account in exactly one group with no revenue
+    lost, and the array union-find agreeing with the reference.
+
+    Args:
+        members: Scored member accounts
+        scored: Scored groups
+        links: Hierarchy links
+
+    Returns:
+        list: (passed, message) tuples
+    """
+    checks = []
+
+    # Check 7: Group members and revenue add up to the accounts
+    member_total = members['revenue_5yr'].sum()
+    group_total = scored['revenue_5yr'].sum()
+    grouped = int(scored['group_members'].sum())
+    if grouped != len(members) or abs(member_total - group_total) > 1:
+        checks.append((False, f"Roll-up mismatch (accounts: {len(members):,}, grouped: {grouped:,}; "
+                              f"revenue: ${member_total:,.2f} vs ${group_total:,.2f})"))
+    else:
+        checks.append((True, f"Roll-up validated: {len(members):,} accounts in {len(scored):,} groups"))
+
+    # Check 8: Array union-find agrees with the one-link-at-a-time reference
+    sample = links.dropna().head(ROLLUP_CHECK_LINKS)
+    if not group_labels_match(sample[HIERARCHY_COLUMNS[0]], sample[HIERARCHY_COLUMNS[1]]):
+        checks.append((False, f"Array union-find disagrees with union_find_groups"))
+    else:
+        checks.append((True, f"Account grouping validated against union-find ({len(sample):,} links)"))
+    return checks
+
+# ============================================================================
+# PIPELINE
+# ============================================================================
+
+def run_analysis_rollup(df, links, config=None, analysis_timestamp=None, metrics=None, order='full'):
+    """
+    run_analysis() with linked accounts scored as one customer.
+
+    Args:
+        df: Raw extract; not modified
+        links: Hierarchy links from load_hierarchy()
+        config: Loyalty config dict (defaults to LOYALTY_CONFIG)
+        analysis_timestamp: Value for the output analysis_timestamp column
+        metrics: Optional loyalty_profiling.StageMetrics
+        order: Output row order, see sort_output()
+
+    Returns:
+        dict: Same keys as run_analysis(), 'scored' and 'output' being one
+        row per group, plus members (member-level output rows) and rollup
+        (statistics)
+
+    Raises:
+        ValueError: If required input columns are missing
+    """
+    if config is None:
+        config = LOYALTY_CONFIG
+    if analysis_timestamp is None:
+        analysis_timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+    missing_columns = find_missing_columns(df, config)
+    if missing_columns:
+        raise ValueError(f"Missing required columns: {missing_columns}")
+
+    input_rows = len(df)
+    with timed_stage(metrics, 'dedupe', input_rows):
+        df, duplicates = drop_duplicate_accounts(df)
+    members, cleaning_stats = clean_data(df, config, metrics)
+    with timed_stage(metrics, 'rollup', len(members)):
+        rolled, group_index, rollup_stats = roll_up(members, links, config)
+    with timed_stage(metrics, 'score_metrics', len(rolled) + len(members)):
+        scored = score_metrics(rolled, config)
+        # Members' own figures, for the member rows
+        members = score_metrics(members, config)
+    with timed_stage(metrics, 'build_output', len(scored)):
+        output_df = build_output(scored, config, analysis_timestamp, sort=False)
+        output_df.insert(len(output_df.columns) - 1, 'group_members', scored['group_members'])
+    with timed_stage(metrics, 'sort', len(output_df)):
+        output_df = sort_output(output_df, order)
+    with timed_stage(metrics, 'member_output', len(members)):
+        member_output = build_member_output(members, scored, group_index, output_df, config,
+                                            analysis_timestamp)
+    with timed_stage(metrics, 'summary', len(scored)):
+        summary = summarize_results(scored, config)
+    with timed_stage(metrics, 'validate', len(members)):
+        validation = check_totals(
+            len(scored), len(output_df),
+            int(output_df['loyalty_status'].isna().sum()),
+            scored['revenue_5yr'].sum(), output_df['revenue_5yr'].sum(),
+        ) + check_parsing(members, config) + check_rollup(members, scored, links)
+
+    return {
+        'config': config,
+        'input_rows': input_rows,
+        'duplicates': duplicates,
+        'cleaning': cleaning_stats,
+        'rollup': rollup_stats,
+        'scored': scored,
+        'output': output_df,
+        'members': member_output,
+        'summary': summary,
+        'validation': validation,
+    }
+
+def print_rollup_report(result):
+    stats = result['rollup']
+    print("\nRolling up linked accounts...")
+    print(f"  • {stats['links']:,} links read")
+    if stats['blank_links'] > 0:
+        print(f"  • {stats['blank_links']:,} links with a blank Account_ID skipped")
+    if stats['outside_ids'] > 0:
+        print(f"  • {stats['outside_ids']:,} linked IDs not in the extract (they connect groups and can be a group's ID)")
+    if stats['linked_groups'] > 0:
+        print(f"✓ {stats['linked_accounts']:,} accounts rolled up into {stats['linked_groups']:,} groups "
+              f"(largest: {stats['largest_group']:,} accounts)")
+    else:
+        print(f"✓ No two accounts in the extract are linked")
+    print(f"  • {stats['groups']:,} customers scored from {len(result['members']):,} accounts")
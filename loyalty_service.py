@@ -0,0 +1,411 @@
+"""
+LOYALTY ANALYSIS - ACCOUNT LOOKUP SERVICE
+
+Purpose: Answer "is account X loyal, and why?" between quarterly runs without
+         re-running the batch script. The service scores the extract once
+         with run_analysis(), keeps every account's output row in memory
+         indexed by Account_ID, and answers single and batch lookups over
+         HTTP on this machine. A reload scores the new extract while lookups
+         are still answered from the previous scoring, then swaps it in.
+
+Usage:
+    python loyalty_service.py [--input FILE] [--host 127.0.0.1] [--port 8765]
+                              [--cache [DIR]] [--log-requests]
+
+Endpoints (JSON):
+    GET  /accounts/<Account_ID>       One account (404 if unknown)
+    GET  /accounts?ids=ID,ID,...      Several accounts
+    POST /accounts  {"ids": [...]}    Several accounts
+    GET  /status                      Extract, evaluation window, account counts
+    POST /reload    {"input": FILE}   Re-read loyalty_config.py and score FILE
+                                      (default: the extract already loaded)
+
+Example:
+    curl localhost:8765/accounts/1004318
+    curl -X POST localhost:8765/reload -d '{"input": "customer_annual_revenue_q2.csv"}'
+
+Library use:
+    from loyalty_service import score_extract
+    table = score_extract("customer_annual_revenue.csv")
+    table.lookup("1004318")    # output row as a dict, or None
+
+Requirements:
+    - pandas library
+    - pyarrow library (with --cache only)
+"""
+
+import argparse
+import json
+import sys
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from loyalty_analysis import INPUT_FILE, LOYALTY_CONFIG, STATUS_ORDER, get_evaluation_years, validate_config
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+# Largest batch answered in one request
+MAX_BATCH = 100_000
+
+# ============================================================================
+# IN-MEMORY ACCOUNT TABLE
+# ============================================================================
+
+class AccountTable:
+    """
+    The output rows of one scoring, looked up by Account_ID.
+
+    Numbers are kept as NumPy columns and text as codes into its distinct
+    values, so a million accounts take about as much memory as the output
+    DataFrame. Account_IDs are matched as text, as they arrive in a URL.
+    """
+
+    def __init__(self, output_df, info=None):
+        import pandas as pd
+
+        self.columns = [column for column in output_df.columns if column != 'analysis_timestamp']
+        # (column, values, None) for numbers, (column, codes, distinct values) for text
+        self._columns = []
+        for column in self.columns:
+            values = output_df[column]
+            if pd.api.types.is_numeric_dtype(values.dtype) and not isinstance(values.dtype, pd.CategoricalDtype):
+                self._columns.append((column, values.to_numpy(), None))
+            else:
+                codes, uniques = pd.factorize(values)
+                self._columns.append((column, codes, [str(value) for value in uniques]))
+        ids = output_df['customer_id'].astype(str).tolist()
+        self._positions = dict(zip(ids, range(len(ids))))
+        self.info = dict(info or {})
+
+        _, codes, statuses = self._columns[self.columns.index('loyalty_status')]
+        counts = dict.fromkeys(STATUS_ORDER, 0)
+        for code, status in enumerate(statuses):
+            counts[status] = int((codes == code).sum())
+        self.status_counts = counts
+
+    def __len__(self):
+        return len(self._positions)
+
+    def _record(self, position):
+        record = {}
+        for column, data, labels in self._columns:
+            if labels is None:
+                value = data[position].item()
+                record[column] = None if value != value else value    # NaN → null
+            else:
+                code = data[position]
+                record[column] = labels[code] if code >= 0 else None
+        return record
+
+    def lookup(self, account_id):
+        """
+        One account's output row.
+
+        Args:
+            account_id: Account_ID (int or text)
+
+        Returns:
+            dict or None: Column → value, or None if the account is unknown
+        """
+        position = self._positions.get(str(account_id).strip())
+        return None if position is None else self._record(position)
+
+    def lookup_many(self, account_ids):
+        """
+        Several accounts' output rows.
+
+        Args:
+            account_ids: Account_IDs
+
+        Returns:
+            tuple: (list of rows found, in request order; list of unknown IDs)
+        """
+        found, missing = [], []
+        for account_id in account_ids:
+            position = self._positions.get(str(account_id).strip())
+            if position is None:
+                missing.append(account_id)
+            else:
+                found.append(self._record(position))
+        return found, missing
+
+    def status(self):
+        """What is loaded: the table's info plus account and status counts."""
+        return {**self.info, 'accounts': len(self), 'status_counts': self.status_counts}
+
+def score_extract(path, config=None, cache_dir=None):
+    """
+    Score an extract and index the result for lookups.
+
+    Args:
+        path: Revenue extract
+        config: Loyalty config dict (defaults to LOYALTY_CONFIG)
+        cache_dir: Reuse loyalty_cache entries from this directory (None: no cache)
+
+    Returns:
+        AccountTable
+
+    Raises:
+        FileNotFoundError: If the extract does not exist
+        ValueError: If required input columns are missing
+    """
+    if config is None:
+        config = LOYALTY_CONFIG
+    start = time.perf_counter()
+    if cache_dir:
+        from loyalty_cache import load_cleaned_extract, run_analysis_cached
+        cleaned, info = load_cleaned_extract(path, config, cache_dir)
+        result = run_analysis_cached(cleaned, info, config, order='none')
+    else:
+        from loyalty_analysis import load_revenue_extract, run_analysis
+        result = run_analysis(load_revenue_extract(path), config, order='none')
+    years = get_evaluation_years(config)
+    analysis_timestamp = result['output']['analysis_timestamp']
+    info = {
+        'input_file': path,
+        'evaluation_window': f"{years[0]}-{years[-1]}",
+        'analysis_timestamp': str(analysis_timestamp.iloc[0]) if len(analysis_timestamp) else None,
+        'duplicates': result['duplicates'],
+    }
+    table = AccountTable(result['output'], info)
+    table.info['load_seconds'] = round(time.perf_counter() - start, 3)
+    return table
+
+def read_config():
+    """
+    Re-read loyalty_config.py, which may have changed since start-up.
+
+    Returns:
+        dict: LOYALTY_CONFIG
+
+    Raises:
+        ValueError: If the config is not valid
+    """
+    import importlib
+
+    import loyalty_config
+
+    importlib.reload(loyalty_config)
+    config = loyalty_config.LOYALTY_CONFIG
+    problems = validate_config(config, getattr(loyalty_config, 'EVALUATION_YEARS', None))
+    if problems:
+        raise ValueError("loyalty_config.py is not valid: " + "; ".join(problems))
+    return config
+
+# ============================================================================
+# SERVICE
+# ============================================================================
+
+class LookupService:
+    """
+    The current AccountTable, replaced as a whole on reload.
+
+    Requests read self.table once and use that table throughout, so a
+    reload that finishes mid-request never mixes two scorings. Only one
+    reload runs at a time.
+    """
+
+    def __init__(self, table, input_path, cache_dir=None):
+        self.table = table
+        self.input_path = input_path
+        self.cache_dir = cache_dir
+        self.generation = 1
+        self.started_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        self._reload_lock = threading.Lock()
+
+    def reload(self, input_path=None):
+        """
+        Score an extract (default: the current one) and swap it in.
+
+        Returns:
+            dict: Status of the new table
+
+        Raises:
+            RuntimeError: If another reload is running
+            FileNotFoundError, ValueError: If the extract or config is
+                unusable; the current table stays in place
+        """
+        if not self._reload_lock.acquire(blocking=False):
+            raise RuntimeError("A reload is already running")
+        try:
+            input_path = input_path or self.input_path
+            table = score_extract(input_path, read_config(), self.cache_dir)
+            self.table = table
+            self.input_path = input_path
+            self.generation += 1
+        finally:
+            self._reload_lock.release()
+        return self.status()
+
+    def status(self):
+        return {
+            **self.table.status(),
+            'generation': self.generation,
+            'reloading': self._reload_lock.locked(),
+            'started_at': self.started_at,
+        }
+
+class LookupHandler(BaseHTTPRequestHandler):
+    """JSON endpoints of the lookup service (see the module docstring)."""
+
+    # Keep-alive, so a client making many lookups pays for one connection;
+    # without TCP_NODELAY each response waits ~40 ms for a delayed ACK
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    log_requests = False
+
+    def log_message(self, format, *args):
+        if self.log_requests:
+            super().log_message(format, *args)
+
+    def send_json(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def read_json(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if not length:
+            return {}
+        payload = json.loads(self.rfile.read(length))
+        if not isinstance(payload, dict):
+            raise ValueError("Request body must be a JSON object")
+        return payload
+
+    def send_batch(self, table, ids):
+        if len(ids) > MAX_BATCH:
+            self.send_json(400, {'error': f"At most {MAX_BATCH:,} ids per request"})
+            return
+        found, missing = table.lookup_many(ids)
+        self.send_json(200, {'accounts': found, 'not_found': missing})
+
+    def do_GET(self):
+        service = self.server.service
+        table = service.table
+        url = urlsplit(self.path)
+        if url.path.startswith('/accounts/'):
+            account_id = url.path[len('/accounts/'):]
+            record = table.lookup(account_id)
+            if record is None:
+                self.send_json(404, {'error': f"Unknown Account_ID '{account_id}'"})
+            else:
+                self.send_json(200, record)
+        elif url.path == '/accounts':
+            ids = [account_id for value in parse_qs(url.query).get('ids', [])
+                   for account_id in value.split(',') if account_id]
+            self.send_batch(table, ids)
+        elif url.path == '/status':
+            self.send_json(200, service.status())
+        else:
+            self.send_json(404, {'error': f"Unknown path '{url.path}'"})
+
+    def do_POST(self):
+        service = self.server.service
+        path = urlsplit(self.path).path
+        try:
+            payload = self.read_json()
+        except ValueError as e:
+            self.send_json(400, {'error': f"Invalid JSON body: {e}"})
+            return
+        if path == '/accounts':
+            ids = payload.get('ids')
+            if not isinstance(ids, list):
+                self.send_json(400, {'error': 'Expected {"ids": [...]}'})
+                return
+            self.send_batch(service.table, ids)
+        elif path == '/reload':
+            try:
+                self.send_json(200, service.reload(payload.get('input')))
+            except RuntimeError as e:
+                self.send_json(409, {'error': str(e)})
+            except Exception as e:
+                self.send_json(400, {'error': f"Reload failed, previous extract still served: {e}"})
+        else:
+            self.send_json(404, {'error': f"Unknown path '{path}'"})
+
+def make_server(service, host=DEFAULT_HOST, port=DEFAULT_PORT, log_requests=False):
+    """
+    An HTTP server for a LookupService (not yet serving).
+
+    Args:
+        service: LookupService
+        host: Interface to listen on (default: this machine only)
+        port: TCP port (0 picks a free one)
+        log_requests: Log every request to stderr
+
+    Returns:
+        ThreadingHTTPServer: Call serve_forever() to start it
+    """
+    handler = type('LookupHandler', (LookupHandler,), {'log_requests': log_requests})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    server.service = service
+    return server
+
+# ============================================================================
+# COMMAND LINE INTERFACE
+# ============================================================================
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Serve loyalty status lookups by Account_ID from an in-memory scoring.")
+    parser.add_argument('--input', default=INPUT_FILE,
+                        help=f"Revenue extract to score (default: {INPUT_FILE})")
+    parser.add_argument('--host', default=DEFAULT_HOST,
+                        help=f"Interface to listen on (default: {DEFAULT_HOST}, this machine only)")
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT,
+                        help=f"Port to listen on (default: {DEFAULT_PORT})")
+    parser.add_argument('--cache', nargs='?', const='.loyalty_cache', default=None, metavar='DIR',
+                        help="Reuse the cleaned-input cache when scoring (requires pyarrow)")
+    parser.add_argument('--log-requests', action='store_true', help="Log every request to stderr")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    try:
+        config = read_config()
+    except ImportError:
+        print("ERROR: loyalty_config.py not found in current directory.")
+        return 1
+    except ValueError as e:
+        print(f"ERROR: {e}")
+        return 1
+
+    print(f"Scoring {args.input}...")
+    try:
+        table = score_extract(args.input, config, args.cache)
+    except FileNotFoundError:
+        print(f"ERROR: Input file '{args.input}' not found.")
+        return 1
+    except Exception as e:
+        print(f"ERROR: Failed to score {args.input}: {e}")
+        return 1
+    counts = ", ".join(f"{count:,} {status}" for status, count in table.status_counts.items())
+    print(f"✓ {len(table):,} accounts in memory ({counts}) in {table.info['load_seconds']:.1f}s")
+
+    try:
+        server = make_server(LookupService(table, args.input, args.cache), args.host, args.port,
+                             args.log_requests)
+    except OSError as e:
+        print(f"ERROR: Cannot listen on {args.host}:{args.port} ({e})")
+        return 1
+    print(f"✓ Serving on http://{args.host}:{server.server_address[1]}/ (Ctrl+C to stop)")
+    print(f"  • GET /accounts/<Account_ID>, GET /accounts?ids=..., POST /accounts, "
+          f"GET /status, POST /reload")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nStopped.")
+    finally:
+        server.server_close()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
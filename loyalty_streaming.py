@@ -0,0 +1,285 @@
+"""
+LOYALTY ANALYSIS - CHUNKED (STREAMING) SCORING
+
+Purpose: Score revenue extracts that are too large to load into memory at once.
+         Loyalty is decided per account, so the extract is read in chunks,
+         each chunk is scored and appended to the output file, and the
+         summary statistics are accumulated as we go.
+
+Usage:
+    python loyalty_analysis.py --chunksize 250000
+
+Library use:
+    from loyalty_streaming import run_analysis_chunked
+    result = run_analysis_chunked("customer_annual_revenue.csv",
+                                  "loyalty_analysis_20250331_091534.csv",
+                                  LOYALTY_CONFIG, chunksize=250000)
+
+Notes:
+    - Output rows are written in input order, not sorted by status/revenue.
+    - Duplicate Account_IDs are dropped across chunk boundaries: the first
+      occurrence in file order is kept, same as the in-memory run.
+    - Memory stays proportional to the chunk size plus ~16 bytes per account
+      (seen Account_IDs and revenue_5yr for the exact median).
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from loyalty_io import ChunkedOutputWriter, iter_chunks
+from loyalty_analysis import (
+    LOYALTY_CONFIG, STATUS_ORDER, account_id_keys, build_output, check_parsing, check_totals,
+    find_missing_columns, get_evaluation_years, rule_status_counts, score_accounts,
+)
+
+DEFAULT_CHUNKSIZE = 250_000
+
+# ============================================================================
+# DUPLICATE TRACKING ACROSS CHUNKS
+# ============================================================================
+
+class SeenAccounts:
+    """
+    Remembers every Account_ID already scored so later duplicates are dropped.
+
+    IDs are keyed with account_id_keys(), so an ID is a duplicate exactly
+    when drop_duplicate_accounts() would call it one. Integer keys (the
+    normal case) are kept in one sorted int64 array and looked up with
+    searchsorted; anything else (strings, blanks) goes in a set.
+    """
+
+    def __init__(self):
+        self._ids = np.empty(0, dtype='int64')
+        self._other = set()
+
+    def __len__(self):
+        return len(self._ids) + len(self._other)
+
+    def first_occurrences(self, account_ids):
+        """
+        Flag rows whose Account_ID has not been seen in this or any earlier chunk.
+
+        Args:
+            account_ids: Account_ID Series for one chunk
+
+        Returns:
+            numpy.ndarray: Boolean keep-mask aligned with the chunk
+        """
+        keep = ~account_ids.duplicated(keep='first').to_numpy()
+        is_integer, integer_ids, other_keys = account_id_keys(account_ids)
+
+        # Integer IDs: binary search in the sorted array of seen IDs
+        if len(self._ids) > 0:
+            positions = np.searchsorted(self._ids, integer_ids).clip(max=len(self._ids) - 1)
+            seen = self._ids[positions] == integer_ids
+            keep[np.flatnonzero(is_integer)[seen]] = False
+
+        # Everything else: plain set membership
+        other_rows = np.flatnonzero(~is_integer)
+        for row, key in zip(other_rows, other_keys):
+            if key in self._other:
+                keep[row] = False
+
+        # Remember the new IDs (the concatenation of two sorted runs sorts in linear time)
+        new_ids = integer_ids[keep[is_integer]]
+        if len(new_ids) > 0:
+            self._ids = np.sort(np.concatenate([self._ids, np.sort(new_ids)]), kind='stable')
+        self._other.update(key for row, key in zip(other_rows, other_keys) if keep[row])
+        return keep
+
+# ============================================================================
+# INCREMENTAL SUMMARY STATISTICS
+# ============================================================================
+
+class RunningSummary:
+    """
+    Accumulates the run summary, cleaning statistics and validation totals
+    chunk by chunk, producing the same dicts as run_analysis().
+    """
+
+    def __init__(self, config):
+        self.years = get_evaluation_years(config)
+        self.total_customers = 0
+        self.status_counts = {status: 0 for status in STATUS_ORDER}
+        self.tenure_min = np.nan
+        self.tenure_max = np.nan
+        self.years_active_counts = np.zeros(len(self.years) + 1, dtype='int64')
+        self.total_revenue = 0.0
+        self.loyal_revenue = 0.0
+        self.revenue_5yr = []
+        self.negative_counts = {year: 0 for year in self.years}
+        self.date_formats = {}
+        self.invalid_dates = 0
+        self.blank_dates = 0
+        self.inferred_count = 0
+        self.no_data = 0
+        self.output_rows = 0
+        self.null_status = 0
+        self.output_revenue = 0.0
+        # Per rule set status counts, only with segment_thresholds
+        self.rule_counts = None
+
+    def add(self, scored, stats, output_chunk):
+        """Fold one scored chunk (and its output rows) into the totals."""
+        self.total_customers += len(scored)
+        for status, count in scored['loyalty_status'].value_counts().items():
+            self.status_counts[status] = self.status_counts.get(status, 0) + int(count)
+
+        self.tenure_min = np.nanmin([self.tenure_min, scored['tenure_years'].min()])
+        self.tenure_max = np.nanmax([self.tenure_max, scored['tenure_years'].max()])
+        self.years_active_counts += np.bincount(
+            scored['years_active'].to_numpy(dtype='int64'), minlength=len(self.years) + 1)
+
+        revenue = scored['revenue_5yr'].to_numpy(dtype='float64')
+        self.revenue_5yr.append(revenue)
+        self.total_revenue += revenue.sum()
+        self.loyal_revenue += revenue[(scored['loyalty_status'] == 'Loyal').to_numpy()].sum()
+        if 'threshold_rule' in scored.columns:
+            chunk_counts = rule_status_counts(scored['threshold_rule'], scored['loyalty_status'])
+            if self.rule_counts is None:
+                self.rule_counts = chunk_counts
+            else:
+                for rule, counts in chunk_counts.items():
+                    for status, count in counts.items():
+                        self.rule_counts[rule][status] += count
+
+        for year, count in stats['negative_counts'].items():
+            self.negative_counts[year] += count
+        for date_format, count in stats['date_formats'].items():
+            self.date_formats[date_format] = self.date_formats.get(date_format, 0) + count
+        self.invalid_dates += stats['invalid_dates']
+        self.blank_dates += stats['blank_dates']
+        self.inferred_count += stats['inferred_count']
+        self.no_data += stats['no_data']
+
+        self.output_rows += len(output_chunk)
+        self.null_status += int(output_chunk['loyalty_status'].isna().sum())
+        self.output_revenue += output_chunk['revenue_5yr'].sum()
+
+    def cleaning(self):
+        """Cleaning statistics in the shape returned by clean_data()."""
+        return {
+            'negative_counts': dict(self.negative_counts),
+            'date_formats': dict(self.date_formats),
+            'invalid_dates': self.invalid_dates,
+            'blank_dates': self.blank_dates,
+            'inferred_count': self.inferred_count,
+            'no_data': self.no_data,
+        }
+
+    def summary(self):
+        """Run summary in the shape returned by summarize_results()."""
+        revenue = np.concatenate(self.revenue_5yr) if self.revenue_5yr else np.empty(0)
+        loyal_count = self.status_counts.get('Loyal', 0)
+        non_loyal_count = self.total_customers - loyal_count
+        summary = {
+            'total_customers': self.total_customers,
+            'status_counts': dict(self.status_counts),
+            'tenure_min': self.tenure_min,
+            'tenure_max': self.tenure_max,
+            'years_active_distribution': {
+                i: int(count) for i, count in enumerate(self.years_active_counts)
+            },
+            'total_revenue': self.total_revenue,
+            'mean_revenue': self.total_revenue / self.total_customers if self.total_customers else np.nan,
+            'median_revenue': np.median(revenue) if len(revenue) else np.nan,
+            'loyal_revenue': self.loyal_revenue,
+            'avg_revenue_loyal': self.loyal_revenue / loyal_count if loyal_count else np.nan,
+            'avg_revenue_non_loyal': (
+                (self.total_revenue - self.loyal_revenue) / non_loyal_count if non_loyal_count else np.nan
+            ),
+        }
+        if self.rule_counts is not None:
+            summary['rule_counts'] = self.rule_counts
+        return summary
+
+    def validation(self):
+        """Record-count, null-status and revenue-total checks over all chunks."""
+        return check_totals(self.total_customers, self.output_rows, self.null_status,
+                            self.total_revenue, self.output_revenue)
+
+# ============================================================================
+# PIPELINE
+# ============================================================================
+
+def run_analysis_chunked(input_path, output_path, config=None, chunksize=DEFAULT_CHUNKSIZE,
+                         analysis_timestamp=None, float_format='shortest'):
+    """
+    Score a revenue extract chunk by chunk, appending to the output file.
+
+    Args:
+        input_path: Revenue extract (.csv, .parquet or .feather)
+        output_path: Output .csv (.csv.gz, .csv.zst) or .parquet to create
+                     (overwritten if it exists)
+        config: Loyalty config dict (defaults to LOYALTY_CONFIG)
+        chunksize: Rows read per chunk
+        analysis_timestamp: Value for the output analysis_timestamp column
+        float_format: CSV only: 'shortest' or 'fixed' (see loyalty_io.csv_lines())
+
+    Returns:
+        dict: Same keys as run_analysis() except 'scored' and 'output', plus
+        output_file, output_rows, output_columns and chunks
+
+    Raises:
+        FileNotFoundError: If the input file does not exist
+        ValueError: If required input columns are missing
+    """
+    if config is None:
+        config = LOYALTY_CONFIG
+    if not os.path.exists(input_path):
+        raise FileNotFoundError(f"Input file '{input_path}' not found.")
+    if analysis_timestamp is None:
+        analysis_timestamp = pd.Timestamp.now().strftime('%Y-%m-%d %H:%M:%S')
+
+    seen = SeenAccounts()
+    running = RunningSummary(config)
+    input_rows = 0
+    duplicates = 0
+    chunks = 0
+    output_columns = 0
+    parsing_checks = []
+
+    writer = ChunkedOutputWriter(output_path, float_format)
+    try:
+        for chunk in iter_chunks(input_path, chunksize):
+            if chunks == 0:
+                missing_columns = find_missing_columns(chunk, config)
+                if missing_columns:
+                    raise ValueError(f"Missing required columns: {missing_columns}")
+            chunks += 1
+            input_rows += len(chunk)
+
+            keep = seen.first_occurrences(chunk['Account_ID'])
+            duplicates += int((~keep).sum())
+            chunk = chunk[keep]
+            if chunk.empty:
+                continue
+
+            scored, stats = score_accounts(chunk, config)
+            output_chunk = build_output(scored, config, analysis_timestamp, sort=False)
+            first_write = running.output_rows == 0
+            writer.write(output_chunk)
+            output_columns = len(output_chunk.columns)
+
+            # The parsing checks run on the first chunk (the parsers themselves
+            # are tested in test_loyalty_analysis.py)
+            if first_write:
+                parsing_checks = check_parsing(scored, config)
+            running.add(scored, stats, output_chunk)
+    finally:
+        writer.close()
+
+    return {
+        'config': config,
+        'input_rows': input_rows,
+        'duplicates': duplicates,
+        'cleaning': running.cleaning(),
+        'summary': running.summary(),
+        'validation': running.validation() + parsing_checks,
+        'output_file': output_path,
+        'output_rows': running.output_rows,
+        'output_columns': output_columns,
+        'chunks': chunks,
+    }
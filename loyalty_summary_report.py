@@ -1,155 +1,435 @@
 """
 LOYALTY ANALYSIS - EXECUTIVE SUMMARY REPORT
 
-Purpose: Generate high-level summary statistics from a loyalty analysis output CSV.
+Purpose: Generate high-level summary statistics from a loyalty analysis output file.
          Produces counts, revenue breakdowns, top accounts, segment analysis,
          and disqualification reasons suitable for executive reporting.
 
 Usage:
-    python loyalty_summary_report.py
+    python loyalty_summary_report.py [FILE] [--recompute]
+
+Library use:
+    from loyalty_summary_report import build_summary, format_report
+    print(format_report(build_summary(output_df), "in-memory run"))
+
+Summary sidecar:
+    loyalty_analysis.py also writes loyalty_analysis_*.summary.json next to
+    each output file, holding every figure of the report (a few KB). The
+    report reads it instead of the output file when it matches that file's
+    size, so it renders instantly however many accounts were scored.
+    Otherwise (older outputs, streaming runs, --recompute) the figures are
+    computed from the output file. The sidecar also keeps the run's
+    analysis_timestamp, which is the only place it is recorded when the
+    output was written with --timestamp sidecar.
 
 Requirements:
     - Python 3.7+
     - pandas library
-    - A loyalty analysis output file (loyalty_analysis_*.csv) in the same directory.
-      Uses the most recent file by timestamp if multiple exist.
+    - A loyalty analysis output file (loyalty_analysis_*.csv, .csv.gz,
+      .csv.zst, .parquet or .feather) in the same directory. Uses the most
+      recent file by timestamp if multiple exist. Parquet/Feather and
+      compressed CSV need the pyarrow library.
 
 Output:
     - Console summary of loyalty program results
 """
 
-import pandas as pd
+import argparse
 import glob
-import sys
+import json
 import os
+import sys
+
+# pandas is imported only when an output file has to be read; reports served
+# from a summary sidecar start without it
+
+STATUSES = ["Loyal", "Not Qualified", "Ineligible"]
+
+ANALYSIS_EXTENSIONS = [".csv", ".csv.gz", ".csv.zst", ".parquet", ".feather"]
+
+# Columns needed by build_summary()
+REPORT_COLUMNS = [
+    "customer_id", "customer_name", "sub_segment", "loyalty_status",
+    "tenure_years", "years_active_in_window", "revenue_5yr", "ineligibility_reason",
+]
+
+# Read as well when present (runs with segment_thresholds)
+OPTIONAL_REPORT_COLUMNS = ["threshold_rule"]
+
+# Columns kept for the listed accounts (top and mid-range) in the sidecar
+ACCOUNT_COLUMNS = [
+    "customer_id", "customer_name", "sub_segment",
+    "tenure_years", "years_active_in_window", "revenue_5yr",
+]
+
+SIDECAR_SUFFIX = ".summary.json"
+SIDECAR_VERSION = 1
 
 # ============================================================================
 # FIND MOST RECENT ANALYSIS FILE
 # ============================================================================
 
-analysis_files = sorted(glob.glob("loyalty_analysis_*.csv"))
-if not analysis_files:
-    print("ERROR: No loyalty_analysis_*.csv files found in current directory.")
-    print("Run loyalty_analysis.py first to generate the analysis output.")
-    sys.exit(1)
+def find_latest_analysis_file(directory=None):
+    """
+    Most recent loyalty_analysis_* output (CSV, compressed CSV, Parquet or
+    Feather) by filename timestamp.
 
-input_file = analysis_files[-1]  # Most recent by filename timestamp
-print(f"Reading: {input_file}")
-print()
+    Args:
+        directory: Directory to search (defaults to the current one)
 
-df = pd.read_csv(input_file)
-total_customers = len(df)
-total_revenue = df["revenue_5yr"].sum()
+    Returns:
+        str or None: Path of the newest output file, or None if there is none
+    """
+    analysis_files = []
+    for extension in ANALYSIS_EXTENSIONS:
+        analysis_files.extend(glob.glob(os.path.join(directory or '', f"loyalty_analysis_*{extension}")))
+    analysis_files.sort(key=lambda path: os.path.splitext(os.path.basename(path))[0])
+    return analysis_files[-1] if analysis_files else None
 
-# ============================================================================
-# STATUS BREAKDOWN
-# ============================================================================
+def load_analysis(path):
+    """
+    Load only the columns the report uses from an analysis output file.
 
-print("=" * 70)
-print("LOYALTY ANALYSIS — EXECUTIVE SUMMARY")
-print("=" * 70)
-print(f"Source File: {input_file}")
-print(f"Total Customers Evaluated: {total_customers:,}")
-print(f"Total 5-Year Revenue: ${total_revenue:,.0f}")
-print()
-
-print("-" * 70)
-print("STATUS BREAKDOWN")
-print("-" * 70)
-print(f"{'Status':<20} {'Count':>8} {'% Base':>8} {'5yr Revenue':>16} {'% Revenue':>10} {'Avg Revenue':>14}")
-print("-" * 70)
-
-for status in ["Loyal", "Not Qualified", "Ineligible"]:
-    subset = df[df["loyalty_status"] == status]
-    count = len(subset)
-    pct = count / total_customers * 100
-    rev = subset["revenue_5yr"].sum()
-    rev_pct = rev / total_revenue * 100
-    avg_rev = subset["revenue_5yr"].mean()
-    print(f"{status:<20} {count:>8,} {pct:>7.1f}% ${rev:>14,.0f} {rev_pct:>9.1f}% ${avg_rev:>12,.0f}")
+    Parquet/Feather outputs are read column-pruned with their stored types;
+    CSV outputs are parsed with usecols.
 
-# ============================================================================
-# LOYAL CUSTOMER DETAILS
-# ============================================================================
+    Args:
+        path: Analysis output file
 
-loyal = df[df["loyalty_status"] == "Loyal"]
+    Returns:
+        DataFrame
+    """
+    import pandas as pd
 
-print()
-print("-" * 70)
-print("LOYAL CUSTOMER PROFILE")
-print("-" * 70)
-print(f"  Count:            {len(loyal):,}")
-print(f"  Total 5yr Revenue: ${loyal['revenue_5yr'].sum():,.0f}")
-print(f"  Average Revenue:   ${loyal['revenue_5yr'].mean():,.0f}")
-print(f"  Median Revenue:    ${loyal['revenue_5yr'].median():,.0f}")
+    wanted = REPORT_COLUMNS + OPTIONAL_REPORT_COLUMNS
+    if path.lower().endswith('.csv'):
+        return pd.read_csv(path, usecols=lambda column: column in wanted)
+    from loyalty_io import read_columns, read_table
+    columns = read_columns(path)
+    return read_table(path, columns=[column for column in wanted if column in columns])
 
 # ============================================================================
-# TOP LOYAL ACCOUNTS
+# SUMMARY STATISTICS
 # ============================================================================
 
-print()
-print("-" * 70)
-print("TOP 10 LOYAL ACCOUNTS (by 5-year revenue)")
-print("-" * 70)
+def build_summary(df):
+    """
+    Compute every figure shown in the executive summary.
+
+    Args:
+        df: Loyalty analysis output table (as written by loyalty_analysis.py)
+
+    Returns:
+        dict: Totals, per-status breakdown, loyal profile, top and mid-range
+        loyal accounts, not-qualified reasons, loyal segment breakdown and
+        (with a threshold_rule column) the breakdown by threshold rule set
+    """
+    import numpy as np
+    from loyalty_query import smallest_positions
+
+    total_customers = len(df)
+    total_revenue = df["revenue_5yr"].sum()
 
-top10 = loyal.nlargest(10, "revenue_5yr")
-for i, (_, r) in enumerate(top10.iterrows(), 1):
-    print(f"  {i:>2}. {r['customer_name']:40s} {r['sub_segment']:20s} "
-          f"Tenure: {r['tenure_years']}yr  Active: {int(r['years_active_in_window'])}/5yr  "
-          f"Rev: ${r['revenue_5yr']:,.0f}")
+    status_rows = []
+    for status in STATUSES:
+        subset = df[df["loyalty_status"] == status]
+        count = len(subset)
+        rev = subset["revenue_5yr"].sum()
+        status_rows.append({
+            "status": status,
+            "count": count,
+            "pct": count / total_customers * 100,
+            "revenue": rev,
+            "revenue_pct": rev / total_revenue * 100,
+            "avg_revenue": subset["revenue_5yr"].mean(),
+        })
+
+    loyal = df[df["loyalty_status"] == "Loyal"]
+    median_rev = loyal["revenue_5yr"].median()
+    # Partial selection, so the loyal accounts are never fully sorted
+    loyal_revenue = loyal["revenue_5yr"].to_numpy(dtype="float64")
+    loyal_positions = np.arange(len(loyal))
+    nq = df[df["loyalty_status"] == "Not Qualified"]
+
+    seg = (loyal.groupby("sub_segment", observed=True)
+           .agg(count=("customer_id", "count"),
+                total_rev=("revenue_5yr", "sum"),
+                avg_rev=("revenue_5yr", "mean"))
+           .sort_values("total_rev", ascending=False))
+
+    rules = []
+    if "threshold_rule" in df.columns:
+        is_loyal = df["loyalty_status"] == "Loyal"
+        rules = (df.assign(loyal=is_loyal, loyal_rev=df["revenue_5yr"].where(is_loyal, 0.0))
+                 .groupby("threshold_rule", observed=False)
+                 .agg(count=("customer_id", "count"), loyal=("loyal", "sum"),
+                      loyal_rev=("loyal_rev", "sum")))
+
+    return {
+        "total_customers": total_customers,
+        "total_revenue": total_revenue,
+        "status_rows": status_rows,
+        "loyal_count": len(loyal),
+        "loyal_revenue": loyal["revenue_5yr"].sum(),
+        "loyal_avg_revenue": loyal["revenue_5yr"].mean(),
+        "loyal_median_revenue": median_rev,
+        "top_accounts": loyal.iloc[smallest_positions(-loyal_revenue, loyal_positions, 10)],
+        "mid_accounts": loyal.iloc[smallest_positions(np.abs(loyal_revenue - median_rev), loyal_positions, 5)],
+        "not_qualified_count": len(nq),
+        "reasons": nq["ineligibility_reason"].value_counts().loc[lambda counts: counts > 0],
+        "segments": seg,
+        "rules": rules,
+    }
 
 # ============================================================================
-# SAMPLE MID-RANGE LOYAL ACCOUNTS
+# SUMMARY SIDECAR
 # ============================================================================
 
-print()
-print("-" * 70)
-print("SAMPLE MID-RANGE LOYAL ACCOUNTS (near median revenue)")
-print("-" * 70)
+def sidecar_path(output_path):
+    """Summary sidecar path for an analysis output file."""
+    from loyalty_io import split_compression
+
+    return os.path.splitext(split_compression(output_path)[0])[0] + SIDECAR_SUFFIX
+
+def _json_value(value):
+    # NumPy scalars (counts, sums) are not JSON serializable as-is
+    return value.item()
 
-median_rev = loyal["revenue_5yr"].median()
-mid = loyal.iloc[(loyal["revenue_5yr"] - median_rev).abs().argsort()[:5]]
-for _, r in mid.iterrows():
-    print(f"  {r['customer_name']:40s} {r['sub_segment']:20s} "
-          f"Tenure: {r['tenure_years']}yr  Active: {int(r['years_active_in_window'])}/5yr  "
-          f"Rev: ${r['revenue_5yr']:,.0f}")
+def save_summary_sidecar(output_df, output_path):
+    """
+    Write the report figures for a freshly written output file.
+
+    Args:
+        output_df: The output table that was written to output_path
+        output_path: The written analysis output file
+
+    Returns:
+        str: Path of the sidecar
+    """
+    summary = build_summary(output_df)
+    payload = {
+        "sidecar_version": SIDECAR_VERSION,
+        "source_file": os.path.basename(output_path),
+        "source_bytes": os.path.getsize(output_path),
+        "source_mtime_ns": os.stat(output_path).st_mtime_ns,
+        "analysis_timestamp": (str(output_df["analysis_timestamp"].iloc[0])
+                               if "analysis_timestamp" in output_df.columns and len(output_df) else None),
+        "total_customers": summary["total_customers"],
+        "total_revenue": summary["total_revenue"],
+        "status_rows": summary["status_rows"],
+        "loyal_count": summary["loyal_count"],
+        "loyal_revenue": summary["loyal_revenue"],
+        "loyal_avg_revenue": summary["loyal_avg_revenue"],
+        "loyal_median_revenue": summary["loyal_median_revenue"],
+        "top_accounts": summary["top_accounts"][ACCOUNT_COLUMNS].to_dict("records"),
+        "mid_accounts": summary["mid_accounts"][ACCOUNT_COLUMNS].to_dict("records"),
+        "not_qualified_count": summary["not_qualified_count"],
+        "reasons": [[str(reason), count] for reason, count in summary["reasons"].items()],
+        "segments": summary["segments"].reset_index().to_dict("records"),
+        "rules": _records(summary["rules"]),
+    }
+    path = sidecar_path(output_path)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(payload, f, indent=1, default=_json_value)
+    return path
+
+def load_summary_sidecar(output_path):
+    """
+    Report figures from the sidecar of an output file, if it is current.
+
+    Args:
+        output_path: Analysis output file
+
+    Returns:
+        dict or None: The figures of build_summary(), with the account,
+        reason and segment tables as plain lists (format_report() accepts
+        both), or None if there is no sidecar or the output file's size
+        or modification time changed since it was written
+    """
+    path = sidecar_path(output_path)
+    try:
+        with open(path, encoding="utf-8") as f:
+            payload = json.load(f)
+    except (OSError, ValueError):
+        return None
+    # Size alone misses a re-run or edit of the same length (rows are
+    # close to fixed-width), so the modification time must match too
+    source = os.stat(output_path)
+    if (payload.get("sidecar_version") != SIDECAR_VERSION
+            or payload.get("source_bytes") != source.st_size
+            or payload.get("source_mtime_ns") != source.st_mtime_ns):
+        return None
+
+    summary = {key: payload[key] for key in (
+        "total_customers", "total_revenue", "status_rows", "loyal_count", "loyal_revenue",
+        "loyal_avg_revenue", "loyal_median_revenue", "not_qualified_count")}
+    summary["top_accounts"] = payload["top_accounts"]
+    summary["mid_accounts"] = payload["mid_accounts"]
+    summary["reasons"] = dict(payload["reasons"])
+    summary["segments"] = payload["segments"]
+    summary["rules"] = payload.get("rules", [])
+    return summary
 
 # ============================================================================
-# NOT QUALIFIED REASONS
+# REPORT FORMATTING
 # ============================================================================
 
-print()
-print("-" * 70)
-print("WHY CUSTOMERS DON'T QUALIFY")
-print("-" * 70)
+def _records(table):
+    # build_summary() gives DataFrames, load_summary_sidecar() lists of dicts
+    if isinstance(table, list):
+        return table
+    if table.index.name is not None:
+        table = table.reset_index()
+    return table.to_dict("records")
+
+def format_account(r):
+    return (f"{r['customer_name']:40s} {r['sub_segment']:20s} "
+            f"Tenure: {r['tenure_years']}yr  Active: {int(r['years_active_in_window'])}/5yr  "
+            f"Rev: ${r['revenue_5yr']:,.0f}")
+
+def format_report(summary, source_file):
+    """
+    Render the executive summary as console text.
+
+    Args:
+        summary: Result of build_summary()
+        source_file: Name of the analysis file shown in the header
+
+    Returns:
+        str: The full report
+    """
+    lines = []
+    out = lines.append
+
+    # ------------------------------------------------------------------------
+    # STATUS BREAKDOWN
+    # ------------------------------------------------------------------------
+    out("=" * 70)
+    out("LOYALTY ANALYSIS — EXECUTIVE SUMMARY")
+    out("=" * 70)
+    out(f"Source File: {source_file}")
+    out(f"Total Customers Evaluated: {summary['total_customers']:,}")
+    out(f"Total 5-Year Revenue: ${summary['total_revenue']:,.0f}")
+    out("")
+
+    out("-" * 70)
+    out("STATUS BREAKDOWN")
+    out("-" * 70)
+    out(f"{'Status':<20} {'Count':>8} {'% Base':>8} {'5yr Revenue':>16} {'% Revenue':>10} {'Avg Revenue':>14}")
+    out("-" * 70)
+    for row in summary["status_rows"]:
+        out(f"{row['status']:<20} {row['count']:>8,} {row['pct']:>7.1f}% ${row['revenue']:>14,.0f} "
+            f"{row['revenue_pct']:>9.1f}% ${row['avg_revenue']:>12,.0f}")
 
-nq = df[df["loyalty_status"] == "Not Qualified"]
-reasons = nq["ineligibility_reason"].value_counts()
-for reason, count in reasons.items():
-    pct = count / len(nq) * 100
-    print(f"  {reason:50s} {count:>6,} ({pct:.1f}%)")
+    # ------------------------------------------------------------------------
+    # LOYAL CUSTOMER DETAILS
+    # ------------------------------------------------------------------------
+    out("")
+    out("-" * 70)
+    out("LOYAL CUSTOMER PROFILE")
+    out("-" * 70)
+    out(f"  Count:            {summary['loyal_count']:,}")
+    out(f"  Total 5yr Revenue: ${summary['loyal_revenue']:,.0f}")
+    out(f"  Average Revenue:   ${summary['loyal_avg_revenue']:,.0f}")
+    out(f"  Median Revenue:    ${summary['loyal_median_revenue']:,.0f}")
+
+    # ------------------------------------------------------------------------
+    # TOP LOYAL ACCOUNTS
+    # ------------------------------------------------------------------------
+    out("")
+    out("-" * 70)
+    out("TOP 10 LOYAL ACCOUNTS (by 5-year revenue)")
+    out("-" * 70)
+    for i, r in enumerate(_records(summary["top_accounts"]), 1):
+        out(f"  {i:>2}. {format_account(r)}")
+
+    # ------------------------------------------------------------------------
+    # SAMPLE MID-RANGE LOYAL ACCOUNTS
+    # ------------------------------------------------------------------------
+    out("")
+    out("-" * 70)
+    out("SAMPLE MID-RANGE LOYAL ACCOUNTS (near median revenue)")
+    out("-" * 70)
+    for r in _records(summary["mid_accounts"]):
+        out(f"  {format_account(r)}")
+
+    # ------------------------------------------------------------------------
+    # NOT QUALIFIED REASONS
+    # ------------------------------------------------------------------------
+    out("")
+    out("-" * 70)
+    out("WHY CUSTOMERS DON'T QUALIFY")
+    out("-" * 70)
+    for reason, count in summary["reasons"].items():
+        pct = count / summary["not_qualified_count"] * 100
+        out(f"  {reason:50s} {count:>6,} ({pct:.1f}%)")
+
+    # ------------------------------------------------------------------------
+    # SEGMENT BREAKDOWN (LOYAL)
+    # ------------------------------------------------------------------------
+    out("")
+    out("-" * 70)
+    out("LOYAL CUSTOMERS BY SEGMENT")
+    out("-" * 70)
+    out(f"{'Segment':<30} {'Count':>6} {'Total Revenue':>16} {'Avg Revenue':>14}")
+    out("-" * 70)
+    for r in _records(summary["segments"]):
+        out(f"  {r['sub_segment']:<28} {r['count']:>6,.0f} ${r['total_rev']:>14,.0f} ${r['avg_rev']:>12,.0f}")
+
+    # ------------------------------------------------------------------------
+    # THRESHOLD RULE SETS (only for runs with segment overrides)
+    # ------------------------------------------------------------------------
+    rules = _records(summary.get("rules", []))
+    if rules:
+        out("")
+        out("-" * 70)
+        out("RESULTS BY THRESHOLD RULE SET")
+        out("-" * 70)
+        out(f"{'Rule Set':<30} {'Count':>8} {'Loyal':>8} {'% Loyal':>8} {'Loyal Revenue':>14}")
+        out("-" * 70)
+        for r in rules:
+            pct = r['loyal'] / r['count'] * 100 if r['count'] else 0.0
+            out(f"  {str(r['threshold_rule']):<28} {r['count']:>8,.0f} {r['loyal']:>8,.0f} "
+                f"{pct:>7.1f}% ${r['loyal_rev']:>13,.0f}")
+
+    out("")
+    out("=" * 70)
+    out("END OF REPORT")
+    out("=" * 70)
+    return "\n".join(lines)
 
 # ============================================================================
-# SEGMENT BREAKDOWN (LOYAL)
+# COMMAND LINE INTERFACE
 # ============================================================================
 
-print()
-print("-" * 70)
-print("LOYAL CUSTOMERS BY SEGMENT")
-print("-" * 70)
-print(f"{'Segment':<30} {'Count':>6} {'Total Revenue':>16} {'Avg Revenue':>14}")
-print("-" * 70)
-
-seg = (loyal.groupby("sub_segment")
-       .agg(count=("customer_id", "count"),
-            total_rev=("revenue_5yr", "sum"),
-            avg_rev=("revenue_5yr", "mean"))
-       .sort_values("total_rev", ascending=False))
-
-for s, r in seg.iterrows():
-    print(f"  {s:<28} {r['count']:>6,.0f} ${r['total_rev']:>14,.0f} ${r['avg_rev']:>12,.0f}")
-
-print()
-print("=" * 70)
-print("END OF REPORT")
-print("=" * 70)
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Print the executive summary for a loyalty analysis output file.")
+    parser.add_argument('file', nargs='?', default=None,
+                        help="Analysis output file (default: most recent loyalty_analysis_*)")
+    parser.add_argument('--recompute', action='store_true',
+                        help="Ignore the summary sidecar and read the full output file")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    input_file = args.file or find_latest_analysis_file()
+    if input_file is None:
+        print("ERROR: No loyalty_analysis_* output files found in current directory.")
+        print("Run loyalty_analysis.py first to generate the analysis output.")
+        return 1
+
+    summary = None if args.recompute else load_summary_sidecar(input_file)
+    if summary is not None:
+        print(f"Reading: {sidecar_path(input_file)}")
+    else:
+        print(f"Reading: {input_file}")
+        summary = build_summary(load_analysis(input_file))
+    print()
+
+    print(format_report(summary, input_file))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
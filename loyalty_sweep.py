@@ -0,0 +1,318 @@
+"""
+LOYALTY ANALYSIS - THRESHOLD SWEEP
+
+Purpose: Evaluate many threshold combinations against one extract without
+         re-running the full analysis for each. The extract is loaded and
+         cleaned once; every scenario is then answered from per-account
+         tenure, years-active and 5-year revenue arrays: accounts are sorted
+         by revenue once, and for each (tenure, consistency, per-year minimum)
+         combination all revenue thresholds are resolved with one binary
+         search over a cumulative revenue sum.
+
+         Each scenario applies its thresholds to every account; the
+         config's segment_thresholds overrides are not used.
+
+Usage:
+    python loyalty_sweep.py [--input FILE] [--output-dir DIR]
+                            [--tenure 3 4 5] [--consistency 0.4 0.6 0.8]
+                            [--revenue 30000 35000 40000 50000]
+                            [--per-year 0 5000]
+
+    Each grid option takes values or START:STOP:STEP ranges (inclusive),
+    e.g. --revenue 20000:80000:500. Options left out use the value in
+    loyalty_config.py, except the defaults above.
+
+Library use:
+    from loyalty_sweep import prepare_sweep, sweep_thresholds
+    prepared = prepare_sweep(df, LOYALTY_CONFIG)
+    results = sweep_thresholds(prepared, tenures=[4], consistency_rates=[0.4, 0.6],
+                               revenue_thresholds=[30000, 35000], per_year_minimums=[0])
+
+Output:
+    - loyalty_sweep_YYYYMMDD_HHMMSS.csv: one row per scenario with loyal
+      count, coverage % and revenue concentration %
+    - Console table (or the baseline scenario only, for large grids)
+"""
+
+import argparse
+import os
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from loyalty_analysis import (
+    INPUT_FILE, LOYALTY_CONFIG, calculate_metrics, clean_data, count_active_years,
+    drop_duplicate_accounts, find_missing_columns, get_evaluation_years, load_revenue_extract,
+    run_analysis,
+)
+
+DEFAULT_CONSISTENCY_RATES = [0.40, 0.60, 0.80]
+DEFAULT_REVENUE_THRESHOLDS = [30000, 35000, 40000, 50000]
+DEFAULT_PER_YEAR_MINIMUMS = [0, 5000]
+
+# Console shows the whole table up to this many scenarios
+MAX_PRINTED_SCENARIOS = 40
+
+SWEEP_COLUMNS = [
+    'min_tenure_years', 'min_consistency_rate', 'min_revenue_5yr', 'min_revenue_per_active_year',
+    'eligible_count', 'loyal_count', 'coverage_pct', 'loyal_revenue', 'revenue_concentration_pct',
+]
+
+# ============================================================================
+# PRECOMPUTED ACCOUNT METRICS
+# ============================================================================
+
+def prepare_sweep(df, config):
+    """
+    Clean the extract once and keep the per-account arrays a sweep needs.
+
+    The evaluation window and current_year come from config; the four
+    thresholds are ignored here and supplied per scenario instead.
+
+    Args:
+        df: Raw extract
+        config: Loyalty config dict
+
+    Returns:
+        dict: tenure, revenue_5yr and yearly_revenue arrays, sorted by
+        revenue_5yr ascending, plus num_years, total_customers and
+        total_revenue
+
+    Raises:
+        ValueError: If required input columns are missing
+    """
+    missing_columns = find_missing_columns(df, config)
+    if missing_columns:
+        raise ValueError(f"Missing required columns: {missing_columns}")
+
+    years = get_evaluation_years(config)
+    df, _ = drop_duplicate_accounts(df)
+    df, _ = clean_data(df, config)
+    df = calculate_metrics(df, dict(config, segment_thresholds={}))
+
+    revenue_5yr = df['revenue_5yr'].to_numpy(dtype='float64')
+    order = np.argsort(revenue_5yr, kind='stable')
+    return {
+        'tenure': df['tenure_years'].to_numpy(dtype='float64')[order],
+        'revenue_5yr': revenue_5yr[order],
+        'yearly_revenue': df[[f'revenue_{year}' for year in years]].to_numpy(dtype='float64')[order],
+        'num_years': len(years),
+        'total_customers': len(df),
+        'total_revenue': revenue_5yr.sum(),
+    }
+
+def required_active_years(min_consistency, num_years):
+    """
+    Fewest active years whose consistency rate meets min_consistency.
+
+    Computed with the same division as calculate_metrics(), so rates that
+    fall exactly on a boundary (e.g. 0.6 = 3/5) round the same way.
+
+    Returns:
+        int: Minimum years active (num_years + 1 if no count qualifies)
+    """
+    meets = np.arange(num_years + 1) / num_years >= min_consistency
+    return int(np.argmax(meets)) if meets.any() else num_years + 1
+
+# ============================================================================
+# SWEEP
+# ============================================================================
+
+def sweep_thresholds(prepared, tenures, consistency_rates, revenue_thresholds, per_year_minimums):
+    """
+    Loyal count, coverage and revenue concentration for every combination
+    of thresholds.
+
+    Args:
+        prepared: Result of prepare_sweep()
+        tenures: min_tenure_years values
+        consistency_rates: min_consistency_rate values
+        revenue_thresholds: min_revenue_5yr values
+        per_year_minimums: min_revenue_per_active_year values
+
+    Returns:
+        DataFrame: One row per scenario (SWEEP_COLUMNS), in grid order
+        per-year minimum → tenure → consistency → revenue
+    """
+    tenure = prepared['tenure']
+    revenue_5yr = prepared['revenue_5yr']
+    num_years = prepared['num_years']
+    total_customers = prepared['total_customers']
+    total_revenue = prepared['total_revenue']
+    thresholds = np.asarray(revenue_thresholds, dtype='float64')
+
+    blocks = []
+    for min_per_year in per_year_minimums:
+        years_active = count_active_years(prepared['yearly_revenue'], min_per_year)
+        for min_tenure in tenures:
+            # NaN tenure (no date, no revenue) compares False, i.e. ineligible
+            eligible = tenure >= min_tenure
+            eligible_count = int(eligible.sum())
+            by_required_years = {}
+            for min_consistency in consistency_rates:
+                required = required_active_years(min_consistency, num_years)
+                if required not in by_required_years:
+                    # Revenues of accounts passing tenure + consistency, still ascending
+                    passing = revenue_5yr[eligible & (years_active >= required)]
+                    # revenue_above[i] = total revenue of passing[i:]
+                    revenue_above = np.append(np.cumsum(passing[::-1])[::-1], 0.0)
+                    first = np.searchsorted(passing, thresholds, side='left')
+                    by_required_years[required] = (len(passing) - first, revenue_above[first])
+                loyal_count, loyal_revenue = by_required_years[required]
+                blocks.append(pd.DataFrame({
+                    'min_tenure_years': min_tenure,
+                    'min_consistency_rate': min_consistency,
+                    'min_revenue_5yr': revenue_thresholds,
+                    'min_revenue_per_active_year': min_per_year,
+                    'eligible_count': eligible_count,
+                    'loyal_count': loyal_count,
+                    'loyal_revenue': loyal_revenue,
+                }))
+
+    results = pd.concat(blocks, ignore_index=True)
+    results['coverage_pct'] = results['loyal_count'] / total_customers * 100
+    results['revenue_concentration_pct'] = results['loyal_revenue'] / total_revenue * 100
+    return results[SWEEP_COLUMNS]
+
+def baseline_matches(results, df, config):
+    """
+    Check the sweep against a full run for the thresholds in config.
+
+    Args:
+        results: sweep_thresholds() result containing the config's scenario
+        df: Raw extract the sweep was prepared from
+        config: Loyalty config dict
+
+    Returns:
+        tuple: (passed, message) in the style of validate_output()
+    """
+    baseline = results[
+        (results['min_tenure_years'] == config['min_tenure_years']) &
+        (results['min_consistency_rate'] == config['min_consistency_rate']) &
+        (results['min_revenue_5yr'] == config['min_revenue_5yr']) &
+        (results['min_revenue_per_active_year'] == config['min_revenue_per_active_year'])
+    ]
+    if baseline.empty:
+        return True, "Baseline check skipped (config thresholds not in the grid)"
+    # Scenarios ignore segment overrides, so neither does the full run
+    expected = run_analysis(df, dict(config, segment_thresholds={}))['summary']['status_counts']['Loyal']
+    swept = int(baseline['loyal_count'].iloc[0])
+    if swept == expected:
+        return True, f"Baseline scenario matches full analysis ({expected:,} loyal)"
+    return False, f"Baseline scenario has {swept:,} loyal, full analysis has {expected:,}"
+
+# ============================================================================
+# COMMAND LINE INTERFACE
+# ============================================================================
+
+def parse_grid_values(values, cast):
+    """
+    Expand CLI grid values; START:STOP:STEP ranges include STOP.
+
+    Args:
+        values: Strings from argparse
+        cast: int or float
+
+    Returns:
+        list: Unique values in the order given
+    """
+    expanded = []
+    for value in values:
+        if ':' in value:
+            start, stop, step = (float(part) for part in value.split(':'))
+            count = int(np.floor((stop - start) / step + 1e-9)) + 1
+            expanded.extend(cast(round(start + i * step, 10)) for i in range(count))
+        else:
+            expanded.append(cast(value))
+    return list(dict.fromkeys(expanded))
+
+def print_results(results):
+    print(f"  {'Tenure':>6} {'Consist.':>8} {'5yr Revenue':>12} {'Per Year':>9} "
+          f"{'Loyal':>8} {'Coverage':>9} {'Revenue %':>10}")
+    print(f"  {'-'*6} {'-'*8} {'-'*12} {'-'*9} {'-'*8} {'-'*9} {'-'*10}")
+    for row in results.itertuples(index=False):
+        print(f"  {row.min_tenure_years:>6} {row.min_consistency_rate:>8.0%} "
+              f"${row.min_revenue_5yr:>11,.0f} ${row.min_revenue_per_active_year:>8,.0f} "
+              f"{row.loyal_count:>8,} {row.coverage_pct:>8.1f}% {row.revenue_concentration_pct:>9.1f}%")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Evaluate a grid of loyalty thresholds against one extract.")
+    parser.add_argument('--input', default=INPUT_FILE,
+                        help=f"Revenue extract: .csv, .parquet or .feather (default: {INPUT_FILE})")
+    parser.add_argument('--output-dir', default=None,
+                        help="Directory for loyalty_sweep_*.csv (default: current directory)")
+    parser.add_argument('--tenure', nargs='+', default=None, metavar='YEARS',
+                        help="min_tenure_years values (default: from loyalty_config.py)")
+    parser.add_argument('--consistency', nargs='+', default=None, metavar='RATE',
+                        help=f"min_consistency_rate values (default: {DEFAULT_CONSISTENCY_RATES})")
+    parser.add_argument('--revenue', nargs='+', default=None, metavar='DOLLARS',
+                        help=f"min_revenue_5yr values (default: {DEFAULT_REVENUE_THRESHOLDS})")
+    parser.add_argument('--per-year', nargs='+', default=None, metavar='DOLLARS',
+                        help=f"min_revenue_per_active_year values (default: {DEFAULT_PER_YEAR_MINIMUMS})")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    if LOYALTY_CONFIG is None:
+        print("ERROR: loyalty_config.py not found in current directory.")
+        return 1
+    config = LOYALTY_CONFIG
+
+    try:
+        tenures = parse_grid_values(args.tenure, int) if args.tenure else [config['min_tenure_years']]
+        consistency_rates = parse_grid_values(args.consistency or map(str, DEFAULT_CONSISTENCY_RATES), float)
+        revenue_thresholds = parse_grid_values(args.revenue or map(str, DEFAULT_REVENUE_THRESHOLDS), float)
+        per_year_minimums = parse_grid_values(args.per_year or map(str, DEFAULT_PER_YEAR_MINIMUMS), float)
+    except ValueError as e:
+        print(f"ERROR: Invalid grid value ({str(e)})")
+        return 1
+    scenario_count = len(tenures) * len(consistency_rates) * len(revenue_thresholds) * len(per_year_minimums)
+
+    print("=" * 80)
+    print("CUSTOMER LOYALTY FRAMEWORK - THRESHOLD SWEEP")
+    print("=" * 80)
+    try:
+        df = load_revenue_extract(args.input)
+    except Exception as e:
+        print(f"ERROR: Failed to load {args.input}")
+        print(f"Error message: {str(e)}")
+        return 1
+    print(f"✓ Loaded {len(df):,} customer records from {args.input}")
+
+    start = time.perf_counter()
+    try:
+        prepared = prepare_sweep(df, config)
+    except ValueError as e:
+        print(f"ERROR: {str(e)}")
+        return 1
+    prepare_seconds = time.perf_counter() - start
+    print(f"✓ Cleaned and measured {prepared['total_customers']:,} accounts in {prepare_seconds:.2f}s")
+
+    start = time.perf_counter()
+    results = sweep_thresholds(prepared, tenures, consistency_rates, revenue_thresholds, per_year_minimums)
+    sweep_seconds = time.perf_counter() - start
+    print(f"✓ Evaluated {scenario_count:,} scenarios in {sweep_seconds:.2f}s")
+
+    passed, message = baseline_matches(results, df, config)
+    print(f"{'✓' if passed else '✗ FAIL:'} {message}")
+
+    print(f"\nScenarios:")
+    if len(results) <= MAX_PRINTED_SCENARIOS:
+        print_results(results)
+    else:
+        print(f"  • {len(results):,} scenarios (see output file); loyal count ranges "
+              f"{results['loyal_count'].min():,} to {results['loyal_count'].max():,}")
+
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    output_filename = os.path.join(args.output_dir or '', f'loyalty_sweep_{timestamp}.csv')
+    results.to_csv(output_filename, index=False)
+    print(f"\n✓ Sweep results saved: {output_filename}")
+    return 0 if passed else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,379 @@
+"""
+LOYALTY ANALYSIS - SYNTHETIC REVENUE EXTRACTS
+
+Purpose: Generate revenue extracts of any size with the same schema and
+         messiness as the PowerBI export, for benchmarks and scale testing.
+         Account mix, first order years and revenue levels follow the shipped
+         customer_annual_revenue.csv; the share of currency text, negatives,
+         blanks, missing dates and duplicate Account_IDs is configurable.
+         The same accounts can also be written as order lines that add up
+         to the extract, for loyalty_transactions.py, and linked into
+         parent/child groups, for loyalty_rollup.py.
+
+Usage:
+    python loyalty_synthetic.py --rows 1000000 [--output synthetic_revenue.csv]
+                                [--seed 42] [--currency-text 0.5]
+                                [--missing-dates 0.002] [--duplicates 0.001]
+    python loyalty_synthetic.py --rows 100000 --transactions [--lines-per-year 4]
+    python loyalty_synthetic.py --rows 100000 --hierarchy synthetic_hierarchy.csv [--linked 0.2]
+
+Library use:
+    from loyalty_synthetic import generate_extract, generate_hierarchy, generate_transactions
+    df = generate_extract(100000, seed=1)
+    lines = generate_transactions(generate_extract(1000, profile={'currency_text': 0}))
+    links = generate_hierarchy(100000, linked=0.3)
+
+Notes:
+    - The same rows, seed and proportions always produce the same file.
+    - Large files are generated and written in chunks, so memory stays flat
+      up to 10M+ rows.
+"""
+
+import argparse
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from loyalty_analysis import LOYALTY_CONFIG, get_evaluation_years, revenue_column_name
+
+DEFAULT_OUTPUT = "synthetic_revenue.csv"
+DEFAULT_TRANSACTIONS_OUTPUT = "synthetic_transactions.csv"
+GENERATE_CHUNKSIZE = 1_000_000
+
+# Proportions of each kind of messy value (shares of accounts or cells)
+DEFAULT_PROFILE = {
+    'currency_text': 0.5,     # Revenue cells written as "$1,234.56" instead of 1234.56
+    'blank_revenue': 0.15,    # Cells after the first order year left blank (else active or $0)
+    'zero_revenue': 0.25,     # Cells after the first order year with $0.00
+    'negative_revenue': 0.003,  # Cells that are returns/credits; "(1,234.56)" when written as text
+    'missing_dates': 0.002,   # Accounts with a blank First Order Date
+    'missing_segment': 0.002,  # Accounts with a blank Sub Segment
+    'duplicates': 0.001,      # Rows that repeat an earlier Account_ID with different data
+}
+
+# Largest sub segments of the shipped extract, by share of accounts (rest is 'NICHE')
+SEGMENT_SHARES = {
+    'NO SHOWROOM': 0.360, 'DESIGNER_INDEPENDENT': 0.239, 'DESIGN_FIRM': 0.163,
+    'SINGLE_LOCATION': 0.070, 'S_LOC RET (SW/SAMP)': 0.051, 'TRADE SHOWROOM': 0.024,
+    'S_LOC RET (STOCK)': 0.023, 'ARCHITECT_BUILDER': 0.018, 'HOSPITALITY': 0.017,
+    'MULTIPLE_LOCATIONS': 0.008, 'M_LOC RET (STOCK)': 0.005, 'SPECIALTY': 0.003,
+}
+
+# First order year, relative to evaluation_start_year, by share of accounts
+FIRST_ORDER_YEAR_SHARES = {-1: 0.071, 0: 0.320, 1: 0.161, 2: 0.110, 3: 0.110, 4: 0.111, 5: 0.106, 6: 0.011}
+
+NAME_WORDS = [
+    'Amy', 'Boyce', 'Chelsea', 'Skye', 'Marian', 'Metta', 'Maison', 'Pavilion', 'Nordic', 'Harbor',
+    'Willow', 'Oak', 'Linden', 'Aspen', 'Cedar', 'Belcher', 'Ballew', 'Monroe', 'Hayes', 'Porter',
+]
+NAME_SUFFIXES = [
+    'Interiors', 'Design', 'Design Group', 'Home', 'Studio', 'Interiors, LLC', 'Floors, Inc',
+    'Decorating Den', 'Design Co.', 'Living',
+]
+
+# ============================================================================
+# GENERATION
+# ============================================================================
+
+def revenue_years(config):
+    """Revenue columns to generate: the evaluation window plus the year after it."""
+    years = get_evaluation_years(config)
+    return years + [years[-1] + 1]
+
+def format_currency_text(values):
+    """
+    Render amounts the way BI exports do: $1,234.56 and ($1,234.56) for negatives.
+
+    Args:
+        values: float array
+
+    Returns:
+        numpy.ndarray: object array of strings
+    """
+    text = pd.Series(np.abs(values)).map('${:,.2f}'.format).to_numpy(dtype=object)
+    negative = values < 0
+    text[negative] = '(' + text[negative] + ')'
+    return text
+
+def generate_extract(rows, config=None, seed=0, profile=None, first_account_id=1_000_000):
+    """
+    Build one synthetic revenue extract in memory.
+
+    Args:
+        rows: Number of rows (duplicates included)
+        config: Loyalty config dict (sets the revenue years; defaults to
+                LOYALTY_CONFIG)
+        seed: Random seed
+        profile: Overrides for DEFAULT_PROFILE proportions
+        first_account_id: Lowest Account_ID to assign
+
+    Returns:
+        DataFrame: Extract with the PowerBI export schema
+    """
+    if config is None:
+        config = LOYALTY_CONFIG
+    profile = {**DEFAULT_PROFILE, **(profile or {})}
+    rng = np.random.default_rng(seed)
+    years = revenue_years(config)
+    start_year = config['evaluation_start_year']
+
+    # Identification columns
+    account_ids = first_account_id + np.arange(rows, dtype='int64')
+    words = np.array(NAME_WORDS, dtype=object)
+    suffixes = np.array(NAME_SUFFIXES, dtype=object)
+    names = (words[rng.integers(len(words), size=rows)] + ' ' +
+             words[rng.integers(len(words), size=rows)] + ' ' +
+             suffixes[rng.integers(len(suffixes), size=rows)])
+
+    segment_names = list(SEGMENT_SHARES) + ['NICHE']
+    segment_shares = list(SEGMENT_SHARES.values())
+    segment_shares.append(1 - sum(segment_shares))
+    segments = np.array(segment_names, dtype=object)[rng.choice(len(segment_names), size=rows, p=segment_shares)]
+    segments[rng.random(rows) < profile['missing_segment']] = None
+
+    offsets = np.array(list(FIRST_ORDER_YEAR_SHARES))
+    year_shares = np.array(list(FIRST_ORDER_YEAR_SHARES.values()))
+    first_years = start_year + offsets[rng.choice(len(offsets), size=rows, p=year_shares / year_shares.sum())]
+    first_dates = (pd.to_datetime(pd.Series(first_years).astype(str), format='%Y') +
+                   pd.to_timedelta(rng.integers(365, size=rows), unit='D'))
+    first_order = first_dates.dt.strftime('%Y-%m-%d 00:00:00').to_numpy(dtype=object)
+    first_order[rng.random(rows) < profile['missing_dates']] = None
+
+    df = pd.DataFrame({
+        'Account_ID': account_ids,
+        'Name': names,
+        'Sub Segment': segments,
+        'First Order Date': first_order,
+    })
+
+    # Revenue: account-level spend (median ~$3K/yr) times year-to-year noise
+    account_level = rng.lognormal(mean=8.0, sigma=1.4, size=rows)
+    active_share = 1 - profile['blank_revenue'] - profile['zero_revenue']
+    for year in years:
+        amounts = np.round(account_level * rng.lognormal(0.0, 0.6, size=rows), 2)
+        draw = rng.random(rows)
+        amounts[draw >= active_share] = 0.0
+        negative = rng.random(rows) < profile['negative_revenue']
+        amounts[negative] = -np.round(amounts[negative] * 0.1 + 50, 2)
+        blank = ((draw >= active_share + profile['zero_revenue']) & ~negative) | (first_years > year)
+
+        values = amounts.astype(object)
+        as_text = rng.random(rows) < profile['currency_text']
+        values[as_text] = format_currency_text(amounts[as_text])
+        values[blank] = None
+        df[revenue_column_name(year)] = values
+
+    # Duplicates: repeat an earlier row's Account_ID on a later row
+    duplicate_rows = np.flatnonzero(rng.random(rows) < profile['duplicates'])
+    duplicate_rows = duplicate_rows[duplicate_rows > 0]
+    if len(duplicate_rows) > 0:
+        sources = (rng.random(len(duplicate_rows)) * duplicate_rows).astype('int64')
+        df.loc[duplicate_rows, 'Account_ID'] = account_ids[sources]
+    return df
+
+def write_synthetic_extract(path, rows, config=None, seed=0, profile=None, chunksize=GENERATE_CHUNKSIZE):
+    """
+    Generate a synthetic extract chunk by chunk and write it as CSV.
+
+    Duplicate Account_IDs repeat an earlier row of the same chunk.
+
+    Args:
+        path: Output CSV path
+        rows: Total rows
+        config: Loyalty config dict (defaults to LOYALTY_CONFIG)
+        seed: Random seed (chunk i uses seed + i)
+        profile: Overrides for DEFAULT_PROFILE proportions
+        chunksize: Rows generated per chunk
+
+    Returns:
+        int: Rows written
+    """
+    written = 0
+    for i, start in enumerate(range(0, rows, chunksize)):
+        chunk = generate_extract(min(chunksize, rows - start), config, seed + i, profile,
+                                 first_account_id=1_000_000 + start)
+        chunk.to_csv(path, index=False, mode='w' if i == 0 else 'a', header=i == 0)
+        written += len(chunk)
+    return written
+
+def generate_transactions(extract, config=None, seed=0, lines_per_year=4, currency_text=0.5):
+    """
+    Order lines that add up to a synthetic extract.
+
+    Each non-zero revenue cell becomes 1 + Poisson(lines_per_year - 1)
+    lines whose cents sum to the cell exactly, dated within its year and
+    not before the First Order Date. A $0.00 line on the First Order Date
+    marks each account's first order. Lines are sorted by date, as order
+    systems export them.
+
+    Args:
+        extract: Extract from generate_extract() with numeric revenue
+                 (profile currency_text=0) and no duplicate Account_IDs
+        config: Loyalty config dict (defaults to LOYALTY_CONFIG)
+        seed: Random seed
+        lines_per_year: Mean order lines per account and year with revenue
+        currency_text: Share of amounts written as "$1,234.56" text
+
+    Returns:
+        DataFrame: Account_ID, Name, Sub Segment, Order Date and
+        Net Product Revenue per order line
+    """
+    if config is None:
+        config = LOYALTY_CONFIG
+    rng = np.random.default_rng(seed)
+    years = revenue_years(config)
+    cents = np.rint(extract[[revenue_column_name(year) for year in years]]
+                    .astype('float64').fillna(0.0).to_numpy() * 100).astype('int64')
+    first_dates = pd.to_datetime(extract['First Order Date'], format='%Y-%m-%d %H:%M:%S',
+                                 errors='coerce').to_numpy(dtype='datetime64[D]')
+
+    # Split each cell into lines; the last line of a cell takes the rounding
+    accounts, year_positions = np.nonzero(cents)
+    cell_cents = cents[accounts, year_positions]
+    counts = 1 + rng.poisson(lines_per_year - 1, size=len(cell_cents))
+    cells = np.repeat(np.arange(len(cell_cents)), counts)
+    weights = rng.random(len(cells)) + 0.1
+    line_cents = (weights / np.bincount(cells, weights)[cells] * cell_cents[cells]).astype('int64')
+    last = np.cumsum(counts) - 1
+    line_cents[last] += cell_cents - np.bincount(cells, line_cents, minlength=len(cell_cents)).astype('int64')
+
+    # Dates: uniform over the year, from the First Order Date in its year
+    line_accounts = accounts[cells]
+    line_years = np.asarray(years)[year_positions[cells]]
+    year_start = (line_years - 1970).astype('datetime64[Y]').astype('datetime64[D]')
+    first = first_dates[line_accounts]
+    earliest = np.where(~np.isnat(first) & (first >= year_start), (first - year_start).astype('int64'), 0)
+    days = earliest + (rng.random(len(cells)) * (365 - earliest)).astype('int64')
+    line_dates = year_start + days
+
+    # First-order marker lines
+    dated = np.flatnonzero(~np.isnat(first_dates))
+    line_accounts = np.concatenate([dated, line_accounts])
+    line_dates = np.concatenate([first_dates[dated], line_dates])
+    amounts = np.concatenate([np.zeros(len(dated)), line_cents / 100])
+
+    order = np.argsort(line_dates, kind='stable')
+    line_accounts, line_dates, amounts = line_accounts[order], line_dates[order], amounts[order]
+    values = amounts.astype(object)
+    as_text = rng.random(len(values)) < currency_text
+    values[as_text] = format_currency_text(amounts[as_text])
+    return pd.DataFrame({
+        'Account_ID': extract['Account_ID'].to_numpy()[line_accounts],
+        'Name': extract['Name'].to_numpy()[line_accounts],
+        'Sub Segment': extract['Sub Segment'].to_numpy()[line_accounts],
+        'Order Date': pd.Series(line_dates).dt.strftime('%Y-%m-%d').to_numpy(dtype=object),
+        'Net Product Revenue': values,
+    })
+
+def write_synthetic_transactions(path, accounts, config=None, seed=0, lines_per_year=4,
+                                 currency_text=0.5, chunksize=GENERATE_CHUNKSIZE):
+    """
+    Generate order lines for synthetic accounts chunk by chunk and write
+    them as CSV.
+
+    Accounts are generated like write_synthetic_extract() (without
+    duplicates or currency text, which only apply to extracts).
+
+    Args:
+        path: Output CSV path
+        accounts: Number of accounts
+        config: Loyalty config dict (defaults to LOYALTY_CONFIG)
+        seed: Random seed (chunk i uses seed + i)
+        lines_per_year: Mean order lines per account and year with revenue
+        currency_text: Share of amounts written as "$1,234.56" text
+        chunksize: Accounts generated per chunk
+
+    Returns:
+        int: Order lines written
+    """
+    written = 0
+    profile = {'currency_text': 0.0, 'duplicates': 0.0}
+    for i, start in enumerate(range(0, accounts, chunksize)):
+        extract = generate_extract(min(chunksize, accounts - start), config, seed + i, profile,
+                                   first_account_id=1_000_000 + start)
+        lines = generate_transactions(extract, config, seed + i, lines_per_year, currency_text)
+        lines.to_csv(path, index=False, mode='w' if i == 0 else 'a', header=i == 0)
+        written += len(lines)
+    return written
+
+def generate_hierarchy(accounts, seed=0, linked=0.2, outside_parents=0.1, first_account_id=1_000_000):
+    """
+    Child → parent links between synthetic accounts, for loyalty_rollup.py.
+
+    A `linked` share of the accounts gets a parent. Parents are picked at
+    random among the accounts, so chains, shared parents and the odd cycle
+    all occur; an `outside_parents` share of the links points at a parent
+    ID that is not an account.
+
+    Args:
+        accounts: Number of accounts (Account_IDs first_account_id onwards,
+                  as generate_extract() assigns them)
+        seed: Random seed
+        linked: Share of accounts with a parent
+        outside_parents: Share of links whose parent is not an account
+        first_account_id: Lowest Account_ID
+
+    Returns:
+        DataFrame: Account_ID (child) and Parent_Account_ID, one row per link
+    """
+    rng = np.random.default_rng(seed)
+    children = np.flatnonzero(rng.random(accounts) < linked)
+    parents = first_account_id + rng.integers(accounts, size=len(children))
+    outside = rng.random(len(children)) < outside_parents
+    # Outside parents (holding companies) each have about ten children
+    parents[outside] = first_account_id + accounts + rng.integers(max(outside.sum() // 10, 1),
+                                                                  size=int(outside.sum()))
+    return pd.DataFrame({'Account_ID': first_account_id + children, 'Parent_Account_ID': parents})
+
+# ============================================================================
+# COMMAND LINE INTERFACE
+# ============================================================================
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a synthetic customer revenue extract.")
+    parser.add_argument('--rows', type=int, default=100_000)
+    parser.add_argument('--output', default=None,
+                        help=f"CSV file to write (default: {DEFAULT_OUTPUT}, or "
+                             f"{DEFAULT_TRANSACTIONS_OUTPUT} with --transactions)")
+    parser.add_argument('--transactions', action='store_true',
+                        help="Write order lines for --rows accounts instead of an extract")
+    parser.add_argument('--lines-per-year', type=float, default=4, metavar='LINES',
+                        help="With --transactions: mean order lines per account and year (default: 4)")
+    parser.add_argument('--hierarchy', default=None, metavar='FILE',
+                        help="Also write child → parent links between the accounts to FILE")
+    parser.add_argument('--linked', type=float, default=0.2, metavar='SHARE',
+                        help="With --hierarchy: share of accounts with a parent (default: 0.2)")
+    parser.add_argument('--seed', type=int, default=0)
+    for key, share in DEFAULT_PROFILE.items():
+        parser.add_argument(f"--{key.replace('_', '-')}", dest=key, type=float, default=share,
+                            metavar='SHARE', help=f"(default: {share})")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    if LOYALTY_CONFIG is None:
+        print("ERROR: loyalty_config.py not found in current directory.")
+        return 1
+
+    start = time.perf_counter()
+    if args.hierarchy:
+        links = generate_hierarchy(args.rows, args.seed, args.linked)
+        links.to_csv(args.hierarchy, index=False)
+        print(f"✓ Wrote {len(links):,} account links to {args.hierarchy}")
+    if args.transactions:
+        output = args.output or DEFAULT_TRANSACTIONS_OUTPUT
+        lines = write_synthetic_transactions(output, args.rows, LOYALTY_CONFIG, args.seed,
+                                             args.lines_per_year, args.currency_text)
+        print(f"✓ Wrote {lines:,} order lines for {args.rows:,} synthetic accounts to {output} "
+              f"in {time.perf_counter() - start:.1f}s")
+        return 0
+    output = args.output or DEFAULT_OUTPUT
+    profile = {key: getattr(args, key) for key in DEFAULT_PROFILE}
+    rows = write_synthetic_extract(output, args.rows, LOYALTY_CONFIG, args.seed, profile)
+    print(f"✓ Wrote {rows:,} synthetic rows to {output} in {time.perf_counter() - start:.1f}s")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,496 @@
+"""
+LOYALTY ANALYSIS - TRANSACTION INGEST
+
+Purpose: Build the revenue extract straight from order-line files instead of
+         the pre-pivoted customer_annual_revenue.csv PowerBI export. Order
+         lines are streamed in chunks. Each chunk is reduced to one row per
+         account (revenue per evaluation year, earliest order date, Name and
+         Sub Segment) and added into running per-account arrays, found
+         through a sorted ID index. Memory grows with the number of
+         accounts, not the number of order lines.
+
+         Amounts are parsed with the clean_currency() rules and order dates
+         with parse_dates(). The result has the extract's schema, with
+         numeric revenue and the true First Order Date (the account's
+         earliest order line in any year), so it goes straight into
+         run_analysis().
+
+Usage:
+    python loyalty_transactions.py orders_2019.csv orders_2020.csv ... [--output FILE]
+                                   [--accounts FILE] [--chunksize 1000000]
+                                   [--account-column COL] [--date-column COL]
+                                   [--amount-column COL]
+    python loyalty_analysis.py --transactions orders_*.csv [--accounts FILE]
+
+Library use:
+    from loyalty_transactions import aggregate_transactions
+    extract, stats = aggregate_transactions(["orders.csv"], LOYALTY_CONFIG)
+    result = run_analysis(extract, LOYALTY_CONFIG)
+
+Order-line columns (see TRANSACTION_COLUMNS):
+    Account_ID            - Account billed; lines without one are skipped
+    Order Date            - Lines without a readable date are skipped (an
+                            error if no line has one)
+    Net Product Revenue   - "$1,234.56", "($500.00)" or a number; blank = $0
+    Name, Sub Segment     - Optional; the first non-blank value per account
+                            is kept. An --accounts file (Account_ID, Name,
+                            Sub Segment) takes precedence.
+
+Notes:
+    - Lines outside the evaluation window count only towards the First
+      Order Date.
+    - Accounts are listed in order of first appearance in the files.
+
+Requirements:
+    - pandas library
+    - pyarrow library for Parquet/Feather order-line files
+"""
+
+import argparse
+import os
+import sys
+import time
+
+# pandas and numpy are imported inside the functions that use them, so that
+# `loyalty_analysis.py --transactions ... --dry-run` checks the files without
+# loading them
+from loyalty_analysis import (
+    LOYALTY_CONFIG, account_id_keys, get_evaluation_years, parse_currency_columns, parse_dates,
+    revenue_column_name, timed_stage,
+)
+
+DEFAULT_CHUNKSIZE = 1_000_000
+
+# First order of an account with no dated line yet (later than any date)
+NO_ORDER = 2 ** 63 - 1
+
+# Order-line column names: role → column
+TRANSACTION_COLUMNS = {
+    'account': 'Account_ID',
+    'date': 'Order Date',
+    'amount': 'Net Product Revenue',
+    'name': 'Name',
+    'segment': 'Sub Segment',
+}
+REQUIRED_ROLES = ['account', 'date', 'amount']
+
+# Optional roles and the extract column they fill
+ATTRIBUTE_COLUMNS = {'name': 'Name', 'segment': 'Sub Segment'}
+
+# ============================================================================
+# AGGREGATION
+# ============================================================================
+
+def first_values(values, codes, groups):
+    """
+    First non-blank value of each group, in row order.
+
+    Args:
+        values: Series, one value per row
+        codes: Group code per row (0 .. groups - 1)
+        groups: Number of groups
+
+    Returns:
+        ExtensionArray or numpy.ndarray: One value per group, missing where
+        a group has no value
+    """
+    import numpy as np
+
+    present = values.notna().to_numpy()
+    first_row = np.full(groups, len(values))
+    np.minimum.at(first_row, codes[present], np.flatnonzero(present))
+    first_row[first_row == len(values)] = -1
+    return values.array.take(first_row, allow_fill=True)
+
+class AccountRows:
+    """
+    Row of each Account_ID in the running totals, numbered in order of
+    first appearance.
+
+    IDs are keyed with account_id_keys(loose=True): whole numbers exactly
+    as int64, so 1001, "1001", "1001.0" and " 1001" are one account while
+    IDs above 2**53 stay distinct. As in loyalty_streaming.SeenAccounts,
+    integer keys are kept in one sorted int64 array (with each ID's row)
+    and found with searchsorted; anything else goes in a dict, keyed on the
+    stripped text.
+    """
+
+    def __init__(self):
+        import numpy as np
+
+        self._ids = np.empty(0, dtype='int64')
+        self._rows = np.empty(0, dtype='int64')
+        self._other = {}
+        self._new_ids = []
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def lookup(self, account_ids):
+        """
+        Rows of Account_IDs, adding rows for new ones.
+
+        Args:
+            account_ids: Non-blank Account_IDs (array-like; repeats, and
+                         IDs with the same key, get the same row)
+
+        Returns:
+            numpy.ndarray: int64 row per ID
+        """
+        import numpy as np
+
+        is_integer, integer_ids, other_keys = account_id_keys(account_ids, loose=True)
+        rows = np.empty(len(is_integer), dtype='int64')
+
+        # Integer IDs: binary search in the sorted array of known IDs
+        integer_rows = np.full(len(integer_ids), -1, dtype='int64')
+        if len(self._ids) > 0:
+            positions = np.searchsorted(self._ids, integer_ids).clip(max=len(self._ids) - 1)
+            known = self._ids[positions] == integer_ids
+            integer_rows[known] = self._rows[positions[known]]
+        new = np.flatnonzero(integer_rows < 0)
+        if len(new) > 0:
+            # New IDs are numbered in order of appearance, once each
+            new_ids, first, inverse = np.unique(integer_ids[new], return_index=True, return_inverse=True)
+            appearance = np.argsort(first, kind='stable')
+            new_rows = np.empty(len(new_ids), dtype='int64')
+            new_rows[appearance] = self.count + np.arange(len(new_ids))
+            integer_rows[new] = new_rows[inverse]
+            self.count += len(new_ids)
+            self._new_ids.append(new_ids[appearance])
+            # The concatenation of two sorted runs sorts in linear time
+            ids = np.concatenate([self._ids, new_ids])
+            merged = np.argsort(ids, kind='stable')
+            self._ids = ids[merged]
+            self._rows = np.concatenate([self._rows, new_rows])[merged]
+        rows[is_integer] = integer_rows
+
+        # Everything else: dict lookup on the stripped text
+        other_ids = []
+        for position, key in zip(np.flatnonzero(~is_integer), other_keys):
+            row = self._other.get(key)
+            if row is None:
+                row = self._other[key] = self.count
+                self.count += 1
+                other_ids.append(key)
+            rows[position] = row
+        if other_ids:
+            self._new_ids.append(np.array(other_ids, dtype=object))
+        return rows
+
+    def ids(self):
+        """Account_ID of every row, in row order (int64 unless some are text)."""
+        import numpy as np
+
+        return np.concatenate(self._new_ids) if self._new_ids else np.empty(0, dtype='int64')
+
+class TransactionAggregator:
+    """
+    Running per-account totals of order lines.
+
+    add() reduces a chunk to one row per distinct account with a factorize
+    and a bincount, finds those accounts' rows with AccountRows, and adds
+    the chunk's revenue into (accounts x years) running arrays. The arrays
+    grow by doubling, so memory is a few dozen bytes per account plus one
+    chunk, however many lines are read.
+    """
+
+    def __init__(self, config, columns=None):
+        import numpy as np
+
+        self.years = get_evaluation_years(config)
+        self.columns = {**TRANSACTION_COLUMNS, **(columns or {})}
+        self.accounts = AccountRows()
+        self._revenue = np.zeros((0, len(self.years)))
+        self._first_order = np.empty(0, dtype='int64')
+        self._attributes = {column: np.empty(0, dtype=object) for column in ATTRIBUTE_COLUMNS.values()}
+        self._attributes_read = set()
+        self.chunks = 0
+        self.lines = 0
+        self.no_account = 0
+        self.undated = 0
+        self.outside_window = 0
+        self.date_formats = {}
+
+    def read_columns(self):
+        """Columns to read from the order-line files."""
+        return list(dict.fromkeys(self.columns.values()))
+
+    def _reserve(self, rows):
+        """Grow the running arrays to hold at least `rows` accounts."""
+        import numpy as np
+
+        capacity = len(self._first_order)
+        if rows <= capacity:
+            return
+        capacity = max(rows, 2 * capacity, 1024)
+        revenue = np.zeros((capacity, len(self.years)))
+        revenue[:len(self._revenue)] = self._revenue
+        self._revenue = revenue
+        first_order = np.full(capacity, NO_ORDER, dtype='int64')
+        first_order[:len(self._first_order)] = self._first_order
+        self._first_order = first_order
+        for column, values in self._attributes.items():
+            grown = np.full(capacity, None, dtype=object)
+            grown[:len(values)] = values
+            self._attributes[column] = grown
+
+    def add(self, chunk):
+        """
+        Fold one chunk of order lines into the totals.
+
+        Raises:
+            ValueError: If the chunk lacks the account, date or amount column
+        """
+        import numpy as np
+        import pandas as pd
+
+        missing = [self.columns[role] for role in REQUIRED_ROLES if self.columns[role] not in chunk.columns]
+        if missing:
+            raise ValueError(f"Order lines lack required columns: {missing}")
+        self.chunks += 1
+        self.lines += len(chunk)
+
+        amount_column = self.columns['amount']
+        amounts = parse_currency_columns(chunk, [amount_column])[amount_column].to_numpy()
+        order_dates, date_stats = parse_dates(chunk[self.columns['date']])
+        for date_format, count in date_stats['formats'].items():
+            self.date_formats[date_format] = self.date_formats.get(date_format, 0) + count
+
+        has_account = chunk[self.columns['account']].notna().to_numpy()
+        dated = ~np.isnat(order_dates)
+        self.no_account += int((~has_account).sum())
+        self.undated += int((has_account & ~dated).sum())
+        keep = has_account & dated
+        codes, ids = pd.factorize(chunk[self.columns['account']][keep])
+        amounts, order_dates = amounts[keep], order_dates[keep]
+
+        # Revenue per (account, year); slot len(years) collects other years
+        num_years = len(self.years)
+        year_index = order_dates.astype('datetime64[Y]').astype('int64') + 1970 - self.years[0]
+        in_window = (year_index >= 0) & (year_index < num_years)
+        self.outside_window += int((~in_window).sum())
+        slots = codes * (num_years + 1) + np.where(in_window, year_index, num_years)
+        revenue = np.bincount(slots, weights=amounts, minlength=len(ids) * (num_years + 1))
+        revenue = revenue.reshape(len(ids), num_years + 1)[:, :num_years]
+
+        first_order = np.full(len(ids), NO_ORDER, dtype='int64')
+        np.minimum.at(first_order, codes, order_dates.view('int64'))
+
+        # Distinct IDs of the chunk can share a row ("1001" and "1001.0"),
+        # so the totals are accumulated with ufunc.at, not assigned
+        rows = self.accounts.lookup(ids)
+        self._reserve(len(self.accounts))
+        np.add.at(self._revenue, rows, revenue)
+        np.minimum.at(self._first_order, rows, first_order)
+        for role, column in ATTRIBUTE_COLUMNS.items():
+            if self.columns[role] in chunk.columns:
+                self._attributes_read.add(column)
+                values = np.asarray(first_values(chunk[self.columns[role]][keep], codes, len(ids)),
+                                    dtype=object)
+                known = self._attributes[column]
+                fill = pd.isna(known[rows]) & ~pd.isna(values)
+                # First value per row, in order of first appearance
+                fill[fill] = ~pd.Series(rows[fill]).duplicated().to_numpy()
+                known[rows[fill]] = values[fill]
+
+    def extract(self):
+        """
+        The aggregated revenue extract.
+
+        Returns:
+            DataFrame: Account_ID, Name, Sub Segment, First Order Date
+            (datetime) and one numeric revenue column per evaluation year,
+            one row per account
+        """
+        import pandas as pd
+
+        count = len(self.accounts)
+        extract = pd.DataFrame({'Account_ID': self.accounts.ids()})
+        for column in ATTRIBUTE_COLUMNS.values():
+            extract[column] = self._attributes[column][:count] if column in self._attributes_read else None
+        extract['First Order Date'] = self._first_order[:count].view('datetime64[s]')
+        for i, year in enumerate(self.years):
+            extract[revenue_column_name(year)] = self._revenue[:count, i]
+        return extract
+
+    def stats(self):
+        """Ingest statistics (line counts by outcome, accounts, date formats)."""
+        return {
+            'chunks': self.chunks,
+            'lines': self.lines,
+            'accounts': len(self.accounts),
+            'no_account': self.no_account,
+            'undated': self.undated,
+            'outside_window': self.outside_window,
+            'date_formats': dict(self.date_formats),
+        }
+
+def apply_account_attributes(extract, accounts_path, account_rows):
+    """
+    Take Name and Sub Segment from an account file where it has them.
+
+    The file's IDs are looked up in the AccountRows the extract was built
+    with, so they match order-line IDs by the same keys (1001, "1001" and
+    "1001.0" alike, even when a text ID makes pandas read the column as
+    strings).
+
+    Args:
+        extract: Aggregated extract (modified in place), row i being
+                 account_rows row i
+        accounts_path: CSV, Parquet or Feather file with Account_ID and
+                       Name and/or Sub Segment
+        account_rows: AccountRows of the aggregation (IDs only in the
+                      account file are added to it)
+
+    Returns:
+        int: Accounts of the extract found in the file
+
+    Raises:
+        FileNotFoundError: If the file does not exist
+        ValueError: If it has no Account_ID column
+    """
+    import numpy as np
+    import pandas as pd
+
+    from loyalty_io import read_columns, read_table
+
+    if not os.path.exists(accounts_path):
+        raise FileNotFoundError(f"Account file '{accounts_path}' not found.")
+    present = read_columns(accounts_path)
+    if 'Account_ID' not in present:
+        raise ValueError(f"Account file '{accounts_path}' has no Account_ID column")
+    columns = ['Account_ID'] + [col for col in ATTRIBUTE_COLUMNS.values() if col in present]
+    accounts = read_table(accounts_path, columns=columns).dropna(subset=['Account_ID'])
+
+    # First line of the file per extract account
+    rows = account_rows.lookup(accounts['Account_ID'])
+    first = ~pd.Series(rows).duplicated().to_numpy()
+    matched = first & (rows < len(extract))
+    positions = rows[matched]
+
+    for column in columns[1:]:
+        values = accounts[column].to_numpy(dtype=object)[matched]
+        known = ~pd.isna(values)
+        merged = np.array(extract[column], dtype=object)
+        merged[positions[known]] = values[known]
+        extract[column] = merged
+    return int(np.count_nonzero(matched))
+
+def aggregate_transactions(paths, config=None, columns=None, accounts_path=None,
+                           chunksize=DEFAULT_CHUNKSIZE, metrics=None):
+    """
+    Aggregate order-line files into a revenue extract.
+
+    Args:
+        paths: Order-line files (CSV, optionally .gz/.zst, Parquet or
+               Feather), read in order
+        config: Loyalty config dict (sets the evaluation years)
+        columns: Overrides for TRANSACTION_COLUMNS (role → column name)
+        accounts_path: Optional account file for Name and Sub Segment
+        chunksize: Order lines read at a time
+        metrics: Optional loyalty_profiling.StageMetrics
+
+    Returns:
+        tuple: (extract DataFrame, ingest statistics dict; see
+        TransactionAggregator.stats(), plus 'files' and, with an account
+        file, 'accounts_matched')
+
+    Raises:
+        FileNotFoundError: If a file does not exist
+        ValueError: If a file lacks a required column, or no line with an
+                    Account_ID has a readable order date
+    """
+    from loyalty_io import iter_chunks
+
+    if config is None:
+        config = LOYALTY_CONFIG
+    for path in paths:
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Order line file '{path}' not found.")
+
+    aggregator = TransactionAggregator(config, columns)
+    with timed_stage(metrics, 'ingest') as record:
+        for path in paths:
+            for chunk in iter_chunks(path, chunksize, columns=aggregator.read_columns()):
+                aggregator.add(chunk)
+        extract = aggregator.extract()
+        record['rows'] = aggregator.lines
+    if aggregator.undated > 0 and aggregator.undated == aggregator.lines - aggregator.no_account:
+        raise ValueError(f"None of the {aggregator.undated:,} order lines has a readable "
+                         f"'{aggregator.columns['date']}'")
+    stats = {'files': len(paths), **aggregator.stats()}
+    if accounts_path:
+        stats['accounts_matched'] = apply_account_attributes(extract, accounts_path, aggregator.accounts)
+    return extract, stats
+
+def print_ingest_report(stats):
+    print(f"✓ Aggregated {stats['lines']:,} order lines from {stats['files']} file(s) "
+          f"into {stats['accounts']:,} accounts")
+    for date_format, count in stats['date_formats'].items():
+        print(f"  • {count:,} order dates in format {date_format}")
+    if stats['outside_window'] > 0:
+        print(f"  • {stats['outside_window']:,} lines outside the evaluation window "
+              f"(used for First Order Date only)")
+    if stats['no_account'] > 0:
+        print(f"  • WARNING: {stats['no_account']:,} lines without an Account_ID skipped")
+    if stats['undated'] > 0:
+        print(f"  • WARNING: {stats['undated']:,} lines without a readable order date skipped")
+    if 'accounts_matched' in stats:
+        print(f"  • Name/Sub Segment from the account file for {stats['accounts_matched']:,} accounts")
+
+# ============================================================================
+# COMMAND LINE INTERFACE
+# ============================================================================
+
+def add_column_arguments(parser):
+    """--account-column, --date-column and --amount-column options."""
+    for role in REQUIRED_ROLES:
+        parser.add_argument(f'--{role}-column', default=TRANSACTION_COLUMNS[role], metavar='COL',
+                            help=f"Order-line {role} column (default: {TRANSACTION_COLUMNS[role]})")
+
+def column_overrides(args):
+    """TRANSACTION_COLUMNS overrides from the parsed --*-column options."""
+    return {role: getattr(args, f'{role}_column') for role in REQUIRED_ROLES}
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Aggregate order-line files into a loyalty revenue extract.")
+    parser.add_argument('files', nargs='+', help="Order-line files (CSV, Parquet or Feather)")
+    parser.add_argument('--output', default=None, metavar='FILE',
+                        help="Write the extract here (.csv, .parquet or .feather); "
+                             "without it only the ingest report is printed")
+    parser.add_argument('--accounts', default=None, metavar='FILE',
+                        help="Account file with Account_ID, Name and Sub Segment")
+    parser.add_argument('--chunksize', type=int, default=DEFAULT_CHUNKSIZE, metavar='LINES',
+                        help=f"Order lines read at a time (default: {DEFAULT_CHUNKSIZE:,})")
+    add_column_arguments(parser)
+    args = parser.parse_args(argv)
+    if args.chunksize < 1:
+        parser.error("--chunksize must be at least 1")
+    return args
+
+def main(argv=None):
+    args = parse_args(argv)
+    if LOYALTY_CONFIG is None:
+        print("ERROR: loyalty_config.py not found in current directory.")
+        return 1
+
+    start = time.perf_counter()
+    try:
+        extract, stats = aggregate_transactions(args.files, LOYALTY_CONFIG, column_overrides(args),
+                                                args.accounts, args.chunksize)
+    except (FileNotFoundError, ValueError) as e:
+        print(f"ERROR: {e}")
+        return 1
+    print_ingest_report(stats)
+    print(f"✓ Done in {time.perf_counter() - start:.1f}s")
+    if args.output:
+        from loyalty_io import write_table
+        write_table(extract, args.output)
+        print(f"✓ Extract written to {args.output}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,333 @@
+"""
+LOYALTY ANALYSIS - ROLLING WINDOWS
+
+Purpose: Score every evaluation window the extract can support (2020-2024,
+         2021-2025, ...) in one pass, instead of editing loyalty_config.py and
+         re-running the analysis once per year. Each window is the config's
+         window slid forward, with current_year slid by the same amount, so a
+         window's statuses are exactly what loyalty_analysis.py would produce
+         with that year-end's config.
+
+         All revenue years are parsed once into an accounts x years array.
+         Active-year counts come from a cumulative sum over that array (one
+         subtraction per window), and the first year with revenue from each
+         year onward (used for blank First Order Dates) from one backward
+         scan over the years.
+
+Usage:
+    python loyalty_windows.py [--input FILE] [--output-dir DIR] [--verify]
+
+Library use:
+    from loyalty_windows import score_windows
+    result = score_windows(df, LOYALTY_CONFIG)
+    result["timeline"]    # one row per account, a status column per window
+    result["summary"]     # status counts per window
+
+Output:
+    - loyalty_windows_YYYYMMDD_HHMMSS.csv: per-account status timeline
+      (status and 5-year revenue for each window, plus threshold_rule when
+      the config has segment_thresholds)
+    - Console status counts per window and moves between consecutive windows
+"""
+
+import argparse
+import os
+import re
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from loyalty_analysis import (
+    BASE_COLUMNS, INPUT_FILE, LOYALTY_CONFIG, STATUS_ORDER, drop_duplicate_accounts,
+    get_evaluation_years, load_revenue_extract, loyalty_masks, parse_currency_columns,
+    parse_first_order_years, revenue_column_name, row_thresholds, rule_categorical, run_analysis,
+)
+
+STATUSES = list(STATUS_ORDER)
+
+# ============================================================================
+# WINDOWS
+# ============================================================================
+
+def available_years(columns):
+    """
+    Years with a revenue column in an extract.
+
+    Args:
+        columns: Extract column names
+
+    Returns:
+        list: Sorted years
+    """
+    pattern = re.compile(re.escape(revenue_column_name(0)).replace('0', r'(\d{4})') + '$')
+    return sorted(int(match.group(1)) for match in map(pattern.match, columns) if match)
+
+def window_config(config, end_year):
+    """
+    The config's evaluation window slid to end in end_year.
+
+    current_year moves by the same number of years, so tenure is measured
+    as it would be at that year-end. Thresholds are unchanged.
+
+    Returns:
+        dict: Config for the window
+    """
+    shift = end_year - config['evaluation_end_year']
+    return {
+        **config,
+        'evaluation_start_year': config['evaluation_start_year'] + shift,
+        'evaluation_end_year': end_year,
+        'current_year': config['current_year'] + shift,
+    }
+
+def window_label(config):
+    return f"{config['evaluation_start_year']}_{config['evaluation_end_year']}"
+
+def list_windows(config, years):
+    """
+    Every slide of the config's window that fits in the available years.
+
+    Args:
+        config: Loyalty config dict
+        years: Years with revenue (from available_years())
+
+    Returns:
+        list: Window configs, earliest first
+    """
+    length = len(get_evaluation_years(config))
+    year_set = set(years)
+    return [window_config(config, end) for end in years
+            if all(year in year_set for year in range(end - length + 1, end + 1))]
+
+# ============================================================================
+# SCORING
+# ============================================================================
+
+def score_windows(df, config, windows=None):
+    """
+    Loyalty status of every account in every window.
+
+    Args:
+        df: Raw extract
+        config: Loyalty config dict (window length and thresholds)
+        windows: Window configs (defaults to list_windows() over the extract)
+
+    Returns:
+        dict: windows (configs), timeline (customer_id, customer_name,
+        sub_segment, then status_START_END and revenue_5yr_START_END per
+        window, in extract order), summary (status counts per window) and
+        input_rows / duplicates
+
+    Raises:
+        ValueError: If identification columns are missing or no window fits
+    """
+    missing_columns = [column for column in BASE_COLUMNS if column not in df.columns]
+    if missing_columns:
+        raise ValueError(f"Missing required columns: {missing_columns}")
+    if windows is None:
+        windows = list_windows(config, available_years(df.columns))
+    if not windows:
+        raise ValueError(f"No {len(get_evaluation_years(config))}-year window fits the revenue "
+                         f"years in the extract ({available_years(df.columns)})")
+
+    input_rows = len(df)
+    df, duplicates = drop_duplicate_accounts(df)
+
+    # Every year any window needs, parsed once
+    years = list(range(windows[0]['evaluation_start_year'], windows[-1]['evaluation_end_year'] + 1))
+    columns = [revenue_column_name(year) for year in years]
+    revenue = parse_currency_columns(df, columns)[columns].to_numpy(dtype='float64')
+    length = len(get_evaluation_years(config))
+
+    # Thresholds per account (segment overrides apply in every window)
+    rules, thresholds = row_thresholds(df['Sub Segment'], config)
+
+    # active_before[:, j] = active years among the first j years
+    min_revenue_per_year = np.asarray(thresholds['min_revenue_per_active_year'])
+    if min_revenue_per_year.ndim > 0:
+        per_year = min_revenue_per_year[:, None]
+        active = np.where(per_year > 0, revenue >= per_year, revenue > 0)
+    else:
+        active = revenue >= min_revenue_per_year if min_revenue_per_year > 0 else revenue > 0
+    active_before = np.zeros((len(df), len(years) + 1), dtype='int16')
+    np.cumsum(active, axis=1, out=active_before[:, 1:])
+
+    # next_revenue[:, j] = index of the first year >= j with positive revenue
+    # (len(years) if none), for inferring blank First Order Dates per window
+    next_revenue = np.full((len(df), len(years) + 1), len(years), dtype='int16')
+    for j in range(len(years) - 1, -1, -1):
+        next_revenue[:, j] = np.where(revenue[:, j] > 0, j, next_revenue[:, j + 1])
+
+    date_year, _ = parse_first_order_years(df['First Order Date'])
+    # Blank revenue counts as $0, summed year by year like calculate_metrics()
+    revenue_filled = np.nan_to_num(revenue, nan=0.0)
+    year_values = np.asarray(years + [np.nan], dtype='float64')
+
+    timeline = pd.DataFrame({
+        'customer_id': df['Account_ID'].to_numpy(),
+        'customer_name': df['Name'].to_numpy(),
+        'sub_segment': df['Sub Segment'].fillna('UNKNOWN').to_numpy(),
+    })
+    if rules is not None:
+        timeline['threshold_rule'] = rule_categorical(rules, config)
+    summary_rows = []
+    for window in windows:
+        start = window['evaluation_start_year'] - years[0]
+        end = start + length
+
+        first_with_revenue = next_revenue[:, start]
+        inferred = np.where(first_with_revenue < end, year_values[first_with_revenue], np.nan)
+        first_order_year = np.where(np.isnan(date_year), inferred, date_year)
+        tenure_years = window['current_year'] - first_order_year
+        consistency_rate = (active_before[:, end] - active_before[:, start]) / length
+        revenue_5yr = revenue_filled[:, start]
+        for j in range(start + 1, end):
+            revenue_5yr = revenue_5yr + revenue_filled[:, j]
+
+        masks = loyalty_masks(tenure_years, consistency_rate, revenue_5yr, thresholds)
+        codes = np.where(masks['ineligible'], STATUS_ORDER['Ineligible'],
+                         np.where(masks['loyal'], STATUS_ORDER['Loyal'], STATUS_ORDER['Not Qualified']))
+        label = window_label(window)
+        timeline[f'status_{label}'] = pd.Categorical.from_codes(codes, STATUSES)
+        timeline[f'revenue_5yr_{label}'] = revenue_5yr.round(2)
+
+        counts = np.bincount(codes, minlength=len(STATUSES))
+        summary_rows.append({
+            'window': f"{window['evaluation_start_year']}-{window['evaluation_end_year']}",
+            **{status: int(count) for status, count in zip(STATUSES, counts)},
+            'loyal_revenue': revenue_5yr[codes == STATUS_ORDER['Loyal']].sum(),
+        })
+
+    return {
+        'windows': windows,
+        'timeline': timeline,
+        'summary': pd.DataFrame(summary_rows),
+        'input_rows': input_rows,
+        'duplicates': duplicates,
+    }
+
+def window_moves(timeline, windows):
+    """
+    Promotions and demotions between each pair of consecutive windows.
+
+    Returns:
+        DataFrame: from_window, to_window, promoted, demoted, other_moves
+    """
+    rows = []
+    for before, after in zip(windows, windows[1:]):
+        old = timeline[f'status_{window_label(before)}'].cat.codes.to_numpy()
+        new = timeline[f'status_{window_label(after)}'].cat.codes.to_numpy()
+        loyal = STATUS_ORDER['Loyal']
+        moved = old != new
+        rows.append({
+            'from_window': f"{before['evaluation_start_year']}-{before['evaluation_end_year']}",
+            'to_window': f"{after['evaluation_start_year']}-{after['evaluation_end_year']}",
+            'promoted': int((moved & (new == loyal)).sum()),
+            'demoted': int((moved & (old == loyal)).sum()),
+            'other_moves': int((moved & (old != loyal) & (new != loyal)).sum()),
+        })
+    return pd.DataFrame(rows, columns=['from_window', 'to_window', 'promoted', 'demoted', 'other_moves'])
+
+def windows_match(df, result):
+    """
+    Check every window against a full run with that window's config.
+
+    Args:
+        df: Raw extract the windows were scored from
+        result: score_windows() result
+
+    Returns:
+        list: (passed, message) tuples in the style of validate_output()
+    """
+    checks = []
+    for window in result['windows']:
+        label = window_label(window)
+        output = run_analysis(df, window)['output'].set_index('customer_id')
+        timeline = result['timeline'].set_index('customer_id')
+        expected = output['loyalty_status'].reindex(timeline.index)
+        mismatches = int((expected.astype(str) != timeline[f'status_{label}'].astype(str)).sum())
+        name = f"{window['evaluation_start_year']}-{window['evaluation_end_year']}"
+        if mismatches == 0:
+            checks.append((True, f"Window {name} matches a full run ({len(output):,} accounts)"))
+        else:
+            checks.append((False, f"Window {name} differs from a full run for {mismatches:,} accounts"))
+    return checks
+
+# ============================================================================
+# COMMAND LINE INTERFACE
+# ============================================================================
+
+def print_summary(summary, moves):
+    print(f"  {'Window':<11} {'Loyal':>9} {'Not Qualified':>14} {'Ineligible':>11} {'Loyal Revenue':>17}")
+    print(f"  {'-'*11} {'-'*9} {'-'*14} {'-'*11} {'-'*17}")
+    for row in summary.itertuples(index=False):
+        print(f"  {row.window:<11} {row.Loyal:>9,} {row[2]:>14,} {row.Ineligible:>11,} ${row.loyal_revenue:>16,.0f}")
+    if not moves.empty:
+        print(f"\nMoves between consecutive windows:")
+        for row in moves.itertuples(index=False):
+            print(f"  • {row.from_window} → {row.to_window}: {row.promoted:,} promoted, "
+                  f"{row.demoted:,} demoted, {row.other_moves:,} other moves")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Score every rolling evaluation window in the extract in one pass.")
+    parser.add_argument('--input', default=INPUT_FILE,
+                        help=f"Revenue extract: .csv, .parquet or .feather (default: {INPUT_FILE})")
+    parser.add_argument('--output-dir', default=None,
+                        help="Directory for loyalty_windows_*.csv (default: current directory)")
+    parser.add_argument('--verify', action='store_true',
+                        help="Also run the full analysis once per window and compare")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    if LOYALTY_CONFIG is None:
+        print("ERROR: loyalty_config.py not found in current directory.")
+        return 1
+    config = LOYALTY_CONFIG
+
+    print("=" * 80)
+    print("CUSTOMER LOYALTY FRAMEWORK - ROLLING WINDOWS")
+    print("=" * 80)
+    try:
+        df = load_revenue_extract(args.input)
+    except Exception as e:
+        print(f"ERROR: Failed to load {args.input}")
+        print(f"Error message: {str(e)}")
+        return 1
+    print(f"✓ Loaded {len(df):,} customer records from {args.input}")
+
+    start = time.perf_counter()
+    try:
+        result = score_windows(df, config)
+    except ValueError as e:
+        print(f"ERROR: {str(e)}")
+        return 1
+    seconds = time.perf_counter() - start
+    if result['duplicates'] > 0:
+        print(f"WARNING: {result['duplicates']} duplicate Account_IDs found (kept first occurrence)")
+    print(f"✓ Scored {len(result['timeline']):,} accounts in {len(result['windows'])} windows "
+          f"in {seconds:.2f}s")
+
+    print(f"\nStatus by window:")
+    print_summary(result['summary'], window_moves(result['timeline'], result['windows']))
+
+    passed = True
+    if args.verify:
+        print()
+        for check_passed, message in windows_match(df, result):
+            print(f"{'✓' if check_passed else '✗ FAIL:'} {message}")
+            passed = passed and check_passed
+
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    output_filename = os.path.join(args.output_dir or '', f'loyalty_windows_{timestamp}.csv')
+    result['timeline'].to_csv(output_filename, index=False)
+    print(f"\n✓ Status timeline saved: {output_filename}")
+    return 0 if passed else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
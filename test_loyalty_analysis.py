@@ -0,0 +1,207 @@
+"""
+Tests for loyalty_analysis.py: the vectorized parsers and keys against
+their one-value-at-a-time reference rules.
+
+Usage:
+    python -m pytest -q test_loyalty_analysis.py
+"""
+
+import math
+import re
+import warnings
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from loyalty_analysis import (
+    _INTEGER_ID, _LOOSE_INTEGER_ID, account_id_keys, calculate_metrics, classify_loyalty,
+    clean_currency, get_evaluation_years, infer_first_order_years, parse_currency_columns,
+    parse_first_order_years, score_metrics,
+)
+from loyalty_config import LOYALTY_CONFIG
+
+# ============================================================================
+# ACCOUNT_ID KEYS
+# ============================================================================
+
+ACCOUNT_ID_EDGE_CASES = [
+    "1001", "1001.0", "1001 ", " 1001", "+1001", "01001", "-7", "0", "1001.5", "1e3", "abc", "",
+    "12345678901234567", "12345678901234568", "9223372036854775807", "9223372036854775808",
+    "99999999999999999999", None,
+]
+INTEGER_ID_EDGE_CASES = [12345678901234567, 12345678901234568, 2 ** 63 - 1, -2 ** 63, 0]
+
+def account_id_key(value, loose=False):
+    """Reference rule for account_id_keys(), one ID at a time."""
+    if pd.isna(value):
+        return None
+    if isinstance(value, (int, np.integer)):
+        return int(value)
+    if isinstance(value, float):
+        return int(value) if value == math.floor(value) and abs(value) < 2.0 ** 63 else value
+    text = str(value).strip() if loose else str(value)
+    if re.fullmatch(_LOOSE_INTEGER_ID if loose else _INTEGER_ID, text):
+        number = int(text.split('.')[0])
+        if -2 ** 63 <= number < 2 ** 63:
+            return number
+    return text
+
+def keys_in_order(account_ids, loose):
+    is_integer, integer_keys, other_keys = account_id_keys(account_ids, loose=loose)
+    integer_keys, other_keys = iter(integer_keys.tolist()), iter(other_keys)
+    return [next(integer_keys) if whole else next(other_keys) for whole in is_integer]
+
+@pytest.mark.parametrize("loose", [False, True])
+@pytest.mark.parametrize("account_ids", [
+    pd.Series(ACCOUNT_ID_EDGE_CASES, dtype=object),
+    pd.Series(ACCOUNT_ID_EDGE_CASES, dtype="str"),
+    pd.Series(INTEGER_ID_EDGE_CASES, dtype="int64"),
+    pd.Series([1001.0, np.nan, 2.5, 1e300, -0.0]),
+    # Mixed IDs: a text ID makes pandas read the column as objects
+    pd.Series([1001, "1001", "A-77", 12345678901234567, "12345678901234568", None], dtype=object),
+    pd.Series([], dtype="int64"),
+], ids=["text", "str", "int64", "float64", "mixed", "empty"])
+def test_account_id_keys_match_reference(account_ids, loose):
+    expected = [account_id_key(value, loose) for value in account_ids.tolist()]
+    actual = keys_in_order(account_ids, loose)
+    assert actual == expected
+    assert [type(key) for key in actual] == [type(key) for key in expected]
+
+def test_large_ids_keep_distinct_keys():
+    _, keys, _ = account_id_keys(pd.Series(["12345678901234567", "12345678901234568"]))
+    assert keys.tolist() == [12345678901234567, 12345678901234568]
+
+# ============================================================================
+# CURRENCY PARSING
+# ============================================================================
+
+CURRENCY_EDGE_CASES = [
+    "$1,234.56", "($500.00)", "(-500)", "-$75.25", "$ 1 234", "", " ", "  ",
+    "abc", "(abc)", "nan", "1e3", "1_000", "inf", "()", "(12", None,
+    float('nan'), 0, 42, -3.5, True,
+]
+
+@pytest.mark.parametrize("dtype", [object, "str"])
+def test_currency_parsing_matches_clean_currency(dtype):
+    values = CURRENCY_EDGE_CASES if dtype is object else [
+        value for value in CURRENCY_EDGE_CASES if value is None or isinstance(value, str)]
+    sample = pd.Series(values, dtype=dtype)
+    expected = np.array([clean_currency(value) for value in sample], dtype="float64")
+    actual = parse_currency_columns(pd.DataFrame({"value": sample}), ["value"])["value"].to_numpy()
+    np.testing.assert_array_equal(actual, expected)
+
+def test_currency_columns_parse_together():
+    df = pd.DataFrame({
+        "text": ["$1,000.50", "(25)", "", None],
+        "number": [1.5, None, -2.0, 0.0],
+    })
+    cleaned = parse_currency_columns(df, ["text", "number"])
+    assert cleaned["text"].tolist() == [1000.5, -25.0, 0.0, 0.0]
+    assert cleaned["number"].tolist() == [1.5, 0.0, -2.0, 0.0]
+
+# ============================================================================
+# FIRST ORDER YEAR INFERENCE
+# ============================================================================
+
+YEAR_COLUMNS = [f"revenue_{year}" for year in range(2020, 2026)]
+
+def infer_first_order_year(row, year_columns):
+    """Reference rule for infer_first_order_years(): the first year with
+    positive revenue, or None."""
+    for col in year_columns:
+        if row[col] > 0:
+            return int(col.split('_')[1])
+    return None
+
+def test_inferred_years_match_reference():
+    rng = np.random.default_rng(7)
+    revenue = rng.choice([0.0, 0.0, -25.0, 0.01, 150.0], size=(200, len(YEAR_COLUMNS)))
+    edge_rows = [[0.0] * 6, [-1.0] * 6, [0.0, -5.0, 0.0, 0.0, 0.0, 3.0], [1e-9] + [0.0] * 5]
+    df = pd.DataFrame(np.vstack([edge_rows, revenue]), columns=YEAR_COLUMNS)
+    expected = [infer_first_order_year(row, YEAR_COLUMNS) for _, row in df.iterrows()]
+    expected = np.array([np.nan if year is None else year for year in expected], dtype="float64")
+    actual = infer_first_order_years(df, YEAR_COLUMNS).to_numpy()
+    np.testing.assert_array_equal(actual, expected)
+    np.testing.assert_array_equal(actual[:4], [np.nan, np.nan, 2025, 2020])
+
+# ============================================================================
+# FUSED SCORING
+# ============================================================================
+
+SEGMENT_OVERRIDES = {
+    "DESIGN_FIRM": {"min_revenue_5yr": 100000},
+    "DESIGNER_INDEPENDENT": {"min_revenue_5yr": 20000, "min_consistency_rate": 0.40,
+                             "min_revenue_per_active_year": 2000},
+    "UNKNOWN": {"min_tenure_years": 2},
+}
+
+def scoring_frame(config, rows=500):
+    rng = np.random.default_rng(11)
+    years = get_evaluation_years(config)
+    df = pd.DataFrame({
+        "Sub Segment": rng.choice(["DESIGN_FIRM", "DESIGNER_INDEPENDENT", "UNKNOWN", "RETAIL"], rows),
+        "first_order_year": rng.choice([np.nan, 2010, 2019, 2021, 2024, 2026], rows),
+    })
+    for year in years:
+        df[f"revenue_{year}"] = rng.choice([0.0, -500.0, 1999.99, 2000.0, 9000.0, 40000.0], rows)
+    return df
+
+@pytest.mark.parametrize("engine", ["numpy", "numba"])
+@pytest.mark.parametrize("overrides", [{}, SEGMENT_OVERRIDES], ids=["default", "segments"])
+def test_fused_scoring_matches_multi_pass(engine, overrides):
+    if engine == "numba":
+        pytest.importorskip("numba")
+    config = {**LOYALTY_CONFIG, "segment_thresholds": overrides}
+    df = scoring_frame(config)
+    expected = classify_loyalty(calculate_metrics(df.copy(), config), config)
+    actual = score_metrics(df.copy(), config, engine)
+    for column in ["tenure_years", "years_active", "consistency_rate", "revenue_5yr"]:
+        np.testing.assert_array_equal(actual[column].to_numpy(dtype="float64"),
+                                      expected[column].to_numpy(dtype="float64"), err_msg=column)
+    for column in ["loyalty_status", "ineligibility_reason"] + (["threshold_rule"] if overrides else []):
+        assert actual[column].astype(object).fillna("").tolist() == \
+            expected[column].astype(object).fillna("").tolist(), column
+
+# ============================================================================
+# DATE PARSING
+# ============================================================================
+
+DATE_EDGE_CASES = [
+    "2020-07-17 00:00:00", "2020-07-17", "7/17/2020", "7/17/20", "12/31/99", "7/17/20 13:45",
+    "Jul 2020", "July 17, 2020", "17.07.2020", "20200717", "2020", "", "  ", "n/a",
+]
+
+def to_datetime_years(values):
+    """Reference years: pd.to_datetime() over the values as one column."""
+    with warnings.catch_warnings():
+        # "Could not infer format" and day-first warnings
+        warnings.simplefilter("ignore", UserWarning)
+        dates = pd.to_datetime(pd.Series(list(values), dtype=object), errors="coerce")
+    return np.asarray(dates.dt.year, dtype="float64")
+
+def assert_years_match(values):
+    # Wherever pd.to_datetime reads a date the year must be the same; values
+    # it leaves NaT because they are in a second format may still be read
+    expected = to_datetime_years(values)
+    actual, _ = parse_first_order_years(pd.Series(list(values), dtype=object))
+    known = ~np.isnan(expected)
+    np.testing.assert_array_equal(actual[known], expected[known])
+
+@pytest.mark.parametrize("value", DATE_EDGE_CASES)
+def test_date_edge_case_matches_to_datetime(value):
+    # One value at a time, since pd.to_datetime reads a whole column in the
+    # first value's format
+    assert_years_match([value])
+
+@pytest.mark.parametrize("values", [
+    ["2019-03-04 00:00:00", "2021-12-31 00:00:00", None, "2019-03-04 00:00:00"],
+    ["3/4/2019", "12/31/2021", "", "3/4/2019"],
+    ["3/4/19", "12/31/21", "7/17/20"],
+], ids=["powerbi", "m/d/yyyy", "m/d/yy"])
+def test_date_columns_match_to_datetime(values):
+    assert_years_match(values)
+
+def test_blank_dates_have_no_year():
+    years, _ = parse_first_order_years(pd.Series(["", "  ", None, "n/a"], dtype=object))
+    assert np.isnan(years).all()
@@ -0,0 +1,30 @@
+"""
+Tests for loyalty_rollup.py (parent/child account grouping).
+
+Usage:
+    python -m pytest -q test_loyalty_rollup.py
+"""
+
+import pandas as pd
+
+from loyalty_rollup import HIERARCHY_COLUMNS, account_groups
+
+def links(pairs):
+    children, parents = zip(*pairs)
+    return pd.DataFrame({HIERARCHY_COLUMNS[0]: list(children), HIERARCHY_COLUMNS[1]: list(parents)})
+
+def test_large_ids_stay_in_separate_groups():
+    account_ids = pd.Series([12345678901234567, 12345678901234568, 1001, 1002])
+    groups, group_ids, _, stats = account_groups(
+        account_ids, links([("12345678901234569", "12345678901234568"), ("1002", "1001")]))
+    assert groups.tolist() == [0, 1, 2, 2]
+    assert group_ids.tolist() == [12345678901234567, 12345678901234568, 1001]
+    assert stats["outside_ids"] == 1
+
+def test_link_ids_match_extract_ids_written_differently():
+    # The hierarchy file has a text ID, so pandas reads its IDs as strings
+    account_ids = pd.Series([1001, 1002, 1003])
+    groups, group_ids, _, _ = account_groups(
+        account_ids, links([("1002.0", "1001"), (" 1003", "P-9")]))
+    assert groups.tolist() == [0, 0, 1]
+    assert group_ids.tolist() == [1001, "P-9"]
@@ -0,0 +1,37 @@
+"""
+Tests for loyalty_streaming.py (chunked scoring).
+
+Usage:
+    python -m pytest -q test_loyalty_streaming.py
+"""
+
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from loyalty_streaming import SeenAccounts
+
+# Large IDs, text IDs and other spellings of 1001; the column is read as
+# text, so only exact repeats are duplicates
+MIXED_IDS = ["1001", "12345678901234567", "7", "12345678901234568", "1001", "abc", "1001.0",
+             "1001 ", "7", "abc", "12345678901234567", "12345678901234568"]
+
+@pytest.mark.parametrize("chunksize", [4, 5, 12])
+def test_chunked_dedupe_matches_in_memory(chunksize):
+    text = "Account_ID\n" + "\n".join(MIXED_IDS) + "\n"
+    full = pd.read_csv(io.StringIO(text))
+    expected = ~full["Account_ID"].duplicated().to_numpy()
+
+    seen = SeenAccounts()
+    actual = np.concatenate([seen.first_occurrences(chunk["Account_ID"])
+                             for chunk in pd.read_csv(io.StringIO(text), chunksize=chunksize)])
+    assert actual.tolist() == expected.tolist()
+
+def test_large_ids_are_not_duplicates_across_chunks():
+    seen = SeenAccounts()
+    assert seen.first_occurrences(pd.Series([12345678901234567])).tolist() == [True]
+    assert seen.first_occurrences(pd.Series([12345678901234568, 12345678901234567])).tolist() == [True, False]
+    # The same account read as text in a chunk with a text ID
+    assert seen.first_occurrences(pd.Series(["12345678901234568", "abc"])).tolist() == [False, True]
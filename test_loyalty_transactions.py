@@ -0,0 +1,66 @@
+"""
+Tests for loyalty_transactions.py (order-line ingest).
+
+Usage:
+    python -m pytest -q test_loyalty_transactions.py
+"""
+
+import pytest
+
+from loyalty_transactions import AccountRows, aggregate_transactions
+
+def write_csv(path, text):
+    path.write_text(text, encoding="utf-8")
+    return str(path)
+
+def test_ids_with_the_same_key_add_up(tmp_path):
+    # Distinct IDs of one chunk that share a row must not overwrite each other
+    orders = write_csv(tmp_path / "orders.csv",
+                       'Account_ID,Order Date,Net Product Revenue\n'
+                       '1001,2021-01-05,20\n"1001.0",2019-02-05,30\n"1001 ",2022-03-05,40\n')
+    extract, stats = aggregate_transactions([orders])
+    assert extract["Account_ID"].tolist() == [1001]
+    assert extract["TY Net Product Revenue 2021"].tolist() == [20.0]
+    assert extract["TY Net Product Revenue 2022"].tolist() == [40.0]
+    assert extract["First Order Date"].dt.year.tolist() == [2019]
+    assert stats["accounts"] == 1
+
+def test_ids_above_2_53_stay_separate(tmp_path):
+    orders = write_csv(tmp_path / "orders.csv",
+                       'Account_ID,Order Date,Net Product Revenue\n'
+                       '12345678901234567,2021-01-05,10\n12345678901234568,2021-01-05,20\n')
+    extract, _ = aggregate_transactions([orders])
+    assert extract["Account_ID"].tolist() == [12345678901234567, 12345678901234568]
+    assert extract["TY Net Product Revenue 2021"].tolist() == [10.0, 20.0]
+
+def test_short_dates_are_read(tmp_path):
+    orders = write_csv(tmp_path / "orders.csv",
+                       'Account_ID,Order Date,Net Product Revenue\n1001,7/17/20,10\n1002,1/2/21,20\n')
+    extract, stats = aggregate_transactions([orders])
+    assert stats["undated"] == 0
+    assert extract["First Order Date"].dt.year.tolist() == [2020, 2021]
+
+def test_file_without_readable_dates_is_an_error(tmp_path):
+    orders = write_csv(tmp_path / "orders.csv",
+                       'Account_ID,Order Date,Net Product Revenue\n1001,,10\n1002,nope,20\n')
+    with pytest.raises(ValueError):
+        aggregate_transactions([orders])
+
+def test_account_file_with_mixed_ids_matches_integer_accounts(tmp_path):
+    # One text ID makes pandas read the account file's IDs as strings
+    orders = write_csv(tmp_path / "orders.csv",
+                       'Account_ID,Order Date,Net Product Revenue\n'
+                       '1001,2021-01-05,20\n1002,2021-01-05,30\nA-77,2022-03-05,40\n')
+    accounts = write_csv(tmp_path / "accounts.csv",
+                         'Account_ID,Name,Sub Segment\n'
+                         '1001,Alpha,RETAIL\n"1002 ",Beta,\nA-77,Gamma,TRADE\n1001,Later,OTHER\n9999,Absent,X\n')
+    extract, stats = aggregate_transactions([orders], accounts_path=accounts)
+    assert extract["Name"].tolist() == ["Alpha", "Beta", "Gamma"]
+    assert extract["Sub Segment"].tolist()[0] == "RETAIL"
+    assert stats["accounts_matched"] == 3
+
+def test_account_rows_numbers_each_key_once():
+    rows = AccountRows()
+    assert rows.lookup(["1001", "1001.0", " 1001", "abc"]).tolist() == [0, 0, 0, 1]
+    assert rows.lookup([1001, 12345678901234567, 12345678901234568]).tolist() == [0, 2, 3]
+    assert rows.ids().tolist() == [1001, "abc", 12345678901234567, 12345678901234568]